@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KnowledgeBackend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# 后台预热热点数据，完成前 /api/health/ready/ 返回 503
+from KnowledgeBackend.warmup import start_warmup  # noqa: E402
+from graph_api.live import LIVE_GRAPH_PATH, live_graph_application  # noqa: E402
+
+start_warmup()
+
+
+async def application(scope, receive, send):
+    """HTTP 交给 Django；WebSocket 只接受图谱实时推送（graph_api/live.py）"""
+    if scope['type'] == 'websocket':
+        if scope['path'] == LIVE_GRAPH_PATH:
+            return await live_graph_application(scope, receive, send)
+        # 握手前关闭，客户端收到 403
+        await receive()
+        await send({'type': 'websocket.close'})
+        return
+    return await django_application(scope, receive, send)
@@ -0,0 +1,108 @@
+"""
+响应压缩：按 Accept-Encoding 协商 Brotli / gzip。
+
+图谱（ECharts 节点与连线）和平台统计的 JSON 响应重复度很高，压缩后通常只有原来的十分之一左右。
+- 只压缩可压缩的内容类型（JSON、文本等），且内容不小于 COMPRESSION_MIN_BYTES；
+  压缩后没有变小时原样返回
+- 客户端同时接受两种编码时优先 Brotli（需要安装 brotli 或 brotlicffi，未安装时只用 gzip），
+  q=0 表示拒绝该编码
+- 流式响应（导出、对话流）不压缩，避免缓冲分块、推迟首字节
+- gzip 与 Django 的 GZipMiddleware 一样在文件头中加入随机字节缓解 BREACH；
+  COMPRESSION_EXCLUDE_PATHS 中的接口（登录、刷新令牌等响应体中带令牌的接口）不压缩
+- 压缩耗时记入当前请求的 compress 分项（见 perf.py）
+"""
+import re
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+from .perf import PHASE_COMPRESS, track
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml', 'text/',
+)
+
+_CODING_RE = re.compile(r'^\s*([A-Za-z0-9*\-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 {编码: q 值}；格式错误的条目忽略"""
+    codings = {}
+    for part in header.split(','):
+        match = _CODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) is not None else 1.0
+        except ValueError:
+            continue
+        codings[match.group(1).lower()] = quality
+    return codings
+
+
+def available_encodings():
+    """服务端支持的编码，按优先级排列"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(header: str) -> Optional[str]:
+    """按服务端优先级选出客户端接受（q > 0）的编码，没有可用编码时返回 None"""
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get('*', 0.0)
+    for encoding in available_encodings():
+        if codings.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    # 与 GZipMiddleware 相同（级别 6），文件头中加入随机字节
+    return compress_string(content, max_random_bytes=CompressionMiddleware.max_random_bytes)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Brotli / gzip 压缩，替代 django.middleware.gzip.GZipMiddleware；应放在中间件列表靠前的位置"""
+
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_BYTES', 1024):
+            return response
+        if request.path.startswith(tuple(getattr(settings, 'COMPRESSION_EXCLUDE_PATHS', ()))):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        with track(PHASE_COMPRESS):
+            compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # 强 ETag 改为弱 ETag（RFC 9110 8.8.1），条件请求仍然可以匹配
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
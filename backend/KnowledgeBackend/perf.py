@@ -0,0 +1,264 @@
+"""
+请求级性能统计。
+
+PerformanceMiddleware 为每个请求建立一份计时记录（存放在 contextvar 中，异步视图与
+sync_to_async 线程同样可见），各处通过 track(phase) 把耗时记入当前请求：
+- db：MySQL 查询，由挂在每个数据库连接上的 execute_wrapper 记录（连接创建时自动挂上）
+- neo4j：graph_api.db_utils 中的只读查询
+- serialize：DRF 响应渲染（KnowledgeBackend.renderers.TimedJSONRenderer）
+- compress：响应压缩（KnowledgeBackend.compression.CompressionMiddleware）
+- llm：chatapi 经准入控制调用大模型（含退避重试；流式响应只计到拿到流为止）
+
+请求结束时：
+- 以 Server-Timing 头返回本次的分项耗时与查询次数，浏览器开发者工具可以直接查看
+- 按“方法 + 路由”累计各分项的直方图，管理员可从 /api/metrics/（KnowledgeBackend.views）查看分位数；
+  直方图在进程内累计，多进程部署时每个进程各自统计
+- 超过 PERF_SLOW_REQUEST_MS 的请求写一条 warning 日志
+
+流式响应的 total 是生成响应头之前的耗时，不含流式输出的时间。
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+PHASE_DB = 'db'
+PHASE_NEO4J = 'neo4j'
+PHASE_SERIALIZE = 'serialize'
+PHASE_LLM = 'llm'
+PHASE_COMPRESS = 'compress'
+PHASE_TOTAL = 'total'
+PHASES = (PHASE_DB, PHASE_NEO4J, PHASE_SERIALIZE, PHASE_COMPRESS, PHASE_LLM)
+
+# 直方图桶的上界（毫秒），最后一个桶收集更慢的请求
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class RequestTimings:
+    """一个请求内各分项的累计耗时（秒）与次数"""
+
+    __slots__ = ('started', 'durations', 'counts', '_lock')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        # 异步视图中可能有多个线程同时记录
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def track(phase: str):
+    """把代码块的耗时记入当前请求；不在请求中时不做任何事"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add(PHASE_DB, time.perf_counter() - start)
+
+
+def _install_db_wrapper(connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+# 之后新建的连接（包括 sync_to_async 线程中的连接）自动挂上计时
+connection_created.connect(_install_db_wrapper, dispatch_uid='perf_db_wrapper')
+
+
+class Histogram:
+    """固定分桶的耗时直方图（毫秒）"""
+
+    __slots__ = ('buckets', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶估计分位数，返回所在桶的上界（最后一个桶返回最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': round(self.max_ms, 1),
+        }
+
+
+class EndpointMetrics:
+    """按接口累计的各分项耗时直方图与调用次数，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._calls: Dict[Tuple[str, str], int] = {}
+        self._statuses: Dict[str, Dict[int, int]] = {}
+
+    def observe(self, endpoint: str, status_code: int, total: float, timings: RequestTimings):
+        with self._lock:
+            self._observe(endpoint, PHASE_TOTAL, total)
+            for phase, seconds in timings.durations.items():
+                self._observe(endpoint, phase, seconds)
+                self._calls[(endpoint, phase)] = self._calls.get((endpoint, phase), 0) + timings.counts[phase]
+            statuses = self._statuses.setdefault(endpoint, {})
+            statuses[status_code] = statuses.get(status_code, 0) + 1
+
+    def _observe(self, endpoint: str, phase: str, seconds: float):
+        histogram = self._histograms.get((endpoint, phase))
+        if histogram is None:
+            histogram = self._histograms[(endpoint, phase)] = Histogram()
+        histogram.observe(seconds * 1000)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            endpoints: Dict[str, Dict] = {}
+            for (endpoint, phase), histogram in sorted(self._histograms.items()):
+                entry = endpoints.setdefault(endpoint, {'statuses': dict(self._statuses.get(endpoint, {})),
+                                                        'phases': {}})
+                summary = histogram.summary()
+                if phase != PHASE_TOTAL:
+                    # 每个请求平均的查询 / 调用次数
+                    summary['calls_per_request'] = round(
+                        self._calls.get((endpoint, phase), 0) / max(1, histogram.count), 2)
+                entry['phases'][phase] = summary
+            return endpoints
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._calls.clear()
+            self._statuses.clear()
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+def endpoint_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    route = match.route if match is not None and match.route else 'unmatched'
+    return f"{request.method} /{route}"
+
+
+def server_timing_header(total: float, timings: RequestTimings) -> str:
+    parts = [f"total;dur={total * 1000:.1f}"]
+    for phase in PHASES:
+        if phase in timings.durations:
+            parts.append(f'{phase};dur={timings.durations[phase] * 1000:.1f};desc="{timings.counts[phase]} calls"')
+    return ', '.join(parts)
+
+
+class PerformanceMiddleware:
+    """记录请求各分项耗时，返回 Server-Timing 头并累计到 endpoint_metrics；应放在中间件列表最前面"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_METRICS_ENABLED', True)
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', True)
+        self.timing_allow_origin = getattr(settings, 'PERF_TIMING_ALLOW_ORIGIN', '')
+        self.slow_request_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 0)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        # 本线程中已存在的连接也挂上计时
+        for connection in connections.all(initialized_only=True):
+            _install_db_wrapper(connection)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings: RequestTimings):
+        total = timings.elapsed()
+        endpoint = endpoint_name(request)
+        endpoint_metrics.observe(endpoint, response.status_code, total, timings)
+        if self.server_timing:
+            response['Server-Timing'] = server_timing_header(total, timings)
+            if self.timing_allow_origin:
+                response['Timing-Allow-Origin'] = self.timing_allow_origin
+        if self.slow_request_ms and total * 1000 >= self.slow_request_ms:
+            logger.warning(f"Slow request {endpoint} ({response.status_code}): {server_timing_header(total, timings)}")
+        return response
@@ -0,0 +1,71 @@
+"""
+项目级的 DRF 渲染器。
+
+- TimedJSONRenderer：标准库 json 渲染，耗时记入当前请求的 serialize 分项（见 perf.py）
+- ORJSONRenderer：用 orjson 渲染（比标准库快数倍，图谱、统计等大响应收益明显），
+  输出与 TimedJSONRenderer 一致；未安装 orjson、请求了缩进格式或遇到 orjson 不支持的值
+  （超过 64 位的整数等）时回退到标准库
+
+两者都能直接输出 Neo4j 驱动的时间类型（neo4j.time.Date / DateTime / Time / Duration），
+按 ISO 8601 字符串输出。
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .perf import PHASE_SERIALIZE, track
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+def _is_neo4j_temporal(obj) -> bool:
+    # 按模块名判断，不需要导入 neo4j 驱动
+    return type(obj).__module__.startswith('neo4j.time') and hasattr(obj, 'iso_format')
+
+
+class GraphJSONEncoder(JSONEncoder):
+    """DRF 的 JSONEncoder，另外支持 Neo4j 时间类型"""
+
+    def default(self, obj):
+        if _is_neo4j_temporal(obj):
+            return obj.iso_format()
+        return super().default(obj)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer，渲染耗时记入当前请求的 serialize 分项（见 perf.py）"""
+
+    encoder_class = GraphJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track(PHASE_SERIALIZE):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ORJSONRenderer(TimedJSONRenderer):
+    """orjson 渲染，输出与标准库渲染一致"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        # orjson 只支持 2 空格缩进，请求了缩进（如可浏览 API）时交给标准库
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        with track(PHASE_SERIALIZE):
+            try:
+                # 日期时间交给 DRF 的编码器，格式（毫秒精度、UTC 写作 Z）与标准库渲染相同
+                ret = orjson.dumps(data, default=self._default,
+                                   option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+            except orjson.JSONEncodeError:
+                ret = None
+        if ret is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # 与 DRF 相同，转义 U+2028 / U+2029，输出可以直接嵌入 <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def _default(self, obj):
+        return self.encoder_class().default(obj)
@@ -53,7 +53,8 @@ INSTALLED_APPS = [
     'graph_api',
     'users',
     'chatapi',
-    'statistics'  # 添加新的统计应用
+    'statistics',  # 添加新的统计应用
+    'jobs',  # 后台任务
 ]
 TEMPLATES = [
     {
@@ -71,6 +72,10 @@ TEMPLATES = [
     },
 ]
 MIDDLEWARE = [
+    # 请求耗时统计与 Server-Timing 头，放在最前面以包含其他中间件的耗时
+    'KnowledgeBackend.perf.PerformanceMiddleware',
+    # Brotli / gzip 响应压缩，需在修改响应体的中间件之前
+    'KnowledgeBackend.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Should be as high as possible
     'django.middleware.common.CommonMiddleware',
@@ -104,6 +109,22 @@ DATABASES = {
     }
 }
 
+# 缓存：设置 CACHE_REDIS_URL 时使用 Redis（需要安装 redis），否则为进程内缓存。
+# 多进程部署时统计/图谱缓存、图谱版本号与 token 吊销过滤器的代号都需要共享缓存
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 
 # Password validation
@@ -151,6 +172,120 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 NEO4J_URI = os.environ.get('NEO4J_URI', 'bolt://localhost:7687')
 NEO4J_USERNAME = os.environ.get('NEO4J_USERNAME', 'neo4j')
 NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', 'password') # 请务必修改默认密码
+# 图谱后端（graph_api.backends）：默认连接 Neo4j；测试、CI 与压测可以设为
+# graph_api.backends.memory.MemoryGraphBackend，使用从 JSON 夹具加载的内存图谱
+GRAPH_BACKEND = os.environ.get('GRAPH_BACKEND', 'graph_api.backends.neo4j_backend.Neo4jBackend')
+GRAPH_BACKEND_OPTIONS = {}
+# 内存图谱启动时加载的夹具（逗号分隔的路径），默认是随代码提供的示例图谱
+GRAPH_FIXTURES = [
+    path for path in os.environ.get(
+        'GRAPH_FIXTURES', str(BASE_DIR / 'graph_api' / 'graph_fixtures' / 'demo_graph.json')
+    ).split(',') if path
+]
+# 由图谱编译的只读快照（graph_api.snapshots）：全量重建间隔（秒，0 表示只从磁盘加载）、
+# 轮询共享缓存中图谱版本号的间隔（秒，图谱写入后据此重建）与磁盘缓存目录
+GRAPH_SNAPSHOT_REFRESH_SECONDS = float(os.environ.get('GRAPH_SNAPSHOT_REFRESH_SECONDS', 600))
+GRAPH_SNAPSHOT_POLL_SECONDS = float(os.environ.get('GRAPH_SNAPSHOT_POLL_SECONDS', 10))
+GRAPH_SNAPSHOT_DIR = os.environ.get('GRAPH_SNAPSHOT_DIR', str(BASE_DIR / 'var' / 'graph_snapshots'))
+# build_graph_snapshots 命令构建的快照
+GRAPH_SNAPSHOTS = [
+    'chatapi.scenarios.scenario_cards',
+    'graph_api.keywords.keyword_matcher',
+]
+# 关键词标注接口（graph_api.keywords）单次请求的最大文本长度
+KEYWORD_MATCH_MAX_CHARS = int(os.environ.get('KEYWORD_MATCH_MAX_CHARS', 20000))
+# 初始图谱、平台统计等公共响应的缓存时间（秒），图谱写入时会主动失效（graph_api.services）
+GRAPH_PAYLOAD_CACHE_TIMEOUT = int(os.environ.get('GRAPH_PAYLOAD_CACHE_TIMEOUT', 300))
+# 图谱实时推送（graph_api.live，WebSocket /ws/graph/live/，仅 ASGI 部署）：
+# 写入后合并等待时间（毫秒）、轮询共享缓存中图谱版本号的间隔（秒，用于发现其他进程的写入）、
+# 每个连接的订阅数上限、每个订阅子图的行数上限、单条消息的发送超时（秒，超时断开）
+LIVE_GRAPH_COALESCE_MS = int(os.environ.get('LIVE_GRAPH_COALESCE_MS', 200))
+LIVE_GRAPH_POLL_SECONDS = float(os.environ.get('LIVE_GRAPH_POLL_SECONDS', 2))
+LIVE_GRAPH_MAX_SUBSCRIPTIONS = int(os.environ.get('LIVE_GRAPH_MAX_SUBSCRIPTIONS', 10))
+LIVE_GRAPH_MAX_ROWS = int(os.environ.get('LIVE_GRAPH_MAX_ROWS', 500))
+LIVE_GRAPH_SEND_TIMEOUT_SECONDS = float(os.environ.get('LIVE_GRAPH_SEND_TIMEOUT_SECONDS', 10))
+
+# --- Statistics Settings ---
+# 排名直方图的全量重建周期（秒），期间依靠信号增量维护
+STATISTICS_RANKING_REFRESH_SECONDS = int(os.environ.get('STATISTICS_RANKING_REFRESH_SECONDS', 300))
+# 用户统计结果的缓存时间（秒），成就/能力变化时会主动失效
+USER_STATISTICS_CACHE_TIMEOUT = int(os.environ.get('USER_STATISTICS_CACHE_TIMEOUT', 60))
+# 成就事件（statistics.achievements）：进程内队列上限（0 表示不记录客户端和图谱浏览事件）、
+# 每批写入条数、写入间隔与批量处理间隔（秒）
+ACHIEVEMENT_EVENT_QUEUE_SIZE = int(os.environ.get('ACHIEVEMENT_EVENT_QUEUE_SIZE', 10000))
+ACHIEVEMENT_EVENT_BATCH_SIZE = int(os.environ.get('ACHIEVEMENT_EVENT_BATCH_SIZE', 200))
+ACHIEVEMENT_EVENT_FLUSH_SECONDS = float(os.environ.get('ACHIEVEMENT_EVENT_FLUSH_SECONDS', 2))
+ACHIEVEMENT_PROCESS_SECONDS = float(os.environ.get('ACHIEVEMENT_PROCESS_SECONDS', 30))
+
+# --- Chat LLM Settings ---
+# OpenAI 兼容的上游地址与对话模型；本地压测时可指向 benchmarks/mock_llm.py（如 http://127.0.0.1:8001/v1）
+CHAT_LLM_BASE_URL = os.environ.get('CHAT_LLM_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
+CHAT_LLM_MODEL = os.environ.get('CHAT_LLM_MODEL', 'deepseek-r1')
+# 上游大模型 HTTP 连接池与并发限制（chatapi.llm）
+CHAT_LLM_MAX_CONNECTIONS = int(os.environ.get('CHAT_LLM_MAX_CONNECTIONS', 100))
+CHAT_LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('CHAT_LLM_MAX_KEEPALIVE_CONNECTIONS', 20))
+CHAT_LLM_KEEPALIVE_EXPIRY = float(os.environ.get('CHAT_LLM_KEEPALIVE_EXPIRY', 30))
+CHAT_LLM_TIMEOUT = float(os.environ.get('CHAT_LLM_TIMEOUT', 120))
+# 上游调用准入控制（chatapi.admission）：每个进程同时进行的上游调用数上限（同步/异步接口共享），
+# 等待队列长度与最长等待时间（秒），每个用户每秒补充的请求数与突发上限，429/503 时的最多重试次数
+CHAT_LLM_MAX_CONCURRENCY = int(os.environ.get('CHAT_LLM_MAX_CONCURRENCY', 64))
+CHAT_ADMISSION_MAX_QUEUE = int(os.environ.get('CHAT_ADMISSION_MAX_QUEUE', 200))
+CHAT_ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('CHAT_ADMISSION_QUEUE_TIMEOUT', 30))
+CHAT_ADMISSION_USER_RATE = float(os.environ.get('CHAT_ADMISSION_USER_RATE', 0.2))
+CHAT_ADMISSION_USER_BURST = float(os.environ.get('CHAT_ADMISSION_USER_BURST', 5))
+CHAT_ADMISSION_MAX_RETRIES = int(os.environ.get('CHAT_ADMISSION_MAX_RETRIES', 2))
+# 后台调用（滚动摘要、开场白补充）同时最多占用的并发名额，只在没有用户请求排队时准入
+CHAT_BACKGROUND_LLM_MAX_CONCURRENCY = int(os.environ.get('CHAT_BACKGROUND_LLM_MAX_CONCURRENCY', 2))
+# 反向代理的地址（逗号分隔）：来自这些地址的请求按 X-Forwarded-For 中的客户端 IP 限速，
+# 否则代理后的所有匿名用户会共用一个令牌桶
+CHAT_TRUSTED_PROXIES = [addr.strip() for addr in os.environ.get('CHAT_TRUSTED_PROXIES', '').split(',') if addr.strip()]
+# 发送给模型的上下文窗口（chatapi.context）：token 预算（含系统提示词和摘要）与最多保留的轮数
+CHAT_CONTEXT_MAX_TOKENS = int(os.environ.get('CHAT_CONTEXT_MAX_TOKENS', 4000))
+CHAT_CONTEXT_MAX_TURNS = int(os.environ.get('CHAT_CONTEXT_MAX_TURNS', 8))
+# 滚动摘要使用的模型（不需要推理模型）及摘要缓存时间（秒）
+CHAT_SUMMARY_MODEL = os.environ.get('CHAT_SUMMARY_MODEL', 'deepseek-v3')
+CHAT_SUMMARY_CACHE_TIMEOUT = int(os.environ.get('CHAT_SUMMARY_CACHE_TIMEOUT', 24 * 3600))
+# 预生成开场白池（chatapi.openers）：每种诈骗情境保留的条数（0 表示关闭）及去重窗口大小
+CHAT_OPENER_POOL_SIZE = int(os.environ.get('CHAT_OPENER_POOL_SIZE', 2))
+CHAT_OPENER_RECENT_SIZE = int(os.environ.get('CHAT_OPENER_RECENT_SIZE', 100))
+# 情境卡片（chatapi.scenarios）中每类条目（渠道/手法/心理）最多列出的个数
+CHAT_SCENARIO_CARD_ITEMS = int(os.environ.get('CHAT_SCENARIO_CARD_ITEMS', 5))
+# 对话存储（chatapi.store）：未设置 CHAT_CONVERSATION_REDIS_URL 时使用进程内 LRU，
+# 多进程/多实例部署请配置 Redis（或兼容协议的服务）
+if os.environ.get('CHAT_CONVERSATION_REDIS_URL'):
+    CHAT_CONVERSATION_STORE = {
+        'BACKEND': 'chatapi.store.RedisConversationStore',
+        'OPTIONS': {
+            'url': os.environ['CHAT_CONVERSATION_REDIS_URL'],
+            'timeout': int(os.environ.get('CHAT_CONVERSATION_TIMEOUT', 7 * 24 * 3600)),
+        },
+    }
+else:
+    CHAT_CONVERSATION_STORE = {
+        'BACKEND': 'chatapi.store.LocMemConversationStore',
+        'OPTIONS': {'max_conversations': int(os.environ.get('CHAT_CONVERSATION_MAX_LOCAL', 1000))},
+    }
+# 对话记录异步落库与汇总（chatapi.analytics）：队列上限（0 表示关闭）、每批条数、写库与汇总间隔（秒）
+CHAT_ANALYTICS_QUEUE_SIZE = int(os.environ.get('CHAT_ANALYTICS_QUEUE_SIZE', 10000))
+CHAT_ANALYTICS_BATCH_SIZE = int(os.environ.get('CHAT_ANALYTICS_BATCH_SIZE', 200))
+CHAT_ANALYTICS_FLUSH_SECONDS = float(os.environ.get('CHAT_ANALYTICS_FLUSH_SECONDS', 2))
+CHAT_ANALYTICS_AGGREGATE_SECONDS = float(os.environ.get('CHAT_ANALYTICS_AGGREGATE_SECONDS', 60))
+# 每轮评分对能力得分的滑动平均权重
+CHAT_SKILL_EMA_ALPHA = float(os.environ.get('CHAT_SKILL_EMA_ALPHA', 0.2))
+
+# --- Users Settings ---
+# 登录时用户名、邮箱、手机号都可以作为账号（users.backends）
+AUTHENTICATION_BACKENDS = ['users.backends.IdentifierBackend']
+# 每个进程中同时计算密码哈希的线程数，0 表示 CPU 核数
+AUTH_PASSWORD_HASH_WORKERS = int(os.environ.get('AUTH_PASSWORD_HASH_WORKERS', 0))
+# JWT 认证时缓存的用户信息的保留时间（秒），用户变化时会主动失效
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 60))
+# 已吊销 refresh token 的内存过滤器（users.revocation）：误判率与定期全量重建间隔（秒）
+REVOKED_TOKEN_FILTER_ERROR_RATE = float(os.environ.get('REVOKED_TOKEN_FILTER_ERROR_RATE', 0.01))
+REVOKED_TOKEN_FILTER_REFRESH_SECONDS = float(os.environ.get('REVOKED_TOKEN_FILTER_REFRESH_SECONDS', 300))
+# 是否启用过滤器；缺省时只在共享缓存（如 CACHE_REDIS_URL）下启用，进程内缓存无法通知其他进程，每次都查询数据库
+REVOKED_TOKEN_FILTER_ENABLED = (os.environ['REVOKED_TOKEN_FILTER_ENABLED'].lower() == 'true'
+                                if os.environ.get('REVOKED_TOKEN_FILTER_ENABLED') else None)
 
 # --- Django REST Framework Settings ---
 # [23, 24, 25]
@@ -169,7 +304,8 @@ REST_FRAMEWORK = {
     # 'DEFAULT_PERMISSION_CLASSES':
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication 的缓存版本，认证时不再每次查询用户表（见 users/authentication.py）
+        'users.authentication.CachedJWTAuthentication',
         # ... 其他认证类
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -178,6 +314,18 @@ REST_FRAMEWORK = {
     ],
     # ... 其他配置
 
+    # 渲染耗时计入 Server-Timing 的 serialize 分项（见 KnowledgeBackend/perf.py）
+    'DEFAULT_RENDERER_CLASSES': [
+        # orjson 渲染（未安装 orjson 时回退到标准库 json），耗时记入 Server-Timing
+        'KnowledgeBackend.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    # 按用户限速的接口（throttle_scope）：客户端上报成就事件
+    'DEFAULT_THROTTLE_RATES': {
+        'achievement_events': os.environ.get('ACHIEVEMENT_EVENT_RATE', '30/min'),
+    },
+
     # 分页设置 [24, 27]
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50  # 每页默认返回 50 条记录，可根据需求调整
@@ -212,10 +360,67 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 
     'TOKEN_OBTAIN_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenObtainPairSerializer',
-    'TOKEN_REFRESH_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenRefreshSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
     'TOKEN_VERIFY_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenVerifySerializer',
     'TOKEN_BLACK_LIST_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenBlacklistSerializer',
 }
+# --- Performance Settings ---
+# 请求耗时统计（KnowledgeBackend.perf）：总开关、是否返回 Server-Timing 头
+PERF_METRICS_ENABLED = os.environ.get('PERF_METRICS_ENABLED', 'True').lower() == 'true'
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'True').lower() == 'true'
+# 跨域页面读取 Server-Timing 需要 Timing-Allow-Origin，与 CORS_ALLOW_ALL_ORIGINS 保持一致
+PERF_TIMING_ALLOW_ORIGIN = os.environ.get('PERF_TIMING_ALLOW_ORIGIN', '*')
+# 超过该耗时（毫秒）的请求写 warning 日志，0 表示不记录
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', 1000))
+
+# --- Job Settings ---
+# 后台任务（jobs 应用）：python manage.py run_jobs 启动工作线程池执行 Job 表中的任务
+# 任务类型 -> 处理函数
+JOB_HANDLERS = {
+    'statistics.refresh': 'statistics.jobs.refresh_statistics',
+    'statistics.export': 'statistics.jobs.export_statistics',
+    'graph.snapshots': 'graph_api.jobs.build_snapshots',
+    'graph.export': 'graph_api.jobs.export_graph',
+    'graph.rings': 'graph_api.jobs.detect_rings',
+    'users.avatars': 'users.jobs.process_avatars',
+}
+# 每个 run_jobs 进程的工作线程数、没有任务时的轮询间隔（秒）
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1))
+# 最多执行次数，第 n 次失败后等待 JOB_RETRY_BACKOFF_SECONDS * 2^(n-1) 秒重试
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_BACKOFF_SECONDS = float(os.environ.get('JOB_RETRY_BACKOFF_SECONDS', 30))
+# 执行中任务的心跳间隔；心跳超过 JOB_STALE_SECONDS 的任务视为工作进程已退出，重新排队
+JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS', 30))
+JOB_STALE_SECONDS = float(os.environ.get('JOB_STALE_SECONDS', 300))
+# 导出等任务的结果文件目录（不经过 MEDIA_URL 公开，通过 /api/jobs/<id>/file/ 下载）
+JOB_OUTPUT_DIR = os.environ.get('JOB_OUTPUT_DIR', str(BASE_DIR / 'var' / 'jobs'))
+
+# --- Warmup Settings ---
+# 工作进程启动后在后台预热（KnowledgeBackend.warmup），完成前 /api/health/ready/ 返回 503
+WARMUP_ON_STARTUP = os.environ.get('WARMUP_ON_STARTUP', 'True').lower() == 'true'
+# 预热任务（名称 -> 函数），按顺序执行
+WARMUP_TASKS = {
+    'graph_backend': 'graph_api.services.verify_graph_backend',
+    'graph_snapshots': 'graph_api.snapshots.warm_graph_snapshots',
+    'initial_graph': 'graph_api.services.warm_initial_graph',
+    'platform_statistics': 'statistics.services.warm_platform_statistics',
+    # 开场白池：后台生成，不等待完成
+    'chat_openers': 'chatapi.openers.warm_opener_pool',
+}
+# 失败任务的重试间隔（秒）
+WARMUP_RETRY_SECONDS = float(os.environ.get('WARMUP_RETRY_SECONDS', 10))
+# 超过该时间（秒）仍未预热完成时也报告就绪（degraded），避免依赖故障时所有进程都被摘除
+WARMUP_READY_TIMEOUT_SECONDS = float(os.environ.get('WARMUP_READY_TIMEOUT_SECONDS', 120))
+
+# --- Compression Settings ---
+# 响应压缩（KnowledgeBackend.compression）：小于该字节数的响应不压缩
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+# Brotli 压缩级别（0-11），动态响应取 4-5 可以兼顾压缩率与 CPU
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+# 不压缩的路径前缀：响应体中带令牌的接口（缓解 BREACH）
+COMPRESSION_EXCLUDE_PATHS = ['/api/users/login/', '/api/users/token/']
+
 # --- Logging Configuration ---
 LOGGING = {
     'version': 1,
@@ -255,6 +460,26 @@ LOGGING = {
             'level': 'DEBUG', # 开发时详细记录
             'propagate': False,
         },
+        'chatapi': { # 对话接口日志（请求路径上的 DEBUG 日志默认不输出）
+            'handlers': ['console'],
+            'level': os.getenv('CHATAPI_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'KnowledgeBackend.perf': { # 慢请求日志
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'KnowledgeBackend.warmup': { # 启动预热日志
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'jobs': { # 后台任务日志
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'neo4j': { # Neo4j 驱动日志
              'handlers': ['console'],
              'level': 'INFO', # 通常设为 INFO 或 WARNING
@@ -270,5 +495,12 @@ LOGGING = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media' # 或者 os.path.join(BASE_DIR, 'media')
 
+# 头像处理（users.avatars，后台任务 users.avatars 执行）：缩略图边长（像素）、上传大小上限、解码像素数上限
+AVATAR_SIZES = tuple(int(size) for size in os.environ.get('AVATAR_SIZES', '64,128,256').split(','))
+AVATAR_MAX_UPLOAD_BYTES = int(os.environ.get('AVATAR_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+AVATAR_MAX_PIXELS = int(os.environ.get('AVATAR_MAX_PIXELS', 40_000_000))
+# 缩略图以内容摘要命名，可以长期缓存
+AVATAR_VARIANT_CACHE_SECONDS = int(os.environ.get('AVATAR_VARIANT_CACHE_SECONDS', 365 * 24 * 3600))
+
 # 配置日志
 logging.config.dictConfig(LOGGING)
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+同步视图的流式响应在 ASGI 下的转发。
+
+ASGI 下 StreamingHttpResponse 遇到同步迭代器时，会先用 sync_to_async(list) 把它整个读完再发送：
+导出不再是常量内存，SSE 对话流要等到回复全部生成后才发出第一个事件。
+streaming_content() 在 ASGI 请求中把同步迭代器交给一个专用线程驱动，经有界队列逐块转为
+异步迭代器（消费慢时生产线程阻塞，内存占用仍与分块大小相当）；WSGI 请求原样返回同步迭代器。
+客户端断开时关闭同步迭代器，生成器中的 finally（归还准入名额、关闭上游流等）照常执行。
+"""
+import asyncio
+import threading
+from typing import AsyncIterator, Iterable, Iterator, TypeVar, Union
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+
+T = TypeVar('T')
+
+# 生产线程最多领先消费方的块数
+MAX_BUFFERED_CHUNKS = 8
+
+_DONE = object()
+
+
+def is_asgi_request(request) -> bool:
+    """request 可以是 Django 的 HttpRequest 或 DRF 的 Request"""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def streaming_content(request, iterator: Iterable[T]) -> Union[Iterator[T], AsyncIterator[T]]:
+    """按请求所在的服务器类型返回 StreamingHttpResponse 可以逐块发送的迭代器"""
+    if is_asgi_request(request):
+        return iterate_in_thread(iterator)
+    return iter(iterator)
+
+
+async def iterate_in_thread(iterator: Iterable[T], max_buffered: int = MAX_BUFFERED_CHUNKS) -> AsyncIterator[T]:
+    """在专用线程中驱动同步迭代器，逐块产出；异常在消费方重新抛出"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+    stopped = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        source = iter(iterator)
+        try:
+            for item in source:
+                if stopped.is_set():
+                    break
+                put((item, None))
+            else:
+                put((_DONE, None))
+        except BaseException as e:  # noqa: B036 - 交给消费方处理
+            if not stopped.is_set():
+                put((_DONE, e))
+        finally:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+            # 每个响应一个生产线程，结束时关闭迭代中（如导出查询）打开的连接
+            connections.close_all()
+
+    thread = threading.Thread(target=produce, name='stream-producer', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        # 客户端断开或消费结束：通知生产线程停止，并清空队列让阻塞中的 put 返回
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
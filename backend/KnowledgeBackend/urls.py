@@ -14,17 +14,31 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings # 导入 settings
 from django.conf.urls.static import static # 导入 static 函数
 
+from .views import LivenessView, PerformanceMetricsView, ReadinessView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/graph/', include('graph_api.urls', namespace='graph_api')),  # 包含应用URL并指定命名空间
     path('api/chat/',include('chatapi.urls',namespace='chat_api')),
     path('api/users/', include('users.urls')),
     path('api/statistics/', include('statistics.urls', namespace='statistics')),  # 添加统计应用的URL路由
+    path('api/jobs/', include('jobs.urls', namespace='jobs')),  # 后台任务状态
+    path('api/metrics/', PerformanceMetricsView.as_view(), name='performance-metrics'),  # 各接口耗时分布
+    path('api/health/live/', LivenessView.as_view(), name='health-live'),  # 存活检查
+    path('api/health/ready/', ReadinessView.as_view(), name='health-ready'),  # 就绪检查（预热完成后返回 200）
 ]
 if settings.DEBUG:
+    from users.avatars import VARIANTS_DIR
+    from users.views import avatar_variant_view
+    # 头像缩略图带长期缓存头，需排在通用的媒体文件路由之前
+    urlpatterns += [
+        re_path(r'^%s(?P<path>%s/.*)$' % (re.escape(settings.MEDIA_URL.lstrip('/')), VARIANTS_DIR), avatar_variant_view),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,40 @@
+from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .perf import BUCKET_BOUNDS_MS, endpoint_metrics
+from .warmup import readiness
+
+
+class PerformanceMetricsView(APIView):
+    """各接口的耗时分布（total / db / neo4j / serialize / llm），DELETE 清空本进程的统计"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({'bucket_bounds_ms': BUCKET_BOUNDS_MS, 'endpoints': endpoint_metrics.snapshot()})
+
+    def delete(self, request, format=None):
+        endpoint_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LivenessView(APIView):
+    """存活检查：进程能处理请求即返回 200，不访问任何依赖"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    def get(self, request, format=None):
+        return Response({'status': 'alive'})
+
+
+class ReadinessView(APIView):
+    """就绪检查：本进程预热完成（见 warmup.py）前返回 503，负载均衡据此决定是否分配流量"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    def get(self, request, format=None):
+        state = readiness()
+        return Response(state, status=status.HTTP_200_OK if state['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE)
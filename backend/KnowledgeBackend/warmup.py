@@ -0,0 +1,129 @@
+"""
+进程启动预热。
+
+部署后的第一批请求原本要承担冷查询：建立 Neo4j 连接池、计算初始图谱和平台统计、构建关键词索引等。
+工作进程启动时（wsgi.py / asgi.py）在后台线程中依次执行 WARMUP_TASKS，结果写入缓存和图谱快照：
+- 失败的任务每隔 WARMUP_RETRY_SECONDS 秒重试，直到全部成功
+- 全部成功后 /api/health/ready/ 返回 200，负载均衡据此只把流量分给预热完成的进程；
+  超过 WARMUP_READY_TIMEOUT_SECONDS 仍未完成时也报告就绪（degraded），
+  避免图数据库故障时所有进程都被摘除
+- 每个进程各自预热；gunicorn --preload 等在 fork 前导入应用的情况，子进程在首次就绪检查时重新启动预热
+- 部署后也可以运行 python manage.py warmup（使用共享缓存时可以为所有进程预先计算）
+
+预热任务是接受 refresh 参数的函数，refresh 为真时忽略已有缓存重新计算。
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TASK_PENDING = 'pending'
+TASK_RUNNING = 'running'
+TASK_OK = 'ok'
+TASK_FAILED = 'failed'
+
+
+class Warmup:
+    """本进程的预热状态"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._started_at = None
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def configured_tasks() -> Dict[str, str]:
+        return dict(getattr(settings, 'WARMUP_TASKS', {}))
+
+    def start(self) -> bool:
+        """启动后台预热，本进程已启动过时返回 False"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            self._pid = os.getpid()
+            self._started_at = time.monotonic()
+            self._tasks = {name: {'state': TASK_PENDING, 'attempts': 0, 'duration_ms': None, 'error': None}
+                           for name in self.configured_tasks()}
+        threading.Thread(target=self._run_until_done, name='warmup', daemon=True).start()
+        return True
+
+    def run(self, names: Optional[Iterable[str]] = None, refresh: bool = False) -> Dict[str, Optional[str]]:
+        """在当前线程中执行一轮预热任务，返回 {任务名: 错误信息或 None}"""
+        tasks = self.configured_tasks()
+        errors = {}
+        for name in names if names is not None else list(tasks):
+            errors[name] = self._run_task(name, tasks[name], refresh)
+        return errors
+
+    def _run_until_done(self):
+        retry_seconds = getattr(settings, 'WARMUP_RETRY_SECONDS', 10)
+        pending = list(self._tasks)
+        while True:
+            errors = self.run(pending)
+            pending = [name for name, error in errors.items() if error is not None]
+            if not pending:
+                break
+            time.sleep(retry_seconds)
+        elapsed = time.monotonic() - self._started_at
+        logger.info(f"Warmup finished in {elapsed:.1f}s.")
+
+    def _run_task(self, name: str, path: str, refresh: bool) -> Optional[str]:
+        task = self._tasks.setdefault(name, {'state': TASK_PENDING, 'attempts': 0, 'duration_ms': None, 'error': None})
+        task['state'] = TASK_RUNNING
+        task['attempts'] += 1
+        start = time.perf_counter()
+        try:
+            import_string(path)(refresh=refresh)
+        except Exception as e:
+            task.update(state=TASK_FAILED, error=str(e))
+            logger.warning(f"Warmup task '{name}' failed (attempt {task['attempts']}): {e}")
+        else:
+            task.update(state=TASK_OK, error=None)
+        task['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        if task['state'] == TASK_OK:
+            logger.info(f"Warmup task '{name}' finished in {task['duration_ms']} ms.")
+        return task['error']
+
+    def status(self) -> Dict[str, Any]:
+        """
+        就绪状态：
+        - ready：全部任务成功
+        - degraded：超过 WARMUP_READY_TIMEOUT_SECONDS 仍有任务未成功，同样视为就绪
+        - warming：预热中
+        """
+        tasks = {name: {'state': task['state'], 'attempts': task['attempts'], 'duration_ms': task['duration_ms']}
+                 for name, task in list(self._tasks.items())}
+        if self._pid != os.getpid():
+            return {'status': 'warming', 'ready': False, 'tasks': {}}
+        if all(task['state'] == TASK_OK for task in tasks.values()):
+            state = 'ready'
+        elif time.monotonic() - self._started_at >= getattr(settings, 'WARMUP_READY_TIMEOUT_SECONDS', 120):
+            state = 'degraded'
+        else:
+            state = 'warming'
+        return {'status': state, 'ready': state != 'warming', 'tasks': tasks}
+
+
+warmup = Warmup()
+
+
+def start_warmup():
+    """WARMUP_ON_STARTUP 开启时启动本进程的后台预热"""
+    if getattr(settings, 'WARMUP_ON_STARTUP', True):
+        warmup.start()
+
+
+def readiness() -> Dict[str, Any]:
+    """就绪检查使用的状态；未开启启动预热时直接视为就绪"""
+    if not getattr(settings, 'WARMUP_ON_STARTUP', True):
+        return {'status': 'ready', 'ready': True, 'tasks': {}}
+    # 在 fork 前启动的预热不会带到子进程，子进程在这里启动自己的预热
+    warmup.start()
+    return warmup.status()
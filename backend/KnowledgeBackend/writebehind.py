@@ -0,0 +1,141 @@
+"""
+进程内的异步落库（write-behind）队列。
+
+请求路径上只把记录放进有界队列，不做任何 I/O；后台线程攒够一批或每隔 flush_interval 秒
+调用 write() 批量写入，数据库暂时不可用时本批放回队首稍后重试；另外每隔 periodic_interval 秒
+调用一次 run_periodic()，用于汇总、处理已写入的记录。队列写满时丢弃新记录并计数。
+
+子类实现 write() 与 run_periodic()，并设置线程名、日志用的记录名称和周期任务的计数器名称，
+见 chatapi.analytics.TurnRecorder 与 statistics.achievements.EventRecorder。
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindRecorder:
+    """有界队列与后台落库线程，线程安全"""
+
+    # 后台线程名
+    thread_name = 'write-behind'
+    # 日志中的记录名称（复数）
+    item_label = 'records'
+    # 周期任务处理条数在 metrics() 中的名称
+    periodic_metric = 'processed'
+    # 为 True 时后台线程启动后第一轮就执行周期任务，否则等待一个周期
+    run_periodic_on_start = False
+
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float, periodic_interval: float):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.periodic_interval = periodic_interval
+        self._queue: Deque[Any] = deque()
+        self._lock = threading.Lock()
+        # 后台线程与退出时的 flush 不能同时写同一批
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_periodic = 0.0 if self.run_periodic_on_start else time.monotonic()
+        self._counters: Counter = Counter()
+
+    def write(self, batch: List[Any]):
+        """把一批记录写入数据库，失败时抛出异常"""
+        raise NotImplementedError
+
+    def run_periodic(self) -> int:
+        """周期任务，返回处理条数"""
+        return 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.queue_size > 0
+
+    def enqueue(self, item) -> bool:
+        """放入队列，立即返回；队列已满或未启用时丢弃并返回 False"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if len(self._queue) >= self.queue_size:
+                self._counters['dropped'] += 1
+                return False
+            self._queue.append(item)
+            self._counters['enqueued'] += 1
+            batch_ready = len(self._queue) >= self.batch_size
+        self.start()
+        if batch_ready:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> int:
+        """把队列中的记录分批写入数据库，返回写入条数；写入失败的批次放回队首"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    return written
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    with self._lock:
+                        self._queue.extendleft(reversed(batch))
+                        self._counters['write_errors'] += 1
+                    logger.error(f"Failed to write {len(batch)} {self.item_label}, will retry: {e}")
+                    return written
+                written += len(batch)
+                with self._lock:
+                    self._counters['written'] += len(batch)
+
+    def periodic(self) -> int:
+        """执行一次周期任务并计数，返回处理条数"""
+        count = self.run_periodic()
+        with self._lock:
+            self._counters[self.periodic_metric] += count
+        return count
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'queue_depth': len(self._queue),
+                'enqueued': self._counters['enqueued'],
+                'dropped': self._counters['dropped'],
+                'written': self._counters['written'],
+                'write_errors': self._counters['write_errors'],
+                self.periodic_metric: self._counters[self.periodic_metric],
+            }
+
+    def start(self):
+        """启动后台线程（幂等）"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+        # 进程正常退出时写入队列中剩余的记录
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if time.monotonic() - self._last_periodic >= self.periodic_interval:
+                    self._last_periodic = time.monotonic()
+                    self.periodic()
+            except Exception as e:
+                logger.error(f"{type(self).__name__} worker failed: {e}")
+            finally:
+                # 常驻线程不经过请求周期，每轮结束时回收超时或已失效的数据库连接
+                close_old_connections()
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KnowledgeBackend.settings')
 
 application = get_wsgi_application()
+
+# 后台预热热点数据，完成前 /api/health/ready/ 返回 503
+from KnowledgeBackend.warmup import start_warmup  # noqa: E402
+
+start_warmup()
@@ -0,0 +1,183 @@
+"""
+对话接口压测：模拟 N 个并发对话，每个对话连续进行若干轮，统计延迟分位数。
+
+每个模拟对话使用独立的 cookie（即独立的 session / 对话），轮与轮之间串行，
+对话之间并发。报告：
+- 每轮延迟的 p50 / p95 / p99（从发出请求到收到完整回复）
+- 首 token 时间（TTFT）的 p50 / p95 / p99（流式模式下为第一个 score/token 事件；
+  非流式模式下等于整轮延迟）
+- 每秒完成的对话数，以及按 --workers（服务端 worker 进程数）折算的单 worker 吞吐
+
+先启动模拟大模型（benchmarks/mock_llm.py）和指向它的 Django 服务，再运行（在 backend 目录下执行）：
+    python benchmarks/chat_load.py --url http://127.0.0.1:8000/api/chat/ --conversations 200 --concurrency 50
+    python benchmarks/chat_load.py --url http://127.0.0.1:8000/api/chat/async/ --stream --workers 4 --json
+
+所有模拟对话来自同一个 IP，新对话的第一轮还没有 session，会共用一个用户令牌桶；
+测量服务端容量时请以 CHAT_ADMISSION_USER_RATE=0 启动 Django 关闭按用户限速。
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+USER_MESSAGES = ['你好', '请问是哪个平台？', '我需要做什么？', '为什么要验证码？', '我要先核实一下', '我会报警的']
+
+
+class Recorder:
+    """线程安全地收集每轮的耗时与错误"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.conversations = 0
+
+    def turn(self, latency: float, ttft: float):
+        with self.lock:
+            self.latencies.append(latency)
+            self.ttfts.append(ttft)
+
+    def error(self, kind: str):
+        with self.lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def conversation_done(self):
+        with self.lock:
+            self.conversations += 1
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _post(opener, url: str, payload: dict, timeout: float):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST',
+    )
+    return opener.open(request, timeout=timeout)
+
+
+def run_turn(opener, url: str, message: str, stream: bool, timeout: float, recorder: Recorder) -> bool:
+    start = time.perf_counter()
+    try:
+        with _post(opener, url, {'message': message, 'stream': stream}, timeout) as response:
+            if not stream:
+                body = json.loads(response.read())
+                if not body.get('success'):
+                    recorder.error('failed_reply')
+                    return False
+                latency = time.perf_counter() - start
+                recorder.turn(latency, latency)
+                return True
+            ttft = None
+            event = None
+            for raw_line in response:
+                line = raw_line.decode('utf-8').rstrip('\r\n')
+                if line.startswith('event: '):
+                    event = line[len('event: '):]
+                    if ttft is None and event in ('score', 'token'):
+                        ttft = time.perf_counter() - start
+                elif event == 'error' and line.startswith('data: '):
+                    recorder.error('stream_error')
+                    return False
+                elif event == 'done' and line.startswith('data: '):
+                    latency = time.perf_counter() - start
+                    recorder.turn(latency, ttft if ttft is not None else latency)
+                    return True
+            recorder.error('stream_incomplete')
+            return False
+    except urllib.error.HTTPError as e:
+        recorder.error(f'http_{e.code}')
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        recorder.error(type(e).__name__)
+    return False
+
+
+def run_conversation(url: str, turns: int, stream: bool, timeout: float, recorder: Recorder):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    for index in range(turns):
+        if not run_turn(opener, url, USER_MESSAGES[index % len(USER_MESSAGES)], stream, timeout, recorder):
+            return
+    recorder.conversation_done()
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 1) if value is not None else None
+
+
+def run(url: str, conversations: int, concurrency: int, turns: int, stream: bool,
+        timeout: float, workers: int) -> dict:
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(conversations):
+            executor.submit(run_conversation, url, turns, stream, timeout, recorder)
+    elapsed = time.perf_counter() - started
+    sessions_per_second = recorder.conversations / elapsed if elapsed else 0.0
+    return {
+        'url': url,
+        'stream': stream,
+        'conversations': conversations,
+        'concurrency': concurrency,
+        'turns_per_conversation': turns,
+        'completed_conversations': recorder.conversations,
+        'completed_turns': len(recorder.latencies),
+        'errors': recorder.errors,
+        'elapsed_s': round(elapsed, 2),
+        'latency_ms': {f'p{p}': _ms(percentile(recorder.latencies, p)) for p in (50, 95, 99)},
+        'ttft_ms': {f'p{p}': _ms(percentile(recorder.ttfts, p)) for p in (50, 95, 99)},
+        'sessions_per_second': round(sessions_per_second, 2),
+        'sessions_per_second_per_worker': round(sessions_per_second / max(1, workers), 2),
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['url']} ({'stream' if report['stream'] else 'json'}), "
+          f"{report['conversations']} conversations x {report['turns_per_conversation']} turns, "
+          f"concurrency {report['concurrency']}")
+    print(f"  completed: {report['completed_conversations']} conversations, "
+          f"{report['completed_turns']} turns in {report['elapsed_s']}s")
+    if report['errors']:
+        print(f"  errors:    {report['errors']}")
+    for label, key in (('latency', 'latency_ms'), ('ttft', 'ttft_ms')):
+        values = report[key]
+        print(f"  {label:<9}  p50 {values['p50']} ms  p95 {values['p95']} ms  p99 {values['p99']} ms")
+    print(f"  throughput {report['sessions_per_second']} sessions/s, "
+          f"{report['sessions_per_second_per_worker']} sessions/s per worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chat endpoint load test')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/chat/')
+    parser.add_argument('--conversations', type=int, default=100, help='模拟的对话总数')
+    parser.add_argument('--concurrency', type=int, default=20, help='同时进行的对话数')
+    parser.add_argument('--turns', type=int, default=3, help='每个对话的轮数')
+    parser.add_argument('--stream', action='store_true', help='使用 SSE 流式接口并测量首 token 时间')
+    parser.add_argument('--timeout', type=float, default=120, help='单轮请求超时（秒）')
+    parser.add_argument('--workers', type=int, default=1, help='服务端 worker 进程数，用于折算单 worker 吞吐')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    report = run(args.url, args.conversations, args.concurrency, args.turns, args.stream,
+                 args.timeout, args.workers)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
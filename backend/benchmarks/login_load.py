@@ -0,0 +1,168 @@
+"""
+登录接口压测：并发发送登录请求，统计延迟分位数与每秒登录数。
+
+登录的主要开销是密码哈希（PBKDF2 默认上百万次迭代），这里用于确认登录高峰时
+单个 worker 能承受的登录速率，以及 AUTH_PASSWORD_HASH_WORKERS 的取值是否合适。
+账号按轮询方式使用，可以混合用户名、邮箱和手机号；--wrong-password-rate 按比例
+发送错误密码（同样需要计算一次哈希）。
+
+先准备测试账号，再运行（在 backend 目录下执行）：
+    python benchmarks/login_load.py --account alice:Secret-pass-123 --requests 500 --concurrency 50
+    python benchmarks/login_load.py --url http://127.0.0.1:8000/api/users/login/async/ \\
+        --accounts-file accounts.txt --workers 4 --json
+
+accounts.txt 每行一个 “账号 密码”（账号可以是用户名、邮箱或手机号）。
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+class Recorder:
+    """线程安全地收集每次请求的耗时与结果"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.logins = 0
+        self.rejected = 0
+
+    def done(self, latency: float, accepted: bool):
+        with self.lock:
+            self.latencies.append(latency)
+            if accepted:
+                self.logins += 1
+            else:
+                self.rejected += 1
+
+    def error(self, kind: str):
+        with self.lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_login(url: str, identifier: str, password: str, expect_success: bool, timeout: float,
+              recorder: Recorder):
+    request = urllib.request.Request(
+        url, data=json.dumps({'username': identifier, 'password': password}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST',
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read())
+        if not body.get('access'):
+            recorder.error('missing_token')
+            return
+        recorder.done(time.perf_counter() - start, True)
+        if not expect_success:
+            recorder.error('wrong_password_accepted')
+    except urllib.error.HTTPError as e:
+        if e.code == 401 and not expect_success:
+            recorder.done(time.perf_counter() - start, False)
+        else:
+            recorder.error(f'http_{e.code}')
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        recorder.error(type(e).__name__)
+
+
+def load_accounts(accounts: List[str], accounts_file: Optional[str]) -> List[Tuple[str, str]]:
+    pairs = [tuple(item.split(':', 1)) for item in accounts if ':' in item]
+    if accounts_file:
+        with open(accounts_file, encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    pairs.append((parts[0], parts[1]))
+    return pairs
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 1) if value is not None else None
+
+
+def run(url: str, accounts: List[Tuple[str, str]], requests: int, concurrency: int,
+        wrong_password_rate: float, timeout: float, workers: int, seed=None) -> dict:
+    recorder = Recorder()
+    rng = random.Random(seed)
+    cycle = itertools.cycle(accounts)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(requests):
+            identifier, password = next(cycle)
+            expect_success = rng.random() >= wrong_password_rate
+            executor.submit(run_login, url, identifier, password if expect_success else password + '-wrong',
+                            expect_success, timeout, recorder)
+    elapsed = time.perf_counter() - started
+    attempts_per_second = len(recorder.latencies) / elapsed if elapsed else 0.0
+    return {
+        'url': url,
+        'requests': requests,
+        'concurrency': concurrency,
+        'accounts': len(accounts),
+        'logins': recorder.logins,
+        'rejected': recorder.rejected,
+        'errors': recorder.errors,
+        'elapsed_s': round(elapsed, 2),
+        'latency_ms': {f'p{p}': _ms(percentile(recorder.latencies, p)) for p in (50, 95, 99)},
+        'attempts_per_second': round(attempts_per_second, 2),
+        'attempts_per_second_per_worker': round(attempts_per_second / max(1, workers), 2),
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['url']}, {report['requests']} requests over {report['accounts']} accounts, "
+          f"concurrency {report['concurrency']}")
+    print(f"  completed: {report['logins']} logins, {report['rejected']} rejected in {report['elapsed_s']}s")
+    if report['errors']:
+        print(f"  errors:    {report['errors']}")
+    values = report['latency_ms']
+    print(f"  latency    p50 {values['p50']} ms  p95 {values['p95']} ms  p99 {values['p99']} ms")
+    print(f"  throughput {report['attempts_per_second']} attempts/s, "
+          f"{report['attempts_per_second_per_worker']} attempts/s per worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login endpoint load test')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/users/login/')
+    parser.add_argument('--account', action='append', default=[], help='账号:密码，可重复指定')
+    parser.add_argument('--accounts-file', help='每行一个“账号 密码”的文件')
+    parser.add_argument('--requests', type=int, default=200, help='登录请求总数')
+    parser.add_argument('--concurrency', type=int, default=20, help='同时进行的请求数')
+    parser.add_argument('--wrong-password-rate', type=float, default=0.0, help='使用错误密码的请求比例')
+    parser.add_argument('--timeout', type=float, default=30, help='单次请求超时（秒）')
+    parser.add_argument('--workers', type=int, default=1, help='服务端 worker 进程数，用于折算单 worker 吞吐')
+    parser.add_argument('--seed', type=int, help='错误密码抽样的随机种子')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    accounts = load_accounts(args.account, args.accounts_file)
+    if not accounts:
+        parser.error('至少需要一个测试账号（--account 或 --accounts-file）')
+    report = run(args.url, accounts, args.requests, args.concurrency, args.wrong_password_rate,
+                 args.timeout, args.workers, args.seed)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+本地 OpenAI 兼容的模拟大模型服务，用于在不访问 DashScope 的情况下测量 chatapi 的性能。
+
+实现 POST /v1/chat/completions（同时接受 /chat/completions），支持普通响应和
+stream=true 的 SSE 流式响应。回复遵循对话提示词要求的“分数：xx 正文：...”格式，
+可以配置首 token 延迟、生成速度、回复长度以及按比例注入的错误（含 Retry-After）。
+
+用法（在 backend 目录下执行）：
+    python benchmarks/mock_llm.py --port 8001 --latency 0.5 --tokens-per-second 40
+    python benchmarks/mock_llm.py --error-rate 0.05 --error-status 429 --retry-after 1
+
+然后以 CHAT_LLM_BASE_URL=http://127.0.0.1:8001/v1 启动 Django 即可。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 回复正文由这些片段循环拼接，每个片段按一个 token 计
+REPLY_TOKENS = [
+    '您好', '，', '我是', '某某', '平台', '的', '客服', '专员', '，', '您的', '订单', '出现', '异常',
+    '，', '需要', '您', '配合', '核实', '一下', '账户', '信息', '，', '以便', '为您', '办理', '退款', '。',
+]
+
+
+class MockConfig:
+    def __init__(self, latency: float, jitter: float, tokens_per_second: float, reply_tokens: int,
+                 error_rate: float, error_status: int, retry_after: float, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def first_token_delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def reply_pieces(self):
+        with self.lock:
+            score = self.random.randint(0, 100)
+        pieces = [f'分数：{score} 正文：']
+        pieces.extend(REPLY_TOKENS[i % len(REPLY_TOKENS)] for i in range(self.reply_tokens))
+        return pieces
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config: MockConfig = None
+
+    def log_message(self, format, *args):
+        # 压测时每个请求一行日志会成为瓶颈，默认不输出
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'not_found'}})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON body.', 'type': 'invalid_request_error'}})
+            return
+
+        config = self.config
+        time.sleep(config.first_token_delay())
+        if config.should_fail():
+            headers = {'Retry-After': f"{config.retry_after:g}"} if config.retry_after else {}
+            self._send_json(config.error_status, {
+                'error': {'message': 'Injected error from mock LLM server.', 'type': 'mock_error',
+                          'code': str(config.error_status)},
+            }, headers)
+            return
+
+        model = request.get('model', 'mock-model')
+        pieces = config.reply_pieces()
+        if request.get('stream'):
+            self._stream(model, pieces)
+        else:
+            self._complete(model, request, pieces)
+
+    def _token_sleep(self):
+        if self.config.tokens_per_second > 0:
+            time.sleep(1 / self.config.tokens_per_second)
+
+    def _complete(self, model, request, pieces):
+        # 非流式响应同样要等完整生成结束
+        for _ in pieces[1:]:
+            self._token_sleep()
+        prompt_chars = sum(len(message.get('content') or '') for message in request.get('messages', []))
+        self._send_json(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(pieces)},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_chars,
+                'completion_tokens': len(pieces),
+                'total_tokens': prompt_chars + len(pieces),
+            },
+        })
+
+    def _stream(self, model, pieces):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        # 长度未知，发送完毕后关闭连接
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        try:
+            chunk({'role': 'assistant', 'content': ''})
+            for index, piece in enumerate(pieces):
+                if index:
+                    self._token_sleep()
+                chunk({'content': piece})
+            chunk({}, 'stop')
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开
+            pass
+
+
+def make_server(host: str, port: int, config: MockConfig) -> ThreadingHTTPServer:
+    handler = type('ConfiguredMockLLMHandler', (MockLLMHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI-compatible mock LLM server for chat benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help='首 token 延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.1, help='首 token 延迟的随机抖动（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=40, help='生成速度，0 表示不限速')
+    parser.add_argument('--reply-tokens', type=int, default=60, help='每条回复的正文 token 数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入错误的比例（0-1）')
+    parser.add_argument('--error-status', type=int, default=429, help='注入错误的 HTTP 状态码')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='注入错误时的 Retry-After（秒），0 表示不返回')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.jitter, args.tokens_per_second, args.reply_tokens,
+                        args.error_rate, args.error_status, args.retry_after, args.seed)
+    server = make_server(args.host, args.port, config)
+    print(f"Mock LLM listening on http://{args.host}:{args.port}/v1 "
+          f"(latency={args.latency}s, {args.tokens_per_second} tok/s, error_rate={args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {config.requests} requests, injected {config.errors} errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+响应渲染与压缩基准：比较初始图谱（/api/graph/initial/）和平台统计（/api/statistics/platform/）
+两个响应在标准库 json 与 orjson 渲染下的耗时和字节数，以及 gzip / Brotli 压缩后的大小与耗时。
+
+默认使用内存图谱后端（graph_api.backends.memory）和随代码提供的示例夹具，不需要 Neo4j；
+--scale 把夹具复制多份（名称加后缀）以得到更大的统计结果，--graph-limit 调整初始图谱的 LIMIT。
+年度案件数来自 MySQL，数据库不可用或未配置时该项为空。
+
+用法（在 backend 目录下执行）：
+    python benchmarks/render_payloads.py
+    python benchmarks/render_payloads.py --scale 20 --graph-limit 2000 --iterations 50 --json
+    python benchmarks/render_payloads.py --graph-backend graph_api.backends.neo4j_backend.Neo4jBackend
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(graph_backend: str):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KnowledgeBackend.settings')
+    os.environ['GRAPH_BACKEND'] = graph_backend
+    sys.path.insert(0, str(BACKEND_DIR))
+    import django
+    django.setup()
+    # 查询日志会混入报告输出
+    logging.disable(logging.WARNING)
+
+
+def scaled_fixture(path: str, scale: int) -> dict:
+    """把夹具复制 scale 份，每份的 id 与名称加上后缀，互不相连"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    nodes, relationships = [], []
+    for copy in range(scale):
+        suffix = f' #{copy}' if copy else ''
+        for node in data['nodes']:
+            properties = dict(node.get('properties') or {})
+            for key in ('name', 'term'):
+                if isinstance(properties.get(key), str):
+                    properties[key] += suffix
+            nodes.append({'id': f"{copy}:{node['id']}", 'labels': node['labels'], 'properties': properties})
+        for rel in data['relationships']:
+            relationships.append(dict(rel, start=f"{copy}:{rel['start']}", end=f"{copy}:{rel['end']}"))
+    return {'nodes': nodes, 'relationships': relationships}
+
+
+def build_payloads(graph_limit: int) -> dict:
+    from django.core.exceptions import ImproperlyConfigured
+    from django.db import Error as DatabaseError
+
+    from graph_api import cypher_queries, db_utils
+    from graph_api.serializers import EchartsGraphSerializer
+    from statistics.serializers import (
+        EmotionalTriggerSerializer, FraudCasesYearlySerializer, FraudFlowSerializer,
+        FraudTypeDistributionSerializer, TacticFrequencySerializer,
+    )
+
+    query = cypher_queries.GET_INITIAL_GRAPH_CYPHER.replace('LIMIT 50', f'LIMIT {int(graph_limit)}')
+    initial_graph = EchartsGraphSerializer(instance=db_utils.read_from_neo4j(query)).data
+    try:
+        yearly = list(FraudCasesYearlySerializer.get_data())
+    except (DatabaseError, ImproperlyConfigured) as e:
+        print(f"MySQL unavailable, fraud_cases_yearly left empty: {e}", file=sys.stderr)
+        yearly = []
+    # 与 PlatformStatisticsView 的响应结构相同
+    platform_statistics = {
+        'fraud_type_distribution': FraudTypeDistributionSerializer.get_data(),
+        'tactic_frequency': TacticFrequencySerializer.get_data(),
+        'emotional_triggers': EmotionalTriggerSerializer.get_data(),
+        'fraud_flow': FraudFlowSerializer.get_data(),
+        'fraud_cases_yearly': yearly,
+    }
+    return {'initial_graph': initial_graph, 'platform_statistics': platform_statistics}
+
+
+def timed(func, iterations: int):
+    """返回 (最后一次的结果, 中位耗时毫秒)"""
+    samples = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return result, round(samples[len(samples) // 2], 3)
+
+
+def measure(payload, iterations: int) -> dict:
+    from KnowledgeBackend import compression
+    from KnowledgeBackend.renderers import ORJSONRenderer, TimedJSONRenderer, orjson
+
+    stdlib_bytes, stdlib_ms = timed(lambda: TimedJSONRenderer().render(payload), iterations)
+    result = {
+        'render': {'stdlib_json': {'ms': stdlib_ms, 'bytes': len(stdlib_bytes)}},
+        'compression': {},
+    }
+    if orjson is not None:
+        orjson_bytes, orjson_ms = timed(lambda: ORJSONRenderer().render(payload), iterations)
+        result['render']['orjson'] = {
+            'ms': orjson_ms,
+            'bytes': len(orjson_bytes),
+            'speedup': round(stdlib_ms / orjson_ms, 2) if orjson_ms else None,
+            'identical': json.loads(orjson_bytes) == json.loads(stdlib_bytes),
+        }
+    for encoding in compression.available_encodings():
+        compressed, ms = timed(lambda: compression.compress(stdlib_bytes, encoding), iterations)
+        result['compression'][encoding] = {
+            'ms': ms,
+            'bytes': len(compressed),
+            'ratio': round(len(compressed) / len(stdlib_bytes), 3),
+        }
+    return result
+
+
+def print_report(report: dict):
+    print(f"graph backend {report['graph_backend']}, scale {report['scale']}, "
+          f"graph limit {report['graph_limit']}, {report['iterations']} iterations (median)")
+    for name, result in report['payloads'].items():
+        print(f"{name}:")
+        for renderer, values in result['render'].items():
+            extra = ''
+            if 'speedup' in values:
+                extra = f"  x{values['speedup']}  identical={values['identical']}"
+            print(f"  render {renderer:<12} {values['ms']:>9.3f} ms  {values['bytes']:>9} bytes{extra}")
+        for encoding, values in result['compression'].items():
+            print(f"  {encoding:<19} {values['ms']:>9.3f} ms  {values['bytes']:>9} bytes  ratio {values['ratio']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Response rendering and compression benchmark')
+    parser.add_argument('--graph-backend', default='graph_api.backends.memory.MemoryGraphBackend',
+                        help='图谱后端类的导入路径')
+    parser.add_argument('--fixture', default=str(BACKEND_DIR / 'graph_api' / 'graph_fixtures' / 'demo_graph.json'),
+                        help='内存后端加载的夹具')
+    parser.add_argument('--scale', type=int, default=1, help='夹具复制份数（仅内存后端）')
+    parser.add_argument('--graph-limit', type=int, default=50, help='初始图谱查询的 LIMIT（接口中为 50）')
+    parser.add_argument('--iterations', type=int, default=20, help='每项测量的重复次数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    setup_django(args.graph_backend)
+    from graph_api.backends import get_graph_backend, set_graph_backend
+    from graph_api.backends.memory import MemoryGraphBackend
+
+    if isinstance(get_graph_backend(), MemoryGraphBackend):
+        backend = MemoryGraphBackend(fixtures=[])
+        backend.load_data(scaled_fixture(args.fixture, max(1, args.scale)))
+        set_graph_backend(backend)
+
+    payloads = build_payloads(args.graph_limit)
+    report = {
+        'graph_backend': args.graph_backend,
+        'scale': args.scale,
+        'graph_limit': args.graph_limit,
+        'iterations': args.iterations,
+        'payloads': {name: measure(payload, args.iterations) for name, payload in payloads.items()},
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+启动耗时基准：测量 django.setup() 以及各应用模块的导入时间，并与预算比较。
+
+每一轮都在全新的 Python 子进程中测量（模块缓存为空，贴近 worker 冷启动），
+取多轮的中位数。任一项超出 startup_budget.json 中的预算时以非零状态码退出，
+可以直接接入 CI。
+
+用法（在 backend 目录下执行）：
+    python benchmarks/startup.py                  # 测量并检查预算
+    python benchmarks/startup.py --runs 10        # 增加测量轮数
+    python benchmarks/startup.py --update-budget  # 以当前测量值（含余量）重写预算
+"""
+import argparse
+import json
+import os
+import statistics as stats_module  # 标准库；backend 目录下同名的 statistics 应用不在本脚本的 sys.path 上
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BUDGET_FILE = Path(__file__).resolve().parent / 'startup_budget.json'
+
+# 按 INSTALLED_APPS 顺序逐个导入，记录的是每个应用的“增量”导入耗时
+APP_MODULES = {
+    'graph_api': ['graph_api.views', 'graph_api.urls'],
+    'users': ['users.views', 'users.urls'],
+    'chatapi': ['chatapi.views', 'chatapi.urls'],
+    'statistics': ['statistics.views', 'statistics.urls'],
+    'urlconf': ['KnowledgeBackend.urls'],
+}
+
+# 在子进程中执行的测量脚本，结果以 JSON 输出到 stdout
+_PROBE = r'''
+import importlib, json, os, sys, time
+t0 = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KnowledgeBackend.settings')
+import django
+t1 = time.perf_counter()
+django.setup()
+t2 = time.perf_counter()
+result = {'import_django_ms': (t1 - t0) * 1000, 'django_setup_ms': (t2 - t1) * 1000, 'apps': {}}
+for app, modules in json.loads(sys.argv[1]).items():
+    start = time.perf_counter()
+    for module in modules:
+        importlib.import_module(module)
+    result['apps'][app] = (time.perf_counter() - start) * 1000
+result['total_ms'] = (time.perf_counter() - t0) * 1000
+heavy = ['numpy', 'pandas', 'openai', 'pyarrow', 'PIL']
+result['heavy_modules_loaded'] = [name for name in heavy if name in sys.modules]
+print(json.dumps(result))
+'''
+
+
+def run_probe():
+    # 从 backend 的上级目录启动 python -c，避免 sys.path[0] 指向 backend 时
+    # 本地 statistics 应用在解释器启动阶段就遮蔽标准库
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get('PYTHONPATH')]))
+    completed = subprocess.run(
+        [sys.executable, '-c', _PROBE, json.dumps(APP_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=False,
+    )
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise SystemExit(f"startup probe failed with exit code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(runs):
+    samples = [run_probe() for _ in range(runs)]
+    median = stats_module.median
+    return {
+        'import_django_ms': round(median(s['import_django_ms'] for s in samples), 1),
+        'django_setup_ms': round(median(s['django_setup_ms'] for s in samples), 1),
+        'apps': {app: round(median(s['apps'][app] for s in samples), 1) for app in APP_MODULES},
+        'total_ms': round(median(s['total_ms'] for s in samples), 1),
+        'heavy_modules_loaded': samples[-1]['heavy_modules_loaded'],
+    }
+
+
+def check_budget(result, budget):
+    """返回超出预算的项目列表"""
+    failures = []
+    for key in ('django_setup_ms', 'total_ms'):
+        if key in budget and result[key] > budget[key]:
+            failures.append(f"{key}: {result[key]}ms > {budget[key]}ms")
+    for app, limit in budget.get('apps', {}).items():
+        if result['apps'].get(app, 0) > limit:
+            failures.append(f"apps.{app}: {result['apps'][app]}ms > {limit}ms")
+    forbidden = set(budget.get('forbidden_modules', [])) & set(result['heavy_modules_loaded'])
+    if forbidden:
+        failures.append(f"heavy modules imported at startup: {', '.join(sorted(forbidden))}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--update-budget', action='store_true', help="以当前测量值乘以 --headroom 重写预算文件")
+    parser.add_argument('--headroom', type=float, default=1.5)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    if args.update_budget:
+        budget = json.loads(BUDGET_FILE.read_text()) if BUDGET_FILE.exists() else {}
+        budget['django_setup_ms'] = round(result['django_setup_ms'] * args.headroom)
+        budget['total_ms'] = round(result['total_ms'] * args.headroom)
+        budget['apps'] = {app: max(20, round(ms * args.headroom)) for app, ms in result['apps'].items()}
+        budget.setdefault('forbidden_modules', ['numpy', 'pandas', 'openai', 'pyarrow'])
+        BUDGET_FILE.write_text(json.dumps(budget, indent=2, ensure_ascii=False) + '\n')
+        print(f"Budget written to {BUDGET_FILE}")
+        return
+
+    if not BUDGET_FILE.exists():
+        print(f"No budget file at {BUDGET_FILE}; run with --update-budget to create one.")
+        return
+    failures = check_budget(result, json.loads(BUDGET_FILE.read_text()))
+    if failures:
+        print("Startup budget exceeded:\n  " + "\n  ".join(failures))
+        raise SystemExit(1)
+    print("Startup within budget.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+# chatapi/admission.py
+"""
+上游大模型调用的准入控制。
+
+所有对话请求在调用模型前都要经过 AdmissionController：
+1. 按用户的令牌桶限速，单个用户的突发请求不会挤占其他用户
+2. 全局并发上限；超出时进入有界的 FIFO 等待队列，每个请求有截止时间，
+   队列已满或等待超时直接拒绝，不会无限堆积
+3. 上游返回 429/503 时读取 Retry-After，整个进程暂停调用到期后再继续，
+   并以带抖动的退避重试，避免所有请求同时重试
+4. 后台调用（滚动摘要、开场白补充）作为低优先级请求准入（admit_background）：不排队，
+   只在没有用户请求排队、并发有空闲时占用名额，且同时最多 max_background 个
+
+同步视图（线程）和异步视图（事件循环）共用一个控制器，并发名额在二者之间共享。
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import suppress
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Optional
+
+from django.conf import settings
+
+from KnowledgeBackend.perf import PHASE_LLM, track
+
+# 用户令牌桶最多保留的数量，超出时淘汰最久未使用的
+MAX_TRACKED_USERS = 10000
+# 重试退避的基数（秒），第 n 次重试额外等待 [0, BACKOFF_BASE * 2**n) 的随机时间
+BACKOFF_BASE_SECONDS = 0.5
+# 上游没有给出 Retry-After 时的默认等待时间（秒）
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入。reason 为 user_rate / queue_full / queue_timeout / background_busy"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def status_code(self) -> int:
+        # 用户超速是客户端的问题；队列满或超时是服务端繁忙
+        return 429 if self.reason == 'user_rate' else 503
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 capacity 个"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """取一个令牌；成功返回 0，否则返回还需等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+def upstream_retry_after(error: Exception) -> Optional[float]:
+    """
+    从 openai 的 APIStatusError 中取出建议的等待秒数；不可重试的错误返回 None。
+    支持 retry-after-ms、以秒为单位或 HTTP 日期格式的 Retry-After。
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code not in RETRYABLE_STATUS_CODES:
+        return None
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    with suppress(TypeError, ValueError):
+        if headers.get('retry-after-ms'):
+            return max(0.0, float(headers['retry-after-ms']) / 1000)
+    value = headers.get('retry-after')
+    if value:
+        with suppress(TypeError, ValueError):
+            return max(0.0, float(value))
+        with suppress(TypeError, ValueError, IndexError):
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    return DEFAULT_RETRY_AFTER_SECONDS
+
+
+class _Waiter:
+    """队列中的一个等待者；同步请求用 threading.Event，异步请求用所在事件循环的 Future"""
+
+    __slots__ = ('event', 'loop', 'future', 'granted')
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.granted = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class Ticket:
+    """已准入请求的凭证，release() 归还并发名额（可重复调用）"""
+
+    __slots__ = ('controller', 'deadline', 'background', '_released')
+
+    def __init__(self, controller: 'AdmissionController', deadline: float, background: bool = False):
+        self.controller = controller
+        self.deadline = deadline
+        self.background = background
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self.background)
+
+
+class AdmissionController:
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 user_rate: float, user_burst: float, max_retries: int, max_background: int = 2):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_retries = max_retries
+        self.max_background = max_background
+        self._lock = threading.Lock()
+        self._active = 0
+        # _active 中后台调用占用的名额数
+        self._background = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._cooldown_until = 0.0
+        self._counters: Dict[str, int] = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected_user_rate': 0,
+            'rejected_queue_full': 0,
+            'rejected_queue_timeout': 0,
+            'queue_cancelled': 0,
+            'admitted_background': 0,
+            'rejected_background_busy': 0,
+            'upstream_retries': 0,
+            'upstream_throttled': 0,
+        }
+
+    # --- 准入 ---
+
+    def _check_user(self, user_key: str):
+        """按用户令牌桶限速，超速时抛出 AdmissionRejected"""
+        if self.user_rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(user_key)
+            if bucket is None:
+                bucket = self._buckets[user_key] = TokenBucket(self.user_rate, self.user_burst)
+                while len(self._buckets) > MAX_TRACKED_USERS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(user_key)
+            wait = bucket.take()
+            if wait:
+                self._counters['rejected_user_rate'] += 1
+        if wait:
+            raise AdmissionRejected('user_rate', wait)
+
+    def _enqueue(self, loop=None) -> Optional[_Waiter]:
+        """有空闲名额时直接占用并返回 None，否则加入等待队列；队列已满时拒绝"""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                self._counters['admitted'] += 1
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self._counters['rejected_queue_full'] += 1
+                raise AdmissionRejected('queue_full', self.queue_timeout)
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            self._counters['queued'] += 1
+            return waiter
+
+    def _abandon(self, waiter: _Waiter, reason: str = 'rejected_queue_timeout') -> bool:
+        """
+        等待者放弃排队（等待超时或被取消，reason 为计入的计数器）。
+        若名额已在此期间转交给它，返回 True（调用方视为准入成功，或在取消时归还）。
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            with suppress(ValueError):
+                self._waiters.remove(waiter)
+            self._counters[reason] += 1
+            return False
+
+    def _release(self, background: bool = False):
+        """归还名额：有等待者时直接转交给队首，否则减少占用数"""
+        with self._lock:
+            if background:
+                self._background -= 1
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self._counters['admitted'] += 1
+                waiter.wake()
+                return
+            self._active -= 1
+
+    def admit(self, user_key: str) -> Ticket:
+        """同步准入，必要时阻塞等待；失败时抛出 AdmissionRejected"""
+        self._check_user(user_key)
+        deadline = time.monotonic() + self.queue_timeout
+        waiter = self._enqueue()
+        if waiter is not None and not waiter.event.wait(self.queue_timeout):
+            if not self._abandon(waiter):
+                raise AdmissionRejected('queue_timeout', self.queue_timeout)
+        return Ticket(self, deadline)
+
+    async def aadmit(self, user_key: str) -> Ticket:
+        """异步准入，排队时不占用线程"""
+        self._check_user(user_key)
+        deadline = time.monotonic() + self.queue_timeout
+        waiter = self._enqueue(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise AdmissionRejected('queue_timeout', self.queue_timeout)
+            except asyncio.CancelledError:
+                # 客户端断开不是排队超时，不计入 rejected_queue_timeout；已转交的名额要归还
+                if self._abandon(waiter, 'queue_cancelled'):
+                    self._release()
+                raise
+        return Ticket(self, deadline)
+
+    def admit_background(self) -> Ticket:
+        """
+        后台调用的准入，不排队、不计入用户限速：有用户请求在排队、没有空闲名额
+        或后台调用已达 max_background 时抛出 AdmissionRejected('background_busy')，调用方稍后再试
+        """
+        with self._lock:
+            if self._waiters or self._active >= self.max_concurrency or self._background >= self.max_background:
+                self._counters['rejected_background_busy'] += 1
+                raise AdmissionRejected('background_busy', DEFAULT_RETRY_AFTER_SECONDS)
+            self._active += 1
+            self._background += 1
+            self._counters['admitted_background'] += 1
+        return Ticket(self, time.monotonic() + self.queue_timeout, background=True)
+
+    def call_background(self, fn: Callable[[], Any]) -> Any:
+        """以后台优先级准入并调用上游（同样遵循全局冷却时间并退避重试），结束后归还名额"""
+        ticket = self.admit_background()
+        try:
+            return self._call(ticket, fn)
+        finally:
+            ticket.release()
+
+    # --- 调用上游 ---
+
+    def _cooldown_remaining(self) -> float:
+        return max(0.0, self._cooldown_until - time.monotonic())
+
+    def _backoff(self, ticket: Ticket, error: Exception, attempt: int) -> Optional[float]:
+        """
+        计算下一次重试前的等待时间；不可重试、次数用尽或会超过截止时间时返回 None。
+        同时把 Retry-After 记为全局冷却时间，其他请求也会等到期后再调用上游。
+        """
+        retry_after = upstream_retry_after(error)
+        if retry_after is None:
+            return None
+        with self._lock:
+            self._counters['upstream_throttled'] += 1
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + retry_after)
+        if attempt >= self.max_retries:
+            return None
+        delay = retry_after + random.uniform(0, BACKOFF_BASE_SECONDS * 2 ** attempt)
+        if time.monotonic() + delay > ticket.deadline:
+            return None
+        with self._lock:
+            self._counters['upstream_retries'] += 1
+        return delay
+
+    def call(self, ticket: Ticket, fn: Callable[[], Any]) -> Any:
+        """在准入凭证下调用上游，遵循全局冷却时间，对 429/503 退避重试；总耗时记入当前请求的 llm 分项"""
+        with track(PHASE_LLM):
+            return self._call(ticket, fn)
+
+    def _call(self, ticket: Ticket, fn: Callable[[], Any]) -> Any:
+        attempt = 0
+        while True:
+            cooldown = self._cooldown_remaining()
+            if cooldown:
+                if time.monotonic() + cooldown > ticket.deadline:
+                    raise AdmissionRejected('queue_timeout', cooldown)
+                time.sleep(cooldown)
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._backoff(ticket, e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+
+    async def acall(self, ticket: Ticket, coroutine_fn: Callable[[], Any]) -> Any:
+        with track(PHASE_LLM):
+            return await self._acall(ticket, coroutine_fn)
+
+    async def _acall(self, ticket: Ticket, coroutine_fn: Callable[[], Any]) -> Any:
+        attempt = 0
+        while True:
+            cooldown = self._cooldown_remaining()
+            if cooldown:
+                if time.monotonic() + cooldown > ticket.deadline:
+                    raise AdmissionRejected('queue_timeout', cooldown)
+                await asyncio.sleep(cooldown)
+            try:
+                return await coroutine_fn()
+            except Exception as e:
+                delay = self._backoff(ticket, e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    # --- 指标 ---
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'active': self._active,
+                'background_active': self._background,
+                'max_background': self.max_background,
+                'queue_depth': len(self._waiters),
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'tracked_users': len(self._buckets),
+                'cooldown_remaining': round(self._cooldown_remaining(), 3),
+                **self._counters,
+            }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """按 settings 创建进程内共享的准入控制器"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_concurrency=getattr(settings, 'CHAT_LLM_MAX_CONCURRENCY', 64),
+                    max_queue=getattr(settings, 'CHAT_ADMISSION_MAX_QUEUE', 200),
+                    queue_timeout=getattr(settings, 'CHAT_ADMISSION_QUEUE_TIMEOUT', 30),
+                    user_rate=getattr(settings, 'CHAT_ADMISSION_USER_RATE', 0.2),
+                    user_burst=getattr(settings, 'CHAT_ADMISSION_USER_BURST', 5),
+                    max_retries=getattr(settings, 'CHAT_ADMISSION_MAX_RETRIES', 2),
+                    max_background=getattr(settings, 'CHAT_BACKGROUND_LLM_MAX_CONCURRENCY', 2),
+                )
+    return _controller
+
+
+def client_ip(request) -> str:
+    """
+    客户端 IP。请求来自 CHAT_TRUSTED_PROXIES 中的反向代理时，取 X-Forwarded-For 中
+    最后一个不属于代理的地址（更靠前的地址可以由客户端伪造）
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    trusted = getattr(settings, 'CHAT_TRUSTED_PROXIES', [])
+    if remote_addr not in trusted:
+        return remote_addr
+    forwarded = [addr.strip() for addr in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if addr.strip()]
+    for addr in reversed(forwarded):
+        if addr not in trusted:
+            return addr
+    return remote_addr
+
+
+def client_key(request, user_id=None) -> str:
+    """
+    限速使用的用户标识：登录用户 id，其次 session，最后客户端 IP。
+    user_id 由调用方传入（analytics.request_user_id / arequest_user_id），这里不读取 request.user，
+    异步视图中不会触发同步的用户查询。新的匿名 session 在本次响应后才有 session_key，首轮按 IP 限速。
+    """
+    if user_id is not None:
+        return f"user:{user_id}"
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        return f"session:{session_key}"
+    return f"ip:{client_ip(request)}"
@@ -0,0 +1,245 @@
+# chatapi/analytics.py
+"""
+对话记录与评分的异步落库（write-behind，队列与后台线程见 KnowledgeBackend.writebehind）。
+
+请求路径上只把已完成的一轮（用户消息、回复、解析出的分数、诈骗情境）放进进程内队列，
+不做任何 I/O；后台线程负责：
+- 攒够一批或每隔几秒用 bulk_create 写入 ChatTurn，数据库暂时不可用时本批留在队列中稍后重试
+- 已登录用户的每一轮同时写入成就事件（statistics.achievements），由成就引擎累计对话相关的成就
+- 周期性把已登录用户尚未汇总的记录汇总到 UserSkill 和 CustomUser.fraud_level
+
+队列有上限，写满时丢弃新记录并计数，统计分析不会拖慢对话。
+多个进程同时汇总时用 SELECT ... FOR UPDATE SKIP LOCKED 分摊记录，每条只汇总一次。
+"""
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from KnowledgeBackend.writebehind import WriteBehindRecorder
+from statistics.achievements import EVENT_CHAT_CONVERSATION, EVENT_CHAT_TURN, get_event_recorder
+from statistics.models import AchievementEvent, UserSkill
+from statistics.ranking import DIMENSION_FRAUD_LEVEL, DIMENSION_SKILL, ranking_index
+from statistics.services import invalidate_user_statistics, provision_user_statistics
+from users.authentication import invalidate_cached_user
+
+from .models import ChatTurn
+
+logger = logging.getLogger(__name__)
+
+# 对话评分反映的是用户识别骗局、评估风险和主动核实/报警的表现，汇总到这三项能力
+CHAT_SKILL_TYPES = ("信息识别能力", "风险评估能力", "主动防御意识")
+
+# 每次汇总最多处理的记录条数
+AGGREGATE_BATCH_SIZE = 1000
+
+
+def request_user_id(request) -> Optional[Any]:
+    """本轮对话所属的登录用户 id：优先取 JWT，其次 Django session；均不查询数据库"""
+    user_id = _token_user_id(request)
+    if user_id is None:
+        user_id = _session_user_id(request.session.get(SESSION_KEY))
+    return user_id
+
+
+async def arequest_user_id(request) -> Optional[Any]:
+    user_id = _token_user_id(request)
+    if user_id is None:
+        user_id = _session_user_id(await request.session.aget(SESSION_KEY))
+    return user_id
+
+
+def _token_user_id(request) -> Optional[Any]:
+    """只校验 access token 的签名与有效期并读取用户 id，不加载用户"""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    from rest_framework_simplejwt.settings import api_settings
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    try:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = authentication.get_validated_token(raw_token)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return token.get(api_settings.USER_ID_CLAIM)
+
+
+def _session_user_id(value) -> Optional[Any]:
+    if value is None:
+        return None
+    return get_user_model()._meta.pk.to_python(value)
+
+
+class TurnRecorder(WriteBehindRecorder):
+    """进程内的对话记录队列：后台线程批量写入 ChatTurn，并周期性汇总到能力和反诈等级"""
+
+    thread_name = 'chat-analytics'
+    item_label = 'chat turns'
+    periodic_metric = 'aggregated'
+
+    def __init__(self, queue_size: Optional[int] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, aggregate_interval: Optional[float] = None):
+        super().__init__(
+            queue_size=(queue_size if queue_size is not None
+                        else getattr(settings, 'CHAT_ANALYTICS_QUEUE_SIZE', 10000)),
+            batch_size=batch_size or getattr(settings, 'CHAT_ANALYTICS_BATCH_SIZE', 200),
+            flush_interval=flush_interval or getattr(settings, 'CHAT_ANALYTICS_FLUSH_SECONDS', 2),
+            periodic_interval=aggregate_interval or getattr(settings, 'CHAT_ANALYTICS_AGGREGATE_SECONDS', 60),
+        )
+
+    def record(self, conversation_id: str, user_id, turn_index: int, user_message: str, reply: str,
+               score: Optional[int], scenario: Optional[str]) -> bool:
+        """把已完成的一轮放入队列，立即返回；队列已满或未启用时丢弃并返回 False"""
+        return self.enqueue({
+            'conversation_id': conversation_id,
+            'user_id': user_id,
+            'turn_index': turn_index,
+            'user_message': user_message,
+            'reply': reply,
+            'score': score,
+            'scenario': scenario or '',
+            # 匿名对话无需汇总
+            'aggregated': user_id is None,
+            'created_at': timezone.now(),
+        })
+
+    def write(self, batch: List[Dict[str, Any]]):
+        write_turns(batch)
+
+    def run_periodic(self) -> int:
+        """汇总所有尚未汇总的记录，返回处理条数"""
+        total = 0
+        while True:
+            count = aggregate_turns()
+            total += count
+            if count < AGGREGATE_BATCH_SIZE:
+                return total
+
+
+def write_turns(turns: List[Dict[str, Any]]):
+    """批量写入对话记录；入队后被删除的用户按匿名记录保存，避免外键错误导致整批失败"""
+    user_ids = {turn['user_id'] for turn in turns if turn['user_id'] is not None}
+    if user_ids:
+        existing = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    else:
+        existing = set()
+    rows, events = [], []
+    for turn in turns:
+        if turn['user_id'] is not None and turn['user_id'] not in existing:
+            turn = dict(turn, user_id=None, aggregated=True)
+        rows.append(ChatTurn(**turn))
+        if turn['user_id'] is not None:
+            # 每一轮计入实战次数，新对话的第一轮计入模拟次数
+            kinds = (EVENT_CHAT_TURN, EVENT_CHAT_CONVERSATION) if turn['turn_index'] == 0 else (EVENT_CHAT_TURN,)
+            events.extend(
+                AchievementEvent(user_id=turn['user_id'], kind=kind, payload={'conversation_id': turn['conversation_id']},
+                                 created_at=turn['created_at'])
+                for kind in kinds
+            )
+    with transaction.atomic():
+        ChatTurn.objects.bulk_create(rows)
+        AchievementEvent.objects.bulk_create(events)
+    if events:
+        get_event_recorder().start()
+
+
+def aggregate_turns(limit: int = AGGREGATE_BATCH_SIZE) -> int:
+    """
+    把一批尚未汇总的已登录用户记录汇总到能力和反诈等级，返回处理条数：
+    - 能力：对 CHAT_SKILL_TYPES 中的每项能力，按时间顺序对每轮评分做指数滑动平均
+    - 反诈等级：用户全部能力得分的平均值（0-100）
+    对话相关的成就由成就事件累计，见 write_turns
+    """
+    alpha = getattr(settings, 'CHAT_SKILL_EMA_ALPHA', 0.2)
+    now = timezone.now()
+    with transaction.atomic():
+        turns = list(
+            ChatTurn.objects.select_for_update(skip_locked=True)
+            .filter(aggregated=False, user__isnull=False)
+            .only('id', 'user_id', 'turn_index', 'score')
+            .order_by('id')[:limit]
+        )
+        if not turns:
+            return 0
+        turns_by_user = defaultdict(list)
+        for turn in turns:
+            turns_by_user[turn.user_id].append(turn)
+        user_ids = list(turns_by_user)
+
+        users = get_user_model().objects.in_bulk(user_ids)
+        provisioned = set(UserSkill.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        for user_id in user_ids:
+            if user_id not in provisioned and user_id in users:
+                provision_user_statistics(users[user_id])
+
+        skills = defaultdict(dict)
+        for skill in UserSkill.objects.filter(user_id__in=user_ids):
+            skills[skill.user_id][skill.skill_type] = skill
+
+        changed_skills, changed_users, ranking_changes = [], [], []
+        for user_id, user_turns in turns_by_user.items():
+            scores = [turn.score for turn in user_turns if turn.score is not None]
+            user_skills = skills.get(user_id, {})
+            for skill_type in CHAT_SKILL_TYPES:
+                skill = user_skills.get(skill_type)
+                if skill is None or not scores:
+                    continue
+                old_score = skill.score
+                value = old_score
+                for score in scores:
+                    value += alpha * (score - value)
+                skill.score = round(value, 2)
+                skill.updated_at = now
+                changed_skills.append(skill)
+                ranking_changes.append((DIMENSION_SKILL, skill_type, old_score, skill.score))
+
+            user = users.get(user_id)
+            if user is not None and scores and user_skills:
+                old_level = user.fraud_level
+                user.fraud_level = round(sum(skill.score for skill in user_skills.values()) / len(user_skills))
+                if user.fraud_level != old_level:
+                    changed_users.append(user)
+                    ranking_changes.append((DIMENSION_FRAUD_LEVEL, '', old_level, user.fraud_level))
+
+        # bulk_update 不触发信号：排名直方图与缓存在提交后更新，回滚时不会留下没有发生的变更
+        UserSkill.objects.bulk_update(changed_skills, ['score', 'updated_at'])
+        get_user_model().objects.bulk_update(changed_users, ['fraud_level'])
+        ChatTurn.objects.filter(pk__in=[turn.pk for turn in turns]).update(aggregated=True)
+        changed_user_ids = [user.pk for user in changed_users]
+
+        def on_commit():
+            for change in ranking_changes:
+                ranking_index.record_change(*change)
+            for user_id in user_ids:
+                invalidate_user_statistics(user_id)
+            # 认证缓存中的用户包含 fraud_level
+            for user_id in changed_user_ids:
+                invalidate_cached_user(user_id)
+
+        transaction.on_commit(on_commit)
+    return len(turns)
+
+
+_recorder: Optional[TurnRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_turn_recorder() -> TurnRecorder:
+    """进程内共享的对话记录队列，首次入队时启动后台线程"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = TurnRecorder()
+    return _recorder
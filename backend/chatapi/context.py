@@ -0,0 +1,220 @@
+# chatapi/context.py
+"""
+对话上下文窗口管理。
+
+对话存储中保存完整历史，但每轮只把以下内容发送给模型：
+系统提示词 + 较早对话的滚动摘要 + 在 token 预算内的最近若干轮对话。
+
+滑出窗口的对话由后台线程折叠进滚动摘要（保存在 Django cache 中），
+摘要生成不在请求的关键路径上：本轮使用已有的摘要，新摘要在下一轮生效。
+
+会话状态的 messages 可以只包含系统提示词和最近的若干条消息（见 history_tail_size），
+此时 conversation_state['offset'] 为未加载的较早消息条数；摘要中的下标按完整历史计算。
+摘要落后（后台摘要被准入控制拒绝、尚未生成等）时，尚未折叠的消息同样需要加载
+（见 unsummarized_since），否则它们既不在窗口中也不在摘要中，会从模型的上下文里消失。
+"""
+import logging
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .prompts import SUMMARY_MESSAGE_TEMPLATE, SUMMARY_PROMPT
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CACHE_KEY = 'chat:summary:{conversation_id}'
+
+# 中日韩字符及全角标点按每字 1 个 token 估算，其余字符约 4 个字符 1 个 token；
+# 每条消息另计角色等固定开销。估算偏保守，不依赖具体模型的分词器。
+_WIDE_CHAR_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# 正在生成摘要的会话，避免同一会话重复提交
+_pending: set = set()
+_pending_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    wide = len(_WIDE_CHAR_RE.findall(text))
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
+
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    return count_tokens(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS
+
+
+def conversation_id(conversation_state: Dict[str, Any]) -> str:
+    """返回会话 id；旧会话状态中没有 id 时补上一个"""
+    if not conversation_state.get('conversation_id'):
+        conversation_state['conversation_id'] = uuid.uuid4().hex
+    return conversation_state['conversation_id']
+
+
+def history_tail_size() -> int:
+    """构建上下文和折叠摘要需要加载的最近消息条数：窗口上限再多留一轮余量"""
+    return getattr(settings, 'CHAT_CONTEXT_MAX_TURNS', 8) * 2 + 2
+
+
+def unsummarized_since(summary: Optional[Dict[str, Any]]) -> int:
+    """
+    尚未折叠进摘要的第一条消息在对话存储日志中的下标（日志不含系统提示词）。
+    读取对话时至少从这里开始加载，供折叠摘要使用
+    """
+    return (summary['upto'] if summary else 1) - 1
+
+
+def _local_upto(conversation_state: Dict[str, Any], summary: Optional[Dict[str, Any]]) -> int:
+    """把摘要覆盖范围换算为 messages 中的下标（至少为 1，即系统提示词之后）"""
+    if not summary:
+        return 1
+    return max(1, summary['upto'] - conversation_state.get('offset', 0))
+
+
+def load_summary(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """读取会话的滚动摘要 {'upto': 已折叠的消息下标上界, 'text': 摘要}"""
+    return cache.get(SUMMARY_CACHE_KEY.format(conversation_id=conversation_id))
+
+
+async def aload_summary(conversation_id: str) -> Optional[Dict[str, Any]]:
+    return await cache.aget(SUMMARY_CACHE_KEY.format(conversation_id=conversation_id))
+
+
+def _summary_message(summary: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    if not summary or not summary.get('text'):
+        return None
+    return {'role': 'system', 'content': SUMMARY_MESSAGE_TEMPLATE.format(summary=summary['text'])}
+
+
+def window_start(messages: List[Dict[str, Any]], reserved_tokens: int = 0) -> int:
+    """
+    计算窗口起点：从最新消息向前累加，直到超出 token 预算或轮数上限。
+    messages[0] 为系统提示词，始终保留；最新一条消息无论多长都会保留。
+    """
+    budget = getattr(settings, 'CHAT_CONTEXT_MAX_TOKENS', 4000) - reserved_tokens
+    max_messages = getattr(settings, 'CHAT_CONTEXT_MAX_TURNS', 8) * 2
+    start = len(messages)
+    used = 0
+    while start > 1:
+        cost = count_message_tokens(messages[start - 1])
+        if start < len(messages) and (used + cost > budget or len(messages) - start >= max_messages):
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+def build_context(conversation_state: Dict[str, Any],
+                  summary: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+    """组装本轮发送给模型的消息列表"""
+    messages = conversation_state['messages']
+    system_message = messages[0]
+    summary_message = _summary_message(summary)
+    reserved = count_message_tokens(system_message)
+    if summary_message:
+        reserved += count_message_tokens(summary_message)
+    start = window_start(messages, reserved)
+    if summary_message:
+        # 已折叠进摘要的消息不再重复发送
+        start = max(start, min(_local_upto(conversation_state, summary), len(messages) - 1))
+
+    context = [system_message]
+    # 摘要只在窗口之前确实有被丢弃的对话时注入
+    if summary_message and start + conversation_state.get('offset', 0) > 1:
+        context.append(summary_message)
+    context.extend(messages[start:])
+    return context
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-summary')
+    return _executor
+
+
+def _fold_range(conversation_state: Dict[str, Any],
+                summary: Optional[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    """返回需要折叠进摘要的消息区间 [from, to)，没有时返回 None"""
+    messages = conversation_state['messages']
+    reserved = count_message_tokens(messages[0])
+    summary_message = _summary_message(summary)
+    if summary_message:
+        reserved += count_message_tokens(summary_message)
+    # 按下一轮的情况预留：届时还会追加一条用户消息
+    start = window_start(messages, reserved + MESSAGE_OVERHEAD_TOKENS)
+    upto = _local_upto(conversation_state, summary)
+    if start <= upto:
+        return None
+    # 积压较多时分批折叠，单次摘要请求的长度有上限，后续轮次继续折叠剩余部分
+    return upto, min(start, upto + history_tail_size())
+
+
+def _summarize(cache_key: str, previous: Optional[str], turns: List[Dict[str, Any]], upto: int):
+    """在后台线程中调用模型生成新的滚动摘要"""
+    from .admission import AdmissionRejected, get_admission_controller
+    from .llm import get_openai_client
+
+    try:
+        dialogue = '\n'.join(
+            f"{'诈骗者' if turn['role'] == 'assistant' else '用户'}：{turn['content']}" for turn in turns
+        )
+        # 以后台优先级经过准入控制，不与用户的对话请求争抢名额
+        completion = get_admission_controller().call_background(lambda: get_openai_client().chat.completions.create(
+            model=getattr(settings, 'CHAT_SUMMARY_MODEL', 'deepseek-v3'),
+            messages=[
+                {'role': 'system', 'content': SUMMARY_PROMPT},
+                {'role': 'user', 'content': f"已有摘要：\n{previous or '无'}\n\n新增对话：\n{dialogue}"},
+            ],
+        ))
+        text = completion.choices[0].message.content
+        if not text:
+            return
+        current = cache.get(cache_key)
+        # 并发情况下只保留覆盖范围更大的摘要
+        if current and current.get('upto', 0) >= upto:
+            return
+        cache.set(cache_key, {'upto': upto, 'text': text.strip()},
+                  getattr(settings, 'CHAT_SUMMARY_CACHE_TIMEOUT', 24 * 3600))
+        logger.info(f"Rolling summary updated for conversation {cache_key}, folded up to message {upto}")
+    except AdmissionRejected:
+        # 上游繁忙，下一轮再尝试
+        logger.debug(f"Skipped rolling summary for conversation {cache_key}: upstream busy")
+    except Exception as e:
+        # 摘要失败不影响对话，下一轮会再次尝试
+        logger.error(f"Failed to summarize conversation {cache_key}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(cache_key)
+
+
+def schedule_summary(conversation_state: Dict[str, Any], summary: Optional[Dict[str, Any]] = None):
+    """
+    若有对话已滑出窗口但尚未折叠进摘要，则提交后台摘要任务。
+    立即返回，不等待模型调用；summary 为本轮已读取的摘要。
+    """
+    fold = _fold_range(conversation_state, summary)
+    if fold is None:
+        return
+    cache_key = SUMMARY_CACHE_KEY.format(conversation_id=conversation_id(conversation_state))
+    with _pending_lock:
+        if cache_key in _pending:
+            return
+        _pending.add(cache_key)
+    begin, end = fold
+    # 传入副本，后台线程不持有会话状态
+    turns = [dict(message) for message in conversation_state['messages'][begin:end]]
+    _get_executor().submit(_summarize, cache_key, summary['text'] if summary else None, turns,
+                           end + conversation_state.get('offset', 0))
@@ -0,0 +1,107 @@
+# chatapi/llm.py
+"""
+大模型客户端管理。
+
+openai SDK 的导入和客户端构造都比较重（会加载 httpx / pydantic 等依赖），
+因此推迟到第一次真正调用大模型时才执行，避免拖慢每个 worker 启动和管理命令。
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+# AsyncOpenAI 底层的 httpx.AsyncClient 绑定在创建它的事件循环上，
+# 因此按事件循环分别缓存客户端。ASGI 部署下每个进程只有一个循环，
+# 所有请求共享同一个连接池。WSGI 下每个异步请求都有自己的短命循环，
+# 异步视图改用同步客户端（见 views.async_chat_api_view），不在这里创建客户端。
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+# 并发限制和 429/503 重试由 admission.AdmissionController 负责，关闭 SDK 自带的重试，
+# 避免两层重试叠加放大上游压力
+MAX_RETRIES = 0
+
+DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+# 上游地址和模型可通过 CHAT_LLM_BASE_URL / CHAT_LLM_MODEL 配置，
+# 例如压测时指向 benchmarks/mock_llm.py 启动的本地模拟服务
+BASE_URL = getattr(settings, 'CHAT_LLM_BASE_URL', DASHSCOPE_BASE_URL)
+# model="deepseek-v3", # 请根据你实际使用的模型调整
+CHAT_MODEL = getattr(settings, 'CHAT_LLM_MODEL', "deepseek-r1")
+
+
+def get_api_key() -> Optional[str]:
+    # 确保你的环境变量 DASHSCOPE_API_KEY 已经设置
+    return os.environ.get("DASHSCOPE_API_KEY")
+
+
+def _http_limits():
+    """上游连接池配置：最大连接数、保持空闲的 keep-alive 连接数及其过期时间"""
+    import openai
+
+    # 使用 SDK 自身依赖的 httpx 中的 Limits 类型，不直接依赖 httpx 的具体版本
+    limits_type = type(openai.DEFAULT_CONNECTION_LIMITS)
+    return limits_type(
+        max_connections=getattr(settings, 'CHAT_LLM_MAX_CONNECTIONS', 100),
+        max_keepalive_connections=getattr(settings, 'CHAT_LLM_MAX_KEEPALIVE_CONNECTIONS', 20),
+        keepalive_expiry=getattr(settings, 'CHAT_LLM_KEEPALIVE_EXPIRY', 30),
+    )
+
+
+def _http_timeout():
+    import openai
+
+    # 推理模型生成时间较长，读超时需要足够宽松；连接超时保持较短
+    return openai.Timeout(getattr(settings, 'CHAT_LLM_TIMEOUT', 120), connect=10)
+
+
+def get_openai_client():
+    """返回进程内共享的 openai.OpenAI 客户端，首次调用时创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+
+                api_key = get_api_key()
+                # 如果 API key 未设置，这里可以根据需要抛出错误或记录警告
+                if not api_key:
+                    logger.warning("DASHSCOPE_API_KEY environment variable not set. AI calls will likely fail.")
+                _client = openai.OpenAI(
+                    api_key=api_key,
+                    base_url=BASE_URL,
+                    max_retries=MAX_RETRIES,
+                    http_client=openai.DefaultHttpxClient(limits=_http_limits(), timeout=_http_timeout())
+                )
+    return _client
+
+
+def get_async_openai_client():
+    """
+    返回当前事件循环共享的 openai.AsyncOpenAI 客户端。
+    必须在协程中调用，且只用于长期运行的事件循环（ASGI 服务器的主循环）。
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import openai
+
+        api_key = get_api_key()
+        if not api_key:
+            logger.warning("DASHSCOPE_API_KEY environment variable not set. AI calls will likely fail.")
+        client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=BASE_URL,
+            max_retries=MAX_RETRIES,
+            http_client=openai.DefaultAsyncHttpxClient(limits=_http_limits(), timeout=_http_timeout())
+        )
+        _async_clients[loop] = client
+    return client
+
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conversation_id', models.CharField(db_index=True, max_length=32, verbose_name='对话ID')),
+                ('turn_index', models.PositiveIntegerField(verbose_name='轮次')),
+                ('user_message', models.TextField(verbose_name='用户消息')),
+                ('reply', models.TextField(verbose_name='助手回复')),
+                ('score', models.IntegerField(blank=True, null=True, verbose_name='风险评分')),
+                ('scenario', models.CharField(blank=True, default='', max_length=50, verbose_name='诈骗情境')),
+                ('aggregated', models.BooleanField(db_index=True, default=False, verbose_name='已汇总')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chat_turns', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '对话记录',
+                'verbose_name_plural': '对话记录',
+                'ordering': ['conversation_id', 'turn_index'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='chatapi_cha_user_id_10dbc6_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,31 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class ChatTurn(models.Model):
+    """
+    模拟诈骗对话中已完成的一轮（用户消息 + 助手回复），由 chatapi.analytics
+    在后台批量写入，用于统计分析，并周期性汇总到用户能力/成就。
+    """
+    conversation_id = models.CharField(max_length=32, db_index=True, verbose_name="对话ID")
+    # 未登录用户的对话同样保存，user 为空
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name="chat_turns", verbose_name="用户")
+    turn_index = models.PositiveIntegerField(verbose_name="轮次")  # 用户消息在对话历史中的位置（不含系统消息）
+    user_message = models.TextField(verbose_name="用户消息")
+    reply = models.TextField(verbose_name="助手回复")
+    score = models.IntegerField(null=True, blank=True, verbose_name="风险评分")  # 回复头部解析出的分数，未按格式输出时为空
+    scenario = models.CharField(max_length=50, blank=True, default='', verbose_name="诈骗情境")
+    # 是否已汇总到用户能力/成就；匿名对话写入时即标记为已汇总
+    aggregated = models.BooleanField(default=False, db_index=True, verbose_name="已汇总")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="创建时间")  # 本轮完成的时间，而非写库时间
+
+    class Meta:
+        verbose_name = "对话记录"
+        verbose_name_plural = "对话记录"
+        ordering = ['conversation_id', 'turn_index']
+        indexes = [models.Index(fields=['user', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.conversation_id} #{self.turn_index} - {self.score}分"
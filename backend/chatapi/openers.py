@@ -0,0 +1,188 @@
+# chatapi/openers.py
+"""
+预生成的对话开场白池。
+
+新对话的第一轮需要发送很长的系统提示词，并等待推理模型完整生成诈骗情境，
+用户要等很久才能看到回复。这里在后台为每种诈骗情境预先生成若干条开场白，
+新对话直接取用，取走后异步补充。
+
+- 每条开场白只使用一次；生成时按正文指纹与最近出现过的开场白去重，
+  避免模型反复生成同一个故事
+- 池为空（尚未预热或补充跟不上）时返回 None，调用方回退到实时生成
+- 生成失败后暂停补充一段时间，避免每个请求都触发一次失败的上游调用
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .prompts import SCENARIO_OPENER_PROMPT
+from .scoring import parse_reply
+
+logger = logging.getLogger(__name__)
+
+# 系统提示词中列举的诈骗情境。名称与知识图谱中 FraudPattern 的 name 一致时，
+# 生成开场白和后续对话都会附上情境卡片（见 scenarios.py）；图谱中没有的情境只使用系统提示词
+FRAUD_SCENARIOS = ('仿冒电商客服', '冒充公检法', '虚假投资', '刷单', '杀猪盘')
+
+# 生成失败后暂停补充的时间（秒）
+REFILL_BACKOFF_SECONDS = 60
+
+_PUNCTUATION_RE = re.compile(r'[\s\W_]+')
+
+
+def opener_fingerprint(content: str) -> str:
+    """开场白正文去掉空白和标点后的摘要，用于去重"""
+    _, body = parse_reply(content)
+    normalized = _PUNCTUATION_RE.sub('', body)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class OpenerPool:
+    """按诈骗情境分别维护的开场白池，线程安全"""
+
+    def __init__(self, scenarios=FRAUD_SCENARIOS, size: Optional[int] = None, recent_size: Optional[int] = None):
+        self.scenarios = tuple(scenarios)
+        self.size = size if size is not None else getattr(settings, 'CHAT_OPENER_POOL_SIZE', 2)
+        recent_size = recent_size if recent_size is not None else getattr(settings, 'CHAT_OPENER_RECENT_SIZE', 100)
+        self._pools: Dict[str, Deque[str]] = {scenario: deque() for scenario in self.scenarios}
+        self._pending: Counter = Counter()
+        # 最近生成过的开场白指纹（含已取走的），超出窗口后才允许再次出现
+        self._recent: Deque[str] = deque(maxlen=recent_size)
+        self._recent_set = set()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def take(self) -> Optional[Tuple[str, str]]:
+        """随机取出一条开场白，返回 (情境, 回复内容)；池为空时返回 None。取走后触发补充"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            available = [scenario for scenario in self.scenarios if self._pools[scenario]]
+            opener = None
+            if available:
+                scenario = random.choice(available)
+                opener = (scenario, self._pools[scenario].popleft())
+        self.refill()
+        return opener
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            return {scenario: len(pool) for scenario, pool in self._pools.items()}
+
+    def refill(self):
+        """为数量不足的情境提交后台生成任务，立即返回"""
+        if not self.enabled or time.monotonic() < self._paused_until:
+            return
+        tasks = []
+        with self._lock:
+            for scenario in self.scenarios:
+                missing = self.size - len(self._pools[scenario]) - self._pending[scenario]
+                if missing > 0:
+                    self._pending[scenario] += missing
+                    tasks.extend([scenario] * missing)
+        if not tasks:
+            return
+        executor = self._get_executor()
+        for scenario in tasks:
+            executor.submit(self._generate, scenario)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-opener')
+            return self._executor
+
+    def _generate(self, scenario: str):
+        from .admission import AdmissionRejected, get_admission_controller
+        from .llm import CHAT_MODEL, get_openai_client
+        from .scenarios import system_message
+
+        try:
+            if time.monotonic() < self._paused_until:
+                return
+            # 以后台优先级经过准入控制，不与用户的对话请求争抢名额
+            completion = get_admission_controller().call_background(lambda: get_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[
+                    # 情境与图谱中的诈骗类型同名时附上情境卡片
+                    system_message(scenario),
+                    {'role': 'user', 'content': SCENARIO_OPENER_PROMPT.format(scenario=scenario)},
+                ],
+            ))
+            content = completion.choices[0].message.content
+            score, _ = parse_reply(content or '')
+            if score is None:
+                # 没有按固定格式输出的开场白不入池
+                logger.warning(f"Discarded malformed opener for scenario {scenario}")
+                return
+            self._add(scenario, content)
+        except AdmissionRejected:
+            # 上游繁忙，下次取用开场白时再补充
+            logger.debug(f"Skipped opener generation for scenario {scenario}: upstream busy")
+        except Exception as e:
+            self._paused_until = time.monotonic() + REFILL_BACKOFF_SECONDS
+            logger.error(f"Failed to generate opener for scenario {scenario}: {e}")
+        finally:
+            with self._lock:
+                self._pending[scenario] -= 1
+
+    def _add(self, scenario: str, content: str) -> bool:
+        """加入池中；与最近的开场白重复时丢弃，返回是否加入"""
+        fingerprint = opener_fingerprint(content)
+        with self._lock:
+            if fingerprint in self._recent_set:
+                logger.info(f"Discarded duplicate opener for scenario {scenario}")
+                return False
+            if len(self._recent) == self._recent.maxlen:
+                self._recent_set.discard(self._recent[0])
+            self._recent.append(fingerprint)
+            self._recent_set.add(fingerprint)
+            self._pools[scenario].append(content)
+        return True
+
+
+_pool: Optional[OpenerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_opener_pool() -> OpenerPool:
+    """进程内共享的开场白池，首次调用时创建并开始预热"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OpenerPool()
+                _pool.refill()
+    return _pool
+
+
+def warm_opener_pool(refresh=False):
+    """
+    预热任务（见 KnowledgeBackend/warmup.py）：创建开场白池并在后台开始生成，不等待生成完成。
+    排在图谱快照之后，生成时能用上情境卡片。开场白池是进程内的，python manage.py warmup 默认跳过
+    """
+    from .scenarios import get_scenario_card
+
+    pool = get_opener_pool()
+    if pool.enabled:
+        missing = [scenario for scenario in pool.scenarios if get_scenario_card(scenario) is None]
+        if missing:
+            logger.info(f"Opener scenarios without a graph scenario card: {', '.join(missing)}")
+        pool.refill()
+
+
+# 只对当前进程有效的预热任务
+warm_opener_pool.per_process = True
@@ -0,0 +1,115 @@
+# chatapi/scenarios.py
+"""
+由知识图谱编译的诈骗情境卡片。
+
+知识图谱中已有 FraudPattern ← FraudCase → Tactic → PsychologicalTrigger / Channel 的结构，
+这里把每种诈骗类型常用的渠道、手法和利用的心理编译为一张简短的文字卡片，
+作为系统提示词的补充，让模拟的骗局贴近真实案例。
+
+卡片由 graph_api.snapshots.GraphSnapshot 在后台构建并缓存在内存和磁盘上，
+对话请求只做字典查找，不访问 Neo4j；图谱内容变化后自动重建。
+"""
+import random
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from graph_api.db_utils import read_from_neo4j
+from graph_api.snapshots import GraphSnapshot
+
+from .prompts import SCENARIO_CARD_PROMPT, SYSTEM_PROMPT
+
+FRAUD_PATTERNS_CYPHER = """
+MATCH (fp:FraudPattern)
+RETURN fp.name AS pattern, fp.description AS description
+"""
+
+PATTERN_TACTICS_CYPHER = """
+MATCH (fp:FraudPattern)<-[:IS_A]-(fc:FraudCase)-[:INVOLVES]->(t:Tactic)
+RETURN fp.name AS pattern, t.name AS name, count(fc) AS uses
+"""
+
+PATTERN_CHANNELS_CYPHER = """
+MATCH (fp:FraudPattern)<-[:IS_A]-(fc:FraudCase)-[:CONDUCTED_VIA]->(c:Channel)
+RETURN fp.name AS pattern, c.name AS name, count(fc) AS uses
+"""
+
+PATTERN_TRIGGERS_CYPHER = """
+MATCH (fp:FraudPattern)<-[:IS_A]-(:FraudCase)-[:INVOLVES]->(:Tactic)-[:EXPLOITS]->(pt:PsychologicalTrigger)
+RETURN fp.name AS pattern, pt.name AS name, count(*) AS uses
+"""
+
+
+def _top_names(rows: List[Dict[str, Any]], limit: int) -> Dict[str, List[str]]:
+    """按诈骗类型分组，每组按出现次数取前 limit 个名称"""
+    grouped = defaultdict(list)
+    for row in rows:
+        if row.get('pattern') and row.get('name'):
+            grouped[row['pattern']].append((-(row.get('uses') or 0), row['name']))
+    return {pattern: [name for _, name in sorted(items)[:limit]] for pattern, items in grouped.items()}
+
+
+def render_card(card: Dict[str, Any]) -> str:
+    """把一张卡片渲染为注入提示词的文字，空的条目不输出"""
+    lines = [f"诈骗类型：{card['pattern']}"]
+    if card.get('description'):
+        lines.append(f"说明：{card['description']}")
+    for label, key in (('常见渠道', 'channels'), ('常用手法', 'tactics'), ('利用的心理', 'triggers')):
+        if card.get(key):
+            lines.append(f"{label}：{'、'.join(card[key])}")
+    return '\n'.join(lines)
+
+
+class ScenarioCardSnapshot(GraphSnapshot):
+    """{诈骗类型: 卡片文字}"""
+
+    name = 'scenario_cards'
+
+    def build(self) -> List[Dict[str, Any]]:
+        limit = getattr(settings, 'CHAT_SCENARIO_CARD_ITEMS', 5)
+        tactics = _top_names(read_from_neo4j(PATTERN_TACTICS_CYPHER), limit)
+        channels = _top_names(read_from_neo4j(PATTERN_CHANNELS_CYPHER), limit)
+        triggers = _top_names(read_from_neo4j(PATTERN_TRIGGERS_CYPHER), limit)
+        cards = []
+        for row in read_from_neo4j(FRAUD_PATTERNS_CYPHER):
+            pattern = row.get('pattern')
+            if not pattern:
+                continue
+            cards.append({
+                'pattern': pattern,
+                'description': row.get('description') or '',
+                'tactics': tactics.get(pattern, []),
+                'channels': channels.get(pattern, []),
+                'triggers': triggers.get(pattern, []),
+            })
+        # 排序后内容摘要才稳定，图谱没有变化时不会触发替换
+        return sorted(cards, key=lambda card: card['pattern'])
+
+    def compile(self, data: List[Dict[str, Any]]) -> Dict[str, str]:
+        return {card['pattern']: render_card(card) for card in data}
+
+
+scenario_cards = ScenarioCardSnapshot()
+
+
+def get_scenario_card(scenario: Optional[str]) -> Optional[str]:
+    """诈骗情境对应的卡片文字，没有卡片时返回 None"""
+    if not scenario:
+        return None
+    return (scenario_cards.get() or {}).get(scenario)
+
+
+def choose_scenario() -> Optional[str]:
+    """为新对话随机选择一种有卡片的诈骗类型，卡片尚未构建时返回 None"""
+    cards = scenario_cards.get()
+    if not cards:
+        return None
+    return random.choice(list(cards))
+
+
+def system_message(scenario: Optional[str] = None) -> Dict[str, str]:
+    """系统提示词；情境有卡片时附在后面"""
+    card = get_scenario_card(scenario)
+    content = SYSTEM_PROMPT + SCENARIO_CARD_PROMPT.format(card=card) if card else SYSTEM_PROMPT
+    return {'role': 'system', 'content': content}
@@ -0,0 +1,71 @@
+# chatapi/scoring.py
+"""
+解析模型回复中的“分数：xx 正文：...”头部。
+
+parse_reply 用于完整回复；ReplyHeaderParser 用于流式回复，
+它在头部到达后立刻给出分数，之后的文本原样透传。
+"""
+import re
+from typing import List, Optional, Tuple
+
+# 兼容全角/半角冒号以及头部前后的空白
+REPLY_HEADER_RE = re.compile(r'^\s*分数\s*[:：]\s*(\d{1,3})\s*正文\s*[:：]\s*')
+
+# 缓冲超过该长度仍未匹配到头部时，认为模型没有按格式输出
+MAX_HEADER_LENGTH = 64
+
+
+def clamp_score(score: int) -> int:
+    return max(0, min(100, score))
+
+
+def parse_reply(content: str) -> Tuple[Optional[int], str]:
+    """
+    解析完整回复，返回 (分数, 正文)。
+    未按固定格式输出时分数为 None，正文为原始内容。
+    """
+    match = REPLY_HEADER_RE.match(content)
+    if not match:
+        return None, content
+    return clamp_score(int(match.group(1))), content[match.end():]
+
+
+class ReplyHeaderParser:
+    """
+    增量解析流式回复。
+
+    feed() 每次接收一段增量文本，返回事件列表：
+    ('score', int) 表示解析出分数；('text', str) 表示正文片段。
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._header_done = False
+        self.score: Optional[int] = None
+
+    def feed(self, text: str) -> List[Tuple[str, object]]:
+        if self._header_done:
+            return [('text', text)] if text else []
+
+        self._buffer += text
+        match = REPLY_HEADER_RE.match(self._buffer)
+        if match:
+            self.score = clamp_score(int(match.group(1)))
+            return self._finish_header([('score', self.score)], self._buffer[match.end():])
+        if len(self._buffer) > MAX_HEADER_LENGTH:
+            # 放弃解析头部，已缓冲的内容作为正文输出
+            return self._finish_header([], self._buffer)
+        return []
+
+    def close(self) -> List[Tuple[str, object]]:
+        """流结束时调用，输出仍留在缓冲区中的内容"""
+        if self._header_done:
+            return []
+        return self._finish_header([], self._buffer)
+
+    def _finish_header(self, events, remainder):
+        self._header_done = True
+        self._buffer = ''
+        if remainder:
+            events.append(('text', remainder))
+        return events
@@ -0,0 +1,170 @@
+# chatapi/store.py
+"""
+对话存储。
+
+每个对话是一条只追加的消息日志加少量元数据（当前分数），按对话 id 存放：
+每轮只写入新增的两条消息，读取时只取最近的若干条，单轮 I/O 与历史长度无关。
+session 中只保存对话 id。系统提示词是常量，不写入日志。
+
+后端可插拔，通过 settings.CHAT_CONVERSATION_STORE 配置（与 CACHES 的写法一致）：
+- LocMemConversationStore：进程内 LRU，适合开发和单进程部署
+- RedisConversationStore：Redis 及兼容协议的服务（Valkey、KeyDB 等），适合多进程/多实例部署
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# load() 的返回值：(元数据, 未加载的较早消息条数, 最近的消息)
+StoredConversation = Tuple[Dict[str, Any], int, List[Dict[str, Any]]]
+
+DEFAULT_CONVERSATION_STORE = {
+    'BACKEND': 'chatapi.store.LocMemConversationStore',
+    'OPTIONS': {},
+}
+
+
+class BaseConversationStore:
+    """对话存储接口。异步方法默认在线程池中调用同步实现。"""
+
+    def load(self, conversation_id: str, tail: Optional[int] = None,
+             since: Optional[int] = None) -> Optional[StoredConversation]:
+        """
+        读取对话；tail 为只读取的最近消息条数，since 不为 None 时还要包含日志下标 since 起的
+        全部消息（滚动摘要落后时，尚未折叠的消息需要一并读取）。对话不存在时返回 None
+        """
+        raise NotImplementedError
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], meta: Dict[str, Any]) -> None:
+        """在日志末尾追加消息并更新元数据，对话不存在时自动创建"""
+        raise NotImplementedError
+
+    def delete(self, conversation_id: str) -> None:
+        raise NotImplementedError
+
+    async def aload(self, conversation_id: str, tail: Optional[int] = None,
+                    since: Optional[int] = None) -> Optional[StoredConversation]:
+        return await sync_to_async(self.load, thread_sensitive=False)(conversation_id, tail, since)
+
+    async def aappend(self, conversation_id: str, messages: List[Dict[str, Any]], meta: Dict[str, Any]) -> None:
+        await sync_to_async(self.append, thread_sensitive=False)(conversation_id, messages, meta)
+
+    async def adelete(self, conversation_id: str) -> None:
+        await sync_to_async(self.delete, thread_sensitive=False)(conversation_id)
+
+
+class LocMemConversationStore(BaseConversationStore):
+    """进程内 LRU 存储，超过 max_conversations 时淘汰最久未访问的对话"""
+
+    def __init__(self, max_conversations: int = 1000):
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, conversation_id, tail=None, since=None):
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return None
+            self._conversations.move_to_end(conversation_id)
+            log = conversation['log']
+            offset = max(0, len(log) - tail) if tail is not None else 0
+            if since is not None:
+                offset = max(0, min(offset, since))
+            return dict(conversation['meta']), offset, [dict(message) for message in log[offset:]]
+
+    def append(self, conversation_id, messages, meta):
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                conversation = self._conversations[conversation_id] = {'meta': {}, 'log': []}
+            self._conversations.move_to_end(conversation_id)
+            conversation['log'].extend(dict(message) for message in messages)
+            conversation['meta'].update(meta)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def delete(self, conversation_id):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    # 纯内存操作不会阻塞，异步接口直接调用同步实现
+    async def aload(self, conversation_id, tail=None, since=None):
+        return self.load(conversation_id, tail, since)
+
+    async def aappend(self, conversation_id, messages, meta):
+        self.append(conversation_id, messages, meta)
+
+    async def adelete(self, conversation_id):
+        self.delete(conversation_id)
+
+
+class RedisConversationStore(BaseConversationStore):
+    """
+    Redis 存储：日志是一个 list（RPUSH 追加，LRANGE 读取尾部），元数据是一个 hash。
+    每次写入都会刷新过期时间，长时间不活跃的对话自动清理。需要安装 redis。
+    """
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', key_prefix: str = 'chat:conversation',
+                 timeout: int = 7 * 24 * 3600):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+
+    def _keys(self, conversation_id):
+        base = f"{self.key_prefix}:{conversation_id}"
+        return f"{base}:log", f"{base}:meta"
+
+    def load(self, conversation_id, tail=None, since=None):
+        log_key, meta_key = self._keys(conversation_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(meta_key)
+        pipe.llen(log_key)
+        pipe.lrange(log_key, -tail if tail else 0, -1)
+        raw_meta, length, raw_messages = pipe.execute()
+        if not raw_meta and not length:
+            return None
+        offset = length - len(raw_messages)
+        if since is not None and max(0, since) < offset:
+            # 摘要落后时补读尚未折叠的较早消息，只在这种情况下多一次往返
+            raw_messages = self.client.lrange(log_key, max(0, since), offset - 1) + raw_messages
+            offset = max(0, since)
+        meta = {key.decode(): json.loads(value) for key, value in raw_meta.items()}
+        messages = [json.loads(message) for message in raw_messages]
+        return meta, offset, messages
+
+    def append(self, conversation_id, messages, meta):
+        log_key, meta_key = self._keys(conversation_id)
+        pipe = self.client.pipeline(transaction=True)
+        if messages:
+            pipe.rpush(log_key, *(json.dumps(message, ensure_ascii=False) for message in messages))
+        if meta:
+            pipe.hset(meta_key, mapping={key: json.dumps(value) for key, value in meta.items()})
+        pipe.expire(log_key, self.timeout)
+        pipe.expire(meta_key, self.timeout)
+        pipe.execute()
+
+    def delete(self, conversation_id):
+        self.client.delete(*self._keys(conversation_id))
+
+
+_store: Optional[BaseConversationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> BaseConversationStore:
+    """按 settings.CHAT_CONVERSATION_STORE 创建进程内共享的存储实例"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'CHAT_CONVERSATION_STORE', DEFAULT_CONVERSATION_STORE)
+                backend = import_string(config['BACKEND'])
+                _store = backend(**config.get('OPTIONS', {}))
+    return _store
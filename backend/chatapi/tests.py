@@ -1,3 +1,414 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.http import JsonResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .admission import (
+    DEFAULT_RETRY_AFTER_SECONDS, AdmissionController, AdmissionRejected, TokenBucket, upstream_retry_after,
+)
+from .context import build_context, schedule_summary, unsummarized_since
+from .openers import OpenerPool, opener_fingerprint
+from .store import LocMemConversationStore
+
+SYSTEM = {'role': 'system', 'content': 'system prompt'}
+
+
+def _turns(count):
+    messages = []
+    for i in range(count):
+        messages.append({'role': 'user', 'content': f"user {i}"})
+        messages.append({'role': 'assistant', 'content': f"assistant {i}"})
+    return messages
+
+
+@override_settings(CHAT_CONTEXT_MAX_TURNS=2, CHAT_CONTEXT_MAX_TOKENS=4000)
+class ContextWindowTests(SimpleTestCase):
+    """history_tail_size() 为 6，窗口最多 4 条消息"""
+
+    def setUp(self):
+        self.store = LocMemConversationStore()
+        self.log = _turns(10)
+        self.store.append('c1', self.log, {'score': 50})
+
+    def load_state(self, summary):
+        meta, offset, messages = self.store.load('c1', tail=6, since=unsummarized_since(summary))
+        return {'conversation_id': 'c1', 'messages': [SYSTEM] + messages, 'offset': offset}
+
+    def scheduled_fold(self, state, summary):
+        executor = mock.Mock()
+        # 模拟的线程池不会执行 _summarize，也就不会清除进行中标记，每次使用新的集合
+        with mock.patch('chatapi.context._get_executor', return_value=executor), \
+                mock.patch('chatapi.context._pending', set()):
+            schedule_summary(state, summary)
+        self.assertEqual(executor.submit.call_count, 1)
+        _, _, previous, turns, upto = executor.submit.call_args.args
+        return previous, turns, upto
+
+    def test_window_without_summary(self):
+        state = self.load_state(None)
+        self.assertEqual(build_context(state), [SYSTEM] + self.log[-4:])
+
+    def test_summary_replaces_folded_messages(self):
+        summary = {'upto': 17, 'text': 'earlier'}
+        state = self.load_state(summary)
+        context = build_context(state, summary)
+        self.assertEqual(context[0], SYSTEM)
+        self.assertIn('earlier', context[1]['content'])
+        self.assertEqual(context[2:], self.log[-4:])
+
+    def test_lagging_summary_loads_unfolded_messages(self):
+        # 摘要只覆盖到日志下标 4 之前，最近 6 条之前的下标 4-13 尚未折叠
+        summary = {'upto': 5, 'text': 'earlier'}
+        state = self.load_state(summary)
+        self.assertEqual(state['offset'], 4)
+        self.assertEqual(state['messages'][1:], self.log[4:])
+        self.assertEqual(build_context(state, summary)[2:], self.log[-4:])
+
+        previous, turns, upto = self.scheduled_fold(state, summary)
+        # 从摘要的边界接着折叠，每次最多 history_tail_size() 条
+        self.assertEqual(previous, 'earlier')
+        self.assertEqual(turns, self.log[4:10])
+        self.assertEqual(upto, 11)
+        self.assertEqual(unsummarized_since({'upto': upto}), 10)
+
+    def test_missing_summary_folds_from_the_start(self):
+        state = self.load_state(None)
+        self.assertEqual(state['offset'], 0)
+        previous, turns, upto = self.scheduled_fold(state, None)
+        self.assertIsNone(previous)
+        self.assertEqual(turns, self.log[:6])
+        self.assertEqual(upto, 7)
+
+
+def _controller(**options):
+    options = {'max_concurrency': 1, 'max_queue': 2, 'queue_timeout': 0.05, 'user_rate': 0, 'user_burst': 1,
+               'max_retries': 2, 'max_background': 1, **options}
+    return AdmissionController(**options)
+
+
+class AdmissionQueueTests(SimpleTestCase):
+
+    def test_async_cancelled_waiter(self):
+        controller = _controller(queue_timeout=5)
+
+        async def scenario():
+            ticket = await controller.aadmit('a')
+            waiting = asyncio.ensure_future(controller.aadmit('b'))
+            await asyncio.sleep(0)
+            self.assertEqual(controller.metrics()['queue_depth'], 1)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            ticket.release()
+
+        asyncio.run(scenario())
+        metrics = controller.metrics()
+        # 客户端断开不是排队超时
+        self.assertEqual((metrics['queue_cancelled'], metrics['rejected_queue_timeout']), (1, 0))
+        self.assertEqual((metrics['queue_depth'], metrics['active']), (0, 0))
+
+    def test_async_cancelled_after_grant_returns_slot(self):
+        controller = _controller(queue_timeout=5)
+
+        async def scenario():
+            ticket = await controller.aadmit('a')
+            waiting = asyncio.ensure_future(controller.aadmit('b'))
+            await asyncio.sleep(0)
+            # 名额已转交，等待者还没被唤醒就被取消
+            ticket.release()
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+
+        asyncio.run(scenario())
+        metrics = controller.metrics()
+        self.assertEqual((metrics['active'], metrics['queue_cancelled'], metrics['rejected_queue_timeout']), (0, 0, 0))
+
+    def test_async_queue_timeout(self):
+        controller = _controller()
+
+        async def scenario():
+            ticket = await controller.aadmit('a')
+            with self.assertRaises(AdmissionRejected) as caught:
+                await controller.aadmit('b')
+            ticket.release()
+            return caught.exception
+
+        rejected = asyncio.run(scenario())
+        self.assertEqual((rejected.reason, rejected.status_code), ('queue_timeout', 503))
+        metrics = controller.metrics()
+        self.assertEqual((metrics['rejected_queue_timeout'], metrics['queue_cancelled']), (1, 0))
+        self.assertEqual((metrics['queue_depth'], metrics['active']), (0, 0))
+
+    def test_sync_queue_timeout_and_handoff(self):
+        controller = _controller()
+        ticket = controller.admit('a')
+        with self.assertRaises(AdmissionRejected) as caught:
+            controller.admit('b')
+        self.assertEqual(caught.exception.reason, 'queue_timeout')
+
+        # 释放的名额直接转交给排队中的请求
+        controller.queue_timeout = 5
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(controller.admit('b')))
+        waiter.start()
+        while not controller.metrics()['queue_depth']:
+            time.sleep(0.001)
+        ticket.release()
+        waiter.join()
+        self.assertEqual(controller.metrics()['active'], 1)
+        admitted[0].release()
+        admitted[0].release()
+        self.assertEqual(controller.metrics()['active'], 0)
+
+    def test_queue_full(self):
+        controller = _controller(max_queue=0)
+        controller.admit('a')
+        with self.assertRaises(AdmissionRejected) as caught:
+            controller.admit('b')
+        self.assertEqual((caught.exception.reason, caught.exception.status_code), ('queue_full', 503))
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    @mock.patch('chatapi.admission.time.monotonic')
+    def test_burst_then_rate(self, monotonic):
+        monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=0.5, capacity=2)
+        self.assertEqual([bucket.take(), bucket.take()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.take(), 2.0)
+        monotonic.return_value = 101.0
+        self.assertAlmostEqual(bucket.take(), 1.0)
+        monotonic.return_value = 102.0
+        self.assertEqual(bucket.take(), 0.0)
+        # 长时间空闲后最多积累 capacity 个
+        monotonic.return_value = 1000.0
+        self.assertEqual([bucket.take(), bucket.take()], [0.0, 0.0])
+        self.assertGreater(bucket.take(), 0)
+
+    def test_user_rate_rejection(self):
+        controller = _controller(user_rate=0.5, user_burst=1, max_concurrency=10)
+        controller.admit('a').release()
+        with self.assertRaises(AdmissionRejected) as caught:
+            controller.admit('a')
+        self.assertEqual((caught.exception.reason, caught.exception.status_code), ('user_rate', 429))
+        self.assertGreater(caught.exception.retry_after, 0)
+        # 其他用户不受影响
+        controller.admit('b').release()
+        self.assertEqual(controller.metrics()['rejected_user_rate'], 1)
+
+
+def _upstream_error(status_code, headers=None):
+    error = Exception('upstream')
+    error.status_code = status_code
+    error.response = SimpleNamespace(headers=headers or {})
+    return error
+
+
+class RetryAfterTests(SimpleTestCase):
+
+    def test_header_formats(self):
+        self.assertIsNone(upstream_retry_after(_upstream_error(400, {'retry-after': '5'})))
+        self.assertIsNone(upstream_retry_after(Exception('network')))
+        self.assertEqual(upstream_retry_after(_upstream_error(429, {'retry-after-ms': '1500'})), 1.5)
+        self.assertEqual(upstream_retry_after(_upstream_error(503, {'retry-after': '3'})), 3.0)
+        self.assertEqual(upstream_retry_after(_upstream_error(429)), DEFAULT_RETRY_AFTER_SECONDS)
+        http_date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(upstream_retry_after(_upstream_error(429, {'retry-after': http_date})), 30, delta=2)
+
+    @mock.patch('chatapi.admission.random.uniform', return_value=0)
+    @mock.patch('chatapi.admission.time.sleep')
+    def test_call_retries_and_cools_down(self, sleep, uniform):
+        controller = _controller(queue_timeout=30)
+        responses = [_upstream_error(429, {'retry-after': '2'}), 'reply']
+
+        def fn():
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        ticket = controller.admit('a')
+        self.assertEqual(controller.call(ticket, fn), 'reply')
+        # 冷却时间（2 秒）内先等待冷却，再等待退避
+        self.assertEqual(sleep.call_count, 2)
+        self.assertAlmostEqual(sum(call.args[0] for call in sleep.call_args_list), 4, delta=0.1)
+        metrics = controller.metrics()
+        self.assertEqual((metrics['upstream_throttled'], metrics['upstream_retries']), (1, 1))
+
+    @mock.patch('chatapi.admission.time.sleep')
+    def test_call_gives_up_after_max_retries(self, sleep):
+        controller = _controller(queue_timeout=30, max_retries=1)
+        error = _upstream_error(503, {'retry-after': '0'})
+        ticket = controller.admit('a')
+        with self.assertRaises(Exception) as caught:
+            controller.call(ticket, mock.Mock(side_effect=error))
+        self.assertIs(caught.exception, error)
+        self.assertEqual(controller.metrics()['upstream_retries'], 1)
+
+
+class BackgroundAdmissionTests(SimpleTestCase):
+
+    def test_background_yields_to_user_requests(self):
+        controller = _controller(max_concurrency=2, max_background=1)
+        background = controller.admit_background()
+        # 后台调用同时最多 max_background 个
+        with self.assertRaises(AdmissionRejected) as caught:
+            controller.admit_background()
+        self.assertEqual(caught.exception.reason, 'background_busy')
+
+        user = controller.admit('a')
+        background.release()
+        # 没有空闲名额时后台调用不排队
+        other = controller.admit('b')
+        with self.assertRaises(AdmissionRejected):
+            controller.admit_background()
+        user.release()
+        other.release()
+        controller.call_background(lambda: None)
+        metrics = controller.metrics()
+        self.assertEqual((metrics['active'], metrics['background_active']), (0, 0))
+        self.assertEqual((metrics['admitted_background'], metrics['rejected_background_busy']), (2, 2))
+
+    def test_background_rejected_while_users_queue(self):
+        controller = _controller(max_concurrency=1, queue_timeout=5)
+
+        async def scenario():
+            ticket = await controller.aadmit('a')
+            waiting = asyncio.ensure_future(controller.aadmit('b'))
+            await asyncio.sleep(0)
+            ticket.release()
+            # 名额已转交给排队中的用户请求
+            with self.assertRaises(AdmissionRejected):
+                controller.admit_background()
+            (await waiting).release()
+
+        asyncio.run(scenario())
+        self.assertEqual(controller.metrics()['active'], 0)
+
+
+class LocMemConversationStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.store = LocMemConversationStore(max_conversations=2)
+
+    def test_append_and_load_tail(self):
+        self.assertIsNone(self.store.load('c1'))
+        self.store.append('c1', _turns(1), {'score': 10})
+        self.store.append('c1', _turns(2)[2:], {'score': 20, 'scenario': '刷单'})
+        meta, offset, messages = self.store.load('c1', tail=3)
+        self.assertEqual(meta, {'score': 20, 'scenario': '刷单'})
+        self.assertEqual((offset, messages), (1, _turns(2)[1:]))
+        self.assertEqual(self.store.load('c1')[1:], (0, _turns(2)))
+
+    def test_since_extends_tail(self):
+        self.store.append('c1', _turns(5), {})
+        self.assertEqual(self.store.load('c1', tail=2, since=4)[1:], (4, _turns(5)[4:]))
+        # since 不会让读取范围变小
+        self.assertEqual(self.store.load('c1', tail=4, since=8)[1], 6)
+
+    def test_loaded_messages_are_copies(self):
+        self.store.append('c1', _turns(1), {'score': 1})
+        meta, _, messages = self.store.load('c1')
+        messages[0]['content'] = 'changed'
+        meta['score'] = 99
+        meta, _, messages = self.store.load('c1')
+        self.assertEqual((meta, messages), ({'score': 1}, _turns(1)))
+
+    def test_lru_eviction_and_delete(self):
+        self.store.append('c1', _turns(1), {})
+        self.store.append('c2', _turns(1), {})
+        self.store.load('c1')
+        self.store.append('c3', _turns(1), {})
+        self.assertIsNone(self.store.load('c2'))
+        self.assertIsNotNone(self.store.load('c1'))
+        self.store.delete('c1')
+        self.assertIsNone(self.store.load('c1'))
+
+    def test_async_interface(self):
+        async def scenario():
+            await self.store.aappend('c1', _turns(2), {'score': 5})
+            loaded = await self.store.aload('c1', tail=2)
+            await self.store.adelete('c1')
+            return loaded, await self.store.aload('c1')
+
+        loaded, deleted = asyncio.run(scenario())
+        self.assertEqual(loaded, ({'score': 5}, 2, _turns(2)[2:]))
+        self.assertIsNone(deleted)
+
+
+def _opener(text, score=60):
+    return f"分数：{score} 正文：{text}"
+
+
+class OpenerPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = OpenerPool(scenarios=('刷单', '杀猪盘'), size=2, recent_size=2)
+
+    def test_fingerprint_ignores_header_and_punctuation(self):
+        self.assertEqual(opener_fingerprint(_opener('您好，我是客服！')), opener_fingerprint(_opener('您好 我是客服', 80)))
+        self.assertNotEqual(opener_fingerprint(_opener('您好，我是客服')), opener_fingerprint(_opener('您好，我是警官')))
+
+    def test_duplicates_discarded_within_recent_window(self):
+        self.assertTrue(self.pool._add('刷单', _opener('第一条')))
+        self.assertFalse(self.pool._add('杀猪盘', _opener('第一条。')))
+        self.assertTrue(self.pool._add('刷单', _opener('第二条')))
+        self.assertTrue(self.pool._add('刷单', _opener('第三条')))
+        # 超出最近窗口后允许再次出现
+        self.assertTrue(self.pool._add('杀猪盘', _opener('第一条')))
+        self.assertEqual(self.pool.depth(), {'刷单': 3, '杀猪盘': 1})
+
+    def test_take_uses_each_opener_once(self):
+        with mock.patch.object(self.pool, 'refill') as refill:
+            self.assertIsNone(self.pool.take())
+            self.pool._add('刷单', _opener('第一条'))
+            self.assertEqual(self.pool.take(), ('刷单', _opener('第一条')))
+            self.assertIsNone(self.pool.take())
+        self.assertEqual(refill.call_count, 3)
+
+    def test_refill_counts_pending_generations(self):
+        executor = mock.Mock()
+        self.pool._add('刷单', _opener('第一条'))
+        with mock.patch.object(self.pool, '_get_executor', return_value=executor):
+            self.pool.refill()
+            # 生成中的也计入，不会重复提交
+            self.pool.refill()
+        self.assertEqual(sorted(call.args[1] for call in executor.submit.call_args_list), ['刷单', '杀猪盘', '杀猪盘'])
+
+    def test_generation_failure_pauses_refill(self):
+        executor = mock.Mock()
+        self.pool._pending['刷单'] = 1
+        with mock.patch('chatapi.admission.AdmissionController.call_background', side_effect=RuntimeError('down')):
+            self.pool._generate('刷单')
+        self.assertEqual(self.pool._pending['刷单'], 0)
+        with mock.patch.object(self.pool, '_get_executor', return_value=executor):
+            self.pool.refill()
+        executor.submit.assert_not_called()
+
+
+class AsyncChatViewTests(SimpleTestCase):
+
+    @mock.patch('chatapi.views.get_async_openai_client')
+    @mock.patch('chatapi.views.chat_api_view', return_value=JsonResponse({'success': True}))
+    def test_wsgi_uses_sync_view(self, chat_api_view, get_async_openai_client):
+        # WSGI 下每个请求一个事件循环，不为它创建 AsyncOpenAI 客户端
+        response = self.client.post(reverse('chat_api:chat_api_async'), {'message': 'hi'},
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'success': True})
+        chat_api_view.assert_called_once()
+        get_async_openai_client.assert_not_called()
+
+    @mock.patch('chatapi.views.chat_api_view')
+    async def test_asgi_stays_async(self, chat_api_view):
+        response = await self.async_client.post(reverse('chat_api:chat_api_async'), {'reset': True},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        chat_api_view.assert_not_called()
@@ -6,4 +6,7 @@ from . import views
 
 urlpatterns = [
     path('', views.chat_api_view, name='chat_api'),
+    # 异步版本，需在 ASGI 服务器下运行
+    path('async/', views.async_chat_api_view, name='chat_api_async'),
+    path('metrics/', views.ChatMetricsView.as_view(), name='chat_metrics'),
 ]
\ No newline at end of file
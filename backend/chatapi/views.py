@@ -4,45 +4,426 @@ from django.shortcuts import render
 # chatapi/views.py
 
 import json
-import os
-from typing import List, Dict, TypedDict, Optional, Any
+import logging
+import uuid
+from typing import List, Dict, TypedDict, Optional, Any, Tuple
 
 # 需要安装 openai 库
 # pip install openai
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-import openai
+from graph_api.keywords import annotate_text
+from KnowledgeBackend.streaming import is_asgi_request, streaming_content
+
+from .analytics import arequest_user_id, get_turn_recorder, request_user_id
+from .admission import AdmissionRejected, client_key, get_admission_controller
+from .context import (
+    aload_summary, build_context, history_tail_size, load_summary, schedule_summary, unsummarized_since,
+)
+from .llm import get_openai_client, get_async_openai_client, CHAT_MODEL
+from .openers import get_opener_pool
+from .scenarios import choose_scenario, system_message
+from .scoring import ReplyHeaderParser, parse_reply
+from .store import get_conversation_store
+
+logger = logging.getLogger(__name__)
 
 # --- 类型定义 (为了代码可读性，对应 Nuxt/H3 中的 interface) ---
 class Message(TypedDict):
     role: str  # 'user', 'assistant', 'system'
     content: str
 
-# 我们将把这个状态字典直接存在 session 中
+# 每轮请求中使用的对话状态，由对话存储 (见 store.py) 中的记录组装而成
 class ConversationState(TypedDict):
+    # 系统提示词 + 最近的若干条消息
     messages: List[Message]
     score: int
-    # 注意：session 存储的数据需要是 JSON 序列化的 (默认数据库 backend 是这样)
-    # 如果有自定义对象，需要特别处理序列化
-
-# --- 初始化 OpenAI 客户端 ---
-# 推荐在 settings.py 中加载环境变量，然后在 views.py 中导入使用
-# 但为了直接对应你的原代码结构，我们在这里直接从 os.environ 获取
-# 确保你的环境变量 DASHSCOPE_API_KEY 已经设置
-DASHSCOPE_API_KEY = os.environ.get("DASHSCOPE_API_KEY")
-
-# 如果 API key 未设置，这里可以根据需要抛出错误或记录警告
-if not DASHSCOPE_API_KEY:
-     print("WARNING: DASHSCOPE_API_KEY environment variable not set. AI calls will likely fail.")
-     # raise EnvironmentError("DASHSCOPE_API_KEY environment variable not set.") # 生产环境建议直接中断
-
-openai_client = openai.OpenAI(
-    api_key=DASHSCOPE_API_KEY,
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-)
+    # 对话存储和滚动摘要 (见 context.py) 的 key
+    conversation_id: str
+    # 未加载的较早消息条数
+    offset: int
+    # 诈骗情境：预生成开场白的情境 (见 openers.py) 或图谱情境卡片的诈骗类型 (见 scenarios.py)，都没有时为 None
+    scenario: Optional[str]
+    # 登录用户 id (JWT 或 session)，匿名时为 None；每轮请求时填入，仅用于统计分析 (见 analytics.py)
+    user_id: Optional[Any]
+
+# session 中只保存对话 id，对话内容在对话存储中，每轮只追加新消息
+SESSION_CONVERSATION_KEY = 'chat_conversation_id'
+
+# --- OpenAI 客户端 ---
+# 客户端在 llm.get_openai_client() / llm.get_async_openai_client() 中按需创建，
+# openai 模块也在首次请求时才导入，这样 worker 启动和管理命令都不需要加载 openai SDK。
+
+# --- 辅助函数 ---
+
+def _parse_chat_body(raw_body: bytes) -> Tuple[Optional[str], Optional[bool], bool, str]:
+    """
+    解析请求体，返回 (user_message, reset_conversation, stream_reply, user_id_from_body)。
+    JSON 格式错误时抛出 json.JSONDecodeError。
+    """
+    body: Dict[str, Any] = json.loads(raw_body)
+    user_message: Optional[str] = body.get('message')
+    reset_conversation: Optional[bool] = body.get('reset')
+    # stream=true 时以 Server-Sent Events 逐段推送回复
+    stream_reply: bool = bool(body.get('stream'))
+    # 虽然我们使用 session 管理状态，但根据原接口，前端可能会发送 userId，
+    # 我们仍然读取它，尽管它不再直接作为状态存储的 key。
+    # 可以用于日志记录或其他内部用途。
+    user_id_from_body: str = body.get('userId', 'anonymous_user')
+    if not isinstance(user_id_from_body, str) or user_id_from_body.strip() == '':
+         user_id_from_body = 'anonymous_user'
+    else:
+         user_id_from_body = user_id_from_body.strip()
+    return user_message, reset_conversation, stream_reply, user_id_from_body
+
+
+def _new_conversation_state() -> ConversationState:
+    """初始化分数和消息列表，并添加系统消息 (内容见 prompts.SYSTEM_PROMPT)"""
+    return {
+        'messages': [system_message()],
+        'score': 50, # 初始化分数
+        'conversation_id': uuid.uuid4().hex,
+        'offset': 0,
+        'scenario': None,
+        'user_id': None,
+    }
+
+
+def _conversation_state(conversation_id: str, stored) -> Optional[ConversationState]:
+    """把对话存储中读取的 (元数据, offset, 最近消息) 组装为对话状态"""
+    if stored is None:
+        return None
+    meta, offset, messages = stored
+    return {
+        # 系统提示词不保存，每轮按对话的情境重新生成（附上情境卡片）
+        'messages': [system_message(meta.get('scenario'))] + messages,
+        'score': meta.get('score', 50),
+        'conversation_id': conversation_id,
+        'offset': offset,
+        'scenario': meta.get('scenario'),
+        'user_id': None,
+    }
+
+
+def _turn_meta(conversation_state: ConversationState) -> Dict[str, Any]:
+    return {'score': conversation_state['score'], 'scenario': conversation_state['scenario']}
+
+
+def _record_turn(conversation_state: ConversationState):
+    """把本轮放入统计分析队列，由后台线程批量写库 (见 analytics.py)，这里不做 I/O"""
+    messages = conversation_state['messages']
+    ai_reply_content = messages[-1]['content']
+    get_turn_recorder().record(
+        conversation_state['conversation_id'], conversation_state['user_id'],
+        conversation_state['offset'] + len(messages) - 3,
+        messages[-2]['content'], ai_reply_content,
+        parse_reply(ai_reply_content)[0], conversation_state['scenario'],
+    )
+
+
+def _save_turn(conversation_state: ConversationState):
+    """把本轮的用户消息和助手回复追加到对话存储，并放入统计分析队列"""
+    get_conversation_store().append(
+        conversation_state['conversation_id'], conversation_state['messages'][-2:],
+        _turn_meta(conversation_state)
+    )
+    _record_turn(conversation_state)
+
+
+async def _asave_turn(conversation_state: ConversationState):
+    await get_conversation_store().aappend(
+        conversation_state['conversation_id'], conversation_state['messages'][-2:],
+        _turn_meta(conversation_state)
+    )
+    _record_turn(conversation_state)
+
+
+def _take_opener(conversation_state: ConversationState) -> Optional[str]:
+    """
+    新对话的第一轮优先使用预生成的开场白，不调用模型；池为空时返回 None。
+    取到时把情境记入对话状态。
+    """
+    if len(conversation_state['messages']) != 2 or conversation_state['offset']:
+        return None
+    opener = get_opener_pool().take()
+    if opener is None:
+        return None
+    conversation_state['scenario'], ai_reply_content = opener
+    return ai_reply_content
+
+
+def _assign_scenario(conversation_state: ConversationState):
+    """
+    没有开场白可用的新对话，从图谱情境卡片中随机选择诈骗类型，
+    并把卡片附在系统提示词后；卡片只在内存中查找，不访问图谱。
+    """
+    if conversation_state['scenario'] or len(conversation_state['messages']) != 2 or conversation_state['offset']:
+        return
+    scenario = choose_scenario()
+    if scenario:
+        conversation_state['scenario'] = scenario
+        conversation_state['messages'][0] = system_message(scenario)
+
+
+def _turn_keywords(conversation_state: ConversationState) -> Optional[Dict[str, Any]]:
+    """
+    用图谱关键词标注本轮的用户消息和回复（见 graph_api.keywords），位置为在各自内容中的下标；
+    关键词自动机尚未构建时返回 None。
+    """
+    messages = conversation_state['messages']
+    message_keywords = annotate_text(messages[-2]['content'])
+    if message_keywords is None:
+        return None
+    return {'message': message_keywords, 'reply': annotate_text(messages[-1]['content'])}
+
+
+def _reply_payload(conversation_state: ConversationState, ai_reply_content: str, current_score: int) -> Dict[str, Any]:
+    """
+    成功响应只返回本轮新增的两条消息；offset 为其中第一条在对话历史中的位置，
+    客户端据此把它们追加到本地保存的历史中。
+    """
+    messages = conversation_state['messages']
+    return {
+        'success': True,
+        'reply': ai_reply_content,
+        'score': current_score,
+        'messages': messages[-2:],
+        'conversationId': conversation_state['conversation_id'],
+        'offset': conversation_state['offset'] + len(messages) - 3,
+        'keywords': _turn_keywords(conversation_state),
+    }
+
+
+def _update_score(conversation_state: ConversationState, ai_reply_content: str) -> int:
+    """解析回复中的分数并写回会话状态；模型未按格式输出时保留原分数"""
+    score, _ = parse_reply(ai_reply_content)
+    if score is not None:
+        conversation_state['score'] = score
+    return conversation_state['score']
+
+
+def _record_reply(conversation_state: ConversationState, ai_reply_content: str,
+                  summary: Optional[Dict[str, Any]]) -> int:
+    """
+    把助手回复写入会话状态并更新分数；有对话滑出上下文窗口时，
+    在后台把它们折叠进滚动摘要。返回当前分数。
+    """
+    conversation_state['messages'].append({'role': 'assistant', 'content': ai_reply_content})
+    current_score = _update_score(conversation_state, ai_reply_content)
+    schedule_summary(conversation_state, summary)
+    return current_score
+
+
+def _ai_error_response(e: Exception, user_id_from_body: str) -> JsonResponse:
+    """把调用 AI 过程中的异常转换为错误响应，同步和异步视图共用"""
+    import openai
+
+    if isinstance(e, AdmissionRejected):
+         # 未获准入（用户超速 / 排队已满 / 等待超时），告诉客户端多久后重试
+         logger.warning(f"Chat request not admitted for user_id_from_body {user_id_from_body}: {e.reason}")
+         response = JsonResponse(
+             {'success': False, 'message': 'AI service is busy. Please try again later.', 'reason': e.reason},
+             status=e.status_code
+         )
+         response['Retry-After'] = str(max(1, int(e.retry_after + 0.999)))
+         return response
+    if isinstance(e, openai.APIConnectionError):
+         logger.error(f"Failed to connect to OpenAI API for user_id_from_body {user_id_from_body}: {e}")
+         return JsonResponse(
+             {'success': False, 'message': 'Failed to connect to AI service.', 'error': str(e)},
+             status=500
+         )
+    if isinstance(e, openai.RateLimitError):
+         logger.error(f"OpenAI API rate limit exceeded for user_id_from_body {user_id_from_body}: {e}")
+         return JsonResponse(
+             {'success': False, 'message': 'AI service rate limit exceeded. Please try again later.', 'error': str(e)},
+             status=429 # Too Many Requests
+         )
+    if isinstance(e, openai.APIStatusError):
+         logger.error(f"OpenAI API returned status error for user_id_from_body {user_id_from_body}: {e.status_code} - {e.response}")
+         # 尝试根据 AI 返回的状态码返回错误
+         status_code = getattr(e, 'status_code', 500)
+         return JsonResponse(
+             {'success': False, 'message': f'AI service returned an error (Status: {status_code}).', 'error': str(e)},
+             status=status_code
+         )
+    if isinstance(e, ValueError): # Handle empty AI content error
+        logger.error(f"AI response content error for user_id_from_body {user_id_from_body}: {e}")
+        return JsonResponse(
+             {'success': False, 'message': f'AI returned invalid response: {str(e)}'},
+             status=500
+         )
+    logger.error(f"An unexpected error occurred during AI call for user_id_from_body {user_id_from_body}: {e}")
+    return JsonResponse(
+        {'success': False, 'message': 'An unexpected error occurred during AI processing.', 'error': str(e)},
+        status=500
+    )
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """编码一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(events, request=None) -> StreamingHttpResponse:
+    """
+    用（同步或异步）事件迭代器构建 SSE 响应；传入 request 时同步迭代器在 ASGI 下
+    同样逐个事件发送（见 KnowledgeBackend.streaming）
+    """
+    if request is not None:
+        events = streaming_content(request, events)
+    response = StreamingHttpResponse(events, content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # 关闭 nginx 等反向代理的缓冲，保证增量内容及时到达浏览器
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class _ReplyRelay:
+    """
+    把模型的流式输出转换为 SSE 事件，同步与异步视图共用。事件依次为：
+    - score: 回复头部解析出分数后立即推送 {'score': int}
+    - token: 正文增量 {'text': str}
+    - done:  流结束，本轮已保存 {'score': int, 'reply': str, 'keywords': 关键词标注}
+    - error: 中途出错 {'message': str}
+    """
+
+    def __init__(self, conversation_state: ConversationState, summary: Optional[Dict[str, Any]],
+                 user_id_from_body: str):
+        self.conversation_state = conversation_state
+        self.summary = summary
+        self.user_id_from_body = user_id_from_body
+        self._parser = ReplyHeaderParser()
+        self._parts: List[str] = []
+
+    def on_chunk(self, chunk) -> List[str]:
+        if not chunk.choices:
+            return []
+        # deepseek-r1 的思考过程在 reasoning_content 中，这里只转发正文
+        text = getattr(chunk.choices[0].delta, 'content', None)
+        if not text:
+            return []
+        self._parts.append(text)
+        return [self._encode(kind, value) for kind, value in self._parser.feed(text)]
+
+    def replay(self, ai_reply_content: str) -> List[str]:
+        """把一条完整回复（预生成的开场白）一次性转换为事件，不含 done"""
+        self._parts.append(ai_reply_content)
+        events = [self._encode(kind, value) for kind, value in self._parser.feed(ai_reply_content)]
+        return events + self.flush()
+
+    def flush(self) -> List[str]:
+        """流结束时输出解析器中剩余的内容"""
+        return [self._encode(kind, value) for kind, value in self._parser.close()]
+
+    def finish(self) -> Optional[str]:
+        """
+        把完整回复写入会话状态并返回 done 事件；回复为空时返回 None。
+        调用方负责随后把本轮写入对话存储。
+        """
+        ai_reply_content = ''.join(self._parts)
+        if not ai_reply_content:
+            logger.error(f"AI stream returned empty content for user_id_from_body {self.user_id_from_body}")
+            return None
+        current_score = _record_reply(self.conversation_state, ai_reply_content, self.summary)
+        logger.info(f"Stream finished for user_id_from_body {self.user_id_from_body}, score: {current_score}")
+        return _sse_event('done', {'score': current_score, 'reply': ai_reply_content,
+                                   'keywords': _turn_keywords(self.conversation_state)})
+
+    def empty(self) -> str:
+        return _sse_event('error', {'message': 'AI returned invalid response: AI response content is empty.'})
+
+    def failed(self, e: Exception) -> str:
+        logger.error(f"AI stream interrupted for user_id_from_body {self.user_id_from_body}: {e}")
+        return _sse_event('error', {'message': 'An unexpected error occurred during AI processing.'})
+
+    @staticmethod
+    def _encode(kind, value) -> str:
+        if kind == 'score':
+            return _sse_event('score', {'score': value})
+        return _sse_event('token', {'text': value})
+
+
+def _stream_chat_reply(request, conversation_state: ConversationState, summary, stream, ticket,
+                       user_id_from_body: str):
+    """把同步的模型流式输出转发为 SSE；流结束时归还准入名额"""
+    relay = _ReplyRelay(conversation_state, summary, user_id_from_body)
+
+    def event_stream():
+        try:
+            for chunk in stream:
+                yield from relay.on_chunk(chunk)
+            yield from relay.flush()
+            done_event = relay.finish()
+            if done_event is None:
+                yield relay.empty()
+                return
+            # 回复完整后才写入对话存储，中途失败的轮次不会留下没有回复的用户消息
+            _save_turn(conversation_state)
+            yield done_event
+        except Exception as e:
+            yield relay.failed(e)
+        finally:
+            ticket.release()
+            stream.close()
+
+    return _sse_response(event_stream(), request)
+
+
+def _astream_chat_reply(conversation_state: ConversationState, summary, stream, ticket,
+                        user_id_from_body: str):
+    """把异步的模型流式输出转发为 SSE；流结束时归还准入名额"""
+    relay = _ReplyRelay(conversation_state, summary, user_id_from_body)
+
+    async def event_stream():
+        try:
+            async for chunk in stream:
+                for event in relay.on_chunk(chunk):
+                    yield event
+            for event in relay.flush():
+                yield event
+            done_event = relay.finish()
+            if done_event is None:
+                yield relay.empty()
+                return
+            await _asave_turn(conversation_state)
+            yield done_event
+        except Exception as e:
+            yield relay.failed(e)
+        finally:
+            ticket.release()
+            await stream.close()
+
+    return _sse_response(event_stream())
+
+
+def _opener_response(request, conversation_state: ConversationState, ai_reply_content: str, stream_reply: bool,
+                     user_id_from_body: str, asynchronous: bool = False):
+    """
+    用预生成的开场白作为本轮回复构建响应，流式请求同样以 SSE 事件返回。
+    调用方在返回响应前把本轮写入对话存储。
+    """
+    logger.info(f"Serving pre-generated opener ({conversation_state['scenario']}) for user_id_from_body: {user_id_from_body}")
+    if stream_reply:
+        relay = _ReplyRelay(conversation_state, None, user_id_from_body)
+        events = relay.replay(ai_reply_content)
+        events.append(relay.finish())
+        if asynchronous:
+            async def event_stream():
+                for event in events:
+                    yield event
+            return _sse_response(event_stream())
+        return _sse_response(iter(events), request)
+    current_score = _record_reply(conversation_state, ai_reply_content, None)
+    return JsonResponse(_reply_payload(conversation_state, ai_reply_content, current_score), status=200)
+
 
 # --- Django View 函数 ---
 
@@ -53,39 +434,31 @@ openai_client = openai.OpenAI(
 @require_POST
 def chat_api_view(request):
     """
-    Handles user chat messages using Django Sessions for state management,
-    calls the AI API, and returns the response in the original format.
+    Handles user chat messages, keeping the conversation in the conversation store
+    (the Django session only holds its id), calls the AI API and returns the new
+    messages of this turn. With {"stream": true} in the body the reply is streamed
+    as Server-Sent Events instead.
     """
-    # 使用一个唯一的 key 来存储会话状态在 session 中
-    SESSION_STATE_KEY = 'chat_conversation_state'
-
+    user_id_from_body = 'anonymous_user'
     try:
         # 1. 读取并解析请求体
-        body: Dict[str, Any] = json.loads(request.body)
-        user_message: Optional[str] = body.get('message')
-        reset_conversation: Optional[bool] = body.get('reset')
-        # 虽然我们使用 session 管理状态，但根据原接口，前端可能会发送 userId，
-        # 我们仍然读取它，尽管它不再直接作为状态存储的 key。
-        # 可以用于日志记录或其他内部用途。
-        user_id_from_body: str = body.get('userId', 'anonymous_user')
-        if not isinstance(user_id_from_body, str) or user_id_from_body.strip() == '':
-             user_id_from_body = 'anonymous_user'
-        else:
-             user_id_from_body = user_id_from_body.strip()
-
-        print(f"[DEBUG] Request received from user_id_from_body: {user_id_from_body}")
-        # Django session ID 是状态的实际 key
-        print(f"[DEBUG] Django Session Key: {request.session.session_key}")
+        user_message, reset_conversation, stream_reply, user_id_from_body = _parse_chat_body(request.body)
 
+        logger.debug(f"Request received from user_id_from_body: {user_id_from_body}")
+        # session 中保存的是对话 id，对话内容在对话存储中
+        logger.debug(f"Django Session Key: {request.session.session_key}")
+
+
+        store = get_conversation_store()
+        conversation_id: Optional[str] = request.session.get(SESSION_CONVERSATION_KEY)
 
         # 2. 处理重置会话请求
         if reset_conversation:
-            print(f"[INFO] Resetting conversation state in session for user_id_from_body: {user_id_from_body}")
-            # 从 session 中删除对应的状态
-            if SESSION_STATE_KEY in request.session:
-                del request.session[SESSION_STATE_KEY]
-            # 标记 session 已修改（对于删除操作通常不是必须的，但安全）
-            # request.session.modified = True # 删除通常不需要显式标记 modified
+            logger.info(f"Resetting conversation state for user_id_from_body: {user_id_from_body}")
+            # 删除对话记录，并从 session 中移除对话 id
+            if conversation_id:
+                store.delete(conversation_id)
+                del request.session[SESSION_CONVERSATION_KEY]
 
             # 返回与原接口一致的成功响应
             return JsonResponse(
@@ -101,150 +474,239 @@ def chat_api_view(request):
              )
 
 
-        # 3. 获取或初始化会话状态 from Session
-        # 从 session 中获取状态，如果不存在，则为 None
-        conversation_state: Optional[ConversationState] = request.session.get(SESSION_STATE_KEY)
-        is_new_conversation = not conversation_state
-
-        if is_new_conversation:
-            print(f"[INFO] Initializing new conversation state in session for user_id_from_body: {user_id_from_body}")
-            # 初始化分数和消息列表
-            conversation_state = {'messages': [], 'score': 50} # 初始化分数
+        # 3. 获取或初始化对话状态：只读取构建上下文所需的最近几轮，以及尚未折叠进摘要的消息
+        conversation_state: Optional[ConversationState] = None
+        summary = None
+        if conversation_id:
+            summary = load_summary(conversation_id)
+            conversation_state = _conversation_state(conversation_id, store.load(
+                conversation_id, tail=history_tail_size(), since=unsummarized_since(summary)
+            ))
 
-            # 新会话开始时，添加系统消息 (这是你原代码的一部分)
-            # 注意：请在这里补充你的系统消息内容
-            system_message_content = '''你是一名精通各种电信诈骗手段的AI，现在你将扮演一个具体的诈骗角色。你的目标是模拟真实诈骗情境，逐步诱导用户泄露敏感信息或进行危险操作，同时不暴露你是AI或诈骗分子。
+        if not conversation_state:
+            summary = None
+            logger.info(f"Initializing new conversation state for user_id_from_body: {user_id_from_body}")
+            conversation_state = _new_conversation_state()
+            # session 只在新建对话时写入一次
+            request.session[SESSION_CONVERSATION_KEY] = conversation_state['conversation_id']
+        conversation_state['user_id'] = request_user_id(request)
 
-每轮对话，在回复用户之前，你需要根据用户的最新回复，为用户在本轮的表现进行一个风险评分（基于用户的警惕性、是否泄露信息、是否听信你的诱导等）。评分范围是0-100分，初始分数为50分。
-评分标准：
-- 如果用户表现出高度警惕、怀疑、要求核实、提及报警或识破骗局，分数应该显著增加（例如+10到+30）。
-- 如果用户轻易相信你、按照你的指示操作、询问敏感信息、或表现出焦虑、不知所措，分数应该减少（例如-10到-30）。
-- 如果用户直接泄露银行卡号、身份证号、验证码、密码等极端敏感信息，分数应大幅减少（例如-40到-60）。
-- 如果用户只是进行普通交流，与骗局核心不相关，分数变化较小或不变。
-- 如果用户一直重复无关内容，或是辱骂性内容，可进行显得有些气急败坏的威胁后主动结束对话，并增加少许评分。
-请根据用户的具体用词、语气和行为来判断并给出分数。
 
-你的回复必须遵循以下固定格式：
-分数：[你的最新评分] 正文：[你扮演角色的回复文本]
-
-例子如下（请注意不要复制此文本）：分数：75 正文：您好！关于您账户异常的问题，请提供一下您的账号信息以便我们核实。
-
-回复文本的要求如下：
-- 保持简短、清晰，避免冗余信息。
-- 严格扮演你设定的诈骗角色，对话要自然、有说服力。
-- 根据用户反应调整策略，深入或转移话题。
-- 设计多样化的诈骗情境，每轮新对话都可以是一个全新的骗局（例如：冒充电商客服退款、冒充公检法、虚假投资平台、兼职刷单、杀猪盘等）。
-
-请在你的第一条回复中，构思一个详细的诈骗背景故事和情境，然后以你扮演的角色身份向用户介绍这个场景，并以指定的格式输出（分数默认为50，因为这是第一条回复）。'''
-            conversation_state['messages'].append({'role': 'system', 'content': system_message_content})
-            print(f"[INFO] Added system message to session state for user_id_from_body: {user_id_from_body}")
-
-            # 将新的或修改后的状态存回 session (Django 通常在请求结束时自动保存，但显式标记 modified 更安全)
-            # request.session[SESSION_STATE_KEY] = conversation_state # 在Python中，dict是引用，直接修改conversation_state会影响session中的dict
-            request.session.modified = True # 标记 session 已修改
-
-
-        # 4. 添加用户消息到会话状态 (使用从 session 中获取的状态)
-        # conversation_state 现在是一个字典，可以直接修改
+        # 4. 添加用户消息到对话状态；本轮成功后才与回复一起写入对话存储
         conversation_state['messages'].append({'role': 'user', 'content': user_message})
-        print(f"[INFO] Added user message to session state for user_id_from_body {user_id_from_body}: {user_message[:50]}...") # 打印消息前50字符
-        request.session.modified = True # 标记 session 已修改
+        logger.debug(f"Added user message for user_id_from_body {user_id_from_body}: {user_message[:50]}...") # 打印消息前50字符
+
 
+        # 新对话的第一轮优先使用预生成的开场白，无需等待模型
+        opener_content = _take_opener(conversation_state)
+        if opener_content:
+            response = _opener_response(request, conversation_state, opener_content, stream_reply, user_id_from_body)
+            _save_turn(conversation_state)
+            return response
+        _assign_scenario(conversation_state)
 
         # 5. 调用 AI API
+        # 只发送系统提示词、滚动摘要和预算内的最近几轮
+        context_messages = build_context(conversation_state, summary)
+        # 调用前先经过准入控制：用户限速、全局并发上限与排队，上游限流时按 Retry-After 退避重试
+        admission = get_admission_controller()
+        ticket = None
+        handed_off = False
         try:
-            print(f"[INFO] Calling AI API for user_id_from_body: {user_id_from_body}")
-            # 调用 AI 时使用当前 session 中的消息历史
-            chat_completion = openai_client.chat.completions.create(
-                # model="deepseek-v3", # 请根据你实际使用的模型调整
-                model="deepseek-r1", # 请根据你实际使用的模型调整
-
-                messages=conversation_state['messages'] # 使用 session 中的消息历史
-            )
-            print(f"[INFO] AI API call successful for user_id_from_body: {user_id_from_body}")
-
-            # 6. 处理 AI 响应并更新状态 (使用从 session 中获取的状态)
+            ticket = admission.admit(client_key(request, conversation_state['user_id']))
+            if stream_reply:
+                # 流式模式：先发起请求（连接/限流等错误仍由下方 except 返回 JSON），
+                # 再把增量内容以 SSE 转发给浏览器
+                logger.info(f"Calling AI API (stream) for user_id_from_body: {user_id_from_body}")
+                stream = admission.call(ticket, lambda: get_openai_client().chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=context_messages,
+                    stream=True
+                ))
+                # 名额交给流式生成器，在流结束时归还
+                handed_off = True
+                return _stream_chat_reply(request, conversation_state, summary, stream, ticket, user_id_from_body)
+
+            logger.info(f"Calling AI API for user_id_from_body: {user_id_from_body}")
+            # 调用 AI 时使用由对话历史组装的上下文窗口
+            chat_completion = admission.call(ticket, lambda: get_openai_client().chat.completions.create(
+                model=CHAT_MODEL, # 请根据你实际使用的模型调整 (见 llm.CHAT_MODEL)
+
+                messages=context_messages
+            ))
+            ticket.release()
+            logger.info(f"AI API call successful for user_id_from_body: {user_id_from_body}")
+
+            # 6. 处理 AI 响应并更新状态
             # 假设响应格式是标准的 OpenAI API 格式
             ai_reply_content = chat_completion.choices[0].message.content
             if not ai_reply_content:
                  # 如果 AI 返回空内容，根据需要处理，这里作为错误
                  raise ValueError("AI response content is empty.")
 
-            # 添加 AI 响应到会话状态 (使用 session 状态)
-            conversation_state['messages'].append({'role': 'assistant', 'content': ai_reply_content})
-            print(f"[INFO] Added assistant message to session state for user_id_from_body {user_id_from_body}: {ai_reply_content[:50]}...")
-            request.session.modified = True # 标记 session 已修改
+            # 7. 添加 AI 响应到对话状态，从回复头部“分数：xx 正文：”中解析分数，并追加到对话存储
+            current_score = _record_reply(conversation_state, ai_reply_content, summary)
+            _save_turn(conversation_state)
+            logger.debug(f"Saved turn for user_id_from_body {user_id_from_body}: {ai_reply_content[:50]}...")
+            logger.info(f"Current score for user_id_from_body {user_id_from_body}: {current_score}")
+
+
+            # 8. 返回响应：只包含本轮新增的消息
+            return JsonResponse(_reply_payload(conversation_state, ai_reply_content, current_score), status=200)
+
+        except Exception as e:
+            return _ai_error_response(e, user_id_from_body)
+        finally:
+            if ticket is not None and not handed_off:
+                ticket.release()
+
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON received: {request.body}")
+        return JsonResponse(
+            {'success': False, 'message': 'Invalid JSON body.'},
+            status=400
+        )
+    except Exception as e:
+        logger.error(f"An unexpected error occurred processing request for user_id_from_body {user_id_from_body}: {e}")
+        return JsonResponse(
+            {'success': False, 'message': 'An unexpected server error occurred.', 'error': str(e)},
+            status=500
+        )
+
 
-            # TODO: 7. 实现分数更新逻辑 (这是你原代码截断的部分，需要你补充!)
-            # 将你的 Nuxt/H3 代码中根据 AI 响应更新 score 的逻辑移植到这里。
-            # 例如:
-            # if "积极" in ai_reply_content:
-            #     conversation_state['score'] += 5
-            # elif "消极" in ai_reply_content:
-            #     conversation_state['score'] -= 5
-            # conversation_state['score'] = max(0, min(100, conversation_state['score'])) # 确保分数在 0-100 范围内
-            # print(f"[INFO] Updated score in session state for user_id_from_body {user_id_from_body}: {conversation_state['score']}")
-            # request.session.modified = True # 标记 session 已修改
+@csrf_exempt
+@require_POST
+async def async_chat_api_view(request):
+    """
+    Async variant of chat_api_view with the same request/response format.
 
+    Uses a shared openai.AsyncOpenAI client (pooled keep-alive connections), caps
+    concurrent upstream calls per process and goes through the async session and
+    conversation store APIs, so no worker thread is held while the model is generating.
+    Serve under ASGI (e.g. uvicorn KnowledgeBackend.asgi:application); under WSGI the
+    request is handled by chat_api_view.
+    """
+    if not is_asgi_request(request):
+        # WSGI 下异步视图在每个请求新建的事件循环中执行，按事件循环缓存的 AsyncOpenAI 客户端
+        # 无法复用，连接池也不会被关闭；改由同步视图使用进程内共享的同步客户端处理
+        return await sync_to_async(chat_api_view)(request)
 
-            # 暂时不做分数更新，保留 session 中原有的值或初始化值
-            current_score = conversation_state['score']
-            print(f"[INFO] Current score in session state for user_id_from_body {user_id_from_body}: {current_score} (Score update logic needs implementation)")
+    user_id_from_body = 'anonymous_user'
+    try:
+        # 1. 读取并解析请求体
+        user_message, reset_conversation, stream_reply, user_id_from_body = _parse_chat_body(request.body)
+        logger.debug(f"Async request received from user_id_from_body: {user_id_from_body}")
 
+        store = get_conversation_store()
+        conversation_id: Optional[str] = await request.session.aget(SESSION_CONVERSATION_KEY)
 
-            # 8. 返回响应 (格式与原接口一致)
+        # 2. 处理重置会话请求
+        if reset_conversation:
+            logger.info(f"Resetting conversation state for user_id_from_body: {user_id_from_body}")
+            if conversation_id:
+                await store.adelete(conversation_id)
+                await request.session.apop(SESSION_CONVERSATION_KEY, None)
             return JsonResponse(
-                {
-                    'success': True,
-                    'reply': ai_reply_content,
-                    'score': current_score,
-                    'messages': conversation_state['messages'] # 返回 session 中的完整消息历史
-                },
+                {'success': True, 'message': 'Conversation state reset successfully.'},
                 status=200
             )
 
-        except openai.APIConnectionError as e:
-             print(f"[ERROR] Failed to connect to OpenAI API for user_id_from_body {user_id_from_body}: {e}")
-             return JsonResponse(
-                 {'success': False, 'message': 'Failed to connect to AI service.', 'error': str(e)},
-                 status=500
-             )
-        except openai.RateLimitError as e:
-             print(f"[ERROR] OpenAI API rate limit exceeded for user_id_from_body {user_id_from_body}: {e}")
-             return JsonResponse(
-                 {'success': False, 'message': 'AI service rate limit exceeded. Please try again later.', 'error': str(e)},
-                 status=429 # Too Many Requests
-             )
-        except openai.APIStatusError as e:
-             print(f"[ERROR] OpenAI API returned status error for user_id_from_body {user_id_from_body}: {e.status_code} - {e.response}")
-             # 尝试根据 AI 返回的状态码返回错误
-             status_code = getattr(e, 'status_code', 500)
+        if not user_message or not isinstance(user_message, str):
              return JsonResponse(
-                 {'success': False, 'message': f'AI service returned an error (Status: {status_code}).', 'error': str(e)},
-                 status=status_code
-             )
-        except ValueError as e: # Handle empty AI content error
-            print(f"[ERROR] AI response content error for user_id_from_body {user_id_from_body}: {e}")
-            return JsonResponse(
-                 {'success': False, 'message': f'AI returned invalid response: {str(e)}'},
-                 status=500
+                 {'success': False, 'message': 'Invalid or missing "message" in request body.'},
+                 status=400
              )
+
+        # 3. 获取或初始化对话状态（异步接口，不在事件循环里执行同步 I/O）
+        conversation_state: Optional[ConversationState] = None
+        summary = None
+        if conversation_id:
+            summary = await aload_summary(conversation_id)
+            conversation_state = _conversation_state(conversation_id, await store.aload(
+                conversation_id, tail=history_tail_size(), since=unsummarized_since(summary)
+            ))
+        if not conversation_state:
+            summary = None
+            logger.info(f"Initializing new conversation state for user_id_from_body: {user_id_from_body}")
+            conversation_state = _new_conversation_state()
+            await request.session.aset(SESSION_CONVERSATION_KEY, conversation_state['conversation_id'])
+        conversation_state['user_id'] = await arequest_user_id(request)
+
+        # 4. 添加用户消息到对话状态
+        conversation_state['messages'].append({'role': 'user', 'content': user_message})
+
+        opener_content = _take_opener(conversation_state)
+        if opener_content:
+            response = _opener_response(request, conversation_state, opener_content, stream_reply, user_id_from_body,
+                                        asynchronous=True)
+            await _asave_turn(conversation_state)
+            return response
+        _assign_scenario(conversation_state)
+
+        context_messages = build_context(conversation_state, summary)
+
+        # 5. 调用 AI API：先经过准入控制，排队时不占用线程
+        admission = get_admission_controller()
+        ticket = None
+        handed_off = False
+        try:
+            ticket = await admission.aadmit(client_key(request, conversation_state['user_id']))
+            client = get_async_openai_client()
+            if stream_reply:
+                logger.info(f"Calling AI API (async stream) for user_id_from_body: {user_id_from_body}")
+                stream = await admission.acall(ticket, lambda: client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=context_messages,
+                    stream=True
+                ))
+                # 名额交给流式生成器，在流结束时归还
+                handed_off = True
+                return _astream_chat_reply(conversation_state, summary, stream, ticket, user_id_from_body)
+
+            logger.info(f"Calling AI API (async) for user_id_from_body: {user_id_from_body}")
+            chat_completion = await admission.acall(ticket, lambda: client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=context_messages
+            ))
         except Exception as e:
-            print(f"[ERROR] An unexpected error occurred during AI call for user_id_from_body {user_id_from_body}: {e}")
-            return JsonResponse(
-                {'success': False, 'message': 'An unexpected error occurred during AI processing.', 'error': str(e)},
-                status=500
-            )
+            return _ai_error_response(e, user_id_from_body)
+        finally:
+            if ticket is not None and not handed_off:
+                ticket.release()
+
+        # 6. 处理 AI 响应
+        ai_reply_content = chat_completion.choices[0].message.content
+        if not ai_reply_content:
+            return _ai_error_response(ValueError("AI response content is empty."), user_id_from_body)
+        # 7. 添加 AI 响应到对话状态，解析分数并追加到对话存储
+        current_score = _record_reply(conversation_state, ai_reply_content, summary)
+        await _asave_turn(conversation_state)
+        logger.info(f"Async AI call finished for user_id_from_body {user_id_from_body}, score: {current_score}")
+
+        # 8. 返回响应 (格式与同步接口一致)
+        return JsonResponse(_reply_payload(conversation_state, ai_reply_content, current_score), status=200)
 
     except json.JSONDecodeError:
-        print(f"[ERROR] Invalid JSON received: {request.body}")
+        logger.error(f"Invalid JSON received: {request.body}")
         return JsonResponse(
             {'success': False, 'message': 'Invalid JSON body.'},
             status=400
         )
     except Exception as e:
-        print(f"[ERROR] An unexpected error occurred processing request for user_id_from_body {user_id_from_body}: {e}")
+        logger.error(f"An unexpected error occurred processing request for user_id_from_body {user_id_from_body}: {e}")
         return JsonResponse(
             {'success': False, 'message': 'An unexpected server error occurred.', 'error': str(e)},
             status=500
-        )
\ No newline at end of file
+        )
+
+
+class ChatMetricsView(APIView):
+    """对话服务运行指标：准入控制的并发/排队深度/拒绝与重试计数、开场白池存量，以及对话记录落库队列"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({
+            'admission': get_admission_controller().metrics(),
+            'opener_pool': get_opener_pool().depth(),
+            'analytics': get_turn_recorder().metrics(),
+        })
@@ -0,0 +1,88 @@
+"""
+可替换的图谱后端。
+
+图谱查询统一经过 GraphBackend 接口（db_utils.read_from_neo4j 等函数转发到当前后端）：
+- graph_api.backends.neo4j_backend.Neo4jBackend：连接 Neo4j（默认）
+- graph_api.backends.memory.MemoryGraphBackend：进程内的内存图谱，从 JSON 夹具加载，
+  支持项目中用到的 Cypher 子集，测试、CI 与压测不需要数据库
+
+后端由 GRAPH_BACKEND 指定（类的导入路径），GRAPH_BACKEND_OPTIONS 作为构造参数；
+测试和压测脚本可以用 set_graph_backend() 直接替换。
+
+查询结果与 Neo4j 驱动的 record.data() 相同：节点为属性字典，
+关系为 (起点属性字典, 关系类型, 终点属性字典) 元组。
+"""
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class GraphBackendError(Exception):
+    """后端无法执行查询（如内存后端不支持的语法、只读查询中包含写操作）"""
+
+
+class GraphBackend:
+    """图谱后端接口；子类至少实现 read()、stream() 和 write()"""
+
+    def read(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """执行只读查询，返回记录字典列表"""
+        raise NotImplementedError
+
+    def stream(self, query: str, params: Optional[Dict[str, Any]] = None,
+               fetch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """流式执行只读查询，逐条产出记录字典"""
+        raise NotImplementedError
+
+    def write(self, query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        在写事务中执行查询，返回 {'records': [...], 'counters': {...}}；
+        counters 与 Neo4j 的 SummaryCounters 同名（nodes_created、relationships_created、
+        properties_set、labels_added、nodes_deleted、relationships_deleted），只包含非零项。
+        """
+        raise NotImplementedError
+
+    def summary(self) -> Dict[str, Any]:
+        """图谱概况：节点数、关系数，以及各标签 / 关系类型的数量"""
+        labels = {row['label']: row['count'] for row in self.read(
+            "MATCH (n) UNWIND labels(n) AS label RETURN label, count(*) AS count ORDER BY label")}
+        types = {row['type']: row['count'] for row in self.read(
+            "MATCH ()-[r]->() RETURN type(r) AS type, count(*) AS count ORDER BY type")}
+        nodes = self.read("MATCH (n) RETURN count(n) AS count")
+        return {
+            'nodes': nodes[0]['count'] if nodes else 0,
+            'relationships': sum(types.values()),
+            'labels': labels,
+            'relationship_types': types,
+        }
+
+    def verify_connectivity(self):
+        """确认后端可用，不可用时抛出异常"""
+
+    def close(self):
+        """释放连接等资源"""
+
+
+_backend: Optional[GraphBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_graph_backend() -> GraphBackend:
+    """当前进程使用的图谱后端，首次调用时按 GRAPH_BACKEND 创建"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = import_string(getattr(
+                    settings, 'GRAPH_BACKEND', 'graph_api.backends.neo4j_backend.Neo4jBackend'))
+                _backend = backend_class(**getattr(settings, 'GRAPH_BACKEND_OPTIONS', {}))
+    return _backend
+
+
+def set_graph_backend(backend: Optional[GraphBackend]) -> Optional[GraphBackend]:
+    """替换当前后端（None 表示下次按配置重新创建），返回原来的后端；不会关闭原来的后端"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
@@ -0,0 +1,684 @@
+"""
+内存图谱后端使用的 Cypher 子集解析器。
+
+支持项目中用到的查询形状及常见的数据导入写法：
+- 读：MATCH / OPTIONAL MATCH（节点标签与属性、有向 / 无向关系、关系类型与属性、多段路径、
+  逗号分隔的多个模式）、WHERE、UNWIND、WITH、RETURN [DISTINCT]、ORDER BY、SKIP、LIMIT
+- 写：CREATE、MERGE（含 ON CREATE SET / ON MATCH SET）、SET（属性、+=、标签）、[DETACH] DELETE
+- 表达式：字面量、$参数、列表 / 映射、属性访问、算术与比较、AND / OR / XOR / NOT、IS [NOT] NULL、
+  IN、STARTS WITH / ENDS WITH / CONTAINS，以及 FUNCTIONS / AGGREGATES 中列出的函数
+
+不支持的语法抛出 GraphBackendError。解析结果按查询文本缓存。
+"""
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+from . import GraphBackendError
+
+# 聚合函数
+AGGREGATES = {'count', 'collect', 'sum', 'avg', 'min', 'max'}
+# 普通函数（实现见 memory.py）
+FUNCTIONS = {'id', 'elementid', 'labels', 'type', 'properties', 'keys', 'coalesce', 'size', 'tolower',
+             'toupper', 'tostring', 'tointeger', 'trim', 'startnode', 'endnode', 'exists'}
+
+KEYWORDS = {
+    'MATCH', 'OPTIONAL', 'WHERE', 'RETURN', 'WITH', 'UNWIND', 'AS', 'ORDER', 'BY', 'ASC', 'ASCENDING',
+    'DESC', 'DESCENDING', 'SKIP', 'LIMIT', 'DISTINCT', 'AND', 'OR', 'XOR', 'NOT', 'IS', 'NULL', 'TRUE',
+    'FALSE', 'IN', 'STARTS', 'ENDS', 'CONTAINS', 'CREATE', 'MERGE', 'ON', 'SET', 'DELETE', 'DETACH',
+}
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<number>\d+\.\d+|\d+)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<param>\$[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*|`[^`]+`)
+  | (?P<op><>|<=|>=|<-|->|\+=|=~|[-+*/%=<>(){}\[\]:,.|])
+""", re.VERBOSE | re.DOTALL)
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', "'": "'", '"': '"'}
+
+
+class Token:
+    __slots__ = ('kind', 'value', 'start', 'end')
+
+    def __init__(self, kind: str, value: Any, start: int, end: int):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def is_keyword(self, *words: str) -> bool:
+        return self.kind == 'name' and self.value.upper() in words
+
+    def is_op(self, *ops: str) -> bool:
+        return self.kind == 'op' and self.value in ops
+
+
+def _unescape(literal: str) -> str:
+    return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)), literal[1:-1])
+
+
+def tokenize(query: str) -> List[Token]:
+    tokens = []
+    position = 0
+    while position < len(query):
+        match = _TOKEN_RE.match(query, position)
+        if match is None:
+            raise GraphBackendError(f"Unexpected character {query[position]!r} at {position}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'number':
+            tokens.append(Token(kind, float(text) if '.' in text else int(text), match.start(), match.end()))
+        elif kind == 'string':
+            tokens.append(Token(kind, _unescape(text), match.start(), match.end()))
+        elif kind == 'param':
+            tokens.append(Token(kind, text[1:], match.start(), match.end()))
+        elif kind == 'name':
+            # 反引号中的名称不是关键字
+            quoted = text.startswith('`')
+            tokens.append(Token('ident' if quoted else kind, text.strip('`'), match.start(), match.end()))
+        elif kind == 'op':
+            tokens.append(Token(kind, text, match.start(), match.end()))
+        position = match.end()
+    tokens.append(Token('eof', None, len(query), len(query)))
+    return tokens
+
+
+# --- 表达式 ---
+
+class Expr:
+    __slots__ = ()
+    # 表达式中是否包含聚合函数
+    aggregate = False
+
+
+class Literal(Expr):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Param(Expr):
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Var(Expr):
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Prop(Expr):
+    __slots__ = ('subject', 'key', 'aggregate')
+
+    def __init__(self, subject: Expr, key: str):
+        self.subject = subject
+        self.key = key
+        self.aggregate = subject.aggregate
+
+
+class ListExpr(Expr):
+    __slots__ = ('items', 'aggregate')
+
+    def __init__(self, items: List[Expr]):
+        self.items = items
+        self.aggregate = any(item.aggregate for item in items)
+
+
+class MapExpr(Expr):
+    __slots__ = ('pairs', 'aggregate')
+
+    def __init__(self, pairs: List[Tuple[str, Expr]]):
+        self.pairs = pairs
+        self.aggregate = any(value.aggregate for _, value in pairs)
+
+
+class Func(Expr):
+    __slots__ = ('name', 'args', 'distinct', 'star', 'aggregate')
+
+    def __init__(self, name: str, args: List[Expr], distinct: bool = False, star: bool = False):
+        self.name = name
+        self.args = args
+        self.distinct = distinct
+        self.star = star
+        self.aggregate = name in AGGREGATES or any(arg.aggregate for arg in args)
+
+
+class Unary(Expr):
+    __slots__ = ('op', 'operand', 'aggregate')
+
+    def __init__(self, op: str, operand: Expr):
+        self.op = op
+        self.operand = operand
+        self.aggregate = operand.aggregate
+
+
+class Binary(Expr):
+    __slots__ = ('op', 'left', 'right', 'aggregate')
+
+    def __init__(self, op: str, left: Expr, right: Expr):
+        self.op = op
+        self.left = left
+        self.right = right
+        self.aggregate = left.aggregate or right.aggregate
+
+
+class IsNull(Expr):
+    __slots__ = ('operand', 'negated', 'aggregate')
+
+    def __init__(self, operand: Expr, negated: bool):
+        self.operand = operand
+        self.negated = negated
+        self.aggregate = operand.aggregate
+
+
+# --- 模式 ---
+
+class NodePattern:
+    __slots__ = ('var', 'labels', 'props')
+
+    def __init__(self, var: Optional[str], labels: List[str], props: Optional[MapExpr]):
+        self.var = var
+        self.labels = labels
+        self.props = props
+
+
+class RelPattern:
+    __slots__ = ('var', 'types', 'props', 'direction')
+
+    def __init__(self, var: Optional[str], types: List[str], props: Optional[MapExpr], direction: str):
+        self.var = var
+        self.types = types
+        self.props = props
+        # 'out'：(a)-[]->(b)，'in'：(a)<-[]-(b)，'both'：(a)-[]-(b)
+        self.direction = direction
+
+
+class PathPattern:
+    __slots__ = ('nodes', 'rels')
+
+    def __init__(self, nodes: List[NodePattern], rels: List[RelPattern]):
+        self.nodes = nodes
+        self.rels = rels
+
+
+# --- 子句 ---
+
+class Match:
+    __slots__ = ('patterns', 'where', 'optional')
+
+    def __init__(self, patterns: List[PathPattern], where: Optional[Expr], optional: bool):
+        self.patterns = patterns
+        self.where = where
+        self.optional = optional
+
+
+class Unwind:
+    __slots__ = ('expr', 'var')
+
+    def __init__(self, expr: Expr, var: str):
+        self.expr = expr
+        self.var = var
+
+
+class Create:
+    __slots__ = ('patterns',)
+
+    def __init__(self, patterns: List[PathPattern]):
+        self.patterns = patterns
+
+
+class SetItem:
+    __slots__ = ('kind', 'var', 'key', 'value', 'labels')
+
+    def __init__(self, kind: str, var: str, key: Optional[str] = None, value: Optional[Expr] = None,
+                 labels: Optional[List[str]] = None):
+        # kind：'prop'（n.key = v）、'merge'（n += map）、'replace'（n = map）、'labels'（n:Label）
+        self.kind = kind
+        self.var = var
+        self.key = key
+        self.value = value
+        self.labels = labels or []
+
+
+class Merge:
+    __slots__ = ('pattern', 'on_create', 'on_match')
+
+    def __init__(self, pattern: PathPattern, on_create: List[SetItem], on_match: List[SetItem]):
+        self.pattern = pattern
+        self.on_create = on_create
+        self.on_match = on_match
+
+
+class SetClause:
+    __slots__ = ('items',)
+
+    def __init__(self, items: List[SetItem]):
+        self.items = items
+
+
+class Delete:
+    __slots__ = ('exprs', 'detach')
+
+    def __init__(self, exprs: List[Expr], detach: bool):
+        self.exprs = exprs
+        self.detach = detach
+
+
+class Projection:
+    """RETURN 与 WITH"""
+    __slots__ = ('items', 'star', 'distinct', 'order', 'skip', 'limit', 'where', 'final')
+
+    def __init__(self, items: List[Tuple[Expr, str]], star: bool, distinct: bool,
+                 order: List[Tuple[Expr, bool]], skip: Optional[Expr], limit: Optional[Expr],
+                 where: Optional[Expr], final: bool):
+        self.items = items
+        self.star = star
+        self.distinct = distinct
+        # [(表达式, 是否降序)]
+        self.order = order
+        self.skip = skip
+        self.limit = limit
+        self.where = where
+        self.final = final
+
+    @property
+    def aggregate(self) -> bool:
+        return any(expr.aggregate for expr, _ in self.items)
+
+
+class Query:
+    __slots__ = ('clauses', 'writes')
+
+    def __init__(self, clauses: list):
+        self.clauses = clauses
+        self.writes = any(isinstance(clause, (Create, Merge, SetClause, Delete)) for clause in clauses)
+
+
+class Parser:
+    def __init__(self, query: str):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.index = 0
+
+    # --- 基础 ---
+
+    @property
+    def token(self) -> Token:
+        return self.tokens[self.index]
+
+    def peek(self, offset: int = 1) -> Token:
+        return self.tokens[min(self.index + offset, len(self.tokens) - 1)]
+
+    def advance(self) -> Token:
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def error(self, message: str):
+        token = self.token
+        near = self.query[token.start:token.start + 30] or 'end of query'
+        raise GraphBackendError(f"{message} near {near!r} (position {token.start})")
+
+    def accept_op(self, *ops: str) -> Optional[Token]:
+        if self.token.is_op(*ops):
+            return self.advance()
+        return None
+
+    def expect_op(self, op: str) -> Token:
+        if not self.token.is_op(op):
+            self.error(f"Expected '{op}'")
+        return self.advance()
+
+    def accept_keyword(self, *words: str) -> Optional[Token]:
+        if self.token.is_keyword(*words):
+            return self.advance()
+        return None
+
+    def expect_keyword(self, word: str) -> Token:
+        if not self.token.is_keyword(word):
+            self.error(f"Expected {word}")
+        return self.advance()
+
+    def identifier(self) -> str:
+        token = self.token
+        if token.kind == 'ident' or (token.kind == 'name' and token.value.upper() not in KEYWORDS):
+            self.advance()
+            return token.value
+        self.error("Expected an identifier")
+
+    def label_name(self) -> str:
+        # 标签、关系类型与属性名可以与关键字同名
+        token = self.token
+        if token.kind in ('ident', 'name'):
+            self.advance()
+            return token.value
+        self.error("Expected a name")
+
+    # --- 查询 ---
+
+    def parse(self) -> Query:
+        clauses = []
+        while self.token.kind != 'eof':
+            clauses.append(self.clause())
+        if not clauses:
+            self.error("Empty query")
+        if not isinstance(clauses[-1], Projection) and not any(
+                isinstance(clause, (Create, Merge, SetClause, Delete)) for clause in clauses):
+            self.error("Query must end with RETURN")
+        for clause in clauses[:-1]:
+            if isinstance(clause, Projection) and clause.final:
+                self.error("RETURN must be the last clause")
+        return Query(clauses)
+
+    def clause(self):
+        if self.accept_keyword('OPTIONAL'):
+            self.expect_keyword('MATCH')
+            return self.match(optional=True)
+        if self.accept_keyword('MATCH'):
+            return self.match(optional=False)
+        if self.accept_keyword('UNWIND'):
+            expr = self.expression()
+            self.expect_keyword('AS')
+            return Unwind(expr, self.identifier())
+        if self.accept_keyword('CREATE'):
+            return Create(self.patterns())
+        if self.accept_keyword('MERGE'):
+            return self.merge()
+        if self.accept_keyword('SET'):
+            return SetClause(self.set_items())
+        if self.accept_keyword('DETACH'):
+            self.expect_keyword('DELETE')
+            return Delete(self.expression_list(), detach=True)
+        if self.accept_keyword('DELETE'):
+            return Delete(self.expression_list(), detach=False)
+        if self.accept_keyword('WITH'):
+            return self.projection(final=False)
+        if self.accept_keyword('RETURN'):
+            return self.projection(final=True)
+        self.error("Unsupported clause")
+
+    def match(self, optional: bool) -> Match:
+        patterns = self.patterns()
+        where = self.expression() if self.accept_keyword('WHERE') else None
+        return Match(patterns, where, optional)
+
+    def merge(self) -> Merge:
+        pattern = self.path()
+        on_create, on_match = [], []
+        while self.token.is_keyword('ON'):
+            self.advance()
+            if self.accept_keyword('CREATE'):
+                target = on_create
+            else:
+                self.expect_keyword('MATCH')
+                target = on_match
+            self.expect_keyword('SET')
+            target.extend(self.set_items())
+        return Merge(pattern, on_create, on_match)
+
+    def set_items(self) -> List[SetItem]:
+        items = []
+        while True:
+            var = self.identifier()
+            if self.accept_op('.'):
+                key = self.label_name()
+                self.expect_op('=')
+                items.append(SetItem('prop', var, key=key, value=self.expression()))
+            elif self.accept_op('+='):
+                items.append(SetItem('merge', var, value=self.expression()))
+            elif self.accept_op('='):
+                items.append(SetItem('replace', var, value=self.expression()))
+            elif self.token.is_op(':'):
+                labels = []
+                while self.accept_op(':'):
+                    labels.append(self.label_name())
+                items.append(SetItem('labels', var, labels=labels))
+            else:
+                self.error("Unsupported SET item")
+            if not self.accept_op(','):
+                return items
+
+    def projection(self, final: bool) -> Projection:
+        distinct = bool(self.accept_keyword('DISTINCT'))
+        items = []
+        star = bool(self.accept_op('*'))
+        if not star or self.accept_op(','):
+            while True:
+                start = self.token.start
+                expr = self.expression()
+                end = self.tokens[self.index - 1].end
+                name = self.identifier() if self.accept_keyword('AS') else self.query[start:end].strip()
+                items.append((expr, name))
+                if not self.accept_op(','):
+                    break
+        order = []
+        if self.accept_keyword('ORDER'):
+            self.expect_keyword('BY')
+            while True:
+                expr = self.expression()
+                descending = bool(self.accept_keyword('DESC', 'DESCENDING'))
+                if not descending:
+                    self.accept_keyword('ASC', 'ASCENDING')
+                order.append((expr, descending))
+                if not self.accept_op(','):
+                    break
+        skip = self.expression() if self.accept_keyword('SKIP') else None
+        limit = self.expression() if self.accept_keyword('LIMIT') else None
+        where = None
+        if not final and self.accept_keyword('WHERE'):
+            where = self.expression()
+        return Projection(items, star, distinct, order, skip, limit, where, final)
+
+    # --- 模式 ---
+
+    def patterns(self) -> List[PathPattern]:
+        patterns = [self.path()]
+        while self.accept_op(','):
+            patterns.append(self.path())
+        return patterns
+
+    def path(self) -> PathPattern:
+        nodes = [self.node()]
+        rels = []
+        while self.token.is_op('-', '<-'):
+            rels.append(self.relationship())
+            nodes.append(self.node())
+        return PathPattern(nodes, rels)
+
+    def node(self) -> NodePattern:
+        self.expect_op('(')
+        var = None
+        if self.token.kind == 'ident' or (self.token.kind == 'name' and self.token.value.upper() not in KEYWORDS):
+            var = self.identifier()
+        labels = []
+        while self.accept_op(':'):
+            labels.append(self.label_name())
+        props = self.map_literal() if self.token.is_op('{') else None
+        self.expect_op(')')
+        return NodePattern(var, labels, props)
+
+    def relationship(self) -> RelPattern:
+        incoming = bool(self.accept_op('<-'))
+        if not incoming:
+            self.expect_op('-')
+        var, types, props = None, [], None
+        if self.accept_op('['):
+            if self.token.kind == 'ident' or (self.token.kind == 'name' and self.token.value.upper() not in KEYWORDS):
+                var = self.identifier()
+            if self.accept_op(':'):
+                types.append(self.label_name())
+                while self.accept_op('|'):
+                    self.accept_op(':')
+                    types.append(self.label_name())
+            if self.token.is_op('*'):
+                self.error("Variable-length relationships are not supported")
+            if self.token.is_op('{'):
+                props = self.map_literal()
+            self.expect_op(']')
+        outgoing = bool(self.accept_op('->'))
+        if not outgoing:
+            self.expect_op('-')
+        if incoming and outgoing:
+            self.error("A relationship cannot point both ways")
+        direction = 'in' if incoming else 'out' if outgoing else 'both'
+        return RelPattern(var, types, props, direction)
+
+    def map_literal(self) -> MapExpr:
+        self.expect_op('{')
+        pairs = []
+        if not self.token.is_op('}'):
+            while True:
+                key = self.label_name() if self.token.kind != 'string' else self.advance().value
+                self.expect_op(':')
+                pairs.append((key, self.expression()))
+                if not self.accept_op(','):
+                    break
+        self.expect_op('}')
+        return MapExpr(pairs)
+
+    # --- 表达式（按优先级从低到高） ---
+
+    def expression_list(self) -> List[Expr]:
+        exprs = [self.expression()]
+        while self.accept_op(','):
+            exprs.append(self.expression())
+        return exprs
+
+    def expression(self) -> Expr:
+        expr = self.xor_expression()
+        while self.accept_keyword('OR'):
+            expr = Binary('or', expr, self.xor_expression())
+        return expr
+
+    def xor_expression(self) -> Expr:
+        expr = self.and_expression()
+        while self.accept_keyword('XOR'):
+            expr = Binary('xor', expr, self.and_expression())
+        return expr
+
+    def and_expression(self) -> Expr:
+        expr = self.not_expression()
+        while self.accept_keyword('AND'):
+            expr = Binary('and', expr, self.not_expression())
+        return expr
+
+    def not_expression(self) -> Expr:
+        if self.accept_keyword('NOT'):
+            return Unary('not', self.not_expression())
+        return self.comparison()
+
+    def comparison(self) -> Expr:
+        expr = self.additive()
+        while True:
+            token = self.token
+            if token.is_op('=', '<>', '<', '>', '<=', '>='):
+                self.advance()
+                expr = Binary(token.value, expr, self.additive())
+            elif token.is_keyword('IS'):
+                self.advance()
+                negated = bool(self.accept_keyword('NOT'))
+                self.expect_keyword('NULL')
+                expr = IsNull(expr, negated)
+            elif token.is_keyword('IN'):
+                self.advance()
+                expr = Binary('in', expr, self.additive())
+            elif token.is_keyword('STARTS', 'ENDS'):
+                self.advance()
+                self.expect_keyword('WITH')
+                expr = Binary(token.value.lower(), expr, self.additive())
+            elif token.is_keyword('CONTAINS'):
+                self.advance()
+                expr = Binary('contains', expr, self.additive())
+            else:
+                return expr
+
+    def additive(self) -> Expr:
+        expr = self.multiplicative()
+        while self.token.is_op('+', '-'):
+            expr = Binary(self.advance().value, expr, self.multiplicative())
+        return expr
+
+    def multiplicative(self) -> Expr:
+        expr = self.unary()
+        while self.token.is_op('*', '/', '%'):
+            expr = Binary(self.advance().value, expr, self.unary())
+        return expr
+
+    def unary(self) -> Expr:
+        if self.accept_op('-'):
+            return Unary('-', self.unary())
+        if self.accept_op('+'):
+            return self.unary()
+        return self.postfix()
+
+    def postfix(self) -> Expr:
+        expr = self.primary()
+        while True:
+            if self.accept_op('.'):
+                expr = Prop(expr, self.label_name())
+            elif self.token.is_op('[') and not isinstance(expr, Literal):
+                self.advance()
+                index = self.expression()
+                self.expect_op(']')
+                expr = Func('__index__', [expr, index])
+            else:
+                return expr
+
+    def primary(self) -> Expr:
+        token = self.token
+        if token.kind in ('number', 'string'):
+            self.advance()
+            return Literal(token.value)
+        if token.kind == 'param':
+            self.advance()
+            return Param(token.value)
+        if token.is_keyword('TRUE', 'FALSE', 'NULL'):
+            self.advance()
+            return Literal({'TRUE': True, 'FALSE': False, 'NULL': None}[token.value.upper()])
+        if token.is_op('('):
+            self.advance()
+            expr = self.expression()
+            self.expect_op(')')
+            return expr
+        if token.is_op('['):
+            self.advance()
+            items = [] if self.token.is_op(']') else self.expression_list()
+            self.expect_op(']')
+            return ListExpr(items)
+        if token.is_op('{'):
+            return self.map_literal()
+        if token.kind in ('name', 'ident') and self.peek().is_op('('):
+            return self.function()
+        if token.kind == 'ident' or (token.kind == 'name' and token.value.upper() not in KEYWORDS):
+            self.advance()
+            return Var(token.value)
+        self.error("Unexpected token")
+
+    def function(self) -> Func:
+        name = self.advance().value.lower()
+        if name not in AGGREGATES and name not in FUNCTIONS:
+            self.error(f"Unsupported function {name}()")
+        self.expect_op('(')
+        if name == 'count' and self.accept_op('*'):
+            self.expect_op(')')
+            return Func(name, [], star=True)
+        distinct = bool(self.accept_keyword('DISTINCT'))
+        args = [] if self.token.is_op(')') else self.expression_list()
+        self.expect_op(')')
+        if distinct and name not in AGGREGATES:
+            self.error("DISTINCT is only allowed in aggregate functions")
+        return Func(name, args, distinct=distinct)
+
+
+@lru_cache(maxsize=256)
+def parse(query: str) -> Query:
+    """解析查询文本；解析结果不可变，按文本缓存"""
+    return Parser(query).parse()
@@ -0,0 +1,830 @@
+"""
+内存图谱后端。
+
+图谱保存在进程内（按标签、属性值建立索引，邻接表按方向分开），从 JSON 夹具加载，
+执行 cypher.py 支持的 Cypher 子集，结果格式与 Neo4j 驱动的 record.data() 相同。
+用于测试、CI 和压测，不需要启动数据库；数据不持久化，也不在进程间共享。
+
+夹具格式（dump_graph_fixture 命令可以从 Neo4j 导出同样格式的文件）：
+    {
+      "nodes": [{"id": "p1", "labels": ["FraudPattern"], "properties": {"name": "杀猪盘"}}],
+      "relationships": [{"start": "c1", "end": "p1", "type": "IS_A", "properties": {}}]
+    }
+夹具中的 id 只用于关联关系的两端，可以跨文件引用已加载的节点。
+
+查询与写入共用一把锁：读查询在锁内执行完毕后再返回结果，其他线程看不到写了一半的写查询；
+写查询中途出错时，已经执行的修改不会回滚。
+"""
+import itertools
+import json
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from . import GraphBackend, GraphBackendError
+from .cypher import (
+    Binary, Create, Delete, Func, IsNull, ListExpr, Literal, MapExpr, Match, Merge, NodePattern, Param,
+    PathPattern, Projection, Prop, Query, SetClause, SetItem, Unary, Unwind, Var, parse,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Node:
+    __slots__ = ('id', 'labels', 'props')
+
+    def __init__(self, node_id: int, labels: List[str], props: Dict[str, Any]):
+        self.id = node_id
+        self.labels = labels
+        self.props = props
+
+
+class Relationship:
+    __slots__ = ('id', 'type', 'start', 'end', 'props')
+
+    def __init__(self, rel_id: int, rel_type: str, start: Node, end: Node, props: Dict[str, Any]):
+        self.id = rel_id
+        self.type = rel_type
+        self.start = start
+        self.end = end
+        self.props = props
+
+
+def _indexable(value: Any) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+
+def _key(value: Any) -> Any:
+    """可哈希的比较键，用于分组、DISTINCT 与属性索引"""
+    if isinstance(value, Node):
+        return ('node', value.id)
+    if isinstance(value, Relationship):
+        return ('rel', value.id)
+    if isinstance(value, bool):
+        return ('bool', value)
+    if isinstance(value, list):
+        return ('list', tuple(_key(item) for item in value))
+    if isinstance(value, dict):
+        return ('map', tuple(sorted((key, _key(item)) for key, item in value.items())))
+    return value
+
+
+def _sort_key(value: Any) -> Tuple:
+    """Cypher 的排序规则：升序时 映射 < 节点 < 关系 < 列表 < 字符串 < 布尔 < 数字 < null"""
+    if isinstance(value, dict):
+        return (0, 0)
+    if isinstance(value, Node):
+        return (1, value.id)
+    if isinstance(value, Relationship):
+        return (2, value.id)
+    if isinstance(value, list):
+        return (3, tuple(_sort_key(item) for item in value))
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (6, value)
+    return (7, 0)
+
+
+def _to_data(value: Any) -> Any:
+    """与 record.data() 相同：节点转换为属性字典，关系转换为 (起点属性, 类型, 终点属性)"""
+    if isinstance(value, Node):
+        return _copy_props(value.props)
+    if isinstance(value, Relationship):
+        return (_copy_props(value.start.props), value.type, _copy_props(value.end.props))
+    if isinstance(value, list):
+        return [_to_data(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_data(item) for key, item in value.items()}
+    return value
+
+
+def _copy_props(props: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: list(value) if isinstance(value, list) else value for key, value in props.items()}
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _comparable(left: Any, right: Any) -> bool:
+    return ((_is_number(left) and _is_number(right)) or (isinstance(left, str) and isinstance(right, str))
+            or (isinstance(left, bool) and isinstance(right, bool)))
+
+
+def _equals(left: Any, right: Any) -> Optional[bool]:
+    if left is None or right is None:
+        return None
+    if isinstance(left, (Node, Relationship)) or isinstance(right, (Node, Relationship)):
+        return left is right
+    if isinstance(left, bool) != isinstance(right, bool):
+        return False
+    if isinstance(left, list) and isinstance(right, list):
+        if len(left) != len(right):
+            return False
+        results = [_equals(a, b) for a, b in zip(left, right)]
+        if False in results:
+            return False
+        return None if None in results else True
+    return left == right
+
+
+def _truthy(value: Any) -> bool:
+    """WHERE 中只有 true 通过，null 与 false 都过滤掉"""
+    return value is True
+
+
+class _Execution:
+    """一次查询的执行状态：参数与写操作计数"""
+
+    def __init__(self, backend: 'MemoryGraphBackend', params: Dict[str, Any], eager: bool):
+        self.backend = backend
+        self.params = params
+        # 写查询逐个子句完整执行，后面的子句看到的是前面子句全部完成后的图
+        self.eager = eager
+        self.counters: Counter = Counter()
+
+    # --- 子句 ---
+
+    def run(self, query: Query) -> Iterator[Dict[str, Any]]:
+        rows: Iterable[Dict[str, Any]] = [{}]
+        for clause in query.clauses:
+            if isinstance(clause, Match):
+                rows = self.match(rows, clause)
+            elif isinstance(clause, Unwind):
+                rows = self.unwind(rows, clause)
+            elif isinstance(clause, Create):
+                rows = self.create(rows, clause)
+            elif isinstance(clause, Merge):
+                rows = self.merge(rows, clause)
+            elif isinstance(clause, SetClause):
+                rows = self.set(rows, clause.items)
+            elif isinstance(clause, Delete):
+                rows = self.delete(rows, clause)
+            elif isinstance(clause, Projection):
+                rows = self.project(rows, clause)
+            if self.eager:
+                rows = list(rows)
+        last = query.clauses[-1]
+        if isinstance(last, Projection) and last.final:
+            return (row for row in rows)
+        # 没有 RETURN 的写查询不返回记录
+        for _ in rows:
+            pass
+        return iter(())
+
+    def match(self, rows, clause: Match):
+        for row in rows:
+            matched = False
+            for result in self.match_patterns(clause.patterns, 0, row, []):
+                if clause.where is None or _truthy(self.eval(clause.where, result)):
+                    matched = True
+                    yield result
+            if clause.optional and not matched:
+                result = dict(row)
+                for path in clause.patterns:
+                    for pattern in itertools.chain(path.nodes, path.rels):
+                        if pattern.var and pattern.var not in result:
+                            result[pattern.var] = None
+                yield result
+
+    def unwind(self, rows, clause: Unwind):
+        for row in rows:
+            value = self.eval(clause.expr, row)
+            if value is None:
+                continue
+            for item in value if isinstance(value, list) else [value]:
+                result = dict(row)
+                result[clause.var] = item
+                yield result
+
+    def create(self, rows, clause: Create):
+        for row in rows:
+            result = dict(row)
+            for path in clause.patterns:
+                self.create_path(path, result, merging=False)
+            yield result
+
+    def merge(self, rows, clause: Merge):
+        for row in rows:
+            matches = list(self.match_path(clause.pattern, row, []))
+            if matches:
+                for result in matches:
+                    self.apply_set(clause.on_match, result)
+                    yield result
+            else:
+                result = dict(row)
+                self.create_path(clause.pattern, result, merging=True)
+                self.apply_set(clause.on_create, result)
+                yield result
+
+    def set(self, rows, items: List[SetItem]):
+        for row in rows:
+            self.apply_set(items, row)
+            yield row
+
+    def delete(self, rows, clause: Delete):
+        for row in rows:
+            for expr in clause.exprs:
+                value = self.eval(expr, row)
+                if value is None:
+                    continue
+                if isinstance(value, Relationship):
+                    if self.backend._delete_relationship(value):
+                        self.counters['relationships_deleted'] += 1
+                elif isinstance(value, Node):
+                    if value.id not in self.backend._nodes:
+                        continue
+                    rels = list(self.backend._out[value.id].values()) + list(self.backend._in[value.id].values())
+                    if rels and not clause.detach:
+                        raise GraphBackendError(
+                            f"Cannot delete node<{value.id}>, because it still has relationships. "
+                            f"To delete this node, you must first delete its relationships.")
+                    for rel in rels:
+                        if self.backend._delete_relationship(rel):
+                            self.counters['relationships_deleted'] += 1
+                    self.backend._delete_node(value)
+                    self.counters['nodes_deleted'] += 1
+                else:
+                    raise GraphBackendError("DELETE expects a node or a relationship")
+            yield row
+
+    def project(self, rows, clause: Projection):
+        if clause.aggregate:
+            projected = self.aggregate_rows(rows, clause)
+        else:
+            projected = self.plain_rows(rows, clause)
+        if clause.distinct:
+            projected = self.distinct_rows(projected)
+        if clause.order:
+            projected = list(projected)
+            # 从最后一个排序键开始依次稳定排序，每个键可以有自己的方向
+            for expr, descending in reversed(clause.order):
+                projected.sort(key=lambda item: _sort_key(self.eval(expr, item[1], item[2])), reverse=descending)
+        skip = self.eval(clause.skip, {}) if clause.skip is not None else 0
+        limit = self.eval(clause.limit, {}) if clause.limit is not None else None
+        if skip or limit is not None:
+            projected = itertools.islice(projected, skip, None if limit is None else skip + limit)
+        for out, scope, group in projected:
+            if clause.where is not None and not _truthy(self.eval(clause.where, out)):
+                continue
+            yield {key: _to_data(value) for key, value in out.items()} if clause.final else out
+
+    def plain_rows(self, rows, clause: Projection):
+        for row in rows:
+            out = dict(row) if clause.star else {}
+            for expr, name in clause.items:
+                out[name] = self.eval(expr, row)
+            # ORDER BY 可以引用投影前的变量
+            yield out, {**row, **out}, None
+
+    def aggregate_rows(self, rows, clause: Projection):
+        keys = [(expr, name) for expr, name in clause.items if not expr.aggregate]
+        aggregates = [(expr, name) for expr, name in clause.items if expr.aggregate]
+        groups: Dict[Tuple, Tuple[Dict[str, Any], List[Dict[str, Any]]]] = {}
+        for row in rows:
+            values = [self.eval(expr, row) for expr, _ in keys]
+            group_key = tuple(_key(value) for value in values)
+            group = groups.get(group_key)
+            if group is None:
+                group = groups[group_key] = (row, [])
+            group[1].append(row)
+        if not groups and not keys:
+            # 没有分组键时，即使没有输入也返回一行（如 count(n) 为 0）
+            groups[()] = ({}, [])
+        for first, members in groups.values():
+            out = {}
+            for expr, name in clause.items:
+                if expr.aggregate:
+                    out[name] = self.eval(expr, first, members)
+                else:
+                    out[name] = self.eval(expr, first)
+            yield out, {**first, **out}, members
+
+    @staticmethod
+    def distinct_rows(projected):
+        seen = set()
+        for item in projected:
+            key = tuple((name, _key(value)) for name, value in item[0].items())
+            if key not in seen:
+                seen.add(key)
+                yield item
+
+    # --- 模式匹配 ---
+
+    def match_patterns(self, patterns: List[PathPattern], index: int, row: Dict[str, Any], used: List[int]):
+        if index == len(patterns):
+            yield row
+            return
+        for result in self.match_path(patterns[index], row, used):
+            yield from self.match_patterns(patterns, index + 1, result, used)
+
+    def match_path(self, path: PathPattern, row: Dict[str, Any], used: List[int]):
+        """按路径从左到右展开；同一次 MATCH 中每条关系只使用一次"""
+        first = path.nodes[0]
+        for node in self.node_candidates(first, row):
+            result = self.bind(row, first.var, node)
+            yield from self.expand(path, 0, node, result, used)
+
+    def expand(self, path: PathPattern, index: int, current: Node, row: Dict[str, Any], used: List[int]):
+        if index == len(path.rels):
+            yield row
+            return
+        rel_pattern = path.rels[index]
+        node_pattern = path.nodes[index + 1]
+        bound_rel = row.get(rel_pattern.var) if rel_pattern.var else None
+        rel_props = self.eval_props(rel_pattern.props, row)
+        for rel, other in self.adjacent(current, rel_pattern.direction):
+            if bound_rel is not None and rel is not bound_rel:
+                continue
+            if rel.id in used:
+                continue
+            if rel_pattern.types and rel.type not in rel_pattern.types:
+                continue
+            if rel_props and any(_equals(rel.props.get(key), value) is not True for key, value in rel_props.items()):
+                continue
+            if not self.node_matches(node_pattern, other, row):
+                continue
+            result = self.bind(self.bind(row, rel_pattern.var, rel), node_pattern.var, other)
+            used.append(rel.id)
+            try:
+                yield from self.expand(path, index + 1, other, result, used)
+            finally:
+                used.pop()
+
+    def adjacent(self, node: Node, direction: str) -> List[Tuple[Relationship, Node]]:
+        backend = self.backend
+        pairs = []
+        if direction in ('out', 'both'):
+            pairs.extend((rel, rel.end) for rel in backend._out[node.id].values())
+        if direction in ('in', 'both'):
+            # 无向匹配时自环只返回一次
+            pairs.extend((rel, rel.start) for rel in backend._in[node.id].values()
+                         if direction == 'in' or rel.start is not rel.end)
+        return pairs
+
+    def node_candidates(self, pattern: NodePattern, row: Dict[str, Any]) -> List[Node]:
+        if pattern.var and pattern.var in row:
+            node = row[pattern.var]
+            if node is None:
+                return []
+            if not isinstance(node, Node):
+                raise GraphBackendError(f"Variable '{pattern.var}' is not a node")
+            return [node] if self.node_matches(pattern, node, row) else []
+        backend = self.backend
+        props = self.eval_props(pattern.props, row)
+        candidates = None
+        for key, value in props.items():
+            if _indexable(value):
+                candidates = backend._by_prop.get((key, _key(value)), {})
+                break
+        if candidates is None and pattern.labels:
+            candidates = min((backend._by_label.get(label, {}) for label in pattern.labels), key=len)
+        if candidates is None:
+            candidates = backend._nodes
+        # 先复制一份，后续子句写入时不影响本次遍历
+        return [node for node in list(candidates.values()) if self.node_matches(pattern, node, row, props)]
+
+    def node_matches(self, pattern: NodePattern, node: Node, row: Dict[str, Any],
+                     props: Optional[Dict[str, Any]] = None) -> bool:
+        if pattern.var and pattern.var in row and row[pattern.var] is not node:
+            return False
+        if any(label not in node.labels for label in pattern.labels):
+            return False
+        if props is None:
+            props = self.eval_props(pattern.props, row)
+        return all(_equals(node.props.get(key), value) is True for key, value in props.items())
+
+    def eval_props(self, props: Optional[MapExpr], row: Dict[str, Any]) -> Dict[str, Any]:
+        if props is None:
+            return {}
+        return {key: self.eval(expr, row) for key, expr in props.pairs}
+
+    @staticmethod
+    def bind(row: Dict[str, Any], var: Optional[str], value: Any) -> Dict[str, Any]:
+        if not var or row.get(var) is value:
+            return row
+        result = dict(row)
+        result[var] = value
+        return result
+
+    # --- 写入 ---
+
+    def create_path(self, path: PathPattern, row: Dict[str, Any], merging: bool):
+        backend = self.backend
+        nodes = []
+        for pattern in path.nodes:
+            if pattern.var and row.get(pattern.var) is not None:
+                if (pattern.labels or pattern.props) and not merging:
+                    raise GraphBackendError(f"Variable '{pattern.var}' already declared")
+                nodes.append(row[pattern.var])
+                continue
+            props = {key: value for key, value in self.eval_props(pattern.props, row).items() if value is not None}
+            node = backend._create_node(list(dict.fromkeys(pattern.labels)), props)
+            self.counters['nodes_created'] += 1
+            self.counters['labels_added'] += len(node.labels)
+            self.counters['properties_set'] += len(props)
+            if pattern.var:
+                row[pattern.var] = node
+            nodes.append(node)
+        for index, pattern in enumerate(path.rels):
+            if len(pattern.types) != 1:
+                raise GraphBackendError("A relationship must have exactly one type to be created")
+            if pattern.direction == 'both' and not merging:
+                raise GraphBackendError("Only directed relationships can be created")
+            start, end = nodes[index], nodes[index + 1]
+            if pattern.direction == 'in':
+                start, end = end, start
+            props = {key: value for key, value in self.eval_props(pattern.props, row).items() if value is not None}
+            rel = backend._create_relationship(pattern.types[0], start, end, props)
+            self.counters['relationships_created'] += 1
+            self.counters['properties_set'] += len(props)
+            if pattern.var:
+                row[pattern.var] = rel
+
+    def apply_set(self, items: List[SetItem], row: Dict[str, Any]):
+        backend = self.backend
+        for item in items:
+            if item.var not in row:
+                raise GraphBackendError(f"Variable '{item.var}' not defined")
+            target = row[item.var]
+            if target is None:
+                continue
+            if not isinstance(target, (Node, Relationship)):
+                raise GraphBackendError(f"Variable '{item.var}' is not a node or relationship")
+            if item.kind == 'labels':
+                if not isinstance(target, Node):
+                    raise GraphBackendError("Only nodes have labels")
+                self.counters['labels_added'] += backend._add_labels(target, item.labels)
+                continue
+            value = self.eval(item.value, row)
+            if item.kind == 'prop':
+                updates = {item.key: value}
+            else:
+                if isinstance(value, (Node, Relationship)):
+                    value = dict(value.props)
+                if not isinstance(value, dict):
+                    raise GraphBackendError("SET += / = expects a map")
+                updates = dict(value)
+                if item.kind == 'replace':
+                    updates.update({key: None for key in target.props if key not in updates})
+            for key, new_value in updates.items():
+                if isinstance(new_value, dict):
+                    raise GraphBackendError("Property values cannot be maps")
+                backend._set_property(target, key, new_value)
+                self.counters['properties_set'] += 1
+
+    # --- 表达式 ---
+
+    def eval(self, expr, row: Dict[str, Any], group: Optional[List[Dict[str, Any]]] = None) -> Any:
+        if isinstance(expr, Literal):
+            return expr.value
+        if isinstance(expr, Var):
+            if expr.name not in row:
+                raise GraphBackendError(f"Variable '{expr.name}' not defined")
+            return row[expr.name]
+        if isinstance(expr, Prop):
+            subject = self.eval(expr.subject, row, group)
+            if subject is None:
+                return None
+            if isinstance(subject, (Node, Relationship)):
+                return subject.props.get(expr.key)
+            if isinstance(subject, dict):
+                return subject.get(expr.key)
+            raise GraphBackendError(f"Cannot read property '{expr.key}' of {type(subject).__name__}")
+        if isinstance(expr, Param):
+            if expr.name not in self.params:
+                raise GraphBackendError(f"Expected parameter(s): {expr.name}")
+            return self.params[expr.name]
+        if isinstance(expr, Binary):
+            return self.eval_binary(expr, row, group)
+        if isinstance(expr, Func):
+            return self.eval_function(expr, row, group)
+        if isinstance(expr, Unary):
+            value = self.eval(expr.operand, row, group)
+            if value is None:
+                return None
+            if expr.op == 'not':
+                return not value
+            if not _is_number(value):
+                raise GraphBackendError("Unary minus expects a number")
+            return -value
+        if isinstance(expr, IsNull):
+            value = self.eval(expr.operand, row, group)
+            return (value is not None) if expr.negated else (value is None)
+        if isinstance(expr, ListExpr):
+            return [self.eval(item, row, group) for item in expr.items]
+        if isinstance(expr, MapExpr):
+            return {key: self.eval(value, row, group) for key, value in expr.pairs}
+        raise GraphBackendError(f"Unsupported expression {type(expr).__name__}")
+
+    def eval_binary(self, expr: Binary, row: Dict[str, Any], group) -> Any:
+        op = expr.op
+        left = self.eval(expr.left, row, group)
+        if op in ('and', 'or', 'xor'):
+            # 三值逻辑
+            right = self.eval(expr.right, row, group)
+            if op == 'and':
+                if left is False or right is False:
+                    return False
+                return None if left is None or right is None else True
+            if op == 'or':
+                if left is True or right is True:
+                    return True
+                return None if left is None or right is None else False
+            return None if left is None or right is None else left != right
+        right = self.eval(expr.right, row, group)
+        if op == '=':
+            return _equals(left, right)
+        if op == '<>':
+            result = _equals(left, right)
+            return None if result is None else not result
+        if op == 'in':
+            if right is None:
+                return None
+            if not isinstance(right, list):
+                raise GraphBackendError("IN expects a list")
+            results = [_equals(left, item) for item in right]
+            if True in results:
+                return True
+            return None if left is None or None in results else False
+        if left is None or right is None:
+            return None
+        if op in ('<', '>', '<=', '>='):
+            if not _comparable(left, right):
+                return None
+            return {'<': left < right, '>': left > right, '<=': left <= right, '>=': left >= right}[op]
+        if op in ('starts', 'ends', 'contains'):
+            if not isinstance(left, str) or not isinstance(right, str):
+                return None
+            if op == 'starts':
+                return left.startswith(right)
+            if op == 'ends':
+                return left.endswith(right)
+            return right in left
+        if op == '+':
+            if isinstance(left, list):
+                return left + (right if isinstance(right, list) else [right])
+            if isinstance(right, list):
+                return [left] + right
+            if isinstance(left, str) or isinstance(right, str):
+                if isinstance(left, (Node, Relationship, dict)) or isinstance(right, (Node, Relationship, dict)):
+                    raise GraphBackendError("Cannot add these values")
+                return f"{left}{right}"
+        if not _is_number(left) or not _is_number(right):
+            raise GraphBackendError(f"Operator '{op}' expects numbers")
+        if op == '+':
+            return left + right
+        if op == '-':
+            return left - right
+        if op == '*':
+            return left * right
+        if right == 0 and isinstance(left, int) and isinstance(right, int):
+            raise GraphBackendError("/ by zero")
+        if op == '/':
+            if isinstance(left, int) and isinstance(right, int):
+                # 整数除法向零取整
+                return int(left / right)
+            return left / right
+        return left % right
+
+    def eval_function(self, expr: Func, row: Dict[str, Any], group) -> Any:
+        name = expr.name
+        if name in ('count', 'collect', 'sum', 'avg', 'min', 'max'):
+            if group is None:
+                raise GraphBackendError(f"Aggregate function {name}() is not allowed here")
+            if expr.star:
+                return len(group)
+            values = [self.eval(expr.args[0], member) for member in group]
+            values = [value for value in values if value is not None]
+            if expr.distinct:
+                unique = {}
+                for value in values:
+                    unique.setdefault(_key(value), value)
+                values = list(unique.values())
+            if name == 'count':
+                return len(values)
+            if name == 'collect':
+                return values
+            if name == 'sum':
+                return sum(values)
+            if not values:
+                return None
+            if name == 'avg':
+                return sum(values) / len(values)
+            return (min if name == 'min' else max)(values, key=_sort_key)
+
+        args = [self.eval(arg, row, group) for arg in expr.args]
+        if name == 'coalesce':
+            return next((value for value in args if value is not None), None)
+        if name == '__index__':
+            subject, index = args
+            if subject is None or index is None:
+                return None
+            if isinstance(subject, list):
+                return subject[index] if -len(subject) <= index < len(subject) else None
+            if isinstance(subject, dict):
+                return subject.get(index)
+            if isinstance(subject, (Node, Relationship)):
+                return subject.props.get(index)
+            raise GraphBackendError("Cannot index this value")
+        if len(args) != 1:
+            raise GraphBackendError(f"{name}() expects one argument")
+        value = args[0]
+        if name == 'exists':
+            return value is not None
+        if value is None:
+            return None
+        if name in ('id', 'elementid'):
+            if not isinstance(value, (Node, Relationship)):
+                raise GraphBackendError(f"{name}() expects a node or a relationship")
+            return value.id if name == 'id' else str(value.id)
+        if name == 'labels':
+            return list(value.labels)
+        if name == 'type':
+            return value.type
+        if name == 'startnode':
+            return value.start
+        if name == 'endnode':
+            return value.end
+        if name == 'properties':
+            return _copy_props(value.props) if isinstance(value, (Node, Relationship)) else dict(value)
+        if name == 'keys':
+            return list(value.props if isinstance(value, (Node, Relationship)) else value)
+        if name == 'size':
+            return len(value)
+        if name == 'tolower':
+            return value.lower()
+        if name == 'toupper':
+            return value.upper()
+        if name == 'trim':
+            return value.strip()
+        if name == 'tostring':
+            if isinstance(value, bool):
+                return 'true' if value else 'false'
+            return str(value)
+        if name == 'tointeger':
+            try:
+                return int(float(value)) if isinstance(value, str) else int(value)
+            except (TypeError, ValueError):
+                return None
+        raise GraphBackendError(f"Unsupported function {name}()")
+
+
+class MemoryGraphBackend(GraphBackend):
+    """进程内的内存图谱；fixtures 缺省时加载 GRAPH_FIXTURES 中的夹具"""
+
+    def __init__(self, fixtures: Optional[List[str]] = None):
+        self._lock = threading.RLock()
+        self.clear()
+        for path in fixtures if fixtures is not None else getattr(settings, 'GRAPH_FIXTURES', []):
+            self.load_fixture(path)
+
+    # --- 数据 ---
+
+    def clear(self):
+        with self._lock:
+            self._nodes: Dict[int, Node] = {}
+            self._rels: Dict[int, Relationship] = {}
+            # 邻接表：节点 id -> {关系 id: 关系}
+            self._out: Dict[int, Dict[int, Relationship]] = {}
+            self._in: Dict[int, Dict[int, Relationship]] = {}
+            self._by_label: Dict[str, Dict[int, Node]] = {}
+            # (属性名, 属性值) -> {节点 id: 节点}，只索引标量属性
+            self._by_prop: Dict[Tuple[str, Any], Dict[int, Node]] = {}
+            self._ids = itertools.count()
+            # 夹具中的 id -> 节点
+            self._fixture_ids: Dict[str, Node] = {}
+
+    def load_fixture(self, path: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.load_data(data)
+        logger.info(f"Loaded graph fixture {path}: {len(data.get('nodes', []))} nodes, "
+                    f"{len(data.get('relationships', []))} relationships.")
+
+    def load_data(self, data: Dict[str, Any]):
+        """加载夹具格式的数据"""
+        with self._lock:
+            for item in data.get('nodes', []):
+                node = self._create_node(list(item.get('labels', [])), {
+                    key: value for key, value in (item.get('properties') or {}).items() if value is not None})
+                if item.get('id') is not None:
+                    self._fixture_ids[str(item['id'])] = node
+            for item in data.get('relationships', []):
+                try:
+                    start = self._fixture_ids[str(item['start'])]
+                    end = self._fixture_ids[str(item['end'])]
+                except KeyError as e:
+                    raise GraphBackendError(f"Relationship references unknown node {e}") from e
+                self._create_relationship(item['type'], start, end, dict(item.get('properties') or {}))
+
+    def dump(self) -> Dict[str, Any]:
+        """导出为夹具格式"""
+        with self._lock:
+            return {
+                'nodes': [{'id': str(node.id), 'labels': list(node.labels), 'properties': _copy_props(node.props)}
+                          for node in self._nodes.values()],
+                'relationships': [{'start': str(rel.start.id), 'end': str(rel.end.id), 'type': rel.type,
+                                   'properties': _copy_props(rel.props)} for rel in self._rels.values()],
+            }
+
+    def _create_node(self, labels: List[str], props: Dict[str, Any]) -> Node:
+        node = Node(next(self._ids), labels, {})
+        self._nodes[node.id] = node
+        self._out[node.id] = {}
+        self._in[node.id] = {}
+        for label in labels:
+            self._by_label.setdefault(label, {})[node.id] = node
+        for key, value in props.items():
+            self._set_property(node, key, value)
+        return node
+
+    def _create_relationship(self, rel_type: str, start: Node, end: Node, props: Dict[str, Any]) -> Relationship:
+        if start.id not in self._nodes or end.id not in self._nodes:
+            raise GraphBackendError("Cannot create a relationship to a deleted node")
+        rel = Relationship(next(self._ids), rel_type, start, end, props)
+        self._rels[rel.id] = rel
+        self._out[start.id][rel.id] = rel
+        self._in[end.id][rel.id] = rel
+        return rel
+
+    def _delete_relationship(self, rel: Relationship) -> bool:
+        if self._rels.pop(rel.id, None) is None:
+            return False
+        self._out[rel.start.id].pop(rel.id, None)
+        self._in[rel.end.id].pop(rel.id, None)
+        return True
+
+    def _delete_node(self, node: Node):
+        self._nodes.pop(node.id, None)
+        self._out.pop(node.id, None)
+        self._in.pop(node.id, None)
+        for label in node.labels:
+            self._by_label.get(label, {}).pop(node.id, None)
+        for key, value in node.props.items():
+            self._unindex(node, key, value)
+
+    def _add_labels(self, node: Node, labels: List[str]) -> int:
+        added = 0
+        for label in labels:
+            if label not in node.labels:
+                node.labels.append(label)
+                self._by_label.setdefault(label, {})[node.id] = node
+                added += 1
+        return added
+
+    def _set_property(self, target, key: str, value: Any):
+        """设置属性并维护属性索引；值为 None 时删除属性"""
+        is_node = isinstance(target, Node)
+        if is_node and key in target.props:
+            self._unindex(target, key, target.props[key])
+        if value is None:
+            target.props.pop(key, None)
+            return
+        target.props[key] = list(value) if isinstance(value, list) else value
+        if is_node and _indexable(value):
+            self._by_prop.setdefault((key, _key(value)), {})[target.id] = target
+
+    def _unindex(self, node: Node, key: str, value: Any):
+        if _indexable(value):
+            index = self._by_prop.get((key, _key(value)))
+            if index is not None:
+                index.pop(node.id, None)
+                if not index:
+                    del self._by_prop[(key, _key(value))]
+
+    # --- GraphBackend ---
+
+    def read(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        parsed = parse(query)
+        if parsed.writes:
+            raise GraphBackendError("Writing in read access mode not allowed")
+        with self._lock:
+            return list(_Execution(self, params or {}, eager=False).run(parsed))
+
+    def stream(self, query: str, params: Optional[Dict[str, Any]] = None,
+               fetch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        # 数据都在内存中，直接在锁内算出全部结果，避免迭代期间持有锁
+        yield from self.read(query, params)
+
+    def write(self, query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        parsed = parse(query)
+        with self._lock:
+            execution = _Execution(self, params or {}, eager=True)
+            records = list(execution.run(parsed))
+        return {'records': records, 'counters': {key: value for key, value in execution.counters.items() if value}}
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'nodes': len(self._nodes),
+                'relationships': len(self._rels),
+                'labels': {label: len(nodes) for label, nodes in sorted(self._by_label.items()) if nodes},
+                'relationship_types': dict(sorted(Counter(rel.type for rel in self._rels.values()).items())),
+            }
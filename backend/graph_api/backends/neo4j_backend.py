@@ -0,0 +1,107 @@
+"""
+Neo4j 图谱后端：驱动与连接池由 graph_api.db_utils 管理（进程内单例），这里负责执行查询。
+"""
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+
+from graph_api import db_utils
+
+from . import GraphBackend
+
+logger = logging.getLogger(__name__)
+
+
+def _execute_read_tx(tx, cypher_query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    在只读事务中执行 Cypher 查询并处理结果。
+    将 Neo4j Record 对象转换为字典列表。
+    """
+    result = tx.run(cypher_query, params or {})
+    # 将 Record 转换为字典，以便序列化器处理
+    # 注意：这是一种简化处理，可能需要根据查询返回的具体结构进行调整
+    # 例如，直接返回 Node/Relationship 对象可能更适合某些序列化器
+    records_list = [record.data() for record in result]
+    logger.debug(f"Query executed. Returned {len(records_list)} records.")
+    return records_list
+
+
+def _execute_write_tx(tx, cypher_query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    result = tx.run(cypher_query, params or {})
+    records = [record.data() for record in result]
+    counters = result.consume().counters
+    names = ('nodes_created', 'nodes_deleted', 'relationships_created', 'relationships_deleted',
+             'properties_set', 'labels_added', 'labels_removed')
+    return {
+        'records': records,
+        'counters': {name: getattr(counters, name) for name in names if getattr(counters, name)},
+    }
+
+
+class Neo4jBackend(GraphBackend):
+    """通过 Bolt 连接 Neo4j；数据库名取 NEO4J_DATABASE（默认 neo4j）"""
+
+    def __init__(self, database: Optional[str] = None):
+        self.database = database or getattr(settings, 'NEO4J_DATABASE', 'neo4j')
+
+    def _driver(self):
+        driver = db_utils.get_neo4j_driver()
+        if not driver:
+            raise db_utils.ServiceUnavailable("Neo4j driver is not available.")
+        return driver
+
+    def read(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        driver = self._driver()
+        try:
+            # 使用 execute_read 进行只读事务管理，失败时驱动会自动重试
+            with driver.session(database=self.database) as session:
+                return session.execute_read(_execute_read_tx, query, params)
+        except Exception as e:
+            self._reraise(e, query)
+
+    def stream(self, query: str, params: Optional[Dict[str, Any]] = None,
+               fetch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        driver = self._driver()
+        count = 0
+        try:
+            # 驱动按 fetch_size 分批从服务器拉取记录，生成器结束（或被关闭）时释放 session
+            with driver.session(database=self.database, default_access_mode=db_utils.READ_ACCESS,
+                                fetch_size=fetch_size) as session:
+                for record in session.run(query, params or {}):
+                    count += 1
+                    yield record.data()
+            logger.info(f"Streaming query finished after {count} records: {query[:100]}...")
+        except Exception as e:
+            self._reraise(e, query)
+
+    def write(self, query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        driver = self._driver()
+        try:
+            with driver.session(database=self.database) as session:
+                result = session.execute_write(_execute_write_tx, query, params)
+        except Exception as e:
+            self._reraise(e, query)
+        logger.info(f"Write query executed: {result['counters']}. Query: {query[:100]}...")
+        return result
+
+    @staticmethod
+    def _reraise(e: Exception, query: str):
+        """记录错误后重新抛出；连接与语法错误保留原类型，其他数据库错误转换为通用异常"""
+        if isinstance(e, db_utils.ServiceUnavailable):
+            logger.error(f"Neo4j Service Unavailable: {e}. Query: {query[:100]}...")
+            raise e
+        if isinstance(e, db_utils.CypherSyntaxError):
+            logger.error(f"Cypher Syntax Error: {e}. Query: {query}")
+            raise e
+        if isinstance(e, db_utils.Neo4jError):
+            logger.error(f"Neo4j database error: {e}. Query: {query[:100]}...")
+            raise Exception(f"Database error: {e}") from e
+        logger.error(f"An unexpected error occurred during graph operation: {e}. Query: {query[:100]}...")
+        raise e
+
+    def verify_connectivity(self):
+        self._driver().verify_connectivity()
+
+    def close(self):
+        db_utils.close_neo4j_driver()
@@ -26,6 +26,28 @@ RETURN n, r, m
 LIMIT 50 // 同样需要调整 LIMIT
 """
 
+# 允许过滤的属性白名单（属性名会被拼接进查询，必须先校验）
+ALLOWED_FILTER_PROPS = ['name', 'user_id', 'ip_address']
+
+
+def limit_clause(limit) -> str:
+    """LIMIT 子句；limit 为 None 时不限制，不是非负整数时抛出 ValueError"""
+    if limit is None:
+        return ''
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 0:
+        raise ValueError(f"limit 必须是非负整数，收到 {limit!r}")
+    return f" LIMIT {limit}"
+
+
+def build_filtered_graph_cypher(filter_prop, limit=50):
+    """
+    构建按属性过滤的子图查询，FilteredGraphView 与导出接口共用。
+    filter_prop 必须在 ALLOWED_FILTER_PROPS 中；limit 为 None 时不限制行数（用于流式导出）。
+    """
+    if filter_prop not in ALLOWED_FILTER_PROPS:
+        raise ValueError(f"不允许按属性 '{filter_prop}' 过滤")
+    return f"MATCH (n {{{filter_prop}: $value}})-[r]-(m) RETURN n, r, m" + limit_clause(limit)
+
 # 获取特定节点的详细信息及其直接邻居
 # 使用 elementId() 获取 Neo4j 内部 ID 进行精确匹配可能更可靠，
 # 但这里使用一个假设的唯一属性 'node_id' 作为示例。
@@ -34,6 +56,12 @@ GET_NODE_DETAIL_CYPHER = """
 MATCH (n {name: $node_id})-[r]-(m) // $node_id 将作为参数传入
 RETURN n, r, m
 """
+
+
+def build_node_neighborhood_cypher(limit=50):
+    """节点（按 name 匹配，与 GET_NODE_DETAIL_CYPHER 相同）及其一度邻居，图谱实时推送的邻域订阅使用"""
+    return "MATCH (n {name: $node_id})-[r]-(m) RETURN n, r, m" + limit_clause(limit)
+
 # MATCH (n) WHERE elementId(n) = $node_id
 # MATCH (n)-[r]-(m)
 # RETURN n, r, m
@@ -52,4 +80,11 @@ MATCH (u1:User)-->(identifier)<--(u2:User)
 WHERE id(u1) < id(u2) // 避免重复和自环
 RETURN u1, u2, identifier
 LIMIT 50
-"""
\ No newline at end of file
+"""
+
+# 团伙识别（graph_api.jobs.detect_rings）：共享设备、IP 等标识的全部用户对及共享的标识数
+SHARED_IDENTIFIER_PAIRS_CYPHER = """
+MATCH (u1:User)-->(identifier)<--(u2:User)
+WHERE id(u1) < id(u2)
+RETURN coalesce(u1.user_id, u1.name) AS user1, coalesce(u2.user_id, u2.name) AS user2, count(identifier) AS shared
+"""
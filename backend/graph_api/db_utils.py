@@ -1,8 +1,28 @@
+from __future__ import annotations
+
 import os
 import logging
-from neo4j import GraphDatabase, Driver, Session, Transaction, Result
-from neo4j.exceptions import ServiceUnavailable, Neo4jError, CypherSyntaxError
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from neo4j import Driver, Session, Transaction, Result
+
+# neo4j 驱动在导入时会顺带加载 numpy / pandas / pyarrow 等可选依赖（如已安装），
+# 耗时可达数百毫秒。这里推迟到第一次访问数据库时才导入，
+# 以下名称在 _load_neo4j() 中绑定为真正的驱动对象。
+GraphDatabase = None
+READ_ACCESS = None
+ServiceUnavailable = None
+Neo4jError = None
+CypherSyntaxError = None
+
+
+def _load_neo4j():
+    """首次使用时导入 neo4j 驱动，并把常用名称绑定到模块全局"""
+    global GraphDatabase, READ_ACCESS, ServiceUnavailable, Neo4jError, CypherSyntaxError
+    if GraphDatabase is None:
+        from neo4j import GraphDatabase, READ_ACCESS
+        from neo4j.exceptions import ServiceUnavailable, Neo4jError, CypherSyntaxError
 
 # 从 Django settings 获取配置 (或者直接从环境变量读取)
 # 确保 Django 项目已正确加载设置
@@ -17,6 +37,8 @@ except ImportError:
     NEO4J_USERNAME = os.environ.get('NEO4J_USERNAME', 'neo4j')
     NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', 'password')
 
+from KnowledgeBackend.perf import PHASE_NEO4J, track
+
 logger = logging.getLogger(__name__)
 
 class Neo4jConnection:
@@ -40,6 +62,7 @@ class Neo4jConnection:
         """
         if self._initialized:
             return
+        _load_neo4j()
         try:
             logger.info(f"Initializing Neo4j Driver for URI: {NEO4J_URI}")
             self._driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
@@ -106,6 +129,7 @@ def get_neo4j_driver() -> Optional[Driver]:
     如果实例不存在或已关闭，则尝试创建。
     """
     global _connection_singleton
+    _load_neo4j()
     if _connection_singleton is None or _connection_singleton.get_driver() is None:
         try:
             _connection_singleton = Neo4jConnection()
@@ -121,22 +145,9 @@ def close_neo4j_driver():
         _connection_singleton.close()
         _connection_singleton = None
 
-def _execute_read_tx(tx: Transaction, cypher_query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-    """
-    在只读事务中执行 Cypher 查询并处理结果。
-    将 Neo4j Record 对象转换为字典列表。
-    """
-    result: Result = tx.run(cypher_query, params or {})
-    # 将 Record 转换为字典，以便序列化器处理
-    # 注意：这是一种简化处理，可能需要根据查询返回的具体结构进行调整
-    # 例如，直接返回 Node/Relationship 对象可能更适合某些序列化器
-    records_list = [record.data() for record in result]
-    logger.debug(f"Query executed. Returned {len(records_list)} records.")
-    return records_list
-
 def read_from_neo4j(cypher_query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
-    执行只读 Neo4j 查询。
+    执行只读图谱查询（经由 GRAPH_BACKEND 配置的后端，默认 Neo4j）。
 
     Args:
         cypher_query: 要执行的 Cypher 查询语句。
@@ -148,67 +159,54 @@ def read_from_neo4j(cypher_query: str, params: Optional[Dict[str, Any]] = None)
     Raises:
         ServiceUnavailable: 如果无法连接到数据库。
         CypherSyntaxError: 如果 Cypher 查询语法错误。
+        GraphBackendError: 如果后端无法执行该查询（内存后端不支持的语法等）。
         Exception: 其他数据库错误。
     """
-    driver = get_neo4j_driver()
-    if not driver:
-        raise ServiceUnavailable("Neo4j driver is not available.")
-
-    records: List[Dict[str, Any]] = []
-    session: Optional[Session] = None
-    print("111111111111111111111111111111111111")
-    print(params)
-    try:
-        # 使用 execute_read 进行只读事务管理
-        # database_ 参数指定要操作的数据库，对于 Neo4j 4.x+ 可能需要配置
-        # 对于默认数据库，可以省略或设为 'neo4j'
-        with driver.session(database=getattr(settings, 'NEO4J_DATABASE', 'neo4j')) as session:
-            records = session.execute_read(_execute_read_tx, cypher_query, params)
-
-        logger.info(f"Read query executed successfully: {cypher_query[:100]}...")
-    except ServiceUnavailable as e:
-        logger.error(f"Neo4j Service Unavailable: {e}. Query: {cypher_query[:100]}...")
-        raise
-    except CypherSyntaxError as e:
-        logger.error(f"Cypher Syntax Error: {e}. Query: {cypher_query}")
-        raise
-    except Neo4jError as e:
-        logger.error(f"Neo4j database error: {e}. Query: {cypher_query[:100]}...")
-        # 可以根据需要处理更具体的 Neo4jError 子类
-        raise Exception(f"Database error: {e}") from e # 重新抛出为通用异常或特定应用异常
-    except Exception as e:
-        logger.error(f"An unexpected error occurred during read operation: {e}. Query: {cypher_query[:100]}...")
-        raise
-    finally:
-        # driver.session() 使用了上下文管理器，会自动关闭 session
-        pass
+    from .backends import get_graph_backend
 
+    logger.debug(f"Running read query with params {params}: {cypher_query[:100]}...")
+    # 耗时记入当前请求的 Server-Timing（neo4j）
+    with track(PHASE_NEO4J):
+        records = get_graph_backend().read(cypher_query, params)
+    logger.debug(f"Read query returned {len(records)} records: {cypher_query[:100]}...")
     return records
 
-# --- 可选：添加写操作函数 ---
-# def _execute_write_tx(tx: Transaction, cypher_query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-#     result: Result = tx.run(cypher_query, params or {})
-#     summary = result.consume()
-#     logger.info(f"Write operation summary: {summary.counters}")
-#     # 对于写操作，通常关注摘要信息，但也可能需要返回结果
-#     return [record.data() for record in result] # 如果需要返回数据
-
-# def write_to_neo4j(cypher_query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-#     driver = get_neo4j_driver()
-#     if not driver:
-#         raise ServiceUnavailable("Neo4j driver is not available.")
-#     results: List[Dict[str, Any]] = []
-#     try:
-#         with driver.session(database=getattr(settings, 'NEO4J_DATABASE', 'neo4j')) as session:
-#             results = session.execute_write(_execute_write_tx, cypher_query, params)
-#         logger.info(f"Write query executed successfully: {cypher_query[:100]}...")
-#     except ServiceUnavailable as e:
-#         logger.error(f"Neo4j Service Unavailable during write: {e}")
-#         raise
-#     except Neo4jError as e:
-#         logger.error(f"Neo4j database error during write: {e}")
-#         raise Exception(f"Database error during write: {e}") from e
-#     except Exception as e:
-#         logger.error(f"An unexpected error occurred during write operation: {e}")
-#         raise
-#     return results
\ No newline at end of file
+def stream_from_neo4j(cypher_query: str, params: Optional[Dict[str, Any]] = None,
+                      fetch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    流式执行只读图谱查询，逐条产出记录字典。
+
+    与 read_from_neo4j 不同，结果不会整体加载到列表中：Neo4j 后端按 fetch_size
+    分批从服务器拉取记录，调用方消费多少就拉取多少，适合大规模导出。
+    生成器在迭代结束（或被关闭）时自动释放 session。
+
+    Args:
+        cypher_query: 要执行的 Cypher 查询语句。
+        params: 查询参数字典。
+        fetch_size: 每批从服务器拉取的记录数。
+
+    Yields:
+        每条记录对应的字典。
+    """
+    from .backends import get_graph_backend
+
+    return get_graph_backend().stream(cypher_query, params, fetch_size=fetch_size)
+
+def write_to_neo4j(cypher_query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    在写事务中执行图谱查询（数据导入等），返回 {'records': [...], 'counters': {...}}。
+    有实际改动（counters 非空）时使缓存的图谱响应失效（见 services.py），并通知实时推送（见 live.py）
+    和由图谱编译的快照（见 snapshots.py）。
+    """
+    from . import live, snapshots
+    from .backends import get_graph_backend
+    from .services import invalidate_graph_payloads
+
+    with track(PHASE_NEO4J):
+        result = get_graph_backend().write(cypher_query, params)
+    # 图谱有变化时，缓存的初始图谱、平台统计等响应失效，并通知实时推送的订阅和快照
+    if result['counters']:
+        invalidate_graph_payloads()
+        live.notify_graph_changed()
+        snapshots.notify_graph_changed()
+    return result
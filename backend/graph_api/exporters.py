@@ -0,0 +1,243 @@
+"""
+流式导出工具 - 把记录迭代器编码为分块的 CSV / Parquet 字节流
+
+所有编码器都只持有一个块（chunk_rows 行）的数据，配合
+db_utils.stream_from_neo4j 使用时，导出任意行数的内存占用都是常数。
+"""
+import csv
+import io
+import itertools
+import json
+import logging
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from django.http import StreamingHttpResponse
+
+from KnowledgeBackend.streaming import streaming_content
+
+from .serializers import get_node_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# 导出列：列名列表（全部按字符串处理），或 列名 -> 类型（string / int64 / float64）。
+# Parquet 按声明的类型写入 schema，不从数据推断：某一块中全为空的列不会被推断成 null 类型
+Columns = Union[List[str], Dict[str, str]]
+
+# 子图导出时每一行对应一条关系 (n)-[r]-(m)
+GRAPH_EXPORT_COLUMNS: Dict[str, str] = {
+    'source_id': 'string',
+    'source_name': 'string',
+    'relationship_type': 'string',
+    'target_id': 'string',
+    'target_name': 'string',
+    'source_properties': 'string',
+    'target_properties': 'string',
+}
+
+_COLUMN_CASTS: Dict[str, Callable[[Any], Any]] = {
+    'string': str,
+    'int64': int,
+    'float64': float,
+}
+
+
+def column_types(columns: Columns) -> Dict[str, str]:
+    """列名 -> 类型；列名列表中的列都按字符串处理"""
+    if isinstance(columns, dict):
+        return dict(columns)
+    return {column: 'string' for column in columns}
+
+
+def prime_rows(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    预取第一条记录后再把迭代器原样交回。
+    流式响应一旦开始就无法再修改状态码，预取可以让连接失败等错误在发送响应头之前抛出。
+    """
+    iterator = iter(rows)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return itertools.chain((first,), iterator)
+
+
+def _node_name(node: Dict[str, Any]) -> Optional[str]:
+    for attr in ('name', 'term', 'method', 'description'):
+        if node.get(attr):
+            return str(node[attr])
+    return None
+
+
+def graph_record_to_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """把 {'n': dict, 'r': (start, type, end), 'm': dict} 记录转换为一行导出数据"""
+    node_n = record.get('n') if isinstance(record.get('n'), dict) else {}
+    node_m = record.get('m') if isinstance(record.get('m'), dict) else {}
+    rel = record.get('r')
+    rel_type = None
+    source, target = node_n, node_m
+    if isinstance(rel, tuple) and len(rel) == 3:
+        start, rel_type, end = rel
+        # 关系元组保留了真实方向，优先使用
+        if isinstance(start, dict) and isinstance(end, dict):
+            source, target = start, end
+    return {
+        'source_id': get_node_id(source),
+        'source_name': _node_name(source),
+        'relationship_type': str(rel_type) if rel_type is not None else None,
+        'target_id': get_node_id(target),
+        'target_name': _node_name(target),
+        'source_properties': json.dumps(source, ensure_ascii=False, default=str),
+        'target_properties': json.dumps(target, ensure_ascii=False, default=str),
+    }
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns: Columns,
+             chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """逐块产出 UTF-8 编码的 CSV（带 BOM，方便 Excel 直接打开）"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), extrasaction='ignore')
+    buffer.write('\ufeff')
+    writer.writeheader()
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode('utf-8')
+
+
+class _DrainableSink:
+    """供 ParquetWriter 写入的缓冲区，每写完一个 row group 就被取走清空"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_parquet(rows: Iterable[Dict[str, Any]], columns: Columns,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    逐块产出 Parquet 文件内容，每 chunk_rows 行写成一个 row group。
+    需要安装 pyarrow；schema 由 columns 声明的类型确定，值按类型转换，None 保留为空值。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = column_types(columns)
+    unknown = set(types.values()) - set(_COLUMN_CASTS)
+    if unknown:
+        raise ValueError(f"不支持的列类型：{', '.join(sorted(unknown))}")
+    schema = pa.schema([(column, getattr(pa, type_name)()) for column, type_name in types.items()])
+    casts = [(column, _COLUMN_CASTS[type_name]) for column, type_name in types.items()]
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write_chunk(chunk):
+        writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append({
+            column: None if row.get(column) is None else cast(row[column])
+            for column, cast in casts
+        })
+        if len(chunk) >= chunk_rows:
+            write_chunk(chunk)
+            chunk = []
+            data = sink.drain()
+            if data:
+                yield data
+    if chunk:
+        write_chunk(chunk)
+    # 空结果也输出一个只有表头的合法文件
+    writer.close()
+    data = sink.drain()
+    if data:
+        yield data
+
+
+ENCODERS: Dict[str, Callable[..., Iterator[bytes]]] = {
+    'csv': iter_csv,
+    'parquet': iter_parquet,
+}
+
+
+def encode_rows(rows: Iterable[Dict[str, Any]], columns: Columns, export_format: str,
+                chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """按格式选择编码器；格式不支持时抛出 ValueError"""
+    encoder = ENCODERS.get(export_format)
+    if encoder is None:
+        raise ValueError(f"不支持的导出格式 '{export_format}'，可选：{', '.join(ENCODERS)}")
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ValueError("Parquet 导出需要安装 pyarrow") from e
+    return encoder(rows, columns, chunk_rows=chunk_rows)
+
+
+def streaming_export_response(request, rows: Iterable[Dict[str, Any]], columns: Columns,
+                              export_format: str, filename: str) -> StreamingHttpResponse:
+    """构建流式下载响应（ASGI 下同样逐块发送，见 KnowledgeBackend.streaming）；格式不支持时抛出 ValueError"""
+    chunks = encode_rows(rows, columns, export_format)
+    response = StreamingHttpResponse(streaming_content(request, chunks), content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+def write_chunks(chunks, output):
+    """把字节块依次写入文件或标准输出（'-'），返回写入的字节数"""
+    written = 0
+    if output == '-':
+        stream = sys.stdout.buffer
+        for chunk in chunks:
+            stream.write(chunk)
+            written += len(chunk)
+        stream.flush()
+        return written
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            written += len(chunk)
+    return written
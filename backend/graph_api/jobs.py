@@ -0,0 +1,109 @@
+"""
+图谱相关的后台任务（见 jobs/queue.py）
+"""
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from jobs.queue import JobFailed
+
+from . import cypher_queries, db_utils, exporters
+
+# 团伙识别时每处理多少个用户对报告一次进度
+RING_PROGRESS_EVERY = 10000
+
+
+def build_snapshots(job):
+    """重建 GRAPH_SNAPSHOTS 中的快照并写入磁盘，运行中的进程会自动加载；参数 names 只重建指定的快照"""
+    paths = getattr(settings, 'GRAPH_SNAPSHOTS', [])
+    snapshots = [import_string(path) for path in paths]
+    if job.params.get('names'):
+        snapshots = [snapshot for snapshot in snapshots if snapshot.name in job.params['names']]
+    versions = {}
+    for index, snapshot in enumerate(snapshots):
+        job.progress(100 * index / len(snapshots), f"构建 {snapshot.name}", force=True)
+        snapshot.load()
+        snapshot.refresh()
+        versions[snapshot.name] = snapshot.version
+    return {'versions': versions}
+
+
+def export_graph(job):
+    """参数与 GraphExportView 相同：filter_prop、filter_value、export_format（csv / parquet）、limit"""
+    params = job.params
+    export_format = params.get('export_format', 'csv')
+    if not params.get('filter_prop') or params.get('filter_value') is None:
+        raise JobFailed("缺少过滤参数 'filter_prop' 和 'filter_value'")
+    if export_format not in exporters.EXPORT_FORMATS:
+        raise JobFailed(f"不支持的导出格式 '{export_format}'")
+    try:
+        query = cypher_queries.build_filtered_graph_cypher(params['filter_prop'], limit=params.get('limit'))
+    except ValueError as e:
+        raise JobFailed(str(e))
+    rows = (
+        exporters.graph_record_to_row(record)
+        for record in db_utils.stream_from_neo4j(query, params={'value': params.get('filter_value')})
+    )
+    chunks = exporters.encode_rows(rows, exporters.GRAPH_EXPORT_COLUMNS, export_format)
+    path = job.output_path(f'graph_export.{export_format}')
+    written = exporters.write_chunks(chunks, str(path))
+    return {'file': path.name, 'bytes': written}
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent: Dict[Any, Any] = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        while parent != item:
+            # 路径减半
+            grandparent = self.parent[parent]
+            self.parent[item] = grandparent
+            item, parent = parent, self.parent[grandparent]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+def detect_rings(job):
+    """
+    团伙识别：通过共享设备、IP 等标识相连的用户构成的连通分量。
+    参数：min_size（团伙最少人数，默认 3）、min_shared（用户对至少共享的标识数，默认 1）、
+    max_rings（返回的团伙数上限，按人数从多到少，默认 100）
+    """
+    try:
+        min_size = int(job.params.get('min_size', 3))
+        min_shared = int(job.params.get('min_shared', 1))
+        max_rings = int(job.params.get('max_rings', 100))
+    except (TypeError, ValueError) as e:
+        raise JobFailed(f"min_size、min_shared、max_rings 必须是整数：{e}")
+
+    rings = _DisjointSet()
+    pairs: List[tuple] = []
+    for index, record in enumerate(db_utils.stream_from_neo4j(cypher_queries.SHARED_IDENTIFIER_PAIRS_CYPHER)):
+        if index and index % RING_PROGRESS_EVERY == 0:
+            job.progress(50, f"已读取 {index} 个用户对")
+        if record['shared'] < min_shared or record['user1'] is None or record['user2'] is None:
+            continue
+        rings.union(record['user1'], record['user2'])
+        pairs.append((record['user1'], record['user2']))
+
+    job.progress(90, "汇总团伙", force=True)
+    members: Dict[Any, List[Any]] = {}
+    for user in list(rings.parent):
+        members.setdefault(rings.find(user), []).append(user)
+    links: Dict[Any, int] = {}
+    for user, _ in pairs:
+        root = rings.find(user)
+        links[root] = links.get(root, 0) + 1
+    found = sorted(
+        ({'size': len(users), 'links': links.get(root, 0), 'users': sorted(map(str, users))}
+         for root, users in members.items() if len(users) >= min_size),
+        key=lambda ring: (-ring['size'], -ring['links']),
+    )
+    return {'ring_count': len(found), 'pairs': len(pairs), 'rings': found[:max_rings]}
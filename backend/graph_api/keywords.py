@@ -0,0 +1,140 @@
+"""
+图谱关键词匹配。
+
+用图谱中全部 Keyword 节点的 term 构建 Aho-Corasick 自动机，一次线性扫描即可找出文本中出现的
+所有关键词（包括相互重叠的），每个关键词附带与之关联的 FraudPattern。
+扫描耗时只与文本长度和命中数有关，与关键词数量无关。
+
+自动机作为 GraphSnapshot 在后台构建，图谱变化后重建并整体替换，匹配时不访问 Neo4j。
+英文等字母按小写匹配，匹配位置对应原文下标。
+"""
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db_utils import read_from_neo4j
+from .snapshots import GraphSnapshot
+
+# 关键词及其关联的诈骗类型：直接相连，或经由 FraudCase 关联
+KEYWORD_PATTERNS_CYPHER = """
+MATCH (k:Keyword)
+WHERE k.term IS NOT NULL AND k.term <> ''
+OPTIONAL MATCH (k)--(direct:FraudPattern)
+OPTIONAL MATCH (k)--(:FraudCase)-[:IS_A]->(via_case:FraudPattern)
+RETURN k.term AS term, collect(DISTINCT direct.name) + collect(DISTINCT via_case.name) AS patterns
+"""
+
+
+def _fold(char: str) -> str:
+    """逐字符转小写；个别字符转小写后长度会变，保留原字符以保证下标对齐"""
+    lowered = char.lower()
+    return lowered if len(lowered) == 1 else char
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 自动机，构建后只读，可在多线程中共享"""
+
+    def __init__(self, terms: Dict[str, List[str]]):
+        """terms: {关键词: [关联的诈骗类型]}"""
+        self.terms: List[str] = []
+        self.patterns: List[Tuple[str, ...]] = []
+        # 状态 0 为根；_goto[s] 为转移表，_fail[s] 为失配指针，_output[s] 为在 s 结束的关键词下标
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+
+        lengths = []
+        for term, term_patterns in terms.items():
+            folded = ''.join(_fold(char) for char in term)
+            if not folded:
+                continue
+            state = 0
+            for char in folded:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (len(self.terms),)
+            self.terms.append(term)
+            self.patterns.append(tuple(term_patterns))
+            lengths.append(len(folded))
+        self._lengths = lengths
+        self._link()
+
+    def _link(self):
+        """按广度优先计算失配指针，并把失配链上的输出合并到当前状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回所有命中 (起始下标, 结束下标, 关键词下标)，按结束位置排序"""
+        goto, fail, output, lengths = self._goto, self._fail, self._output, self._lengths
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            char = _fold(char)
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term_index in output[state]:
+                matches.append((index + 1 - lengths[term_index], index + 1, term_index))
+        return matches
+
+    def annotate(self, text: str) -> Dict[str, Any]:
+        """命中的关键词（含位置和关联的诈骗类型），以及各诈骗类型的命中次数"""
+        matches = []
+        pattern_counts: Counter = Counter()
+        for start, end, term_index in self.find(text):
+            patterns = self.patterns[term_index]
+            matches.append({
+                'term': self.terms[term_index],
+                'start': start,
+                'end': end,
+                'patterns': list(patterns),
+            })
+            pattern_counts.update(patterns)
+        return {'matches': matches, 'patterns': dict(pattern_counts.most_common())}
+
+
+class KeywordSnapshot(GraphSnapshot):
+    name = 'keyword_matcher'
+
+    def build(self) -> List[Dict[str, Any]]:
+        terms = {}
+        for row in read_from_neo4j(KEYWORD_PATTERNS_CYPHER):
+            term = row.get('term')
+            if not isinstance(term, str) or not term.strip():
+                continue
+            patterns = terms.setdefault(term.strip(), set())
+            patterns.update(name for name in row.get('patterns') or [] if name)
+        # 排序后内容摘要才稳定
+        return [{'term': term, 'patterns': sorted(terms[term])} for term in sorted(terms)]
+
+    def compile(self, data: List[Dict[str, Any]]) -> KeywordAutomaton:
+        return KeywordAutomaton({item['term']: item['patterns'] for item in data})
+
+
+keyword_matcher = KeywordSnapshot()
+
+
+def annotate_text(text: str) -> Optional[Dict[str, Any]]:
+    """用当前版本的自动机标注文本；自动机尚未构建时返回 None"""
+    automaton = keyword_matcher.get()
+    if automaton is None:
+        return None
+    return automaton.annotate(text)
@@ -0,0 +1,338 @@
+"""
+图谱实时推送（WebSocket，仅 ASGI 部署，路径 /ws/graph/live/）。
+
+客户端连接后订阅子图，代替定时重新拉取整个图谱：
+    {"action": "subscribe", "id": "s1", "filter": {"prop": "name", "value": "杀猪盘"}}   # 与 FilteredGraphView 相同
+    {"action": "subscribe", "id": "s2", "node": "杀猪盘"}                                # 节点的一度邻域
+    {"action": "unsubscribe", "id": "s1"}
+服务端先推送完整子图 {"type": "snapshot", "id", "nodes", "links"}（ECharts 格式，连线另带 id），
+之后只推送变化 {"type": "delta", "id", "nodes_added", "nodes_updated", "nodes_removed", "links_added", "links_removed"}，
+删除项只给出 id。变化比子图本身还大时改为推送新的 snapshot。
+
+- 变化来源：write_to_neo4j（数据导入等写入路径）写入后通知本进程；其他进程的写入通过
+  共享缓存中的图谱版本号（graph_api.services）每隔 LIVE_GRAPH_POLL_SECONDS 秒发现，需要共享缓存
+- 合并：写入后等待 LIVE_GRAPH_COALESCE_MS 再重算，期间的多次写入只重算一次；
+  同一轮中相同的子图只查询一次，由所有订阅共享（结果只保留 RESULT_TTL_SECONDS 秒，
+  最多 MAX_SHARED_RESULTS 个，失败的查询不保留）
+- 背压：每个订阅只记录客户端已有的子图，发送前才与最新结果比较，客户端处理不过来时
+  中间的多次变化自然合并为一个差量，不会在服务端堆积消息；
+  一次发送超过 LIVE_GRAPH_SEND_TIMEOUT_SECONDS 秒时断开连接（1013），由客户端重连
+"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import cypher_queries
+from .db_utils import read_from_neo4j
+from .serializers import EchartsGraphSerializer
+
+logger = logging.getLogger(__name__)
+
+LIVE_GRAPH_PATH = '/ws/graph/live/'
+
+# 1008：违反协议（消息格式错误等）；1013：稍后重试（客户端接收太慢）
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+MAX_MESSAGE_CHARS = 4096
+# 同一轮重算中共享的子图查询结果：保留时间（秒）与最多保留的个数
+RESULT_TTL_SECONDS = 1.0
+MAX_SHARED_RESULTS = 256
+MAX_SUBSCRIPTION_ID_CHARS = 64
+
+# {节点 id: 节点}, {连线 id: 连线}
+Subgraph = Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]
+
+
+def subgraph_query(request: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """把订阅请求转换为 (查询, 参数)，请求不合法时抛出 ValueError"""
+    limit = getattr(settings, 'LIVE_GRAPH_MAX_ROWS', 500)
+    if 'node' in request:
+        node = request['node']
+        if not isinstance(node, str) or not node:
+            raise ValueError("'node' 必须是非空字符串")
+        return cypher_queries.build_node_neighborhood_cypher(limit=limit), {'node_id': node}
+    graph_filter = request.get('filter')
+    if not isinstance(graph_filter, dict) or graph_filter.get('value') is None:
+        raise ValueError("订阅需要 'node' 或 'filter': {'prop': ..., 'value': ...}")
+    query = cypher_queries.build_filtered_graph_cypher(graph_filter.get('prop'), limit=limit)
+    return query, {'value': graph_filter['value']}
+
+
+def link_id(link: Dict[str, Any]) -> str:
+    return f"{link['source']}-[{link['type']}]->{link['target']}"
+
+
+def fetch_subgraph(query: str, params: Dict[str, Any]) -> Subgraph:
+    data = EchartsGraphSerializer(instance=read_from_neo4j(query, params=params)).data
+    nodes = {node['id']: node for node in data['nodes']}
+    links = {}
+    for link in data['links']:
+        key = link_id(link)
+        links[key] = dict(link, id=key)
+    return nodes, links
+
+
+def diff_subgraph(old: Subgraph, new: Subgraph) -> Dict[str, Any]:
+    """两个子图之间的变化，没有变化时各项均为空"""
+    old_nodes, old_links = old
+    new_nodes, new_links = new
+    return {
+        'nodes_added': [node for key, node in new_nodes.items() if key not in old_nodes],
+        'nodes_updated': [node for key, node in new_nodes.items() if key in old_nodes and old_nodes[key] != node],
+        'nodes_removed': [key for key in old_nodes if key not in new_nodes],
+        'links_added': [link for key, link in new_links.items() if key not in old_links],
+        'links_removed': [key for key in old_links if key not in new_links],
+    }
+
+
+class SlowClient(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, query: str, params: Dict[str, Any]):
+        self.query = query
+        self.params = params
+        # 客户端已有的子图，尚未发送 snapshot 时为 None
+        self.sent: Optional[Subgraph] = None
+        self.dirty = True
+
+
+class LiveGraphConnection:
+    """一个 WebSocket 连接：接收订阅请求，由单独的发送任务按需推送"""
+
+    def __init__(self, hub: 'LiveGraphHub', send):
+        self.hub = hub
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self.subscriptions: Dict[str, Subscription] = {}
+
+    def mark_dirty(self):
+        for subscription in self.subscriptions.values():
+            subscription.dirty = True
+        self._wakeup.set()
+
+    async def send_json(self, message: Dict[str, Any]):
+        timeout = getattr(settings, 'LIVE_GRAPH_SEND_TIMEOUT_SECONDS', 10)
+        text = json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+        async with self._send_lock:
+            try:
+                await asyncio.wait_for(self._send({'type': 'websocket.send', 'text': text}), timeout)
+            except asyncio.TimeoutError:
+                raise SlowClient()
+
+    async def handle_message(self, text: Optional[str]):
+        try:
+            request = json.loads(text or '')
+            if not isinstance(request, dict):
+                raise ValueError
+        except ValueError:
+            await self.send_json({'type': 'error', 'error': '消息必须是 JSON 对象'})
+            return
+        action = request.get('action')
+        subscription_id = request.get('id')
+        if not isinstance(subscription_id, str) or not 0 < len(subscription_id) <= MAX_SUBSCRIPTION_ID_CHARS:
+            await self.send_json({'type': 'error', 'error': "缺少订阅 'id'"})
+            return
+
+        if action == 'unsubscribe':
+            self.subscriptions.pop(subscription_id, None)
+            await self.send_json({'type': 'unsubscribed', 'id': subscription_id})
+        elif action == 'subscribe':
+            max_subscriptions = getattr(settings, 'LIVE_GRAPH_MAX_SUBSCRIPTIONS', 10)
+            if subscription_id not in self.subscriptions and len(self.subscriptions) >= max_subscriptions:
+                await self.send_json({'type': 'error', 'id': subscription_id,
+                                      'error': f"每个连接最多 {max_subscriptions} 个订阅"})
+                return
+            try:
+                query, params = subgraph_query(request)
+            except ValueError as e:
+                await self.send_json({'type': 'error', 'id': subscription_id, 'error': str(e)})
+                return
+            # 同一 id 重新订阅时替换，发送新的 snapshot
+            self.subscriptions[subscription_id] = Subscription(query, params)
+            self._wakeup.set()
+        else:
+            await self.send_json({'type': 'error', 'id': subscription_id, 'error': f"未知操作 '{action}'"})
+
+    async def receive_loop(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message['type'] != 'websocket.receive':
+                continue
+            text = message.get('text')
+            if text is None and message.get('bytes') is not None:
+                text = message['bytes'].decode('utf-8', errors='replace')
+            if text is not None and len(text) > MAX_MESSAGE_CHARS:
+                await self._send({'type': 'websocket.close', 'code': CLOSE_POLICY_VIOLATION})
+                return
+            await self.handle_message(text)
+
+    async def send_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            for subscription_id, subscription in list(self.subscriptions.items()):
+                if subscription.dirty:
+                    await self._push(subscription_id, subscription)
+
+    async def _push(self, subscription_id: str, subscription: Subscription):
+        subscription.dirty = False
+        try:
+            current = await self.hub.fetch(subscription.query, subscription.params)
+        except Exception as e:
+            logger.warning(f"Live graph query failed for subscription {subscription_id}: {e}")
+            await self.send_json({'type': 'error', 'id': subscription_id, 'error': '图谱查询失败，将在图谱下次变化时重试'})
+            return
+        if self.subscriptions.get(subscription_id) is not subscription:
+            # 查询期间已取消或替换
+            return
+
+        nodes, links = current
+        message = None
+        if subscription.sent is not None:
+            delta = diff_subgraph(subscription.sent, current)
+            changes = sum(len(items) for items in delta.values())
+            if not changes:
+                return
+            if changes < len(nodes) + len(links):
+                message = dict({'type': 'delta', 'id': subscription_id}, **delta)
+        if message is None:
+            message = {'type': 'snapshot', 'id': subscription_id,
+                       'nodes': list(nodes.values()), 'links': list(links.values())}
+        await self.send_json(message)
+        subscription.sent = current
+
+
+class LiveGraphHub:
+    """本进程中所有连接共享：接收写入通知，合并后让各连接重算自己的订阅"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connections: Set[LiveGraphConnection] = set()
+        # 本轮已发起的子图查询 (发起时间, 结果)，图谱变化时清空
+        self._results: "OrderedDict[Tuple[str, str], Tuple[float, asyncio.Future]]" = OrderedDict()
+
+    def notify(self):
+        """图谱已变化；可以在任意线程中调用"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._mark_changed)
+
+    def _mark_changed(self):
+        if self._changed is not None:
+            self._changed.set()
+
+    def attach(self, connection: LiveGraphConnection):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._changed = asyncio.Event()
+            self._task = None
+            self._results.clear()
+        self._connections.add(connection)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    def detach(self, connection: LiveGraphConnection):
+        self._connections.discard(connection)
+
+    async def fetch(self, query: str, params: Dict[str, Any]) -> Subgraph:
+        """
+        查询子图。同一轮中（查询进行中，或完成不超过 RESULT_TTL_SECONDS 秒）相同的查询共享一次结果；
+        之后订阅的客户端重新查询，不会拿到过期的结果
+        """
+        key = (query, json.dumps(params, sort_keys=True, default=str))
+        now = asyncio.get_running_loop().time()
+        entry = self._results.get(key)
+        if entry is not None and (not entry[1].done() or now - entry[0] <= RESULT_TTL_SECONDS):
+            future = entry[1]
+        else:
+            future = asyncio.ensure_future(sync_to_async(fetch_subgraph, thread_sensitive=False)(query, params))
+            self._results[key] = (now, future)
+        self._results.move_to_end(key)
+        while len(self._results) > MAX_SHARED_RESULTS:
+            self._results.popitem(last=False)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # 失败的查询不共享，下次重新查询
+            entry = self._results.get(key)
+            if entry is not None and entry[1] is future:
+                del self._results[key]
+            raise
+
+    async def _run(self):
+        from .services import graph_cache_version
+
+        poll_seconds = getattr(settings, 'LIVE_GRAPH_POLL_SECONDS', 2)
+        coalesce_seconds = getattr(settings, 'LIVE_GRAPH_COALESCE_MS', 200) / 1000
+        read_version = sync_to_async(graph_cache_version, thread_sensitive=False)
+        version = await read_version()
+        while self._connections:
+            try:
+                await asyncio.wait_for(self._changed.wait(), poll_seconds)
+                await asyncio.sleep(coalesce_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                current_version = await read_version()
+            except Exception as e:
+                logger.warning(f"Failed to read graph version: {e}")
+                current_version = version
+            if not self._changed.is_set() and current_version == version:
+                continue
+            # 本进程的写入已经更换过版本号，这里一并记下，避免下次轮询时重复重算
+            version = current_version
+            self._changed.clear()
+            self._results.clear()
+            for connection in list(self._connections):
+                connection.mark_dirty()
+
+
+hub = LiveGraphHub()
+
+
+def notify_graph_changed():
+    """图谱写入后调用（见 db_utils.write_to_neo4j）"""
+    hub.notify()
+
+
+async def live_graph_application(scope, receive, send):
+    """ASGI WebSocket 应用"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+    connection = LiveGraphConnection(hub, send)
+    hub.attach(connection)
+    receiver = asyncio.ensure_future(connection.receive_loop(receive))
+    sender = asyncio.ensure_future(connection.send_loop())
+    try:
+        done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if isinstance(error, SlowClient):
+                logger.info("Closing live graph connection: client is not keeping up.")
+                try:
+                    await asyncio.wait_for(send({'type': 'websocket.close', 'code': CLOSE_TRY_AGAIN_LATER}), 1)
+                except Exception:
+                    pass
+            elif error is not None:
+                logger.error(f"Live graph connection failed: {error}")
+    finally:
+        receiver.cancel()
+        sender.cancel()
+        hub.detach(connection)
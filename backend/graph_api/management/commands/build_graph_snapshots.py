@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = "从图谱离线构建只读快照（如对话使用的情境卡片）并写入 GRAPH_SNAPSHOT_DIR，运行中的进程会自动加载"
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="只构建指定名称的快照，缺省时构建 GRAPH_SNAPSHOTS 中的全部")
+
+    def handle(self, *args, **options):
+        snapshots = [import_string(path) for path in getattr(settings, 'GRAPH_SNAPSHOTS', [])]
+        if options['names']:
+            unknown = set(options['names']) - {snapshot.name for snapshot in snapshots}
+            if unknown:
+                raise CommandError(f"Unknown snapshot(s): {', '.join(sorted(unknown))}")
+            snapshots = [snapshot for snapshot in snapshots if snapshot.name in options['names']]
+
+        for snapshot in snapshots:
+            # 先加载磁盘上的版本，内容没有变化时不重写文件
+            snapshot.load()
+            try:
+                changed = snapshot.refresh()
+            except Exception as e:
+                raise CommandError(f"Failed to build snapshot '{snapshot.name}': {e}")
+            status = 'updated' if changed else 'unchanged'
+            self.stdout.write(self.style.SUCCESS(f"{snapshot.name}: {status} (version {snapshot.version[:12]})"))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from graph_api import db_utils
+
+NODES_CYPHER = "MATCH (n) RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties"
+RELATIONSHIPS_CYPHER = """
+MATCH (a)-[r]->(b)
+RETURN elementId(a) AS start, elementId(b) AS end, type(r) AS type, properties(r) AS properties
+"""
+
+
+class Command(BaseCommand):
+    help = "把当前图谱后端（通常是 Neo4j）中的全部节点和关系导出为内存图谱后端可以加载的 JSON 夹具"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help="输出文件路径，'-' 表示标准输出")
+
+    def handle(self, *args, **options):
+        try:
+            data = {
+                'nodes': list(db_utils.stream_from_neo4j(NODES_CYPHER)),
+                'relationships': list(db_utils.stream_from_neo4j(RELATIONSHIPS_CYPHER)),
+            }
+        except Exception as e:
+            raise CommandError(f"Failed to read the graph: {e}")
+
+        # 日期等 Neo4j 时间类型按字符串保存
+        encoded = json.dumps(data, ensure_ascii=False, indent=1, default=str)
+        if options['output'] == '-':
+            self.stdout.write(encoded)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            f.write(encoded)
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {len(data['nodes'])} nodes and {len(data['relationships'])} relationships "
+            f"to {options['output']}"))
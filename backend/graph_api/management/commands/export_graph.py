@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from graph_api import cypher_queries, db_utils, exporters
+
+
+class Command(BaseCommand):
+    help = "流式导出过滤后的子图（CSV / Parquet），过滤条件与 FilteredGraphView 相同"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filter-prop', required=True, choices=cypher_queries.ALLOWED_FILTER_PROPS)
+        parser.add_argument('--filter-value', required=True)
+        parser.add_argument('--format', dest='export_format', default='csv', choices=list(exporters.EXPORT_FORMATS))
+        parser.add_argument('--limit', type=int, default=None, help="最大导出行数，缺省时导出全部")
+        parser.add_argument('--chunk-rows', type=int, default=exporters.DEFAULT_CHUNK_ROWS)
+        parser.add_argument('--output', '-o', default='-', help="输出文件路径，'-' 表示标准输出")
+
+    def handle(self, *args, **options):
+        try:
+            query = cypher_queries.build_filtered_graph_cypher(options['filter_prop'], limit=options['limit'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        rows = (
+            exporters.graph_record_to_row(record)
+            for record in db_utils.stream_from_neo4j(
+                query, params={'value': options['filter_value']}, fetch_size=options['chunk_rows']
+            )
+        )
+        try:
+            chunks = exporters.encode_rows(
+                rows, exporters.GRAPH_EXPORT_COLUMNS, options['export_format'], chunk_rows=options['chunk_rows']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        written = exporters.write_chunks(chunks, options['output'])
+        if options['output'] != '-':
+            self.stderr.write(self.style.SUCCESS(f"Exported {written} bytes to {options['output']}"))
+
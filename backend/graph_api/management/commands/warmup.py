@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from KnowledgeBackend.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = ("执行启动预热任务（WARMUP_TASKS）：连接图谱后端、构建图谱快照、计算初始图谱和平台统计并写入缓存。"
+            "适合在部署后运行；缓存是进程内缓存时只有快照能被其他进程复用")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="只执行指定的任务，缺省时执行全部")
+        parser.add_argument('--refresh', action='store_true', help="忽略已有缓存和快照，重新计算")
+
+    def handle(self, *args, **options):
+        tasks = warmup.configured_tasks()
+        unknown = set(options['names']) - set(tasks)
+        if unknown:
+            raise CommandError(f"Unknown warmup task(s): {', '.join(sorted(unknown))}")
+
+        # 只对当前进程有效的任务（如开场白池）在命令中没有意义，除非显式指定
+        names = options['names'] or [
+            name for name, path in tasks.items() if not getattr(import_string(path), 'per_process', False)
+        ]
+        errors = warmup.run(names, refresh=options['refresh'])
+        for name, error in errors.items():
+            if error is None:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+            else:
+                self.stderr.write(self.style.ERROR(f"{name}: {error}"))
+        failed = [name for name, error in errors.items() if error is not None]
+        if failed:
+            raise CommandError(f"Warmup failed: {', '.join(failed)}")
@@ -0,0 +1,64 @@
+"""
+图谱热点响应的缓存 - 初始图谱、平台统计等所有访客都相同的结果
+
+缓存键带图谱版本号，write_to_neo4j 写入图谱后更换版本号，之前的结果全部失效；
+另外按 GRAPH_PAYLOAD_CACHE_TIMEOUT 过期。多进程部署需要共享缓存（如 Redis）才能互相复用。
+"""
+import logging
+import time
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import cypher_queries, db_utils, serializers
+
+logger = logging.getLogger(__name__)
+
+GRAPH_CACHE_VERSION_KEY = 'graph:payload:version'
+GRAPH_PAYLOAD_CACHE_KEY = 'graph:payload:{name}:{version}'
+
+
+def graph_cache_version() -> str:
+    return cache.get(GRAPH_CACHE_VERSION_KEY) or '0'
+
+
+def invalidate_graph_payloads():
+    """更换图谱版本号，之前缓存的响应不再命中"""
+    # 与用户缓存相同，用时间戳而不是自增
+    cache.set(GRAPH_CACHE_VERSION_KEY, str(time.time_ns()), None)
+
+
+def cached_graph_payload(name: str, build: Callable[[], Any], refresh: bool = False) -> Any:
+    """读取缓存的响应，未命中（或 refresh）时调用 build() 计算并写入缓存"""
+    cache_key = GRAPH_PAYLOAD_CACHE_KEY.format(name=name, version=graph_cache_version())
+    if not refresh:
+        payload = cache.get(cache_key)
+        if payload is not None:
+            return payload
+    payload = build()
+    cache.set(cache_key, payload, getattr(settings, 'GRAPH_PAYLOAD_CACHE_TIMEOUT', 300))
+    return payload
+
+
+def _build_initial_graph():
+    results = db_utils.read_from_neo4j(cypher_queries.GET_INITIAL_GRAPH_CYPHER)
+    return serializers.EchartsGraphSerializer(instance=results).data
+
+
+def get_initial_graph(refresh: bool = False):
+    """初始图谱（ECharts 格式）"""
+    return cached_graph_payload('initial_graph', _build_initial_graph, refresh)
+
+
+# --- 预热任务（见 KnowledgeBackend/warmup.py） ---
+
+def verify_graph_backend(refresh: bool = False):
+    """创建图谱后端并确认可用（Neo4j 后端会建立驱动的连接池）"""
+    from .backends import get_graph_backend
+
+    get_graph_backend().verify_connectivity()
+
+
+def warm_initial_graph(refresh: bool = False):
+    get_initial_graph(refresh=refresh)
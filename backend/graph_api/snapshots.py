@@ -0,0 +1,185 @@
+"""
+由知识图谱编译出的只读快照。
+
+有些数据（对话使用的诈骗情境卡片等）来自图谱，但在请求路径上使用时不能每次都查询 Neo4j。
+GraphSnapshot 把图谱数据编译为内存中的对象：
+- 后台线程在图谱写入后重建：db_utils.write_to_neo4j 会更换图谱版本号（services.graph_cache_version）
+  并通知本进程的快照，其他进程的写入通过轮询共享缓存中的版本号发现；另外每隔 refresh_seconds
+  全量重建一次，覆盖绕过应用直接写入 Neo4j 的情况
+- 以编译结果的内容摘要作为快照版本，内容变化时才替换，替换是一次引用赋值，读取方不需要加锁
+- 每次重建的结果同时写入磁盘（GRAPH_SNAPSHOT_DIR），进程启动时先加载磁盘上的版本，
+  Neo4j 暂时不可用时也能使用上一次的结果；也可以用 build_graph_snapshots 命令离线构建
+- get() 只读内存，不访问数据库；尚无任何版本时返回 None，调用方自行降级
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# 已启动后台线程的快照，图谱写入后逐个唤醒
+_running: 'weakref.WeakSet[GraphSnapshot]' = weakref.WeakSet()
+
+
+class GraphSnapshot:
+    """子类实现 build()（查询图谱，返回可 JSON 序列化的数据），按需覆盖 compile()"""
+
+    # 快照名，同时是磁盘文件名
+    name = ''
+
+    def __init__(self, refresh_seconds: Optional[float] = None, directory: Optional[str] = None):
+        self.refresh_seconds = (refresh_seconds if refresh_seconds is not None
+                                else getattr(settings, 'GRAPH_SNAPSHOT_REFRESH_SECONDS', 600))
+        self.directory = directory if directory is not None else getattr(settings, 'GRAPH_SNAPSHOT_DIR', None)
+        # (版本, 编译结果)，整体替换
+        self._current: Optional[Tuple[str, Any]] = None
+        self._loaded_mtime = 0.0
+        self._lock = threading.Lock()
+        self._started = False
+        # 上次重建时的图谱版本号；本进程写入图谱时被唤醒
+        self._graph_version: Optional[str] = None
+        self._last_build: Optional[float] = None
+        self._changed = threading.Event()
+
+    def build(self) -> Any:
+        raise NotImplementedError
+
+    def compile(self, data: Any) -> Any:
+        """把 build() 的结果转换为运行时使用的对象，默认原样返回"""
+        return data
+
+    @property
+    def path(self) -> Optional[Path]:
+        return Path(self.directory) / f'{self.name}.json' if self.directory else None
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._current
+        return current[0] if current else None
+
+    def get(self) -> Optional[Any]:
+        """当前版本的编译结果；首次调用时加载磁盘上的版本并启动后台重建"""
+        if not self._started:
+            self.start()
+        current = self._current
+        return current[1] if current else None
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.load()
+        if self.refresh_seconds > 0:
+            _running.add(self)
+            threading.Thread(target=self._run, name=f'graph-snapshot-{self.name}', daemon=True).start()
+
+    def refresh(self) -> bool:
+        """从图谱重建，内容有变化时替换并写入磁盘，返回是否替换"""
+        data = self.build()
+        version = self._digest(data)
+        if version == self.version:
+            return False
+        self._current = (version, self.compile(data))
+        self.save(version, data)
+        logger.info(f"Graph snapshot '{self.name}' updated to version {version[:12]}.")
+        return True
+
+    def load(self) -> bool:
+        """加载磁盘上的快照，文件不存在或损坏时返回 False"""
+        path = self.path
+        if path is None or not path.exists():
+            return False
+        try:
+            mtime = path.stat().st_mtime
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            if payload['version'] != self.version:
+                self._current = (payload['version'], self.compile(payload['data']))
+            self._loaded_mtime = mtime
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to load graph snapshot '{self.name}' from {path}: {e}")
+            return False
+        return True
+
+    def save(self, version: str, data: Any):
+        """先写临时文件再替换，其他进程不会读到写了一半的文件"""
+        path = self.path
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': version, 'built_at': time.time(), 'data': data}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._loaded_mtime = path.stat().st_mtime
+        except OSError as e:
+            logger.warning(f"Failed to save graph snapshot '{self.name}' to {path}: {e}")
+
+    def notify(self):
+        """图谱已写入，唤醒后台线程重建"""
+        self._changed.set()
+
+    def check(self) -> bool:
+        """
+        后台线程每次被唤醒或轮询到期时调用：图谱版本号变化、收到写入通知或距上次重建超过
+        refresh_seconds 时重建，返回是否重建
+        """
+        from .services import graph_cache_version
+
+        graph_version = graph_cache_version()
+        if (self._last_build is not None and not self._changed.is_set() and graph_version == self._graph_version
+                and time.monotonic() - self._last_build < self.refresh_seconds):
+            return False
+        # 先记下版本号再重建，重建期间的写入会再触发一次；重建失败时等到下次全量重建再试
+        self._changed.clear()
+        self._graph_version = graph_version
+        self._last_build = time.monotonic()
+        # 其他进程或离线命令写入了更新的文件时直接加载
+        path = self.path
+        if path is not None and path.exists() and path.stat().st_mtime > self._loaded_mtime:
+            self.load()
+        self.refresh()
+        return True
+
+    def _run(self):
+        poll_seconds = min(getattr(settings, 'GRAPH_SNAPSHOT_POLL_SECONDS', 10), self.refresh_seconds)
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Failed to rebuild graph snapshot '{self.name}': {e}")
+            self._changed.wait(poll_seconds)
+
+    @staticmethod
+    def _digest(data: Any) -> str:
+        encoded = json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(encoded).hexdigest()
+
+
+def notify_graph_changed():
+    """图谱写入后调用（见 db_utils.write_to_neo4j），本进程已启动的快照立即重建"""
+    for snapshot in list(_running):
+        snapshot.notify()
+
+
+def warm_graph_snapshots(refresh: bool = False):
+    """
+    预热任务（见 KnowledgeBackend/warmup.py）：启动 GRAPH_SNAPSHOTS 中的快照；
+    磁盘上没有可用版本（或 refresh）时立即构建，不等后台线程
+    """
+    for path in getattr(settings, 'GRAPH_SNAPSHOTS', []):
+        snapshot = import_string(path)
+        snapshot.start()
+        if refresh or snapshot.version is None:
+            snapshot.refresh()
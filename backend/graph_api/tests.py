@@ -1,3 +1,377 @@
-from django.test import TestCase
+import json
+import random
+from collections import Counter
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from statistics.serializers import (
+    EmotionalTriggerSerializer, FraudFlowSerializer, FraudTypeDistributionSerializer, TacticFrequencySerializer,
+)
+
+from . import cypher_queries
+from .backends import GraphBackend, GraphBackendError, set_graph_backend
+from .backends.cypher import parse
+from .backends.memory import MemoryGraphBackend
+from .db_utils import write_to_neo4j
+from .keywords import KEYWORD_PATTERNS_CYPHER, KeywordAutomaton, KeywordSnapshot
+from .management.commands.dump_graph_fixture import NODES_CYPHER, RELATIONSHIPS_CYPHER
+from .services import invalidate_graph_payloads
+from .snapshots import notify_graph_changed
+
+DEMO_GRAPH = Path(__file__).resolve().parent / 'graph_fixtures' / 'demo_graph.json'
+
+
+class DemoGraphTestCase(SimpleTestCase):
+    """在示例图谱上执行项目中的查询，期望值直接由夹具文件计算"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.backend = MemoryGraphBackend(fixtures=[str(DEMO_GRAPH)])
+        with open(DEMO_GRAPH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        cls.nodes = {node['id']: node for node in data['nodes']}
+        cls.relationships = data['relationships']
+
+    def name(self, node_id):
+        return self.nodes[node_id]['properties'].get('name')
+
+    def has_label(self, node_id, label):
+        return label in self.nodes[node_id]['labels']
+
+    def edges(self, rel_type, start_label, end_label):
+        """夹具中指定类型、两端标签的关系 (起点 id, 终点 id)"""
+        return [(rel['start'], rel['end']) for rel in self.relationships
+                if rel['type'] == rel_type and self.has_label(rel['start'], start_label)
+                and self.has_label(rel['end'], end_label)]
+
+    def neighbours(self, node_id):
+        """无向邻居，每条关系一个"""
+        return [rel['end'] if rel['start'] == node_id else rel['start'] for rel in self.relationships
+                if node_id in (rel['start'], rel['end'])]
+
+    def assertRanking(self, rows, expected):
+        """rows 为 [{'name', 'value'}]，按 value 降序且与 expected 计数一致"""
+        values = [row['value'] for row in rows]
+        self.assertEqual(values, sorted(values, reverse=True))
+        self.assertEqual({row['name']: row['value'] for row in rows}, dict(expected))
+
+
+class GraphQueryTests(DemoGraphTestCase):
+    """graph_api.cypher_queries 中的查询"""
+
+    def test_initial_graph(self):
+        rows = self.backend.read(cypher_queries.GET_INITIAL_GRAPH_CYPHER)
+        self.assertEqual(len(rows), 50)
+        for row in rows:
+            start, rel_type, end = row['r']
+            self.assertIsInstance(rel_type, str)
+            self.assertIn(row['n'], (start, end))
+            self.assertIn(row['m'], (start, end))
+
+    def test_undirected_match_returns_both_directions(self):
+        rows = self.backend.read("MATCH (n)-[r]-(m) RETURN n, r, m")
+        self.assertEqual(len(rows), 2 * len(self.relationships))
+
+    def test_filtered_graph(self):
+        query = cypher_queries.build_filtered_graph_cypher('name', limit=None)
+        rows = self.backend.read(query, {'value': '杀猪盘'})
+        self.assertEqual(sorted(row['m'].get('name') or '' for row in rows),
+                         sorted(self.name(node_id) or '' for node_id in self.neighbours('p_pig')))
+        self.assertTrue(all(row['n']['name'] == '杀猪盘' for row in rows))
+
+    def test_filtered_graph_limit(self):
+        query = cypher_queries.build_filtered_graph_cypher('name', limit=2)
+        self.assertEqual(len(self.backend.read(query, {'value': '杀猪盘'})), 2)
+        query = cypher_queries.build_filtered_graph_cypher('name', limit=0)
+        self.assertEqual(self.backend.read(query, {'value': '杀猪盘'}), [])
+
+    def test_filtered_graph_template(self):
+        # 模板中的属性名是占位的 prop，示例图谱中没有这个属性；行尾 // 注释应被忽略
+        self.assertEqual(self.backend.read(cypher_queries.GET_FILTERED_GRAPH_CYPHER, {'value': '杀猪盘'}), [])
+
+    def test_filtered_graph_rejects_unknown_property(self):
+        with self.assertRaises(ValueError):
+            cypher_queries.build_filtered_graph_cypher('password')
+
+    def test_limit_clause(self):
+        self.assertEqual(cypher_queries.limit_clause(None), '')
+        self.assertEqual(cypher_queries.limit_clause(10), ' LIMIT 10')
+        for limit in (-1, '10', 1.5, True):
+            with self.assertRaises(ValueError):
+                cypher_queries.limit_clause(limit)
+
+    def test_node_detail(self):
+        rows = self.backend.read(cypher_queries.GET_NODE_DETAIL_CYPHER, {'node_id': '制造紧迫感'})
+        self.assertEqual(Counter(row['m'].get('name') for row in rows),
+                         Counter(self.name(node_id) for node_id in self.neighbours('t_urgent')))
+
+    def test_node_neighbourhood(self):
+        rows = self.backend.read(cypher_queries.build_node_neighborhood_cypher(limit=3), {'node_id': '制造紧迫感'})
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self.backend.read(cypher_queries.build_node_neighborhood_cypher(),
+                                           {'node_id': '不存在的节点'}), [])
+
+    def test_missing_parameter(self):
+        with self.assertRaises(GraphBackendError):
+            self.backend.read(cypher_queries.GET_NODE_DETAIL_CYPHER)
+
+    def test_user_queries_on_graph_without_users(self):
+        self.assertEqual(self.backend.read(cypher_queries.GET_USER_TRANSACTIONS_CYPHER, {'user_id': 'u1'}), [])
+        self.assertEqual(self.backend.read(cypher_queries.GET_SHARED_IDENTIFIER_USERS_CYPHER), [])
+        self.assertEqual(self.backend.read(cypher_queries.SHARED_IDENTIFIER_PAIRS_CYPHER), [])
+
+    def test_summary_matches_generic_queries(self):
+        # GraphBackend.summary() 通过 Cypher 统计，内存后端的实现直接读取索引，两者应一致
+        summary = self.backend.summary()
+        self.assertEqual(GraphBackend.summary(self.backend), summary)
+        self.assertEqual(summary['nodes'], len(self.nodes))
+        self.assertEqual(summary['relationships'], len(self.relationships))
+        self.assertEqual(summary['relationship_types'], dict(Counter(rel['type'] for rel in self.relationships)))
+
+    def test_dump_fixture_round_trip(self):
+        # dump_graph_fixture 导出的数据重新加载后与原图一致
+        data = {
+            'nodes': self.backend.read(NODES_CYPHER),
+            'relationships': self.backend.read(RELATIONSHIPS_CYPHER),
+        }
+        copy = MemoryGraphBackend(fixtures=[])
+        copy.load_data(data)
+        self.assertEqual(copy.summary(), self.backend.summary())
+        query = "MATCH (a)-[r]->(b) RETURN a.name AS a, type(r) AS type, b.name AS b"
+        self.assertEqual(Counter(tuple(row.values()) for row in copy.read(query)),
+                         Counter(tuple(row.values()) for row in self.backend.read(query)))
+
+
+class StatisticsQueryTests(DemoGraphTestCase):
+    """statistics.serializers 中的查询"""
+
+    def test_fraud_type_distribution(self):
+        expected = Counter(self.name(pattern) for _, pattern in self.edges('IS_A', 'FraudCase', 'FraudPattern'))
+        self.assertRanking(self.backend.read(FraudTypeDistributionSerializer.query), expected)
+
+    def test_tactic_frequency(self):
+        expected = Counter(self.name(tactic) for _, tactic in self.edges('INVOLVES', 'FraudCase', 'Tactic'))
+        self.assertRanking(self.backend.read(TacticFrequencySerializer.query), expected)
+
+    def test_emotional_triggers(self):
+        expected = Counter(self.name(trigger) for _, trigger in
+                           self.edges('EXPLOITS', 'Tactic', 'PsychologicalTrigger'))
+        self.assertRanking(self.backend.read(EmotionalTriggerSerializer.query), expected)
+
+    def test_fraud_flow(self):
+        expected = Counter()
+        channels = self.edges('CONDUCTED_VIA', 'FraudCase', 'Channel')
+        patterns = self.edges('IS_A', 'FraudCase', 'FraudPattern')
+        tactics = self.edges('INVOLVES', 'FraudCase', 'Tactic')
+        for case, channel in channels:
+            for pattern in (p for c, p in patterns if c == case):
+                for tactic in (t for c, t in tactics if c == case):
+                    expected[(self.name(channel), self.name(pattern), self.name(tactic))] += 1
+
+        rows = self.backend.read(FraudFlowSerializer.query)
+        values = [row['value'] for row in rows]
+        self.assertEqual(values, sorted(values, reverse=True))
+        self.assertEqual({(row['channel'], row['pattern'], row['tactic']): row['value'] for row in rows},
+                         dict(expected))
+
+
+class CypherTests(DemoGraphTestCase):
+    """解析器与执行器的通用行为"""
+
+    def test_parse_is_cached(self):
+        self.assertIs(parse(cypher_queries.GET_INITIAL_GRAPH_CYPHER), parse(cypher_queries.GET_INITIAL_GRAPH_CYPHER))
+
+    def test_unsupported_syntax(self):
+        for query in ("MATCH (n) RETURN n UNION MATCH (m) RETURN m", "MATCH (n) RETURN n ORDER BY",
+                      "MATCH (n RETURN n"):
+            with self.assertRaises(GraphBackendError, msg=query):
+                self.backend.read(query)
+
+    def test_read_rejects_writes(self):
+        self.assertTrue(parse("CREATE (n:Device)").writes)
+        with self.assertRaises(GraphBackendError):
+            self.backend.read("CREATE (n:Device)")
+
+    def test_expressions(self):
+        rows = self.backend.read(
+            "RETURN 7 / 2 AS d, 7.0 / 2 AS f, 1 + 2 * 3 AS x, 'a' + 'b' AS s, [1, 2][1] AS i, "
+            "coalesce(null, 5) AS c, toLower('ABC') AS lower, size([1, 2, 3]) AS n")
+        self.assertEqual(rows, [{'d': 3, 'f': 3.5, 'x': 7, 's': 'ab', 'i': 2, 'c': 5, 'lower': 'abc', 'n': 3}])
+
+    def test_where_order_skip_limit(self):
+        names = sorted(node['properties']['name'] for node in self.nodes.values()
+                       if 'FraudPattern' in node['labels'])
+        rows = self.backend.read("MATCH (p:FraudPattern) RETURN p.name AS name ORDER BY name SKIP 1 LIMIT 2")
+        self.assertEqual([row['name'] for row in rows], names[1:3])
+
+        rows = self.backend.read("MATCH (p:FraudPattern) WHERE p.name IN $names AND NOT p.name STARTS WITH '杀' "
+                                 "RETURN p.name AS name", {'names': names})
+        self.assertEqual(sorted(row['name'] for row in rows), [name for name in names if not name.startswith('杀')])
+
+    def test_optional_match_and_distinct(self):
+        rows = self.backend.read(
+            "MATCH (k:Keyword {term: '退款'}) OPTIONAL MATCH (k)-[:NOT_A_TYPE]->(x) RETURN k.term AS term, x")
+        self.assertEqual(rows, [{'term': '退款', 'x': None}])
+        rows = self.backend.read("MATCH (:FraudCase)-[:IS_A]->(p:FraudPattern) RETURN DISTINCT p.name AS name")
+        self.assertEqual(len(rows), len({pattern for _, pattern in self.edges('IS_A', 'FraudCase', 'FraudPattern')}))
+
+
+class GraphWriteTests(SimpleTestCase):
+    """写查询与共享标识查询，使用空的内存图谱"""
+
+    def setUp(self):
+        self.backend = MemoryGraphBackend(fixtures=[])
+        # u1、u2 共用设备和 IP，u2、u3 共用同一 IP
+        self.backend.write(
+            "CREATE (u1:User {user_id: 'u1'}), (u2:User {user_id: 'u2'}), (u3:User {user_id: 'u3'}), "
+            "(d:Device {device_id: 'd1'}), (ip:IP {ip_address: '10.0.0.1'}), "
+            "(u1)-[:USED_DEVICE]->(d), (u2)-[:USED_DEVICE]->(d), "
+            "(u1)-[:USED_IP]->(ip), (u2)-[:USED_IP]->(ip), (u3)-[:USED_IP]->(ip)")
+
+    def test_shared_identifier_pairs(self):
+        rows = self.backend.read(cypher_queries.SHARED_IDENTIFIER_PAIRS_CYPHER)
+        self.assertEqual({frozenset((row['user1'], row['user2'])): row['shared'] for row in rows}, {
+            frozenset(('u1', 'u2')): 2,
+            frozenset(('u1', 'u3')): 1,
+            frozenset(('u2', 'u3')): 1,
+        })
+
+    def test_shared_identifier_users(self):
+        rows = self.backend.read(cypher_queries.GET_SHARED_IDENTIFIER_USERS_CYPHER)
+        self.assertEqual(len(rows), 4)
+
+    def test_filtered_graph_by_ip(self):
+        query = cypher_queries.build_filtered_graph_cypher('ip_address')
+        rows = self.backend.read(query, {'value': '10.0.0.1'})
+        self.assertEqual(sorted(row['m']['user_id'] for row in rows), ['u1', 'u2', 'u3'])
+
+    def test_merge_and_delete_counters(self):
+        created = self.backend.write("MERGE (d:Device {device_id: 'd2'}) ON CREATE SET d.new = true")
+        self.assertEqual(created['counters'].get('nodes_created'), 1)
+        matched = self.backend.write("MERGE (d:Device {device_id: 'd2'}) ON MATCH SET d.new = false RETURN d")
+        self.assertNotIn('nodes_created', matched['counters'])
+        self.assertEqual(matched['records'], [{'d': {'device_id': 'd2', 'new': False}}])
+
+        with self.assertRaises(GraphBackendError):
+            # 仍有关系的节点不能直接删除
+            self.backend.write("MATCH (d:Device {device_id: 'd1'}) DELETE d")
+        deleted = self.backend.write("MATCH (d:Device) DETACH DELETE d")
+        self.assertEqual(deleted['counters'], {'nodes_deleted': 2, 'relationships_deleted': 2})
+        self.assertEqual(self.backend.read("MATCH (d:Device) RETURN d"), [])
+
+
+class KeywordAutomatonTests(SimpleTestCase):
+    """graph_api.keywords 中的 Aho-Corasick 自动机"""
+
+    @staticmethod
+    def brute_force(terms, text):
+        folded = text.lower()
+        return sorted((start, start + len(term), index) for index, term in enumerate(terms)
+                      for start in range(len(text)) if folded.startswith(term.lower(), start))
+
+    def test_overlapping_terms(self):
+        automaton = KeywordAutomaton({'he': [], 'she': [], 'his': [], 'hers': []})
+        found = {(start, end, automaton.terms[index]) for start, end, index in automaton.find('ushers')}
+        self.assertEqual(found, {(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')})
+
+    def test_matches_brute_force(self):
+        terms = ['安全账户', '账户', '退款', '退款退款', 'ab', 'abab', 'bab', 'b']
+        automaton = KeywordAutomaton({term: [] for term in terms})
+        rng = random.Random(0)
+        alphabet = 'abAB安全账户退款'
+        for _ in range(200):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            self.assertEqual(sorted(automaton.find(text)), self.brute_force(automaton.terms, text), text)
+
+    def test_case_folding_keeps_positions(self):
+        automaton = KeywordAutomaton({'ETC': ['网络钓鱼']})
+        text = '您的etc认证已失效，ETC 请点击'
+        self.assertEqual([(start, end) for start, end, _ in automaton.find(text)], [(2, 5), (11, 14)])
+        self.assertEqual(text[2:5], 'etc')
+
+    def test_empty_terms_are_skipped(self):
+        automaton = KeywordAutomaton({'': ['x'], '退款': ['仿冒电商客服']})
+        self.assertEqual(len(automaton), 1)
+        self.assertEqual(automaton.find(''), [])
+
+    def test_annotate(self):
+        automaton = KeywordAutomaton({'安全账户': ['冒充公检法'], '逮捕令': ['冒充公检法'], '退款': ['仿冒电商客服']})
+        result = automaton.annotate('他出示了逮捕令，要求把钱转到安全账户')
+        self.assertEqual([match['term'] for match in result['matches']], ['逮捕令', '安全账户'])
+        self.assertEqual(result['matches'][0], {'term': '逮捕令', 'start': 4, 'end': 7, 'patterns': ['冒充公检法']})
+        self.assertEqual(result['patterns'], {'冒充公检法': 2})
+
+
+class KeywordSnapshotTests(DemoGraphTestCase):
+    """关键词快照从示例图谱构建：关联的诈骗类型包括直接相连的和经由 FraudCase 的"""
+
+    def expected_patterns(self):
+        expected = {}
+        for node_id, node in self.nodes.items():
+            if 'Keyword' not in node['labels']:
+                continue
+            patterns = set()
+            for neighbour in self.neighbours(node_id):
+                if self.has_label(neighbour, 'FraudPattern'):
+                    patterns.add(self.name(neighbour))
+                elif self.has_label(neighbour, 'FraudCase'):
+                    patterns.update(self.name(pattern) for case, pattern in
+                                    self.edges('IS_A', 'FraudCase', 'FraudPattern') if case == neighbour)
+            expected[node['properties']['term']] = sorted(patterns)
+        return expected
+
+    def test_keyword_patterns_query(self):
+        rows = self.backend.read(KEYWORD_PATTERNS_CYPHER)
+        self.assertEqual({row['term']: sorted(set(row['patterns'])) for row in rows}, self.expected_patterns())
+
+    def test_build_and_annotate(self):
+        previous = set_graph_backend(self.backend)
+        try:
+            snapshot = KeywordSnapshot()
+            data = snapshot.build()
+        finally:
+            set_graph_backend(previous)
+        expected = self.expected_patterns()
+        self.assertEqual(data, [{'term': term, 'patterns': expected[term]} for term in sorted(expected)])
+
+        result = snapshot.compile(data).annotate('对方说账户涉嫌洗钱，出示逮捕令后让我转到安全账户')
+        self.assertEqual([match['term'] for match in result['matches']], ['逮捕令', '安全账户'])
+        self.assertEqual(result['patterns'], Counter(expected['逮捕令'] + expected['安全账户']))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class GraphSnapshotRefreshTests(SimpleTestCase):
+    """图谱写入后快照立即重建，不等全量重建间隔"""
+
+    def setUp(self):
+        self.previous = set_graph_backend(MemoryGraphBackend(fixtures=[]))
+        write_to_neo4j("CREATE (:Keyword {term: '安全账户'})-[:RELATED_TO]->(:FraudPattern {name: '冒充公检法'})")
+        self.snapshot = KeywordSnapshot(refresh_seconds=600, directory='')
+        self.assertTrue(self.snapshot.check())
+
+    def tearDown(self):
+        set_graph_backend(self.previous)
+
+    def test_no_rebuild_without_changes(self):
+        self.assertFalse(self.snapshot.check())
+
+    def test_rebuild_after_local_write(self):
+        # 本进程已启动的快照收到写入通知；不启动后台线程，由测试调用 check()
+        with mock.patch('graph_api.snapshots.threading.Thread'):
+            self.snapshot.start()
+        write_to_neo4j("MATCH (p:FraudPattern) CREATE (:Keyword {term: '逮捕令'})-[:RELATED_TO]->(p)")
+        self.assertTrue(self.snapshot._changed.is_set())
+        self.assertTrue(self.snapshot.check())
+        self.assertEqual(self.snapshot.get().annotate('逮捕令')['patterns'], {'冒充公检法': 1})
+
+        notify_graph_changed()
+        self.assertTrue(self.snapshot.check())
+
+    def test_rebuild_after_version_change(self):
+        # 其他进程的写入只更换共享缓存中的版本号
+        invalidate_graph_payloads()
+        self.assertTrue(self.snapshot.check())
+        self.assertFalse(self.snapshot.check())
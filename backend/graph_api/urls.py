@@ -15,4 +15,6 @@ urlpatterns = [
     path('initial/', views.InitialGraphView.as_view(), name='initial-graph'),
     path('filtered/', views.FilteredGraphView.as_view(), name='filtered-graph'),
     path('nodes/<str:node_id>/', views.NodeDetailView.as_view(), name='node-detail'),
+    path('export/', views.GraphExportView.as_view(), name='graph-export'),
+    path('keywords/match/', views.KeywordMatchView.as_view(), name='keyword-match'),
 ]
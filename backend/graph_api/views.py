@@ -2,14 +2,21 @@ from django.shortcuts import render
 
 # Create your views here.
 import logging
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from neo4j.exceptions import ServiceUnavailable, CypherSyntaxError, Neo4jError
+from rest_framework.permissions import IsAdminUser
+
+from statistics.achievements import EVENT_GRAPH_EXPLORE, record_event
 
 from . import db_utils
 from . import serializers
 from . import cypher_queries
+from . import exporters
+from . import keywords
+from . import services
+from .backends import GraphBackendError
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +31,16 @@ class BaseGraphAPIView(APIView):
         自定义异常处理，捕获特定的 Neo4j 异常。
         [1]
         """
+        if isinstance(exc, GraphBackendError):
+            logger.error(f"Graph backend error: {exc}")
+            return Response(
+                {"error": "处理请求时发生内部错误（查询语法）。"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # 仅在出错时才需要异常类型，按需导入以免启动时加载 neo4j 驱动
+        from neo4j.exceptions import ServiceUnavailable, CypherSyntaxError, Neo4jError
+
         if isinstance(exc, ServiceUnavailable):
             logger.error(f"Neo4j Service Unavailable: {exc}")
             return Response(
@@ -58,13 +75,10 @@ class InitialGraphView(BaseGraphAPIView):
         """
         try:
             logger.info("Fetching initial graph data...")
-            results = db_utils.read_from_neo4j(cypher_queries.GET_INITIAL_GRAPH_CYPHER)
-            # print("下面是结果\n")
-            # print(results)
-            # print("上面是结果\n")
-            serializer = serializers.EchartsGraphSerializer(instance=results)
+            # 所有访客相同，读取缓存（启动时预热，见 services.get_initial_graph）
+            data = services.get_initial_graph()
             logger.info("Initial graph data fetched and serialized successfully.")
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(data, status=status.HTTP_200_OK)
         except Exception as e:
             # 异常将由 BaseGraphAPIView 的 handle_exception 处理
             # 但我们可以在这里记录特定于此视图的上下文
@@ -94,9 +108,7 @@ class FilteredGraphView(BaseGraphAPIView):
             # return Response({"error": "缺少过滤参数 'filter_prop' 和 'filter_value'"}, status=status.HTTP_400_BAD_REQUEST)
             # 或者，作为备选方案，返回初始图：
             try:
-                results = db_utils.read_from_neo4j(cypher_queries.GET_INITIAL_GRAPH_CYPHER)
-                serializer = serializers.EchartsGraphSerializer(instance=results)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                return Response(services.get_initial_graph(), status=status.HTTP_200_OK)
             except Exception as e:
                 logger.exception("Error fetching initial graph data as fallback in FilteredGraphView.")
                 raise e
@@ -113,21 +125,12 @@ class FilteredGraphView(BaseGraphAPIView):
         # query = cypher_queries.GET_FILTERED_GRAPH_CYPHER
 
         # --- 更灵活但需要谨慎处理的动态属性过滤示例 ---
-        # 警告：直接使用 filter_prop 构建查询字符串部分可能不安全，需要验证！
-        # 更好的方法是有一个允许过滤的属性白名单。
-        allowed_filter_props = ['name', 'user_id', 'ip_address']  # 示例白名单
-        if filter_prop not in allowed_filter_props:
-            return Response({"error": f"不允许按属性 '{filter_prop}' 过滤"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 动态构建查询（仍然很简单，仅匹配一个属性）
-        # 注意 $prop 不能直接用作属性键，需要拼接字符串或使用 apoc 过程
-        # 这里采用拼接方式，但再次强调，输入验证至关重要！
-        # 更安全的做法是为每个允许的属性准备一个查询模板。
-        # 为了演示，我们使用一个稍微修改的查询概念（假设属性名已知）
-        # 假设我们有一个查询模板字典
-        query_template = f"MATCH (n {{{filter_prop}: $value}})-[r]-(m) RETURN n, r, m LIMIT 50"
+        # 属性名通过白名单校验后拼接进查询，值始终使用参数传递
+        try:
+            query = cypher_queries.build_filtered_graph_cypher(filter_prop)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         params = {'value': filter_value}
-        query = query_template  # 在实际应用中，应从 cypher_queries.py 获取或构建
         logger.info(f"Fetching filtered graph data with query: {query} and params: {params}")
         # --- 结束动态过滤示例 ---
 
@@ -162,10 +165,75 @@ class NodeDetailView(BaseGraphAPIView):
                 logger.warning(f"Node not found for node_id: {node_id}")
                 return Response({"error": "未找到指定节点"}, status=status.HTTP_404_NOT_FOUND)
 
+            # 登录用户查看节点详情计入图谱浏览成就（异步落库），同一节点只计一次
+            if request.user.is_authenticated:
+                record_event(request.user.pk, EVENT_GRAPH_EXPLORE, {'node_id': node_id}, dedup_key=node_id)
+
             # NodeDetailSerializer 期望接收记录列表
             serializer = serializers.NodeDetailSerializer(instance=results)
             logger.info(f"Node details for {node_id} fetched and serialized successfully.")
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:
             logger.exception(f"Error fetching node details for node_id: {node_id}")
-            raise e
\ No newline at end of file
+            raise e
+
+
+class GraphExportView(BaseGraphAPIView):
+    """
+    API 端点：流式导出过滤后的子图（CSV / Parquet）。
+    过滤参数与 FilteredGraphView 相同，另外支持：
+    - export_format: csv（默认）或 parquet
+    - limit: 可选的最大行数，缺省时导出全部匹配结果
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        filter_prop = request.query_params.get('filter_prop', None)
+        filter_value = request.query_params.get('filter_value', None)
+        export_format = request.query_params.get('export_format', 'csv')
+        limit = request.query_params.get('limit', None)
+
+        if not filter_prop or filter_value is None:
+            return Response({"error": "缺少过滤参数 'filter_prop' 和 'filter_value'"}, status=status.HTTP_400_BAD_REQUEST)
+        if export_format not in exporters.EXPORT_FORMATS:
+            return Response({"error": f"不支持的导出格式 '{export_format}'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(limit) if limit else None
+        except ValueError:
+            return Response({"error": "limit 必须是非负整数"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            query = cypher_queries.build_filtered_graph_cypher(filter_prop, limit=limit)
+            rows = exporters.prime_rows(
+                exporters.graph_record_to_row(record)
+                for record in db_utils.stream_from_neo4j(query, params={'value': filter_value})
+            )
+            response = exporters.streaming_export_response(
+                request, rows, exporters.GRAPH_EXPORT_COLUMNS, export_format, filename='graph_export'
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Streaming graph export: {filter_prop}={filter_value}, format={export_format}, limit={limit}")
+        return response
+
+
+class KeywordMatchView(BaseGraphAPIView):
+    """
+    API 端点：用图谱关键词标注一段文本。
+    请求体 {"text": "..."}，返回命中的关键词（位置与关联的诈骗类型）及各诈骗类型的命中次数。
+    匹配使用内存中的 Aho-Corasick 自动机（见 keywords.py），不访问 Neo4j。
+    """
+
+    def post(self, request, format=None):
+        text = request.data.get('text')
+        if not isinstance(text, str):
+            return Response({"error": "缺少文本参数 'text'"}, status=status.HTTP_400_BAD_REQUEST)
+        max_chars = getattr(settings, 'KEYWORD_MATCH_MAX_CHARS', 20000)
+        if len(text) > max_chars:
+            return Response({"error": f"文本长度不能超过 {max_chars} 个字符"}, status=status.HTTP_400_BAD_REQUEST)
+
+        annotation = keywords.annotate_text(text)
+        if annotation is None:
+            return Response({"error": "关键词索引尚未构建，请稍后重试。"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        annotation['version'] = keywords.keyword_matcher.version
+        return Response(annotation, status=status.HTTP_200_OK)
@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import job_handlers
+from jobs.worker import WorkerPool
+
+
+class Command(BaseCommand):
+    help = "启动后台任务工作线程池，执行 Job 表中排队的任务（收到 SIGTERM / SIGINT 后等待执行中的任务结束再退出）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="工作线程数，缺省为 JOB_WORKERS")
+        parser.add_argument('--kinds', default='', help="只执行这些类型的任务（逗号分隔），缺省时执行全部")
+        parser.add_argument('--once', action='store_true', help="队列中没有可执行的任务时退出")
+
+    def handle(self, *args, **options):
+        kinds = [kind for kind in options['kinds'].split(',') if kind]
+        unknown = set(kinds) - set(job_handlers())
+        if unknown:
+            raise CommandError(f"Unknown job kind(s): {', '.join(sorted(unknown))}")
+
+        pool = WorkerPool(workers=options['workers'], kinds=kinds, exit_when_idle=options['once'])
+
+        def shutdown(signum, frame):
+            self.stderr.write("Stopping after the running jobs finish...")
+            pool.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        pool.run()
+        self.stdout.write(self.style.SUCCESS(f"Processed {pool.processed} jobs"))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='任务类型')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='参数')),
+                ('priority', models.IntegerField(default=0, verbose_name='优先级')),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '执行中'), ('succeeded', '已完成'), ('failed', '失败'), ('cancelled', '已取消')], default='pending', max_length=16, verbose_name='状态')),
+                ('dedup_key', models.CharField(db_index=True, max_length=40, verbose_name='去重键')),
+                ('pending_key', models.CharField(blank=True, max_length=40, null=True, unique=True, verbose_name='排队去重键')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='已执行次数')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='最多执行次数')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='最早执行时间')),
+                ('progress', models.FloatField(default=0, verbose_name='进度')),
+                ('progress_message', models.CharField(blank=True, default='', max_length=255, verbose_name='进度说明')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='请求取消')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='结果')),
+                ('error', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('worker', models.CharField(blank=True, default='', max_length=100, verbose_name='执行者')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='心跳时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='创建者')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'indexes': [models.Index(fields=['status', 'priority', 'run_after'], name='jobs_job_status_00b708_idx'), models.Index(fields=['kind', 'created_at'], name='jobs_job_kind_fbc839_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+User = get_user_model()
+
+# 优先级：数值越大越先执行
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
+
+class Job(models.Model):
+    """后台任务（见 queue.py），由 run_jobs 命令启动的工作线程执行"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '排队中'),
+        (STATUS_RUNNING, '执行中'),
+        (STATUS_SUCCEEDED, '已完成'),
+        (STATUS_FAILED, '失败'),
+        (STATUS_CANCELLED, '已取消'),
+    ]
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+    kind = models.CharField(max_length=50, verbose_name="任务类型")
+    params = models.JSONField(default=dict, blank=True, verbose_name="参数")
+    priority = models.IntegerField(default=PRIORITY_NORMAL, verbose_name="优先级")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="状态")
+    # 类型与参数的摘要；排队中的任务另存在唯一的 pending_key 中，相同的排队任务只保留一个
+    # （MySQL 不支持条件唯一索引，非排队状态置为 NULL，唯一索引允许多个 NULL）
+    dedup_key = models.CharField(max_length=40, db_index=True, verbose_name="去重键")
+    pending_key = models.CharField(max_length=40, null=True, blank=True, unique=True, verbose_name="排队去重键")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="已执行次数")
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name="最多执行次数")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="最早执行时间")
+    progress = models.FloatField(default=0, verbose_name="进度")
+    progress_message = models.CharField(max_length=255, blank=True, default='', verbose_name="进度说明")
+    cancel_requested = models.BooleanField(default=False, verbose_name="请求取消")
+    result = models.JSONField(null=True, blank=True, verbose_name="结果")
+    error = models.TextField(blank=True, default='', verbose_name="错误信息")
+    worker = models.CharField(max_length=100, blank=True, default='', verbose_name="执行者")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name="jobs", verbose_name="创建者")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="创建时间")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="心跳时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="结束时间")
+
+    class Meta:
+        verbose_name = "后台任务"
+        verbose_name_plural = "后台任务"
+        indexes = [
+            # 取任务：按状态过滤，按优先级和时间排序
+            models.Index(fields=['status', 'priority', 'run_after']),
+            models.Index(fields=['kind', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
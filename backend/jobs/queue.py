@@ -0,0 +1,261 @@
+"""
+后台任务队列。
+
+耗时的预计算（统计刷新、图谱快照、导出、团伙识别、头像处理等）不在请求处理中执行，
+而是写入 Job 表，由 python manage.py run_jobs 启动的工作线程池执行（见 worker.py）：
+- 任务类型在 JOB_HANDLERS 中注册（类型 -> 处理函数），处理函数接收 JobContext，返回可 JSON 序列化的结果
+  （不能序列化时任务记为失败）
+- 优先级高的先执行，同优先级按最早执行时间与创建顺序
+- 去重：类型和参数都相同的任务只会有一个在排队，重复提交返回已有的任务（并取较高的优先级）
+- 多个工作进程用 SELECT ... FOR UPDATE SKIP LOCKED 取任务，每个任务只会被一个线程执行
+- 失败后按指数退避重试，最多执行 max_attempts 次（处理函数抛出 JobFailed 时不重试）；执行中的任务定期写入心跳，
+  工作进程异常退出后心跳超过 JOB_STALE_SECONDS 的任务重新排队
+- 处理函数通过 JobContext.progress() 报告进度，同时检查取消请求
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import PRIORITY_NORMAL, Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """任务被请求取消，由 JobContext.progress() 抛出"""
+
+
+class JobFailed(Exception):
+    """参数错误等重试也不会成功的失败，处理函数抛出后任务直接记为失败"""
+
+
+def job_handlers() -> Dict[str, str]:
+    return dict(getattr(settings, 'JOB_HANDLERS', {}))
+
+
+def get_handler(kind: str) -> Callable[['JobContext'], Any]:
+    path = job_handlers().get(kind)
+    if path is None:
+        raise ValueError(f"未知的任务类型 '{kind}'，可选：{', '.join(job_handlers())}")
+    return import_string(path)
+
+
+def dedup_key(kind: str, params: Dict[str, Any]) -> str:
+    encoded = json.dumps([kind, params], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def enqueue(kind: str, params: Optional[Dict[str, Any]] = None, priority: int = PRIORITY_NORMAL,
+            max_attempts: Optional[int] = None, delay_seconds: float = 0, created_by=None) -> Tuple[Job, bool]:
+    """
+    提交任务，返回 (任务, 是否新建)。已有相同类型和参数的任务在排队时不新建，返回已有的任务。
+    类型未注册或参数不能 JSON 序列化时抛出 ValueError。
+    """
+    if kind not in job_handlers():
+        raise ValueError(f"未知的任务类型 '{kind}'，可选：{', '.join(job_handlers())}")
+    params = params or {}
+    try:
+        key = dedup_key(kind, params)
+    except TypeError as e:
+        raise ValueError(f"任务参数必须可以 JSON 序列化：{e}")
+
+    job = Job(
+        kind=kind,
+        params=params,
+        priority=priority,
+        dedup_key=key,
+        pending_key=key,
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 3),
+        run_after=timezone.now() + timedelta(seconds=delay_seconds),
+        created_by=created_by,
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        existing = Job.objects.filter(pending_key=key).first()
+        if existing is None:
+            # 已有的任务恰好在这期间被取走，重新提交
+            return enqueue(kind, params, priority, max_attempts, delay_seconds, created_by)
+        if priority > existing.priority:
+            Job.objects.filter(pk=existing.pk, status=Job.STATUS_PENDING).update(priority=priority)
+            existing.priority = priority
+        logger.info(f"Job {kind} deduplicated into pending job #{existing.pk}.")
+        return existing, False
+    logger.info(f"Enqueued job #{job.pk} {kind} (priority {priority}).")
+    return job, True
+
+
+def claim(worker: str, kinds: Optional[Iterable[str]] = None) -> Optional[Job]:
+    """取出一个可执行的任务并标记为执行中；没有可执行的任务时返回 None"""
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.STATUS_PENDING, run_after__lte=now)
+        if kinds is not None:
+            queryset = queryset.filter(kind__in=list(kinds))
+        job = queryset.order_by('-priority', 'run_after', 'id').first()
+        if job is None:
+            return None
+        job.status = Job.STATUS_RUNNING
+        job.pending_key = None
+        job.attempts += 1
+        job.worker = worker
+        job.started_at = job.heartbeat_at = now
+        job.error = ''
+        job.save(update_fields=['status', 'pending_key', 'attempts', 'worker', 'started_at', 'heartbeat_at', 'error'])
+    return job
+
+
+def _transition(job: Job, conditions: Optional[Dict[str, Any]] = None, **fields) -> bool:
+    """
+    以条件更新改变本次执行的状态：只有任务仍处于执行中且执行次数未变（没有被重新排队后再次取走）
+    时才更新，并同步到 job 对象，返回是否更新。多个维护线程或工作线程同时处理同一任务时只有一个生效
+    """
+    updated = Job.objects.filter(
+        pk=job.pk, status=Job.STATUS_RUNNING, attempts=job.attempts, **(conditions or {})
+    ).update(**fields)
+    if updated:
+        for name, value in fields.items():
+            setattr(job, name, value)
+    return bool(updated)
+
+
+def _finish(job: Job, status: str, conditions: Optional[Dict[str, Any]] = None, **fields) -> bool:
+    return _transition(job, conditions, status=status, finished_at=timezone.now(), **fields)
+
+
+def _requeue(job: Job, error: str, delay_seconds: float, conditions: Optional[Dict[str, Any]] = None) -> bool:
+    """重新排队；已有相同的任务在排队时放弃本次重试，返回是否重新排队"""
+    try:
+        with transaction.atomic():
+            return _transition(
+                job, conditions,
+                status=Job.STATUS_PENDING,
+                pending_key=job.dedup_key,
+                run_after=timezone.now() + timedelta(seconds=delay_seconds),
+                error=error,
+                worker='',
+            )
+    except IntegrityError:
+        _finish(job, Job.STATUS_CANCELLED, conditions, pending_key=None,
+                error=f"{error}\n相同的任务已在排队，不再重试")
+        return False
+
+
+def run_job(job: Job) -> Job:
+    """执行一个已取出的任务，根据结果更新状态"""
+    context = JobContext(job)
+    start = time.monotonic()
+    try:
+        result = get_handler(job.kind)(context)
+        # 结果写入 JSONField，不能序列化时在这里记为失败（重试也不会成功），而不是在保存时抛出，
+        # 让任务停留在执行中直到心跳超时
+        try:
+            json.dumps(result)
+        except (TypeError, ValueError) as e:
+            raise JobFailed(f"任务结果不能 JSON 序列化：{e}")
+    except JobCancelled:
+        if _finish(job, Job.STATUS_CANCELLED):
+            logger.info(f"Job #{job.pk} {job.kind} cancelled.")
+    except JobFailed as e:
+        if _finish(job, Job.STATUS_FAILED, error=str(e)):
+            logger.error(f"Job #{job.pk} {job.kind} failed: {e}")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if job.attempts < job.max_attempts:
+            backoff = getattr(settings, 'JOB_RETRY_BACKOFF_SECONDS', 30) * 2 ** (job.attempts - 1)
+            if _requeue(job, error, backoff):
+                logger.warning(f"Job #{job.pk} {job.kind} failed (attempt {job.attempts}/{job.max_attempts}), "
+                               f"retrying in {backoff}s: {error}")
+        elif _finish(job, Job.STATUS_FAILED, error=error):
+            logger.error(f"Job #{job.pk} {job.kind} failed after {job.attempts} attempts: {error}")
+    else:
+        if _finish(job, Job.STATUS_SUCCEEDED, result=result, progress=100):
+            logger.info(f"Job #{job.pk} {job.kind} succeeded in {time.monotonic() - start:.1f}s.")
+    if job.status == Job.STATUS_RUNNING:
+        # 执行期间心跳超时，任务已被重新排队（可能已由其他线程执行），本次结果丢弃
+        logger.warning(f"Job #{job.pk} {job.kind} was requeued while running; discarding this run's outcome.")
+    return job
+
+
+def cancel(job: Job) -> bool:
+    """取消任务：排队中的直接取消，执行中的设置取消请求（处理函数下次报告进度时停止）"""
+    if job.status == Job.STATUS_PENDING:
+        updated = Job.objects.filter(pk=job.pk, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_CANCELLED, pending_key=None, finished_at=timezone.now())
+        if updated:
+            return True
+        job.refresh_from_db()
+    if job.status == Job.STATUS_RUNNING:
+        Job.objects.filter(pk=job.pk).update(cancel_requested=True)
+        return True
+    return False
+
+
+def heartbeat(job_ids: Iterable[int]):
+    job_ids = list(job_ids)
+    if job_ids:
+        Job.objects.filter(pk__in=job_ids, status=Job.STATUS_RUNNING).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs() -> int:
+    """心跳超时（工作进程异常退出）的执行中任务重新排队，次数用完的记为失败"""
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_STALE_SECONDS', 300))
+    # 条件中再次检查心跳：读取后任务可能已恢复心跳、结束，或已被其他进程的维护线程处理
+    stale = {'heartbeat_at__lt': stale_before}
+    requeued = 0
+    for job in Job.objects.filter(status=Job.STATUS_RUNNING, heartbeat_at__lt=stale_before):
+        error = f"Worker {job.worker} stopped responding"
+        if job.attempts < job.max_attempts:
+            requeued += _requeue(job, error, 0, stale)
+        else:
+            _finish(job, Job.STATUS_FAILED, stale, error=error)
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale jobs.")
+    return requeued
+
+
+def output_dir() -> Path:
+    return Path(getattr(settings, 'JOB_OUTPUT_DIR'))
+
+
+class JobContext:
+    """传给处理函数：任务参数、进度报告，以及结果文件的存放位置"""
+
+    # 两次写入进度的最短间隔（秒）
+    progress_interval = 1.0
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.params: Dict[str, Any] = dict(job.params or {})
+        self._last_report = 0.0
+
+    def progress(self, percent: float, message: str = '', force: bool = False):
+        """报告进度（0-100）；任务已被请求取消或本次执行已被重新排队时抛出 JobCancelled"""
+        now = time.monotonic()
+        if not force and now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        percent = max(0.0, min(100.0, float(percent)))
+        updated = Job.objects.filter(pk=self.job.pk, status=Job.STATUS_RUNNING, attempts=self.job.attempts).update(
+            progress=percent, progress_message=message[:255], heartbeat_at=timezone.now())
+        self.job.progress, self.job.progress_message = percent, message[:255]
+        # 本次执行已被重新排队（心跳超时）时同样停止，任务由其他线程重新执行
+        if not updated or Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            raise JobCancelled()
+
+    def output_path(self, filename: str) -> Path:
+        """任务结果文件的路径（JOB_OUTPUT_DIR 下，以任务 id 为前缀）；结果中的 'file' 指向该文件时可以通过接口下载"""
+        directory = output_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f'{self.job.pk}-{filename}'
@@ -0,0 +1,15 @@
+from rest_framework import serializers
+
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """任务状态"""
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'priority', 'status', 'progress', 'progress_message',
+            'attempts', 'max_attempts', 'result', 'error', 'created_at', 'run_after', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,211 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+
+from . import queue
+from .models import PRIORITY_HIGH, PRIORITY_LOW, Job
+from .queue import JobContext, JobFailed
+
+HANDLERS = {'test.a': 'jobs.tests.handler', 'test.b': 'jobs.tests.handler'}
+
+
+def handler(job):
+    return {'ok': True}
+
+
+def run_with(job, result=None, error=None):
+    """用给定的结果或异常代替处理函数执行任务"""
+    def fake(context):
+        if error is not None:
+            raise error
+        return result
+
+    with mock.patch('jobs.queue.get_handler', return_value=fake):
+        return queue.run_job(job)
+
+
+@override_settings(JOB_HANDLERS=HANDLERS, JOB_MAX_ATTEMPTS=3, JOB_RETRY_BACKOFF_SECONDS=10, JOB_STALE_SECONDS=300)
+class JobQueueTests(TestCase):
+
+    def test_enqueue_deduplicates_pending_jobs(self):
+        job, created = queue.enqueue('test.a', {'n': 1, 'm': 2})
+        self.assertTrue(created)
+        same, created = queue.enqueue('test.a', {'m': 2, 'n': 1}, priority=PRIORITY_HIGH)
+        self.assertFalse(created)
+        self.assertEqual(same.pk, job.pk)
+        # 重复提交时取较高的优先级
+        job.refresh_from_db()
+        self.assertEqual(job.priority, PRIORITY_HIGH)
+
+        # 参数或类型不同的任务不合并
+        self.assertTrue(queue.enqueue('test.a', {'n': 2})[1])
+        self.assertTrue(queue.enqueue('test.b', {'n': 1, 'm': 2})[1])
+
+        # 取走后不再占用去重键，可以再次提交
+        queue.claim('w', ['test.a'])
+        self.assertTrue(queue.enqueue('test.a', {'n': 1, 'm': 2})[1])
+
+    def test_enqueue_rejects_unknown_kind_and_bad_params(self):
+        with self.assertRaises(ValueError):
+            queue.enqueue('missing')
+        with self.assertRaises(ValueError):
+            queue.enqueue('test.a', {'ids': {1, 2}})
+
+    def test_claim_order(self):
+        low, _ = queue.enqueue('test.a', {'n': 1}, priority=PRIORITY_LOW)
+        first, _ = queue.enqueue('test.a', {'n': 2})
+        second, _ = queue.enqueue('test.a', {'n': 3})
+        high, _ = queue.enqueue('test.b', {'n': 4}, priority=PRIORITY_HIGH)
+        queue.enqueue('test.a', {'n': 5}, priority=PRIORITY_HIGH, delay_seconds=60)
+
+        claimed = [queue.claim('w') for _ in range(5)]
+        self.assertEqual([job.pk for job in claimed[:4]], [high.pk, first.pk, second.pk, low.pk])
+        # 未到最早执行时间的任务不取
+        self.assertIsNone(claimed[4])
+
+        job = Job.objects.get(pk=high.pk)
+        self.assertEqual((job.status, job.attempts, job.worker), (Job.STATUS_RUNNING, 1, 'w'))
+        self.assertIsNone(job.pending_key)
+
+    def test_claim_filters_kinds(self):
+        queue.enqueue('test.a', priority=PRIORITY_HIGH)
+        job_b, _ = queue.enqueue('test.b')
+        self.assertEqual(queue.claim('w', ['test.b']).pk, job_b.pk)
+        self.assertIsNone(queue.claim('w', ['test.b']))
+
+    def test_success(self):
+        queue.enqueue('test.a')
+        job = run_with(queue.claim('w'), result={'rows': 3})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.progress), (Job.STATUS_SUCCEEDED, {'rows': 3}, 100))
+
+    def test_retry_with_exponential_backoff(self):
+        queue.enqueue('test.a')
+        for attempt, backoff in ((1, 10), (2, 20)):
+            job = queue.claim('w')
+            self.assertEqual(job.attempts, attempt)
+            before = timezone.now()
+            run_with(job, error=RuntimeError('boom'))
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.STATUS_PENDING)
+            self.assertEqual(job.pending_key, job.dedup_key)
+            self.assertIn('RuntimeError: boom', job.error)
+            self.assertAlmostEqual((job.run_after - before).total_seconds(), backoff, delta=1)
+            # 退避期间不取
+            self.assertIsNone(queue.claim('w'))
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+        # 第三次失败后次数用完
+        job = run_with(queue.claim('w'), error=RuntimeError('boom'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 3))
+
+    def test_retry_dropped_when_same_job_pending(self):
+        queue.enqueue('test.a')
+        job = queue.claim('w')
+        duplicate, created = queue.enqueue('test.a')
+        self.assertTrue(created)
+        run_with(job, error=RuntimeError('boom'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_CANCELLED)
+        self.assertEqual(Job.objects.get(pk=duplicate.pk).status, Job.STATUS_PENDING)
+
+    def test_job_failed_is_not_retried(self):
+        queue.enqueue('test.a')
+        job = run_with(queue.claim('w'), error=JobFailed('bad params'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (Job.STATUS_FAILED, 'bad params'))
+
+    def test_unserializable_result_fails(self):
+        queue.enqueue('test.a')
+        job = run_with(queue.claim('w'), result={'ids': {1, 2}})
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIsNone(job.result)
+
+    def test_requeue_stale_jobs(self):
+        queue.enqueue('test.a', {'n': 1})
+        queue.enqueue('test.a', {'n': 2})
+        queue.enqueue('test.a', {'n': 3})
+        stale, exhausted, alive = queue.claim('w'), queue.claim('w'), queue.claim('w')
+        Job.objects.filter(pk=exhausted.pk).update(attempts=3)
+        Job.objects.filter(pk__in=[stale.pk, exhausted.pk]).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=600))
+
+        self.assertEqual(queue.requeue_stale_jobs(), 1)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[stale.pk], Job.STATUS_PENDING)
+        self.assertEqual(statuses[exhausted.pk], Job.STATUS_FAILED)
+        self.assertEqual(statuses[alive.pk], Job.STATUS_RUNNING)
+
+        # 被重新排队的那次执行随后结束：结果丢弃，不覆盖排队状态
+        run_with(stale, result={'late': True})
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.result), (Job.STATUS_PENDING, None))
+
+    def test_cancel_pending(self):
+        job, _ = queue.enqueue('test.a')
+        self.assertTrue(queue.cancel(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_CANCELLED)
+        self.assertIsNone(job.pending_key)
+        self.assertIsNone(queue.claim('w'))
+        self.assertFalse(queue.cancel(job))
+
+    def test_cancel_running(self):
+        queue.enqueue('test.a')
+        job = queue.claim('w')
+        self.assertTrue(queue.cancel(Job.objects.get(pk=job.pk)))
+
+        def report(context):
+            context.progress(50, force=True)
+            return {'finished': True}
+
+        with mock.patch('jobs.queue.get_handler', return_value=report):
+            queue.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.STATUS_CANCELLED, None))
+
+    def test_progress_after_requeue_stops_handler(self):
+        queue.enqueue('test.a')
+        job = queue.claim('w')
+        context = JobContext(job)
+        context.progress(10, force=True)
+        self.assertEqual(Job.objects.get(pk=job.pk).progress, 10)
+        Job.objects.filter(pk=job.pk).update(status=Job.STATUS_PENDING)
+        with self.assertRaises(queue.JobCancelled):
+            context.progress(20, force=True)
+
+
+@override_settings(JOB_HANDLERS=HANDLERS)
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ClaimSkipLockedTests(TransactionTestCase):
+    """另一个工作进程锁定了队首的任务时跳过它，取下一个（SQLite 不支持行锁，跳过）"""
+
+    def test_skips_locked_job(self):
+        first, _ = queue.enqueue('test.a', {'n': 1}, priority=PRIORITY_HIGH)
+        second, _ = queue.enqueue('test.a', {'n': 2})
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(Job.objects.select_for_update().filter(pk=first.pk))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(queue.claim('w').pk, second.pk)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(queue.claim('w').pk, first.pk)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .views import JobDetailView, JobListView, JobResultFileView
+
+app_name = 'jobs'
+
+urlpatterns = [
+    path('', JobListView.as_view(), name='job-list'),
+    path('<int:job_id>/', JobDetailView.as_view(), name='job-detail'),
+    path('<int:job_id>/file/', JobResultFileView.as_view(), name='job-result-file'),
+]
@@ -0,0 +1,94 @@
+import logging
+
+from django.http import FileResponse, Http404
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Job, PRIORITY_NORMAL
+from .queue import cancel, enqueue, output_dir
+from .serializers import JobSerializer
+
+logger = logging.getLogger(__name__)
+
+MAX_LIST_LIMIT = 200
+
+
+def get_visible_job(request, job_id) -> Job:
+    """管理员可以查看全部任务，其他用户只能查看自己提交的任务"""
+    queryset = Job.objects.all()
+    if not request.user.is_staff:
+        queryset = queryset.filter(created_by=request.user)
+    try:
+        return queryset.get(pk=job_id)
+    except Job.DoesNotExist:
+        raise Http404
+
+
+class JobListView(APIView):
+    """后台任务列表与提交API"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        """最近的任务，可按 status、kind 过滤，limit 默认 50"""
+        queryset = Job.objects.order_by('-id')
+        if request.query_params.get('status'):
+            queryset = queryset.filter(status=request.query_params['status'])
+        if request.query_params.get('kind'):
+            queryset = queryset.filter(kind=request.query_params['kind'])
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), MAX_LIST_LIMIT)
+        except ValueError:
+            return Response({"error": "limit 必须是整数"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(JobSerializer(queryset[:limit], many=True).data, status=status.HTTP_200_OK)
+
+    def post(self, request, format=None):
+        """
+        请求体：{"kind": "graph.export", "params": {...}, "priority": 0}
+        新建任务返回 202；相同的任务已在排队时返回已有的任务（200，deduplicated 为 true）
+        """
+        kind = request.data.get('kind')
+        params = request.data.get('params') or {}
+        if not isinstance(kind, str) or not isinstance(params, dict):
+            return Response({"error": "缺少任务类型 'kind'，'params' 必须是对象"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            priority = int(request.data.get('priority', PRIORITY_NORMAL))
+            job, created = enqueue(kind, params, priority=priority, created_by=request.user)
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = dict(JobSerializer(job).data, deduplicated=not created)
+        return Response(data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+
+class JobDetailView(APIView):
+    """任务状态与进度API，DELETE 取消任务"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, format=None):
+        return Response(JobSerializer(get_visible_job(request, job_id)).data, status=status.HTTP_200_OK)
+
+    def delete(self, request, job_id, format=None):
+        """排队中的任务立即取消，执行中的任务在下次报告进度时停止"""
+        job = get_visible_job(request, job_id)
+        if not cancel(job):
+            return Response({"error": "任务已结束，无法取消"}, status=status.HTTP_409_CONFLICT)
+        job.refresh_from_db()
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class JobResultFileView(APIView):
+    """下载任务生成的结果文件（导出等）"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, format=None):
+        job = get_visible_job(request, job_id)
+        filename = (job.result or {}).get('file') if isinstance(job.result, dict) else None
+        if job.status != Job.STATUS_SUCCEEDED or not filename:
+            return Response({"error": "任务没有可下载的结果文件"}, status=status.HTTP_404_NOT_FOUND)
+        directory = output_dir().resolve()
+        path = (directory / filename).resolve()
+        if path.parent != directory or not path.is_file():
+            logger.warning(f"Result file of job #{job.pk} is missing: {path}")
+            return Response({"error": "结果文件不存在"}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename.split('-', 1)[-1])
@@ -0,0 +1,92 @@
+"""
+任务工作线程池，由 python manage.py run_jobs 启动。
+
+- 每个线程循环取任务执行，没有任务时每隔 JOB_POLL_SECONDS 秒查询一次
+- 维护线程定期为本进程执行中的任务写入心跳，并把其他已退出进程遗留的任务重新排队
+- stop() 后不再取新任务，等待执行中的任务结束（处理函数可以通过进度报告更快地响应取消）
+"""
+import logging
+import os
+import socket
+import threading
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    def __init__(self, workers: Optional[int] = None, kinds: Optional[Iterable[str]] = None,
+                 exit_when_idle: bool = False):
+        self.workers = workers or getattr(settings, 'JOB_WORKERS', 2)
+        self.kinds = list(kinds) if kinds else None
+        # 队列为空时退出（用于 cron 或一次性处理积压）
+        self.exit_when_idle = exit_when_idle
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+        self._running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.processed = 0
+
+    def run(self):
+        """启动工作线程并阻塞到全部线程结束"""
+        logger.info(f"Job worker pool {self.name} started with {self.workers} workers "
+                    f"(kinds: {', '.join(self.kinds) if self.kinds else 'all'}).")
+        threads = [threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                   for index in range(self.workers)]
+        maintenance = threading.Thread(target=self._maintain, name='job-maintenance', daemon=True)
+        maintenance.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # 带超时的 join，主线程仍能响应 KeyboardInterrupt
+            while thread.is_alive():
+                thread.join(1)
+        self._stop.set()
+        logger.info(f"Job worker pool {self.name} stopped after {self.processed} jobs.")
+
+    def stop(self):
+        self._stop.set()
+
+    def _work(self):
+        worker = f'{self.name}:{threading.current_thread().name}'
+        poll_seconds = getattr(settings, 'JOB_POLL_SECONDS', 1)
+        while not self._stop.is_set():
+            try:
+                job = queue.claim(worker, self.kinds)
+                if job is None:
+                    if self.exit_when_idle:
+                        return
+                    self._stop.wait(poll_seconds)
+                    continue
+                with self._lock:
+                    self._running[worker] = job.pk
+                try:
+                    queue.run_job(job)
+                finally:
+                    with self._lock:
+                        self._running.pop(worker, None)
+                        self.processed += 1
+            except Exception as e:
+                logger.exception(f"Job worker {worker} failed: {e}")
+                self._stop.wait(poll_seconds)
+            finally:
+                # 工作线程不经过请求周期，需要自行回收失效的数据库连接
+                close_old_connections()
+
+    def _maintain(self):
+        interval = getattr(settings, 'JOB_HEARTBEAT_SECONDS', 30)
+        while not self._stop.wait(interval):
+            try:
+                with self._lock:
+                    running = list(self._running.values())
+                queue.heartbeat(running)
+                queue.requeue_stale_jobs()
+            except Exception as e:
+                logger.warning(f"Job maintenance failed: {e}")
+            finally:
+                close_old_connections()
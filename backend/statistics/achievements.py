@@ -0,0 +1,255 @@
+"""
+事件驱动的成就引擎。
+
+对话、答题、图谱浏览等行为作为事件追加到 AchievementEvent 日志：
+- 请求路径上只把事件放进进程内队列（record_event），后台线程用 bulk_create 批量写入；
+  对话记录由 chatapi.analytics 在落库时一并写入事件
+- 后台线程周期性地批量处理尚未处理的事件：每个事件按 COUNTER_RULES 给用户的计数器加上增量，
+  再按 ACHIEVEMENT_RULES 由计数器直接算出成就进度，每个事件的开销与历史长度无关
+- 计数器、成就进度都在一个事务中批量更新；进度首次达到 100 时记录达成时间
+- 多个进程同时处理时用 SELECT ... FOR UPDATE SKIP LOCKED 分摊事件，每个事件只处理一次；
+  同一用户的计数器行加锁，并发处理不会丢失增量
+"""
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from KnowledgeBackend.writebehind import WriteBehindRecorder
+
+from .models import ACHIEVEMENT_RULES, AchievementEvent, UserAchievement, UserCounter
+from .ranking import DIMENSION_ACHIEVEMENT, ranking_index
+from .services import achievement_progress, invalidate_user_statistics, provision_user_statistics
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+EVENT_CHAT_TURN = 'chat_turn'
+EVENT_CHAT_CONVERSATION = 'chat_conversation'
+EVENT_QUIZ_ANSWER = 'quiz_answer'
+EVENT_QUIZ_COMPLETED = 'quiz_completed'
+EVENT_GRAPH_EXPLORE = 'graph_explore'
+EVENT_SHARE = 'share'
+
+# 允许客户端通过接口上报的事件类型 -> (去重字段, 允许的字段及类型)；对话和图谱浏览由服务端记录。
+# 这些事件无法在服务端核实，每道题、每个测验、每个分享对象对同一用户只计一次，其余字段丢弃
+CLIENT_EVENT_SCHEMAS: Dict[str, Tuple[str, Dict[str, type]]] = {
+    EVENT_QUIZ_ANSWER: ('question_id', {'question_id': str, 'correct': bool}),
+    EVENT_QUIZ_COMPLETED: ('quiz_id', {'quiz_id': str}),
+    EVENT_SHARE: ('target', {'target': str}),
+}
+CLIENT_EVENT_KINDS = tuple(CLIENT_EVENT_SCHEMAS)
+# 客户端上报的字符串字段的最大长度
+MAX_CLIENT_FIELD_LENGTH = 64
+
+# 事件类型 -> 由事件数据计算计数器增量
+COUNTER_RULES: Dict[str, Callable[[Dict[str, Any]], Dict[str, int]]] = {
+    EVENT_CHAT_TURN: lambda payload: {'chat_turns': 1},
+    EVENT_CHAT_CONVERSATION: lambda payload: {'chat_conversations': 1},
+    EVENT_QUIZ_ANSWER: lambda payload: {'quiz_answers': 1, 'quiz_correct': 1 if payload.get('correct') else 0},
+    EVENT_QUIZ_COMPLETED: lambda payload: {'quizzes_completed': 1},
+    EVENT_GRAPH_EXPLORE: lambda payload: {'graph_explorations': 1},
+    EVENT_SHARE: lambda payload: {'shares': 1},
+}
+
+# 每次处理最多取出的事件数
+PROCESS_BATCH_SIZE = 1000
+
+
+def counter_deltas(kind: str, payload: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """事件对应的计数器增量；未知的事件类型没有增量"""
+    rule = COUNTER_RULES.get(kind)
+    if rule is None:
+        return {}
+    return {name: delta for name, delta in rule(payload or {}).items() if delta}
+
+
+def event_key(value: Any) -> str:
+    """事件的去重值；超过字段长度时取哈希"""
+    value = str(value)
+    if len(value) > 64:
+        value = hashlib.sha1(value.encode('utf-8')).hexdigest()
+    return value
+
+
+def clean_client_event(kind: str, payload: Any) -> Tuple[Dict[str, Any], str]:
+    """
+    校验客户端上报的事件，返回 (只保留允许字段的事件数据, 去重值)；
+    类型不支持、缺少去重字段或字段类型、长度不符时抛出 ValueError
+    """
+    if kind not in CLIENT_EVENT_SCHEMAS:
+        raise ValueError(f"不支持的事件类型 '{kind}'")
+    if not isinstance(payload, dict):
+        raise ValueError("payload 必须是对象")
+    key_field, fields = CLIENT_EVENT_SCHEMAS[kind]
+    cleaned = {}
+    for name, field_type in fields.items():
+        value = payload.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, field_type) or (isinstance(value, str) and len(value) > MAX_CLIENT_FIELD_LENGTH):
+            raise ValueError(f"字段 '{name}' 必须是长度不超过 {MAX_CLIENT_FIELD_LENGTH} 的 {field_type.__name__}")
+        cleaned[name] = value
+    if not cleaned.get(key_field):
+        raise ValueError(f"缺少字段 '{key_field}'")
+    return cleaned, cleaned[key_field]
+
+
+def process_events(limit: int = PROCESS_BATCH_SIZE) -> int:
+    """处理一批尚未处理的事件，返回处理条数"""
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            AchievementEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed=False)
+            .only('id', 'user_id', 'kind', 'payload')
+            .order_by('id')[:limit]
+        )
+        if not events:
+            return 0
+        increments = defaultdict(Counter)
+        for event in events:
+            increments[event.user_id].update(counter_deltas(event.kind, event.payload))
+        increments = {user_id: deltas for user_id, deltas in increments.items() if deltas}
+        AchievementEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed=True)
+        if not increments:
+            return len(events)
+
+        user_ids = list(increments)
+        names = {name for deltas in increments.values() for name in deltas}
+        UserCounter.objects.bulk_create(
+            [UserCounter(user_id=user_id, name=name) for user_id, deltas in increments.items() for name in deltas],
+            ignore_conflicts=True,
+        )
+        counters = {}
+        for counter in UserCounter.objects.select_for_update().filter(user_id__in=user_ids, name__in=names):
+            counters[(counter.user_id, counter.name)] = counter
+        changed_counters = []
+        for user_id, deltas in increments.items():
+            for name, delta in deltas.items():
+                counter = counters.get((user_id, name))
+                if counter is not None:
+                    counter.value += delta
+                    counter.updated_at = now
+                    changed_counters.append(counter)
+        UserCounter.objects.bulk_update(changed_counters, ['value', 'updated_at'])
+
+        achievement_types = [achievement_type for achievement_type, (counter_name, _) in ACHIEVEMENT_RULES.items()
+                             if counter_name in names]
+        users = get_user_model().objects.in_bulk(user_ids)
+        provisioned = set(
+            UserAchievement.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True).distinct()
+        )
+        for user_id in user_ids:
+            if user_id not in provisioned and user_id in users:
+                provision_user_statistics(users[user_id])
+
+        changed_achievements, ranking_changes = [], []
+        for achievement in UserAchievement.objects.filter(user_id__in=user_ids,
+                                                          achievement_type__in=achievement_types):
+            counter_name, target = ACHIEVEMENT_RULES[achievement.achievement_type]
+            if counter_name not in increments[achievement.user_id]:
+                continue
+            counter = counters.get((achievement.user_id, counter_name))
+            progress = achievement_progress(counter.value if counter else 0, target)
+            if progress == achievement.progress:
+                continue
+            ranking_changes.append(
+                (DIMENSION_ACHIEVEMENT, achievement.achievement_type, achievement.progress, progress))
+            achievement.progress = progress
+            if progress >= 100 and achievement.achieved_at is None:
+                achievement.achieved_at = now
+            achievement.updated_at = now
+            changed_achievements.append(achievement)
+        # bulk_update 不触发信号：排名直方图与缓存在提交后更新，回滚时不会留下没有发生的变更
+        UserAchievement.objects.bulk_update(changed_achievements, ['progress', 'achieved_at', 'updated_at'])
+
+        def on_commit():
+            for change in ranking_changes:
+                ranking_index.record_change(*change)
+            for user_id in user_ids:
+                invalidate_user_statistics(user_id)
+
+        transaction.on_commit(on_commit)
+    return len(events)
+
+
+class EventRecorder(WriteBehindRecorder):
+    """进程内的事件队列：后台线程批量写入事件日志，并周期性处理尚未处理的事件"""
+
+    thread_name = 'achievement-events'
+    item_label = 'achievement events'
+    periodic_metric = 'processed'
+    # 事件可能由 start() 的调用方直接写入事件日志（如 chatapi.analytics.write_turns），启动后立即处理一次
+    run_periodic_on_start = True
+
+    def __init__(self, queue_size: Optional[int] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, process_interval: Optional[float] = None):
+        super().__init__(
+            queue_size=(queue_size if queue_size is not None
+                        else getattr(settings, 'ACHIEVEMENT_EVENT_QUEUE_SIZE', 10000)),
+            batch_size=batch_size or getattr(settings, 'ACHIEVEMENT_EVENT_BATCH_SIZE', 200),
+            flush_interval=flush_interval or getattr(settings, 'ACHIEVEMENT_EVENT_FLUSH_SECONDS', 2),
+            periodic_interval=process_interval or getattr(settings, 'ACHIEVEMENT_PROCESS_SECONDS', 30),
+        )
+
+    def record(self, user_id, kind: str, payload: Optional[Dict[str, Any]] = None,
+               dedup_key: Optional[str] = None) -> bool:
+        """
+        把事件放入队列，立即返回；匿名用户、队列已满或未启用时丢弃并返回 False。
+        dedup_key 相同的事件（同一用户、同一类型）写入时只保留第一个
+        """
+        if user_id is None:
+            return False
+        return self.enqueue(AchievementEvent(user_id=user_id, kind=kind, payload=payload or {},
+                                             dedup_key=event_key(dedup_key) if dedup_key is not None else None,
+                                             created_at=timezone.now()))
+
+    def write(self, batch: List[AchievementEvent]):
+        write_events(batch)
+
+    def run_periodic(self) -> int:
+        """处理所有尚未处理的事件，返回处理条数"""
+        total = 0
+        while True:
+            count = process_events()
+            total += count
+            if count < PROCESS_BATCH_SIZE:
+                return total
+
+
+def write_events(events):
+    """
+    批量写入事件；入队后被删除的用户的事件直接丢弃，避免外键错误导致整批失败。
+    去重值已记录过的事件由唯一约束忽略
+    """
+    user_ids = {event.user_id for event in events}
+    existing = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    AchievementEvent.objects.bulk_create([event for event in events if event.user_id in existing],
+                                         ignore_conflicts=True)
+
+
+_recorder: Optional[EventRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_event_recorder() -> EventRecorder:
+    """进程内共享的事件队列，首次入队时启动后台线程"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = EventRecorder()
+    return _recorder
+
+
+def record_event(user_id, kind: str, payload: Optional[Dict[str, Any]] = None,
+                 dedup_key: Optional[str] = None) -> bool:
+    """记录一个成就事件（异步落库），匿名用户忽略"""
+    return get_event_recorder().record(user_id, kind, payload, dedup_key)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class StatisticsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'statistics'
+
+    def ready(self):
+        # 注册信号处理器（分数变化时增量刷新排名直方图）
+        from . import signals  # noqa: F401
@@ -0,0 +1,46 @@
+"""
+统计数据导出 - 定义可导出的数据集及其流式行迭代器
+"""
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from graph_api.db_utils import stream_from_neo4j
+from .models import FraudStatistics
+from .serializers import (
+    FraudTypeDistributionSerializer,
+    TacticFrequencySerializer,
+    EmotionalTriggerSerializer,
+    FraudFlowSerializer,
+)
+
+
+def _cypher_rows(query: str) -> Callable[[], Iterator[Dict[str, Any]]]:
+    return lambda: stream_from_neo4j(query)
+
+
+def _yearly_rows() -> Iterator[Dict[str, Any]]:
+    return (
+        FraudStatistics.objects.order_by('year')
+        .values('year', 'reported_cases', 'filed_cases')
+        .iterator(chunk_size=2000)
+    )
+
+
+# 数据集名称 -> (列名及类型, 行迭代器工厂)，列类型见 graph_api.exporters.Columns
+# 与平台统计接口不同，导出不会回退到示例数据，也不会把桑基图结果组装成节点/链接。
+STATISTICS_DATASETS: Dict[str, Tuple[Dict[str, str], Callable[[], Iterator[Dict[str, Any]]]]] = {
+    'fraud_type_distribution': ({'name': 'string', 'value': 'int64'},
+                                _cypher_rows(FraudTypeDistributionSerializer.query)),
+    'tactic_frequency': ({'name': 'string', 'value': 'int64'}, _cypher_rows(TacticFrequencySerializer.query)),
+    'emotional_triggers': ({'name': 'string', 'value': 'int64'}, _cypher_rows(EmotionalTriggerSerializer.query)),
+    'fraud_flow': ({'channel': 'string', 'pattern': 'string', 'tactic': 'string', 'value': 'int64'},
+                   _cypher_rows(FraudFlowSerializer.query)),
+    'fraud_cases_yearly': ({'year': 'int64', 'reported_cases': 'int64', 'filed_cases': 'int64'}, _yearly_rows),
+}
+
+
+def get_dataset(name: str) -> Tuple[Dict[str, str], Iterator[Dict[str, Any]]]:
+    """返回数据集的列名和行迭代器；名称未知时抛出 ValueError"""
+    if name not in STATISTICS_DATASETS:
+        raise ValueError(f"未知的数据集 '{name}'，可选：{', '.join(STATISTICS_DATASETS)}")
+    columns, rows_factory = STATISTICS_DATASETS[name]
+    return columns, rows_factory()
@@ -0,0 +1,39 @@
+"""
+统计相关的后台任务（见 jobs/queue.py）
+"""
+from graph_api import exporters
+from jobs.queue import JobFailed
+
+from .achievements import PROCESS_BATCH_SIZE, process_events
+from .exports import get_dataset
+from .services import get_platform_statistics
+
+
+def refresh_statistics(job):
+    """处理积压的成就事件，并重新计算平台统计缓存"""
+    processed = 0
+    while True:
+        count = process_events(limit=PROCESS_BATCH_SIZE)
+        processed += count
+        job.progress(10, f"已处理 {processed} 个成就事件")
+        if count < PROCESS_BATCH_SIZE:
+            break
+    job.progress(60, "计算平台统计", force=True)
+    get_platform_statistics(refresh=True)
+    return {'achievement_events': processed}
+
+
+def export_statistics(job):
+    """参数：dataset（见 exports.STATISTICS_DATASETS）、export_format（csv / parquet）"""
+    dataset = job.params.get('dataset')
+    export_format = job.params.get('export_format', 'csv')
+    if export_format not in exporters.EXPORT_FORMATS:
+        raise JobFailed(f"不支持的导出格式 '{export_format}'")
+    try:
+        columns, rows = get_dataset(dataset)
+    except ValueError as e:
+        raise JobFailed(str(e))
+    chunks = exporters.encode_rows(rows, columns, export_format)
+    path = job.output_path(f'{dataset}.{export_format}')
+    written = exporters.write_chunks(chunks, str(path))
+    return {'file': path.name, 'bytes': written}
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from graph_api import exporters
+from statistics.exports import STATISTICS_DATASETS, get_dataset
+
+
+class Command(BaseCommand):
+    help = "流式导出平台统计数据集（CSV / Parquet）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(STATISTICS_DATASETS))
+        parser.add_argument('--format', dest='export_format', default='csv', choices=list(exporters.EXPORT_FORMATS))
+        parser.add_argument('--chunk-rows', type=int, default=exporters.DEFAULT_CHUNK_ROWS)
+        parser.add_argument('--output', '-o', default='-', help="输出文件路径，'-' 表示标准输出")
+
+    def handle(self, *args, **options):
+        try:
+            columns, rows = get_dataset(options['dataset'])
+            chunks = exporters.encode_rows(rows, columns, options['export_format'], chunk_rows=options['chunk_rows'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        written = exporters.write_chunks(chunks, options['output'])
+        if options['output'] != '-':
+            self.stderr.write(self.style.SUCCESS(f"Exported {written} bytes to {options['output']}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from statistics.achievements import PROCESS_BATCH_SIZE, process_events
+
+
+class Command(BaseCommand):
+    help = "批量处理尚未处理的成就事件（各进程的后台线程也会定期处理，可用于补处理积压）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PROCESS_BATCH_SIZE, help="每批处理的事件数")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = process_events(limit=options['batch_size'])
+            total += count
+            if count < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} achievement events"))
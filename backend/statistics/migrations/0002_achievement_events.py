@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistics', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userachievement',
+            name='achieved_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='达成时间'),
+        ),
+        migrations.CreateModel(
+            name='AchievementEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32, verbose_name='事件类型')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='事件数据')),
+                ('processed', models.BooleanField(db_index=True, default=False, verbose_name='已处理')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='发生时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievement_events', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '成就事件',
+                'verbose_name_plural': '成就事件',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='statistics__user_id_cc29a2_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, verbose_name='计数器')),
+                ('value', models.IntegerField(default=0, verbose_name='计数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '用户计数器',
+                'verbose_name_plural': '用户计数器',
+                'unique_together': {('user', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def backfill_events(apps, schema_editor):
+    """
+    成就改为由事件计数器计算：已有的完成度是占位值，清零后把已保存的对话记录补写为事件，
+    由成就引擎重新累计。能力得分同样是按用户 id 生成的占位值，清零后把已登录用户的对话记录
+    标记为未汇总，由 chatapi.analytics.aggregate_turns 按时间顺序重新计算
+    """
+    UserAchievement = apps.get_model('statistics', 'UserAchievement')
+    UserSkill = apps.get_model('statistics', 'UserSkill')
+    AchievementEvent = apps.get_model('statistics', 'AchievementEvent')
+    ChatTurn = apps.get_model('chatapi', 'ChatTurn')
+
+    UserAchievement.objects.update(progress=0, achieved_at=None)
+    UserSkill.objects.update(score=0)
+    ChatTurn.objects.filter(user__isnull=False).update(aggregated=False)
+    batch = []
+    turns = ChatTurn.objects.filter(user__isnull=False).values_list(
+        'user_id', 'conversation_id', 'turn_index', 'created_at'
+    ).order_by('id')
+    for user_id, conversation_id, turn_index, created_at in turns.iterator(chunk_size=2000):
+        kinds = ('chat_turn', 'chat_conversation') if turn_index == 0 else ('chat_turn',)
+        for kind in kinds:
+            batch.append(AchievementEvent(user_id=user_id, kind=kind, payload={'conversation_id': conversation_id},
+                                          created_at=created_at))
+        if len(batch) >= 2000:
+            AchievementEvent.objects.bulk_create(batch)
+            batch = []
+    AchievementEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatapi', '0001_initial'),
+        ('statistics', '0002_achievement_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistics', '0003_backfill_achievement_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievementevent',
+            name='dedup_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='去重值'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='achievementevent',
+            unique_together={('user', 'kind', 'dedup_key')},
+        ),
+    ]
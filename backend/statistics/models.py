@@ -1,8 +1,22 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
+# 新用户默认开通的成就与能力类型
+DEFAULT_ACHIEVEMENT_TYPES = ["学习成就", "模拟成就", "分享成就", "防骗实战", "知识掌握"]
+DEFAULT_SKILL_TYPES = ["信息识别能力", "情绪应对能力", "主动防御意识", "风险评估能力", "安全意识"]
+
+# 成就类型 -> (计数器, 完成所需的次数)，计数器由成就事件累加（见 achievements.py）
+ACHIEVEMENT_RULES = {
+    "学习成就": ('graph_explorations', 50),
+    "模拟成就": ('chat_conversations', 10),
+    "分享成就": ('shares', 5),
+    "防骗实战": ('chat_turns', 100),
+    "知识掌握": ('quiz_correct', 100),
+}
+
 class FraudStatistics(models.Model):
     """全局诈骗统计数据"""
     year = models.IntegerField(verbose_name="年份")
@@ -25,6 +39,7 @@ class UserAchievement(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="achievements", verbose_name="用户")
     achievement_type = models.CharField(max_length=50, verbose_name="成就类型")  # 学习成就、模拟成就、分享成就等
     progress = models.FloatField(default=0, verbose_name="完成度")  # 0-100的百分比
+    achieved_at = models.DateTimeField(null=True, blank=True, verbose_name="达成时间")  # 完成度首次达到100的时间
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
@@ -51,4 +66,40 @@ class UserSkill(models.Model):
         unique_together = ['user', 'skill_type']
 
     def __str__(self):
-        return f"{self.user.username} - {self.skill_type} - {self.score}分" 
\ No newline at end of file
+        return f"{self.user.username} - {self.skill_type} - {self.score}分" 
+
+
+class AchievementEvent(models.Model):
+    """成就事件日志：对话、答题、图谱浏览等，由 achievements.process_events 批量处理"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="achievement_events", verbose_name="用户")
+    kind = models.CharField(max_length=32, verbose_name="事件类型")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="事件数据")
+    # 去重值（题目 id、节点 id 等）：同一用户同一类型的相同去重值只记录一次；为空时不去重
+    dedup_key = models.CharField(max_length=64, null=True, blank=True, verbose_name="去重值")
+    processed = models.BooleanField(default=False, db_index=True, verbose_name="已处理")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="发生时间")
+
+    class Meta:
+        verbose_name = "成就事件"
+        verbose_name_plural = "成就事件"
+        indexes = [models.Index(fields=['user', 'created_at'])]
+        unique_together = ['user', 'kind', 'dedup_key']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.kind} - {self.created_at}"
+
+
+class UserCounter(models.Model):
+    """用户的事件计数器，成就规则按计数器计算进度，无需回扫事件日志"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="counters", verbose_name="用户")
+    name = models.CharField(max_length=50, verbose_name="计数器")
+    value = models.IntegerField(default=0, verbose_name="计数")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "用户计数器"
+        verbose_name_plural = "用户计数器"
+        unique_together = ['user', 'name']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.name} - {self.value}"
@@ -0,0 +1,228 @@
+"""
+用户排名子系统 - 为“已超过xx%的用户”提供百分位查询
+
+每个维度（成就类型 / 能力类型 / 反诈等级）维护一个按整数分桶的直方图，
+直方图用树状数组（Fenwick Tree）存储，单次更新和前缀计数都是 O(log n)，
+请求路径上不再需要对用户表做 COUNT 扫描。
+
+直方图在首次使用时通过一次 GROUP BY 聚合构建，之后由信号增量维护；
+为了修正多进程部署下各 worker 之间的偏差，超过刷新周期后会在后台线程中重新聚合，
+期间继续使用旧的直方图；同一时间只有一个线程聚合，聚合期间的增量变更在换入新直方图前重放。
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.db.models.functions import Floor
+
+logger = logging.getLogger(__name__)
+
+# 排名维度
+DIMENSION_ACHIEVEMENT = 'achievement'
+DIMENSION_SKILL = 'skill'
+DIMENSION_FRAUD_LEVEL = 'fraud_level'
+
+# 分数范围 0-100，按整数分桶；超出范围的值会被截断到两端
+MAX_BUCKET = 100
+
+
+def score_to_bucket(value: Optional[float]) -> Optional[int]:
+    """把分数转换为直方图桶下标，None 表示没有分数"""
+    if value is None:
+        return None
+    try:
+        bucket = int(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, min(MAX_BUCKET, bucket))
+
+
+class FenwickHistogram:
+    """基于树状数组的计数直方图"""
+
+    def __init__(self, size: int = MAX_BUCKET + 1):
+        self.size = size
+        self.total = 0
+        self._tree = [0] * (size + 1)
+
+    def add(self, bucket: int, delta: int = 1):
+        """在 bucket 上增加 delta 个计数"""
+        self.total += delta
+        i = bucket + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def count_below(self, bucket: int) -> int:
+        """返回桶下标严格小于 bucket 的计数之和"""
+        count = 0
+        i = bucket
+        while i > 0:
+            count += self._tree[i]
+            i -= i & -i
+        return count
+
+    def percentile(self, value: Optional[float]) -> float:
+        """返回分数严格低于 value 的用户占比（0-100）"""
+        bucket = score_to_bucket(value)
+        if bucket is None or self.total <= 0:
+            return 0.0
+        return round(self.count_below(bucket) * 100 / self.total, 2)
+
+
+class RankingIndex:
+    """
+    进程内的排名索引，按 (维度, 类型) 管理多个直方图。
+    """
+
+    def __init__(self, refresh_seconds: Optional[int] = None):
+        self._refresh_seconds = refresh_seconds
+        self._histograms: Dict[Tuple[str, str], FenwickHistogram] = {}
+        self._built_at: Optional[float] = None
+        self._lock = threading.RLock()
+        # 同一时间只有一个线程聚合
+        self._rebuild_lock = threading.Lock()
+        # 聚合期间的增量变更 (维度, 类型, 旧桶, 新桶)，换入新直方图前重放；不在聚合时为 None
+        self._pending_changes: Optional[List[Tuple[str, str, Optional[int], Optional[int]]]] = None
+
+    @property
+    def refresh_seconds(self) -> int:
+        if self._refresh_seconds is not None:
+            return self._refresh_seconds
+        return getattr(settings, 'STATISTICS_RANKING_REFRESH_SECONDS', 300)
+
+    @staticmethod
+    def _apply(histograms: Dict[Tuple[str, str], FenwickHistogram], dimension: str, key: str,
+               old_bucket: Optional[int], new_bucket: Optional[int]):
+        histogram = histograms.get((dimension, key))
+        if histogram is None:
+            histogram = histograms[(dimension, key)] = FenwickHistogram()
+        if old_bucket is not None:
+            histogram.add(old_bucket, -1)
+        if new_bucket is not None:
+            histogram.add(new_bucket, 1)
+
+    def rebuild(self):
+        """通过分组聚合重建全部直方图（阻塞到完成）"""
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        """调用方需持有 _rebuild_lock"""
+        with self._lock:
+            self._pending_changes = []
+        try:
+            histograms = self._aggregate()
+        except Exception:
+            with self._lock:
+                self._pending_changes = None
+            raise
+        with self._lock:
+            # 聚合期间的变更可能已包含在聚合结果中，重放时会重复计入，直到下次刷新；
+            # 与丢失变更相比，这种偏差更小
+            for change in self._pending_changes:
+                self._apply(histograms, *change)
+            self._pending_changes = None
+            self._histograms = histograms
+            self._built_at = time.monotonic()
+        logger.info(f"Ranking histograms rebuilt: {len(histograms)} dimensions.")
+
+    def _aggregate(self) -> Dict[Tuple[str, str], FenwickHistogram]:
+        # 延迟导入，避免模块加载时触发模型注册顺序问题
+        from django.contrib.auth import get_user_model
+        from .models import UserAchievement, UserSkill
+
+        histograms: Dict[Tuple[str, str], FenwickHistogram] = {}
+
+        def fill(dimension, rows, key_field):
+            for row in rows:
+                key = row[key_field] if key_field else ''
+                bucket = score_to_bucket(row['bucket'])
+                if bucket is None:
+                    continue
+                histogram = histograms.get((dimension, key))
+                if histogram is None:
+                    histogram = histograms[(dimension, key)] = FenwickHistogram()
+                histogram.add(bucket, row['n'])
+
+        fill(
+            DIMENSION_ACHIEVEMENT,
+            UserAchievement.objects.annotate(bucket=Floor('progress'))
+            .values('achievement_type', 'bucket').annotate(n=Count('id')).order_by(),
+            'achievement_type',
+        )
+        fill(
+            DIMENSION_SKILL,
+            UserSkill.objects.annotate(bucket=Floor('score'))
+            .values('skill_type', 'bucket').annotate(n=Count('id')).order_by(),
+            'skill_type',
+        )
+        fill(
+            DIMENSION_FRAUD_LEVEL,
+            get_user_model().objects.values(bucket=Floor('fraud_level'))
+            .annotate(n=Count('id')).order_by(),
+            None,
+        )
+
+        return histograms
+
+    def _ensure_fresh(self):
+        built_at = self._built_at
+        if built_at is None:
+            # 首次查询需要等待构建；同时到达的其他线程等待同一次聚合完成
+            with self._rebuild_lock:
+                if self._built_at is None:
+                    self._rebuild()
+        elif time.monotonic() - built_at > self.refresh_seconds and self._rebuild_lock.acquire(blocking=False):
+            # 定期刷新不阻塞请求：在后台线程中聚合，期间继续使用旧的直方图
+            threading.Thread(target=self._background_rebuild, name='ranking-rebuild', daemon=True).start()
+
+    def _background_rebuild(self):
+        try:
+            self._rebuild()
+        except Exception as e:
+            logger.error(f"Failed to rebuild ranking histograms: {e}")
+        finally:
+            self._rebuild_lock.release()
+            # 一次性线程即将结束，关闭聚合时打开的连接，不留给垃圾回收
+            connections.close_all()
+
+    def percentile(self, dimension: str, key: str, value: Optional[float]) -> float:
+        """查询 value 在指定维度中超过了百分之多少的用户"""
+        self._ensure_fresh()
+        with self._lock:
+            histogram = self._histograms.get((dimension, key or ''))
+            if histogram is None:
+                return 0.0
+            return histogram.percentile(value)
+
+    def record_change(self, dimension: str, key: str,
+                      old_value: Optional[float], new_value: Optional[float]):
+        """
+        增量更新：把一个用户的分数从 old_value 移动到 new_value。
+        old_value 为 None 表示新增，new_value 为 None 表示删除。
+        """
+        old_bucket = score_to_bucket(old_value)
+        new_bucket = score_to_bucket(new_value)
+        if old_bucket == new_bucket:
+            return
+        with self._lock:
+            # 尚未构建且不在聚合中时无需增量维护，首次查询时会整体聚合
+            if self._built_at is not None:
+                self._apply(self._histograms, dimension, key or '', old_bucket, new_bucket)
+            if self._pending_changes is not None:
+                self._pending_changes.append((dimension, key or '', old_bucket, new_bucket))
+
+    def invalidate(self):
+        """丢弃当前直方图，下次查询时重新聚合"""
+        with self._lock:
+            self._histograms = {}
+            self._built_at = None
+
+
+# 全局排名索引
+ranking_index = RankingIndex()
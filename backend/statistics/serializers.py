@@ -1,9 +1,8 @@
 from rest_framework import serializers
 from .models import FraudStatistics, UserAchievement, UserSkill
 from django.db.models import Count, Sum
-import numpy as np
-import pandas as pd
 from graph_api.db_utils import read_from_neo4j
+from .ranking import ranking_index, DIMENSION_ACHIEVEMENT, DIMENSION_SKILL
 
 
 class FraudStatisticsSerializer(serializers.ModelSerializer):
@@ -13,15 +12,27 @@ class FraudStatisticsSerializer(serializers.ModelSerializer):
 
 
 class UserAchievementSerializer(serializers.ModelSerializer):
+    # 已超过百分之多少的用户
+    percentile = serializers.SerializerMethodField()
+
     class Meta:
         model = UserAchievement
-        fields = ['achievement_type', 'progress']
+        fields = ['achievement_type', 'progress', 'achieved_at', 'percentile']
+
+    def get_percentile(self, obj):
+        return ranking_index.percentile(DIMENSION_ACHIEVEMENT, obj.achievement_type, obj.progress)
 
 
 class UserSkillSerializer(serializers.ModelSerializer):
+    # 已超过百分之多少的用户
+    percentile = serializers.SerializerMethodField()
+
     class Meta:
         model = UserSkill
-        fields = ['skill_type', 'score']
+        fields = ['skill_type', 'score', 'percentile']
+
+    def get_percentile(self, obj):
+        return ranking_index.percentile(DIMENSION_SKILL, obj.skill_type, obj.score)
 
 
 class FraudTypeDistributionSerializer(serializers.Serializer):
@@ -29,15 +40,16 @@ class FraudTypeDistributionSerializer(serializers.Serializer):
     name = serializers.CharField()
     value = serializers.IntegerField()
 
+    # 执行Cypher查询，获取诈骗类型分布
+    query = """
+    MATCH (fp:FraudPattern)<-[:IS_A]-(fc:FraudCase)
+    RETURN fp.name as name, count(fc) as value
+    ORDER BY value DESC
+    """
+
     @classmethod
     def get_data(cls):
-        # 执行Cypher查询，获取诈骗类型分布
-        query = """
-        MATCH (fp:FraudPattern)<-[:IS_A]-(fc:FraudCase)
-        RETURN fp.name as name, count(fc) as value
-        ORDER BY value DESC
-        """
-        results = read_from_neo4j(query)
+        results = read_from_neo4j(cls.query)
         
         # 如果没有数据，返回示例数据
         if not results:
@@ -57,15 +69,16 @@ class TacticFrequencySerializer(serializers.Serializer):
     name = serializers.CharField()
     value = serializers.IntegerField()
 
+    # 执行Cypher查询，获取诈骗手法使用频次
+    query = """
+    MATCH (t:Tactic)<-[:INVOLVES]-(fc:FraudCase)
+    RETURN t.name as name, count(fc) as value
+    ORDER BY value DESC
+    """
+
     @classmethod
     def get_data(cls):
-        # 执行Cypher查询，获取诈骗手法使用频次
-        query = """
-        MATCH (t:Tactic)<-[:INVOLVES]-(fc:FraudCase)
-        RETURN t.name as name, count(fc) as value
-        ORDER BY value DESC
-        """
-        results = read_from_neo4j(query)
+        results = read_from_neo4j(cls.query)
         
         # 如果没有数据，返回示例数据
         if not results:
@@ -85,15 +98,16 @@ class EmotionalTriggerSerializer(serializers.Serializer):
     name = serializers.CharField()
     value = serializers.IntegerField()
 
+    # 执行Cypher查询，获取情感触发点
+    query = """
+    MATCH (pt:PsychologicalTrigger)<-[:EXPLOITS]-(t:Tactic)
+    RETURN pt.name as name, count(t) as value
+    ORDER BY value DESC
+    """
+
     @classmethod
     def get_data(cls):
-        # 执行Cypher查询，获取情感触发点
-        query = """
-        MATCH (pt:PsychologicalTrigger)<-[:EXPLOITS]-(t:Tactic)
-        RETURN pt.name as name, count(t) as value
-        ORDER BY value DESC
-        """
-        results = read_from_neo4j(query)
+        results = read_from_neo4j(cls.query)
         
         # 如果没有数据，返回示例数据
         if not results:
@@ -116,20 +130,22 @@ class FraudFlowSerializer(serializers.Serializer):
     nodes = serializers.ListField(child=serializers.DictField())
     links = serializers.ListField(child=serializers.DictField())
 
+    # 执行Cypher查询，获取诈骗流程
+    query = """
+    MATCH (c:Channel)<-[:CONDUCTED_VIA]-(fc:FraudCase)-[:IS_A]->(fp:FraudPattern)
+    MATCH (fc)-[:INVOLVES]->(t:Tactic)
+    RETURN c.name as channel, fp.name as pattern, t.name as tactic, count(fc) as value
+    ORDER BY value DESC
+    """
+
     @classmethod
     def get_data(cls):
-        # 执行Cypher查询，获取诈骗流程
-        query = """
-        MATCH (c:Channel)<-[:CONDUCTED_VIA]-(fc:FraudCase)-[:IS_A]->(fp:FraudPattern)
-        MATCH (fc)-[:INVOLVES]->(t:Tactic)
-        RETURN c.name as channel, fp.name as pattern, t.name as tactic, count(fc) as value
-        ORDER BY value DESC
-        """
-        results = read_from_neo4j(query)
+        results = read_from_neo4j(cls.query)
         
         # 如果没有数据，返回示例数据
         if not results:
-            # 示例数据
+            # 示例数据（numpy 只在回退时用到，按需导入以加快启动）
+            import numpy as np
             channels = ["短信", "电话", "社交软件", "虚假网站", "虚假App"]
             patterns = ["杀猪盘", "仿冒电商客服", "冒充公检法", "虚假投资", "网络钓鱼"]
             tactics = ["建立情感信任", "展示虚假盈利", "制造紧迫感", "谎称订单异常", "要求按指示操作"]
@@ -0,0 +1,141 @@
+"""
+统计服务 - 成就/能力的批量开通、用户统计与平台统计结果缓存
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from graph_api.services import GRAPH_PAYLOAD_CACHE_KEY, cached_graph_payload, graph_cache_version
+
+from .models import (
+    ACHIEVEMENT_RULES,
+    DEFAULT_ACHIEVEMENT_TYPES,
+    DEFAULT_SKILL_TYPES,
+    UserAchievement,
+    UserCounter,
+    UserSkill,
+)
+from .ranking import (
+    DIMENSION_ACHIEVEMENT,
+    DIMENSION_FRAUD_LEVEL,
+    DIMENSION_SKILL,
+    ranking_index,
+)
+from .serializers import (
+    EmotionalTriggerSerializer,
+    FraudCasesYearlySerializer,
+    FraudFlowSerializer,
+    FraudTypeDistributionSerializer,
+    TacticFrequencySerializer,
+    UserAchievementSerializer,
+    UserSkillSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+USER_STATISTICS_CACHE_KEY = 'statistics:user:{user_id}'
+PLATFORM_STATISTICS_PAYLOAD = 'platform_statistics'
+
+
+def achievement_progress(value: int, target: int) -> float:
+    """计数器达到 target 时完成度为 100"""
+    return round(min(100.0, 100.0 * value / target), 2)
+
+
+def provision_user_statistics(user):
+    """
+    为用户批量创建默认的成就与能力记录。
+    成就完成度由已有的事件计数器算出（新用户为 0），能力从 0 分开始，由对话评分累积。
+    使用 ignore_conflicts，并发的首次请求不会因 unique_together 冲突而报错。
+    """
+    counters = dict(UserCounter.objects.filter(user=user).values_list('name', 'value'))
+    now = timezone.now()
+    achievements = []
+    for achievement_type in DEFAULT_ACHIEVEMENT_TYPES:
+        counter_name, target = ACHIEVEMENT_RULES.get(achievement_type, (None, 1))
+        progress = achievement_progress(counters.get(counter_name, 0), target)
+        achievements.append(UserAchievement(
+            user=user,
+            achievement_type=achievement_type,
+            progress=progress,
+            achieved_at=now if progress >= 100 else None,
+        ))
+    skills = [UserSkill(user=user, skill_type=skill_type, score=0) for skill_type in DEFAULT_SKILL_TYPES]
+    UserAchievement.objects.bulk_create(achievements, ignore_conflicts=True)
+    UserSkill.objects.bulk_create(skills, ignore_conflicts=True)
+
+    # bulk_create 不会触发信号，这里手动增量更新排名直方图并清理缓存（在事务中调用时提交后才更新）。
+    # 并发开通时可能重复计数，由排名索引的周期性重建修正。
+    def on_commit():
+        for achievement in achievements:
+            ranking_index.record_change(DIMENSION_ACHIEVEMENT, achievement.achievement_type, None,
+                                        achievement.progress)
+        for skill in skills:
+            ranking_index.record_change(DIMENSION_SKILL, skill.skill_type, None, skill.score)
+
+    transaction.on_commit(on_commit)
+    invalidate_user_statistics(user.id)
+    logger.info(f"Provisioned default achievements and skills for user {user.id}.")
+
+
+def invalidate_user_statistics(user_id):
+    """删除用户统计结果缓存"""
+    cache.delete(USER_STATISTICS_CACHE_KEY.format(user_id=user_id))
+
+
+def get_user_statistics(user):
+    """
+    获取用户统计数据。命中缓存时不访问数据库；
+    未命中时成就和能力各一次查询，首次访问才会额外开通默认记录。
+    """
+    cache_key = USER_STATISTICS_CACHE_KEY.format(user_id=user.id)
+    payload = cache.get(cache_key)
+    if payload is not None:
+        return payload
+
+    achievements = list(UserAchievement.objects.filter(user=user))
+    skills = list(UserSkill.objects.filter(user=user))
+    if not achievements or not skills:
+        provision_user_statistics(user)
+        achievements = list(UserAchievement.objects.filter(user=user))
+        skills = list(UserSkill.objects.filter(user=user))
+
+    payload = {
+        "achievements": UserAchievementSerializer(achievements, many=True).data,
+        "skills": UserSkillSerializer(skills, many=True).data,
+        "fraud_level": user.fraud_level,
+        "fraud_level_percentile": ranking_index.percentile(DIMENSION_FRAUD_LEVEL, '', user.fraud_level)
+    }
+    cache.set(cache_key, payload, getattr(settings, 'USER_STATISTICS_CACHE_TIMEOUT', 60))
+    return payload
+
+
+def _build_platform_statistics():
+    return {
+        "fraud_type_distribution": FraudTypeDistributionSerializer.get_data(),
+        "tactic_frequency": TacticFrequencySerializer.get_data(),
+        "emotional_triggers": EmotionalTriggerSerializer.get_data(),
+        "fraud_flow": FraudFlowSerializer.get_data(),
+        "fraud_cases_yearly": FraudCasesYearlySerializer.get_data(),
+    }
+
+
+def get_platform_statistics(refresh=False):
+    """
+    获取平台统计数据。四项来自图谱，年度案件数来自 FraudStatistics；
+    结果与图谱响应一同缓存（见 graph_api/services.py），图谱写入或年度数据变化时失效。
+    """
+    return cached_graph_payload(PLATFORM_STATISTICS_PAYLOAD, _build_platform_statistics, refresh)
+
+
+def invalidate_platform_statistics():
+    """删除平台统计结果缓存"""
+    cache.delete(GRAPH_PAYLOAD_CACHE_KEY.format(name=PLATFORM_STATISTICS_PAYLOAD, version=graph_cache_version()))
+
+
+def warm_platform_statistics(refresh=False):
+    """预热任务（见 KnowledgeBackend/warmup.py）"""
+    get_platform_statistics(refresh=refresh)
@@ -0,0 +1,99 @@
+"""
+统计应用信号 - 分数变化时增量刷新排名直方图（事务提交后，回滚的变更不计入），
+并维护用户统计与平台统计缓存
+"""
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .models import FraudStatistics, UserAchievement, UserSkill
+from .ranking import (
+    DIMENSION_ACHIEVEMENT,
+    DIMENSION_FRAUD_LEVEL,
+    DIMENSION_SKILL,
+    ranking_index,
+)
+from .services import invalidate_platform_statistics, invalidate_user_statistics, provision_user_statistics
+
+User = get_user_model()
+
+# 模型 -> (排名维度, 类型字段, 分数字段)
+RANKED_MODELS = {
+    UserAchievement: (DIMENSION_ACHIEVEMENT, 'achievement_type', 'progress'),
+    UserSkill: (DIMENSION_SKILL, 'skill_type', 'score'),
+    User: (DIMENSION_FRAUD_LEVEL, None, 'fraud_level'),
+}
+
+
+def _current(instance, key_field, value_field):
+    # 使用 __dict__ 读取，避免对延迟加载字段触发额外查询
+    key = instance.__dict__.get(key_field, '') if key_field else ''
+    return key, instance.__dict__.get(value_field)
+
+
+def _remember(sender, instance, **kwargs):
+    """记录实例加载时的分数，保存时据此计算增量"""
+    _, key_field, value_field = RANKED_MODELS[sender]
+    instance._ranking_original = _current(instance, key_field, value_field)
+
+
+def _record_on_commit(*change):
+    transaction.on_commit(partial(ranking_index.record_change, *change))
+
+
+def _on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    dimension, key_field, value_field = RANKED_MODELS[sender]
+    key, value = _current(instance, key_field, value_field)
+    if created:
+        _record_on_commit(dimension, key, None, value)
+    else:
+        old_key, old_value = getattr(instance, '_ranking_original', (key, None))
+        if old_key != key:
+            _record_on_commit(dimension, old_key, old_value, None)
+            _record_on_commit(dimension, key, None, value)
+        else:
+            _record_on_commit(dimension, key, old_value, value)
+    instance._ranking_original = (key, value)
+
+
+def _on_delete(sender, instance, **kwargs):
+    dimension, key_field, value_field = RANKED_MODELS[sender]
+    key, value = getattr(instance, '_ranking_original', _current(instance, key_field, value_field))
+    _record_on_commit(dimension, key, value, None)
+
+
+for _model in RANKED_MODELS:
+    post_init.connect(_remember, sender=_model, dispatch_uid=f'ranking_init_{_model.__name__}')
+    post_save.connect(_on_save, sender=_model, dispatch_uid=f'ranking_save_{_model.__name__}')
+    post_delete.connect(_on_delete, sender=_model, dispatch_uid=f'ranking_delete_{_model.__name__}')
+
+
+def _invalidate_statistics(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    invalidate_user_statistics(user_id)
+
+
+for _model in RANKED_MODELS:
+    post_save.connect(_invalidate_statistics, sender=_model, dispatch_uid=f'statistics_cache_save_{_model.__name__}')
+    post_delete.connect(_invalidate_statistics, sender=_model, dispatch_uid=f'statistics_cache_delete_{_model.__name__}')
+
+
+def _invalidate_platform_statistics(sender, instance, **kwargs):
+    invalidate_platform_statistics()
+
+
+post_save.connect(_invalidate_platform_statistics, sender=FraudStatistics, dispatch_uid='platform_statistics_cache_save')
+post_delete.connect(_invalidate_platform_statistics, sender=FraudStatistics, dispatch_uid='platform_statistics_cache_delete')
+
+
+def _provision_new_user(sender, instance, created, raw=False, **kwargs):
+    """注册时即开通默认成就与能力，避免首次访问统计页时再写库"""
+    if created and not raw:
+        provision_user_statistics(instance)
+
+
+post_save.connect(_provision_new_user, sender=User, dispatch_uid='statistics_provision_new_user')
@@ -0,0 +1,97 @@
+import random
+
+from django.test import SimpleTestCase
+
+from .ranking import DIMENSION_SKILL, MAX_BUCKET, FenwickHistogram, RankingIndex, score_to_bucket
+
+
+class FenwickHistogramTests(SimpleTestCase):
+
+    def test_count_below_matches_linear_scan(self):
+        rng = random.Random(0)
+        histogram = FenwickHistogram()
+        counts = [0] * (MAX_BUCKET + 1)
+        for _ in range(500):
+            bucket = rng.randint(0, MAX_BUCKET)
+            delta = 1 if counts[bucket] == 0 else rng.choice((1, -1))
+            histogram.add(bucket, delta)
+            counts[bucket] += delta
+        self.assertEqual(histogram.total, sum(counts))
+        for bucket in range(MAX_BUCKET + 2):
+            self.assertEqual(histogram.count_below(bucket), sum(counts[:bucket]))
+
+    def test_percentile(self):
+        histogram = FenwickHistogram()
+        self.assertEqual(histogram.percentile(50), 0.0)
+        for score in (10, 20, 20, 30):
+            histogram.add(score_to_bucket(score))
+        self.assertEqual(histogram.percentile(10), 0.0)
+        self.assertEqual(histogram.percentile(20.9), 25.0)
+        self.assertEqual(histogram.percentile(30), 75.0)
+        self.assertEqual(histogram.percentile(1000), 100.0)
+        self.assertEqual(histogram.percentile(None), 0.0)
+
+    def test_score_to_bucket(self):
+        self.assertEqual(score_to_bucket(42.7), 42)
+        self.assertEqual(score_to_bucket(-5), 0)
+        self.assertEqual(score_to_bucket(250), MAX_BUCKET)
+        self.assertIsNone(score_to_bucket(None))
+        self.assertIsNone(score_to_bucket('abc'))
+
+
+class StubRankingIndex(RankingIndex):
+    """聚合结果由测试提供，不访问数据库；during_aggregate 模拟聚合期间到达的变更"""
+
+    def __init__(self, scores, during_aggregate=None):
+        super().__init__(refresh_seconds=300)
+        self.scores = scores
+        self.during_aggregate = during_aggregate
+
+    def _aggregate(self):
+        histograms = {}
+        for score in self.scores:
+            self._apply(histograms, DIMENSION_SKILL, 'defense', None, score_to_bucket(score))
+        if self.during_aggregate:
+            self.during_aggregate(self)
+        return histograms
+
+
+class RankingIndexTests(SimpleTestCase):
+
+    def test_first_query_builds(self):
+        index = StubRankingIndex([10, 20, 30, 40])
+        self.assertEqual(index.percentile(DIMENSION_SKILL, 'defense', 35), 75.0)
+        self.assertEqual(index.percentile(DIMENSION_SKILL, 'unknown', 35), 0.0)
+
+    def test_record_change_updates_built_histogram(self):
+        index = StubRankingIndex([10, 20, 30, 40])
+        index.rebuild()
+        index.record_change(DIMENSION_SKILL, 'defense', 40, 5)
+        self.assertEqual(index.percentile(DIMENSION_SKILL, 'defense', 35), 100.0)
+        self.assertEqual(index.percentile(DIMENSION_SKILL, 'defense', 10), 25.0)
+        index.record_change(DIMENSION_SKILL, 'defense', None, 90)
+        self.assertEqual(index.percentile(DIMENSION_SKILL, 'defense', 95), 100.0)
+
+    def test_changes_during_rebuild_are_replayed(self):
+        def change(index):
+            # 聚合已经读完数据库，这个变更不在聚合结果中
+            index.record_change(DIMENSION_SKILL, 'defense', None, 90)
+
+        index = StubRankingIndex([10, 20, 30, 40])
+        index.rebuild()
+        index.during_aggregate = change
+        index.rebuild()
+        self.assertEqual(index.percentile(DIMENSION_SKILL, 'defense', 50), 80.0)
+        self.assertIsNone(index._pending_changes)
+
+    def test_failed_rebuild_keeps_histograms(self):
+        def fail(index):
+            raise RuntimeError('database unavailable')
+
+        index = StubRankingIndex([10, 20, 30, 40])
+        index.rebuild()
+        index.during_aggregate = fail
+        with self.assertRaises(RuntimeError):
+            index.rebuild()
+        self.assertIsNone(index._pending_changes)
+        self.assertEqual(index.percentile(DIMENSION_SKILL, 'defense', 35), 75.0)
@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import PlatformStatisticsView, UserStatisticsView
+from .views import PlatformStatisticsView, UserStatisticsView, StatisticsExportView, AchievementEventView
 
 app_name = 'statistics'
  
 urlpatterns = [
     path('platform/', PlatformStatisticsView.as_view(), name='platform-statistics'),
     path('user/', UserStatisticsView.as_view(), name='user-statistics'),
+    path('events/', AchievementEventView.as_view(), name='achievement-events'),
+    path('export/<str:dataset>/', StatisticsExportView.as_view(), name='statistics-export'),
 ] 
\ No newline at end of file
@@ -2,18 +2,12 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import FraudStatistics, UserAchievement, UserSkill
-from .serializers import (
-    FraudStatisticsSerializer, 
-    UserAchievementSerializer, 
-    UserSkillSerializer,
-    FraudTypeDistributionSerializer,
-    TacticFrequencySerializer,
-    EmotionalTriggerSerializer,
-    FraudFlowSerializer,
-    FraudCasesYearlySerializer
-)
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.throttling import ScopedRateThrottle
+from graph_api import exporters
+from .services import get_platform_statistics, get_user_statistics
+from .achievements import clean_client_event, get_event_recorder
+from .exports import get_dataset
 
 
 class PlatformStatisticsView(APIView):
@@ -21,20 +15,8 @@ class PlatformStatisticsView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, format=None):
-        """获取平台统计数据"""
-        fraud_type_distribution = FraudTypeDistributionSerializer.get_data()
-        tactic_frequency = TacticFrequencySerializer.get_data()
-        emotional_triggers = EmotionalTriggerSerializer.get_data()
-        fraud_flow = FraudFlowSerializer.get_data()
-        fraud_cases_yearly = FraudCasesYearlySerializer.get_data()
-
-        return Response({
-            "fraud_type_distribution": fraud_type_distribution,
-            "tactic_frequency": tactic_frequency,
-            "emotional_triggers": emotional_triggers,
-            "fraud_flow": fraud_flow,
-            "fraud_cases_yearly": fraud_cases_yearly
-        }, status=status.HTTP_200_OK)
+        """获取平台统计数据（缓存，见 services.get_platform_statistics）"""
+        return Response(get_platform_statistics(), status=status.HTTP_200_OK)
 
 
 class UserStatisticsView(APIView):
@@ -43,39 +25,44 @@ class UserStatisticsView(APIView):
 
     def get(self, request, format=None):
         """获取用户统计数据"""
-        user = request.user
+        return Response(get_user_statistics(request.user), status=status.HTTP_200_OK)
+
+
+class AchievementEventView(APIView):
+    """客户端上报成就事件（答题、分享）API"""
+    permission_classes = [IsAuthenticated]
+    # 按用户限速，速率见 REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'achievement_events'
 
-        # 获取用户成就数据
-        achievements = UserAchievement.objects.filter(user=user)
-        if not achievements.exists():
-            # 如果没有数据，创建示例数据
-            achievement_types = ["学习成就", "模拟成就", "分享成就", "防骗实战", "知识掌握"]
-            for achievement_type in achievement_types:
-                UserAchievement.objects.create(
-                    user=user,
-                    achievement_type=achievement_type,
-                    progress=round(30 + 70 * user.id % 100 / 100, 2)  # 生成30-100之间的随机值
-                )
-            achievements = UserAchievement.objects.filter(user=user)
+    def post(self, request, format=None):
+        """
+        请求体：{"kind": "quiz_answer", "payload": {"question_id": "q1", "correct": true}}
+        字段见 achievements.CLIENT_EVENT_SCHEMAS，同一道题（测验、分享对象）只计一次。
+        事件异步落库并批量计入成就，接口立即返回 202
+        """
+        try:
+            payload, dedup_key = clean_client_event(request.data.get('kind'), request.data.get('payload') or {})
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not get_event_recorder().record(request.user.pk, request.data['kind'], payload, dedup_key):
+            return Response({"error": "事件队列已满，请稍后重试"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"accepted": True}, status=status.HTTP_202_ACCEPTED)
 
-        # 获取用户能力数据
-        skills = UserSkill.objects.filter(user=user)
-        if not skills.exists():
-            # 如果没有数据，创建示例数据
-            skill_types = ["信息识别能力", "情绪应对能力", "主动防御意识", "风险评估能力", "安全意识"]
-            for skill_type in skill_types:
-                UserSkill.objects.create(
-                    user=user,
-                    skill_type=skill_type,
-                    score=round(40 + 60 * user.id % 100 / 100, 2)  # 生成40-100之间的随机值
-                )
-            skills = UserSkill.objects.filter(user=user)
 
-        # 序列化数据
-        achievement_data = UserAchievementSerializer(achievements, many=True).data
-        skill_data = UserSkillSerializer(skills, many=True).data
+class StatisticsExportView(APIView):
+    """统计数据流式导出API（CSV / Parquet）"""
+    permission_classes = [IsAdminUser]
 
-        return Response({
-            "achievements": achievement_data,
-            "skills": skill_data
-        }, status=status.HTTP_200_OK) 
\ No newline at end of file
+    def get(self, request, dataset, format=None):
+        """导出指定数据集，export_format 可选 csv（默认）或 parquet"""
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in exporters.EXPORT_FORMATS:
+            return Response({"error": f"不支持的导出格式 '{export_format}'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            columns, rows = get_dataset(dataset)
+            return exporters.streaming_export_response(
+                request, exporters.prime_rows(rows), columns, export_format, filename=dataset
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
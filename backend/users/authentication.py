@@ -0,0 +1,81 @@
+"""
+带缓存的 JWT 认证。
+
+JWTAuthentication 每个请求都会按 token 中的 user_id 查询一次用户表。
+这里把视图实际用到的少数字段缓存起来（见 CACHED_USER_FIELDS），命中时不访问数据库：
+- 缓存 key 带版本号，资料修改、改密码、删除用户时（见 signals.py）更换版本号，旧条目不再被读取；
+  即使并发请求在更换前读到旧数据并写回缓存，写入的也是旧版本的 key
+- 条目本身只保留较短时间（AUTH_USER_CACHE_TIMEOUT），作为兜底
+- 还原出的用户对象中其余字段为延迟加载，访问时才查询；save() 只会更新已加载的字段，
+  需要修改用户时请重新从数据库读取
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# 认证与各视图（个人资料、统计、权限判断）用到的字段
+CACHED_USER_FIELDS = (
+    'id', 'username', 'nickname', 'email', 'phone_number', 'avatar', 'avatar_variants',
+    'fraud_level', 'user_type', 'is_active', 'is_staff', 'is_superuser',
+)
+
+USER_CACHE_VERSION_KEY = 'users:auth:version:{user_id}'
+USER_CACHE_KEY = 'users:auth:{user_id}:{version}'
+
+
+def _cache_version(user_id) -> str:
+    return cache.get(USER_CACHE_VERSION_KEY.format(user_id=user_id)) or '0'
+
+
+def _cached_field_names(user_model):
+    # from_db 要求字段按模型中的定义顺序排列
+    return [field.attname for field in user_model._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+
+
+def get_cached_user(user_id):
+    """按 user_id 返回用户（只加载 CACHED_USER_FIELDS），用户不存在时返回 None"""
+    user_model = get_user_model()
+    field_names = _cached_field_names(user_model)
+    key = USER_CACHE_KEY.format(user_id=user_id, version=_cache_version(user_id))
+    values = cache.get(key)
+    if values is None:
+        row = (user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+               .values_list(*field_names).first())
+        if row is None:
+            return None
+        values = list(row)
+        cache.set(key, values, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+    return user_model.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+
+def invalidate_cached_user(user_id):
+    """更换用户的缓存版本号，之后的请求会重新从数据库加载"""
+    # 用时间戳而不是自增，版本号 key 被淘汰后也不会与仍未过期的旧条目重名
+    cache.set(USER_CACHE_VERSION_KEY.format(user_id=user_id), str(time.time_ns()), None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """与 JWTAuthentication 行为一致，但用户从缓存中读取"""
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD not in CACHED_USER_FIELDS:
+            # 需要比对密码摘要，或按未缓存的字段查找用户时，直接查询数据库
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,176 @@
+"""
+头像处理。
+
+上传请求中只做廉价的检查（大小上限、文件头是否为常见图片格式），原图保存后立即返回；
+解码、校验和缩放由后台任务 users.avatars 执行（见 jobs/queue.py 与 users/jobs.py）：
+- 按 EXIF 方向摆正，居中裁剪为正方形，缩放到 AVATAR_SIZES 中的每个尺寸，
+  分别编码为 WebP 和 JPEG
+- 缩略图以内容摘要命名（avatars/variants/<尺寸>/<sha256>.<扩展名>），内容不变则地址不变，
+  可以设置长期缓存（immutable）；相同内容只保存一份
+- 结果写入 CustomUser.avatar_variants，个人资料接口返回各尺寸的地址；处理完成前为空，
+  前端回退到原图
+- 解码失败或像素数超过 AVATAR_MAX_PIXELS 时删除原图并清空头像
+- 处理期间用户又换了头像时，旧任务的结果不会覆盖新头像（按原图路径条件更新）
+"""
+import hashlib
+import io
+import logging
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'avatars/variants'
+
+# 文件头与对应的图片格式
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+# 缩略图格式：(格式, 扩展名, 编码参数)
+_VARIANT_FORMATS = (
+    ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+def avatar_sizes():
+    return tuple(sorted(getattr(settings, 'AVATAR_SIZES', (64, 128, 256))))
+
+
+def _sniff_format(head: bytes) -> Optional[str]:
+    for signature, image_format in _SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def validate_avatar_upload(upload):
+    """请求中的检查：只读取文件头，不解码图片"""
+    max_bytes = getattr(settings, 'AVATAR_MAX_UPLOAD_BYTES', 10 * 1024 * 1024)
+    if upload.size > max_bytes:
+        raise ValidationError(f"Avatar must be at most {max_bytes // (1024 * 1024)} MB.")
+    upload.seek(0)
+    head = upload.read(16)
+    upload.seek(0)
+    if _sniff_format(head) is None:
+        raise ValidationError("Upload a valid image (JPEG, PNG, GIF or WebP).")
+
+
+def render_variants(data: bytes) -> Dict[str, Dict[str, bytes]]:
+    """解码原图并生成各尺寸的缩略图，返回 {尺寸: {扩展名: 编码后的内容}}；图片无效时抛出 ValueError"""
+    from PIL import Image, ImageOps
+
+    max_pixels = getattr(settings, 'AVATAR_MAX_PIXELS', 40_000_000)
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            if probe.format not in ('JPEG', 'PNG', 'GIF', 'WEBP'):
+                raise ValueError(f"unsupported format {probe.format}")
+            if probe.width * probe.height > max_pixels:
+                raise ValueError(f"image too large ({probe.width}x{probe.height})")
+            probe.verify()
+        # verify() 之后需要重新打开才能读取像素
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft('RGB', (max(avatar_sizes()) * 2,) * 2)
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                # 透明背景铺白，JPEG 不支持透明
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+            side = min(image.size)
+            square = ImageOps.fit(image, (side, side), method=Image.Resampling.LANCZOS)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(str(e)) from e
+
+    variants = {}
+    for size in avatar_sizes():
+        resized = square if size >= side else square.resize((size, size), Image.Resampling.LANCZOS)
+        encoded = {}
+        for image_format, extension, options in _VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            encoded[extension] = buffer.getvalue()
+        variants[str(size)] = encoded
+    return variants
+
+
+def store_variants(variants: Dict[str, Dict[str, bytes]]) -> Dict[str, Dict[str, str]]:
+    """以内容摘要命名保存缩略图，返回 {尺寸: {扩展名: 存储路径}}"""
+    names = {}
+    for size, encoded in variants.items():
+        names[size] = {}
+        for extension, content in encoded.items():
+            digest = hashlib.sha256(content).hexdigest()[:32]
+            name = f'{VARIANTS_DIR}/{size}/{digest}.{extension}'
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(content))
+            names[size][extension] = name
+    return names
+
+
+def process_avatar(user_id, source_name: str) -> bool:
+    """为用户当前的原图生成缩略图；原图已被替换时放弃结果，返回是否写入了新的缩略图"""
+    from .authentication import invalidate_cached_user
+    from .models import CustomUser
+
+    try:
+        with default_storage.open(source_name, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        logger.warning(f"Avatar {source_name} of user {user_id} is missing: {e}")
+        return False
+
+    try:
+        variants = render_variants(data)
+    except ValueError as e:
+        logger.warning(f"Rejected avatar {source_name} of user {user_id}: {e}")
+        updated = CustomUser.objects.filter(pk=user_id, avatar=source_name).update(avatar=None, avatar_variants={})
+        default_storage.delete(source_name)
+        if updated:
+            invalidate_cached_user(user_id)
+        return False
+
+    names = store_variants(variants)
+    updated = CustomUser.objects.filter(pk=user_id, avatar=source_name).update(avatar_variants=names)
+    if updated:
+        invalidate_cached_user(user_id)
+    return bool(updated)
+
+
+def schedule_avatar_processing(user):
+    """
+    事务提交后提交头像处理任务；任务执行时处理用户当时的头像，同一用户排队中的任务只保留一个。
+    失败时由任务队列重试，run_jobs 未运行时任务留在队列中，不会丢失
+    """
+    from jobs.models import PRIORITY_HIGH
+    from jobs.queue import enqueue
+
+    if not user.avatar:
+        return
+    user_id = user.pk
+    # 用户在等待缩略图，优先于统计刷新等任务
+    transaction.on_commit(lambda: enqueue('users.avatars', {'user_ids': [user_id]}, priority=PRIORITY_HIGH))
+
+
+def variant_urls(user, request=None) -> Dict[str, Dict[str, str]]:
+    """{尺寸: {扩展名: 地址}}，有 request 时返回绝对地址"""
+    urls = {}
+    for size, names in (user.avatar_variants or {}).items():
+        urls[size] = {}
+        for extension, name in names.items():
+            url = default_storage.url(name)
+            urls[size][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
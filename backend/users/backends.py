@@ -0,0 +1,120 @@
+"""
+账号 / 邮箱 / 手机号登录。
+
+- 三种标识在一次查询中解析：用户名走唯一索引，邮箱按小写比较（对应 LOWER(email) 函数索引），
+  手机号先去掉空格和连字符再比较（保存时同样规范化，对应唯一索引），数据库可以合并三个索引查找
+- 同一个输入同时匹配多个用户时，优先选取输入看起来的那种标识（含 @ 为邮箱，纯数字为手机号），
+  其次才是用户名：注册时已不允许邮箱、手机号形式的用户名，旧账号仍可以用这类用户名登录，
+  但不能借此抢占别人的邮箱或手机号登录。邮箱不唯一，匹配到多个用户时不允许用邮箱登录
+- 密码哈希（PBKDF2 等）是登录请求中最耗 CPU 的部分，统一交给大小固定的线程池执行：
+  同步接口中限制同时进行的哈希数，避免登录高峰占满 worker；异步接口中不阻塞事件循环。
+  hashlib 计算时会释放 GIL，线程池可以利用多核
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .models import identifier_kind, normalize_email, normalize_phone
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'AUTH_PASSWORD_HASH_WORKERS', 0) or os.cpu_count() or 1
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor
+
+
+def find_user_by_identifier(identifier: str):
+    """按用户名、邮箱或手机号查找用户（一次查询），找不到时返回 None"""
+    return _pick_user(identifier, list(_identifier_queryset(identifier)))
+
+
+async def afind_user_by_identifier(identifier: str):
+    return _pick_user(identifier, [user async for user in _identifier_queryset(identifier)])
+
+
+def _identifier_queryset(identifier: str):
+    condition = Q(username=identifier) | Q(email_normalized=normalize_email(identifier))
+    phone = normalize_phone(identifier)
+    if phone:
+        condition |= Q(phone_number=phone)
+    # 用户名、手机号唯一；邮箱可能重复，全部取回用于判断
+    return get_user_model().objects.annotate(email_normalized=Lower('email')).filter(condition)
+
+
+def _pick_user(identifier: str, candidates):
+    kind = identifier_kind(identifier)
+    if kind == 'email':
+        email = normalize_email(identifier)
+        by_email = [user for user in candidates if user.email and user.email.lower() == email]
+        if len(by_email) == 1:
+            return by_email[0]
+        if by_email:
+            # 邮箱有歧义时不退回用户名匹配
+            return None
+    elif kind == 'phone':
+        phone = normalize_phone(identifier)
+        for user in candidates:
+            if user.phone_number == phone:
+                return user
+    for user in candidates:
+        if user.username == identifier:
+            return user
+    return None
+
+
+def _check_password(user, password: str) -> bool:
+    if user is None:
+        # 用户不存在时也计算一次哈希，响应时间不泄露账号是否存在
+        get_user_model()().set_password(password)
+        return False
+    return user.check_password(password)
+
+
+def check_password(user, password: str) -> bool:
+    """在哈希线程池中校验密码；user 为 None 时同样耗时并返回 False"""
+    return _get_executor().submit(_check_password, user, password).result()
+
+
+async def acheck_password(user, password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), _check_password, user, password)
+
+
+class IdentifierBackend(ModelBackend):
+    """
+    username 参数可以是用户名、邮箱或手机号。
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if not username or password is None:
+            return None
+        user = find_user_by_identifier(username)
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if not username or password is None:
+            return None
+        user = await afind_user_by_identifier(username)
+        if await acheck_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
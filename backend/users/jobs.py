@@ -0,0 +1,24 @@
+"""
+用户相关的后台任务（见 jobs/queue.py）
+"""
+from .avatars import process_avatar
+from .models import CustomUser
+
+
+def process_avatars(job):
+    """
+    生成头像缩略图。参数：user_ids（只处理这些用户），all（重新生成已有缩略图的用户）；
+    缺省时处理所有有头像但还没有缩略图的用户，与 process_avatars 命令相同
+    """
+    users = CustomUser.objects.exclude(avatar='').exclude(avatar=None)
+    if job.params.get('user_ids'):
+        users = users.filter(pk__in=job.params['user_ids'])
+    elif not job.params.get('all'):
+        users = users.filter(avatar_variants={})
+    pending = list(users.values_list('id', 'avatar'))
+    processed = 0
+    for index, (user_id, avatar) in enumerate(pending):
+        if process_avatar(user_id, avatar):
+            processed += 1
+        job.progress(100 * (index + 1) / len(pending), f"{index + 1}/{len(pending)}")
+    return {'users': len(pending), 'processed': processed}
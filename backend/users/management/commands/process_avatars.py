@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from users.avatars import process_avatar
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "为已有头像但还没有缩略图的用户生成缩略图（--all 时全部重新生成）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="重新生成所有用户的缩略图")
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.exclude(avatar='').exclude(avatar=None)
+        if not options['all']:
+            users = users.filter(avatar_variants={})
+        processed = 0
+        for user_id, avatar in users.values_list('id', 'avatar').iterator():
+            if process_avatar(user_id, avatar):
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} avatars"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.revocation import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "分批删除已过期的 refresh token 及其黑名单记录（建议通过 cron 定期执行）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="每批删除的 token 数")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired tokens"))
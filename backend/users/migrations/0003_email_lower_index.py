@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:46
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def normalize_phone_numbers(apps, schema_editor):
+    """去掉已有手机号中的分隔符；规范化后与其他用户重复的保持原样"""
+    from users.models import normalize_phone
+
+    CustomUser = apps.get_model('users', 'CustomUser')
+    taken = set(CustomUser.objects.exclude(phone_number=None).values_list('phone_number', flat=True))
+    for user in CustomUser.objects.exclude(phone_number=None).only('id', 'phone_number'):
+        normalized = normalize_phone(user.phone_number)
+        if normalized == user.phone_number or (normalized is not None and normalized in taken):
+            continue
+        taken.discard(user.phone_number)
+        taken.add(normalized)
+        CustomUser.objects.filter(pk=user.pk).update(phone_number=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_customuser_avatar_customuser_nickname'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='users_email_lower_idx'),
+        ),
+        migrations.RunPython(normalize_phone_numbers, migrations.RunPython.noop),
+    ]
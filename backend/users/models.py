@@ -1,5 +1,32 @@
+import re
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
+
+_PHONE_SEPARATORS = re.compile(r'[\s\-()]')
+_PHONE_LIKE = re.compile(r'^\+?\d{5,15}$')
+
+
+def normalize_email(value):
+    return value.strip().lower() if value else value
+
+
+def normalize_phone(value):
+    """去掉手机号中的空格、连字符和括号；空字符串视为未填写"""
+    if value is None:
+        return None
+    return _PHONE_SEPARATORS.sub('', value) or None
+
+
+def identifier_kind(value):
+    """登录标识看起来是哪一种：'email'（含 @）、'phone'（规范化后为 5-15 位数字，可带 +）或 'username'"""
+    if '@' in value:
+        return 'email'
+    if _PHONE_LIKE.match(normalize_phone(value) or ''):
+        return 'phone'
+    return 'username'
+
 
 class CustomUser(AbstractUser):
     # 添加你的自定义字段
@@ -8,9 +35,21 @@ class CustomUser(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True, null=True, unique=True) # 手机号
     nickname = models.CharField(max_length=100, blank=True, null=True) # 添加昵称字段
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True) # 添加头像字段
+    avatar_variants = models.JSONField(default=dict, blank=True) # 头像缩略图 {尺寸: {扩展名: 路径}}，见 users.avatars
     # email 字段 AbstractUser 已经包含了
 
     # 可以添加其他需要的字段，比如头像等
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # 邮箱登录按小写比较（见 users.backends）
+            models.Index(Lower('email'), name='users_email_lower_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # 手机号统一去掉分隔符后保存，登录时按同样的规则规范化输入
+        self.phone_number = normalize_phone(self.phone_number)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username
@@ -0,0 +1,176 @@
+"""
+refresh token 吊销（黑名单）。
+
+- 批量吊销：改密码等场景下，用一次 bulk_create(ignore_conflicts=True) 把用户所有未过期的
+  refresh token 加入黑名单，不再逐条 get_or_create
+- 内存过滤器：每个进程用所有未过期的已吊销 jti 构建一个 Bloom 过滤器。校验 refresh token 时
+  先查过滤器，不在其中的一定没有被吊销，无需查询数据库；只有命中（真正吊销或极少量误判）时才查库
+- 过滤器的“代号”保存在 Django cache 中，任何进程吊销 token 后更换代号，其他进程下次校验时
+  发现代号变化即重建。cache 是进程内的（LocMemCache 等）时其他进程看不到代号变化，
+  过滤器默认不启用，每次都查询数据库（见 REVOKED_TOKEN_FILTER_ENABLED）
+- 过期 token 由 purge_expired_tokens 命令定期分批清理，表和过滤器都保持在较小的规模
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+REVOKED_TOKENS_GENERATION_KEY = 'users:revoked_tokens:generation'
+
+# 过滤器的最小容量，避免已吊销 token 很少时频繁因容量不足而重建
+MIN_FILTER_CAPACITY = 1024
+
+# 只在当前进程内有效（或不保存数据）的 cache 后端，无法把代号变化通知其他进程
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def filter_enabled() -> bool:
+    """REVOKED_TOKEN_FILTER_ENABLED 未设置时，只在默认 cache 为共享缓存时启用过滤器"""
+    enabled = getattr(settings, 'REVOKED_TOKEN_FILTER_ENABLED', None)
+    if enabled is not None:
+        return enabled
+    backend = getattr(settings, 'CACHES', {}).get('default', {}).get('BACKEND', '')
+    return backend not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+class BloomFilter:
+    """定长位数组上的 Bloom 过滤器（双重哈希），只会误判存在，不会漏判"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevokedTokenFilter:
+    """进程内的已吊销 jti 过滤器，线程安全"""
+
+    def __init__(self, error_rate: Optional[float] = None, refresh_seconds: Optional[float] = None):
+        self.error_rate = error_rate or getattr(settings, 'REVOKED_TOKEN_FILTER_ERROR_RATE', 0.01)
+        self.refresh_seconds = (refresh_seconds if refresh_seconds is not None
+                                else getattr(settings, 'REVOKED_TOKEN_FILTER_REFRESH_SECONDS', 300))
+        self._bloom: Optional[BloomFilter] = None
+        self._generation = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def might_be_revoked(self, jti: str) -> bool:
+        """False 表示一定未被吊销；True 时需要再查询数据库确认。过滤器未启用时总是返回 True"""
+        if not filter_enabled():
+            return True
+        self._ensure_fresh()
+        bloom = self._bloom
+        return bloom is None or jti in bloom
+
+    def add(self, jtis: Iterable[str]):
+        """
+        记录新吊销的 jti 并更换代号。本进程同样在下次校验时从数据库重建，
+        这样不会漏掉其他进程在此期间吊销的 token；吊销远少于校验，重建的开销可以忽略。
+        """
+        jtis = list(jtis)
+        if not jtis:
+            return
+        # 事务提交后再更换代号，其他进程重建时才能读到新的黑名单记录
+        transaction.on_commit(self._bump_generation)
+        with self._lock:
+            if self._bloom is not None:
+                for jti in jtis:
+                    self._bloom.add(jti)
+
+    def invalidate(self):
+        """黑名单有删除（如清理过期 token）时调用，所有进程下次校验时重建"""
+        transaction.on_commit(self._bump_generation)
+        with self._lock:
+            self._bloom = None
+
+    def _ensure_fresh(self):
+        generation = cache.get(REVOKED_TOKENS_GENERATION_KEY)
+        if (self._bloom is not None and generation == self._generation
+                and time.monotonic() - self._built_at < self.refresh_seconds):
+            return
+        with self._lock:
+            if (self._bloom is not None and generation == self._generation
+                    and time.monotonic() - self._built_at < self.refresh_seconds):
+                return
+            jtis = list(
+                BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+                .values_list('token__jti', flat=True)
+            )
+            bloom = BloomFilter(max(MIN_FILTER_CAPACITY, 2 * len(jtis)), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            self._bloom = bloom
+            self._generation = generation
+            self._built_at = time.monotonic()
+        logger.info(f"Rebuilt revoked token filter with {len(jtis)} tokens.")
+
+    @staticmethod
+    def _bump_generation() -> str:
+        generation = str(time.time_ns())
+        cache.set(REVOKED_TOKENS_GENERATION_KEY, generation, None)
+        return generation
+
+
+revoked_tokens = RevokedTokenFilter()
+
+
+def revoke_user_tokens(user) -> int:
+    """把用户所有未过期的 refresh token 加入黑名单，返回本次涉及的 token 数"""
+    tokens = list(
+        OutstandingToken.objects.filter(user=user, expires_at__gt=timezone.now()).values_list('id', 'jti')
+    )
+    if not tokens:
+        return 0
+    # 已在黑名单中的 token 由唯一约束忽略
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token_id=token_id) for token_id, _ in tokens], ignore_conflicts=True
+    )
+    revoked_tokens.add(jti for _, jti in tokens)
+    return len(tokens)
+
+
+def purge_expired_tokens(batch_size: int = 1000) -> int:
+    """分批删除已过期的 token 及其黑名单记录，避免一次大删除长时间锁表，返回删除的 token 数"""
+    deleted = 0
+    now = timezone.now()
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+    if deleted:
+        revoked_tokens.invalidate()
+    return deleted
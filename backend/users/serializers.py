@@ -1,13 +1,18 @@
 from rest_framework import serializers
-from .models import CustomUser
+from .avatars import schedule_avatar_processing, validate_avatar_upload, variant_urls
+from .models import CustomUser, identifier_kind, normalize_phone
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.contrib.auth.models import update_last_login
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .tokens import RefreshToken
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
-    avatar = serializers.ImageField(required=False) # 添加头像字段，非必填
+    # 添加头像字段，非必填；请求中只检查文件头，解码和缩放在后台进行（见 avatars.py）
+    avatar = serializers.FileField(required=False, validators=[validate_avatar_upload])
 
     class Meta:
         model = CustomUser
@@ -20,6 +25,19 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             'avatar': {'required': False}, # 明确指定 avatar 为非必填
         }
 
+    def validate_username(self, value):
+        # 登录时按输入的形式优先匹配邮箱或手机号（见 backends.py），用户名不能与之混淆
+        if identifier_kind(value) != 'username':
+            raise serializers.ValidationError("Username must not look like an email address or phone number.")
+        return value
+
+    def validate_phone_number(self, value):
+        # 与保存时的规范化一致，再检查一次唯一性
+        value = normalize_phone(value)
+        if value and CustomUser.objects.filter(phone_number=value).exists():
+            raise serializers.ValidationError("Phone number already exists.")
+        return value
+
     def validate(self, data):
         if data['password'] != data['password2']:
             raise serializers.ValidationError({"password": "Passwords do not match"})
@@ -49,16 +67,23 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         if avatar_file:
             user.avatar = avatar_file
         user.save()
+        schedule_avatar_processing(user)
         return user
 
 class UserProfileSerializer(serializers.ModelSerializer):
-    avatar = serializers.ImageField(required=False)
+    avatar = serializers.FileField(required=False, validators=[validate_avatar_upload])
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
-        fields = ('username', 'nickname', 'email', 'phone_number', 'fraud_level', 'user_type', 'avatar')
+        fields = ('username', 'nickname', 'email', 'phone_number', 'fraud_level', 'user_type', 'avatar',
+                  'avatar_variants')
         read_only_fields = ('username', 'fraud_level', 'user_type')
 
+    def get_avatar_variants(self, obj):
+        # 各尺寸缩略图地址，头像处理完成前为空
+        return variant_urls(obj, self.context.get('request'))
+
     def validate_email(self, value):
         # 校验邮箱唯一性
         if value and self.instance and CustomUser.objects.exclude(id=self.instance.id).filter(email=value).exists():
@@ -66,7 +91,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return value
 
     def validate_phone_number(self, value):
-        # 校验手机号唯一性
+        # 校验手机号唯一性（按规范化后的号码）
+        value = normalize_phone(value)
         if value and self.instance and CustomUser.objects.exclude(id=self.instance.id).filter(phone_number=value).exists():
             raise serializers.ValidationError("Phone number already exists.")
         return value
@@ -74,10 +100,18 @@ class UserProfileSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         # 在这里可以处理更复杂的更新逻辑，例如触发验证码发送
         # 目前只进行简单的更新
-        return super().update(instance, validated_data)
+        if 'avatar' in validated_data:
+            # 新头像处理完成前不再返回旧头像的缩略图
+            instance.avatar_variants = {}
+        instance = super().update(instance, validated_data)
+        if validated_data.get('avatar'):
+            schedule_avatar_processing(instance)
+        return instance
 
 
 class UserLoginSerializer(TokenObtainPairSerializer):
+    token_class = RefreshToken
+
     def validate(self, attrs):
         # Call the parent class's validate method to get the tokens
         data = super().validate(attrs)
@@ -90,6 +124,21 @@ class UserLoginSerializer(TokenObtainPairSerializer):
         return data
 
 
+def login_payload(user):
+    """为已通过认证的用户签发 token，返回与 UserLoginSerializer 相同格式的数据"""
+    refresh = UserLoginSerializer.get_token(user)
+    data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+    if api_settings.UPDATE_LAST_LOGIN:
+        update_last_login(None, user)
+    data['user'] = UserProfileSerializer(user).data
+    return data
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    # 校验黑名单时先查内存中的吊销过滤器，未被吊销的 token 不查询数据库
+    token_class = RefreshToken
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(write_only=True, required=True)
     new_password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -0,0 +1,21 @@
+"""
+用户应用信号 - 用户资料变化（修改资料、改密码）或删除时更换认证缓存的版本号
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .authentication import invalidate_cached_user
+
+User = get_user_model()
+
+
+def _invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # 事务提交后再更换版本号，避免并发请求在提交前把旧数据写回缓存
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
+
+
+post_save.connect(_invalidate_cached_user, sender=User, dispatch_uid='users_auth_cache_save')
+post_delete.connect(_invalidate_cached_user, sender=User, dispatch_uid='users_auth_cache_delete')
@@ -1,3 +1,149 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
 
-# Create your tests here.
+from jobs.models import PRIORITY_HIGH, Job
+
+from .avatars import schedule_avatar_processing
+from .backends import find_user_by_identifier
+from .models import identifier_kind
+from .revocation import BloomFilter, RevokedTokenFilter, filter_enabled, revoke_user_tokens, revoked_tokens
+from .serializers import UserRegistrationSerializer
+from .tokens import RefreshToken
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                           'LOCATION': 'redis://localhost:6379/0'}}
+
+
+class BloomFilterTests(SimpleTestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        keys = [f"jti-{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertEqual(bloom.count, 1000)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(20000))
+        # 容量内的误判率应接近 error_rate，留出两倍余量
+        self.assertLess(false_positives / 20000, 0.02)
+
+    def test_empty_filter(self):
+        bloom = BloomFilter(0)
+        self.assertGreaterEqual(bloom.size, 8)
+        self.assertNotIn('jti', bloom)
+
+
+class FilterEnabledTests(SimpleTestCase):
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_disabled_with_process_local_cache(self):
+        with self.settings(REVOKED_TOKEN_FILTER_ENABLED=None):
+            self.assertFalse(filter_enabled())
+            # 未启用时每次都需要查询数据库
+            self.assertTrue(RevokedTokenFilter().might_be_revoked('jti'))
+
+    @override_settings(CACHES=REDIS_CACHE, REVOKED_TOKEN_FILTER_ENABLED=None)
+    def test_enabled_with_shared_cache(self):
+        self.assertTrue(filter_enabled())
+
+    @override_settings(CACHES=LOCMEM_CACHE, REVOKED_TOKEN_FILTER_ENABLED=True)
+    def test_explicit_setting_wins(self):
+        self.assertTrue(filter_enabled())
+
+
+@override_settings(CACHES=LOCMEM_CACHE, REVOKED_TOKEN_FILTER_ENABLED=True)
+class RevokedTokenFilterTests(TestCase):
+    """LocMem 在单进程测试中同样可以传递代号变化"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('alice', password='pw')
+        revoked_tokens.invalidate()
+
+    def test_revocation(self):
+        first, second = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        # 另一个进程中的过滤器，在吊销前构建
+        other = RevokedTokenFilter()
+        self.assertFalse(other.might_be_revoked(first['jti']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(revoke_user_tokens(self.user), 2)
+
+        for token in (first, second):
+            self.assertTrue(revoked_tokens.might_be_revoked(token['jti']))
+            self.assertTrue(other.might_be_revoked(token['jti']))
+            with self.assertRaises(TokenError):
+                token.check_blacklist()
+
+        fresh = RefreshToken.for_user(self.user)
+        self.assertFalse(revoked_tokens.might_be_revoked(fresh['jti']))
+        fresh.check_blacklist()
+
+    def test_blacklist_single_token(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(revoked_tokens.might_be_revoked(token['jti']))
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        self.assertTrue(revoked_tokens.might_be_revoked(token['jti']))
+        with self.assertRaises(TokenError):
+            token.check_blacklist()
+
+
+class IdentifierLoginTests(TestCase):
+    """登录标识优先按输入的形式匹配邮箱或手机号，用户名不能抢占别人的邮箱、手机号"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.victim = User.objects.create_user('victim', email='victim@example.com', phone_number='13800000000',
+                                               password='pw')
+        # 注册校验加入之前已存在的账号
+        User.objects.create_user('victim@example.com', password='pw')
+        User.objects.create_user('13800000000', password='pw')
+
+    def test_identifier_kind(self):
+        self.assertEqual(identifier_kind('a@b.c'), 'email')
+        self.assertEqual(identifier_kind('+86 138-0000-0000'), 'phone')
+        self.assertEqual(identifier_kind('alice'), 'username')
+        self.assertEqual(identifier_kind('1234'), 'username')
+
+    def test_email_and_phone_win_over_username(self):
+        for identifier in ('victim@example.com', 'VICTIM@example.com', '138-0000-0000', 'victim'):
+            self.assertEqual(find_user_by_identifier(identifier), self.victim, identifier)
+
+    def test_legacy_username_still_logs_in(self):
+        legacy = get_user_model().objects.create_user('nobody@example.com', password='pw')
+        self.assertEqual(find_user_by_identifier('nobody@example.com'), legacy)
+
+    def test_registration_rejects_ambiguous_usernames(self):
+        serializer = UserRegistrationSerializer()
+        for username in ('someone@example.com', '13900000000'):
+            with self.assertRaises(serializers.ValidationError, msg=username):
+                serializer.validate_username(username)
+        self.assertEqual(serializer.validate_username('alice'), 'alice')
+
+
+class AvatarSchedulingTests(TestCase):
+    """头像处理通过任务队列执行，提交事务后入队，同一用户排队中的任务只保留一个"""
+
+    def test_enqueue_after_commit(self):
+        user = get_user_model().objects.create_user('alice', password='pw', avatar='avatars/a.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_avatar_processing(user)
+            self.assertFalse(Job.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_avatar_processing(user)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.params, job.priority), ('users.avatars', {'user_ids': [user.pk]}, PRIORITY_HIGH))
+
+    def test_no_avatar(self):
+        user = get_user_model().objects.create_user('bob', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_avatar_processing(user)
+        self.assertFalse(Job.objects.exists())
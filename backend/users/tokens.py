@@ -0,0 +1,21 @@
+"""
+带内存吊销过滤器的 refresh token。
+
+校验黑名单时先查进程内的过滤器（见 revocation.py），确定未被吊销的 token 不再查询数据库。
+"""
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from .revocation import revoked_tokens
+
+
+class RefreshToken(BaseRefreshToken):
+
+    def check_blacklist(self):
+        if revoked_tokens.might_be_revoked(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        revoked_tokens.add([self.payload[api_settings.JTI_CLAIM]])
+        return result
@@ -4,11 +4,13 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
     TokenVerifyView,
 )
-from .views import UserRegistrationView, UserLoginView, UserLogoutView, UserProfileView, ChangePasswordView,DeleteUserView
+from .views import async_login_view, UserRegistrationView, UserLoginView, UserLogoutView, UserProfileView, ChangePasswordView,DeleteUserView
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='user-register'),
     path('login/', UserLoginView.as_view(), name='token_obtain_pair'),
+    # 异步版本，需在 ASGI 服务器下运行
+    path('login/async/', async_login_view, name='token_obtain_pair_async'),
     path('logout/', UserLogoutView.as_view(), name='user-logout'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
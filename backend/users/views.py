@@ -1,14 +1,26 @@
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.static import serve
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
 from rest_framework.views import APIView
-from django.contrib.auth import login, logout
+from django.contrib.auth import aauthenticate, login, logout
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
-from .serializers import UserRegistrationSerializer, UserLoginSerializer,UserProfileSerializer, ChangePasswordSerializer # Import ChangePasswordSerializer
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken # Import necessary models
+from .serializers import UserRegistrationSerializer, UserLoginSerializer,UserProfileSerializer, ChangePasswordSerializer, login_payload # Import ChangePasswordSerializer
+from .revocation import revoke_user_tokens
+from .tokens import RefreshToken
 from .models import CustomUser
 
+logger = logging.getLogger(__name__)
+
 class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
 
@@ -28,6 +40,41 @@ class UserLoginView(TokenObtainPairView):
     # 使用我们自定义的登录序列化器来处理账号/邮箱/手机号登录逻辑
     serializer_class = UserLoginSerializer
 
+@csrf_exempt
+@require_POST
+async def async_login_view(request):
+    """
+    Async variant of UserLoginView with the same request/response format.
+
+    The user lookup goes through the async ORM and the password hash runs in the
+    backend's hashing pool (see users.backends), so a login storm does not block
+    the event loop. Serve under ASGI.
+    """
+    try:
+        body = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'detail': 'Invalid JSON body.'}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({'detail': 'Invalid JSON body.'}, status=400)
+
+    errors = {field: ['该字段是必填项。'] for field in ('username', 'password') if not body.get(field)}
+    if errors:
+        return JsonResponse(errors, status=400)
+
+    user = await aauthenticate(request, username=str(body['username']), password=str(body['password']))
+    if user is None:
+        return JsonResponse(
+            {'detail': str(_("No active account found with the given credentials")), 'code': 'no_active_account'},
+            status=401
+        )
+    return JsonResponse(await sync_to_async(login_payload)(user), status=200)
+
+def avatar_variant_view(request, path):
+    """开发环境下提供头像缩略图；文件名即内容摘要，响应可以长期缓存"""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = f"public, max-age={settings.AVATAR_VARIANT_CACHE_SECONDS}, immutable"
+    return response
+
 class UserLogoutView(APIView):
     permission_classes = [AllowAny]
 
@@ -45,8 +92,11 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated] # 只允许认证用户访问
 
     def get_object(self):
-        # 返回当前登录用户
-        return self.request.user
+        # 返回当前登录用户；request.user 来自认证缓存，只加载了部分字段，
+        # 修改资料时重新从数据库读取，避免用缓存中的旧值覆盖其他字段
+        if self.request.method in SAFE_METHODS:
+            return self.request.user
+        return CustomUser.objects.get(pk=self.request.user.pk)
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -77,28 +127,24 @@ class ChangePasswordView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        # 重新从数据库读取，request.user 来自认证缓存（见 users/authentication.py）
+        return CustomUser.objects.get(pk=self.request.user.pk)
 
     def update(self, request, *args, **kwargs):
         self.object = self.get_object()
         serializer = self.get_serializer(data=request.data)
-        print(self.object.check_password('admin123456'))
         if serializer.is_valid():
-            print(f"serializer.validated_data: {serializer.validated_data}")
-            print(f"serializer.validated_data.get('old_password'): {serializer.validated_data.get('old_password')}")
-            print(f"serializer.validated_data: {serializer.validated_data}")
             if not self.object.check_password(serializer.validated_data.get("old_password")):
                 return Response({"old_password": ["Wrong password."]}, status=status.HTTP_400_BAD_REQUEST)
 
             self.object.set_password(serializer.validated_data.get("new_password"))
             self.object.save()
 
-            # Blacklist all refresh tokens for the user
+            # Blacklist all refresh tokens for the user (one bulk insert, see revocation.py)
             try:
-                for token in OutstandingToken.objects.filter(user=self.object):
-                    t, _ = BlacklistedToken.objects.get_or_create(token=token)
+                revoke_user_tokens(self.object)
             except Exception as e:
-                print(f"Error blacklisting tokens: {e}")
+                logger.exception(f"Error blacklisting tokens: {e}")
 
             return Response({"message": "Password updated successfully"}, status=status.HTTP_200_OK)
 